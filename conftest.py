@@ -1,6 +1,9 @@
 import sys
 import types
 import datetime
+import contextlib
+
+import pytest
 
 frappe = types.ModuleType("frappe")
 
@@ -61,3 +64,69 @@ sys.modules.setdefault("frappe.model.naming", naming_mod)
 payroll_entry_mod = types.ModuleType("hrms.payroll.doctype.payroll_entry.payroll_entry")
 payroll_entry_mod.PayrollEntry = type("PayrollEntry", (object,), {})
 sys.modules.setdefault("hrms.payroll.doctype.payroll_entry.payroll_entry", payroll_entry_mod)
+
+
+# Packages re-imported against the per-test frappe stub of ``fake_frappe``
+STUBBED_PACKAGES = (
+    "payroll_indonesia.config",
+    "payroll_indonesia.override",
+    "payroll_indonesia.utils",
+    "payroll_indonesia.payroll_indonesia",
+)
+
+
+def build_fake_frappe():
+    """
+    Fresh frappe stub with what Payroll Indonesia modules use at import time.
+    Submodules (utils, utils.safe_exec, model.document) are attributes of it.
+    """
+    stub = types.ModuleType("frappe")
+    stub.logger = lambda *a, **k: DummyLogger()
+    stub.log_error = lambda *a, **k: None
+    stub.throw = lambda *a, **k: None
+    stub.whitelist = lambda *a, **k: (lambda fn: fn)
+    stub.ValidationError = type("ValidationError", (Exception,), {})
+    stub.db = types.SimpleNamespace()
+    stub.session = types.SimpleNamespace(user="Administrator")
+
+    stub.utils = types.ModuleType("frappe.utils")
+    stub.utils.flt = lambda v, precision=None: float(v or 0)
+    stub.utils.cint = lambda v: int(v or 0)
+    stub.utils.getdate = lambda v: v
+    stub.utils.now = lambda: "2026-01-31 10:00:00"
+    stub.utils.file_lock = lambda *a, **k: contextlib.nullcontext()
+    stub.utils.safe_exec = types.ModuleType("frappe.utils.safe_exec")
+    stub.utils.safe_exec.safe_eval = lambda expr, context=None: eval(expr, context or {})
+
+    stub.model = types.ModuleType("frappe.model")
+    stub.model.document = types.ModuleType("frappe.model.document")
+    stub.model.document.Document = type("Document", (object,), {})
+    return stub
+
+
+@pytest.fixture
+def fake_frappe(monkeypatch):
+    """
+    Install a fresh ``build_fake_frappe()`` stub (and HRMS base classes) for one
+    test and drop the already imported ``STUBBED_PACKAGES`` modules, so they are
+    imported again against it. Tests set the frappe attributes they need.
+    """
+    stub = build_fake_frappe()
+    hrms_entry = types.ModuleType("hrms.payroll.doctype.payroll_entry.payroll_entry")
+    hrms_entry.PayrollEntry = object
+    hrms_slip = types.ModuleType("hrms.payroll.doctype.salary_slip.salary_slip")
+    hrms_slip.SalarySlip = object
+    for module in (
+        stub,
+        stub.utils,
+        stub.utils.safe_exec,
+        stub.model,
+        stub.model.document,
+        hrms_entry,
+        hrms_slip,
+    ):
+        monkeypatch.setitem(sys.modules, module.__name__, module)
+    for name in list(sys.modules):
+        if name.startswith(STUBBED_PACKAGES):
+            monkeypatch.delitem(sys.modules, name)
+    return stub
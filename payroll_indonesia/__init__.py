@@ -1,10 +1,12 @@
 __version__ = "1.0.0"
 
-import frappe
 
 def _patch_salary_slip_globals():
     """Resolve string hooks (e.g. 'payroll_indonesia.config.get_bpjs_cap')
     into actual callable functions, so Salary Slip safe_eval can use them."""
+    # Imported here so payroll_indonesia.engine can be imported without frappe
+    import frappe
+
     hooks = frappe.get_hooks("salary_slip_globals") or {}
     globals_dict = {}
     for key, paths in hooks.items():
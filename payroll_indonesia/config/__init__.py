@@ -6,6 +6,7 @@ from .config import (
     get_ter_code,
     get_ter_rate,
     get_value,
+    resolve_tax_status_bulk,
     get_biaya_jabatan_rate,
     get_biaya_jabatan_cap_yearly,
     get_biaya_jabatan_cap_monthly,
@@ -19,6 +20,7 @@ __all__ = [
     "get_ptkp_amount",
     "get_ter_code",
     "get_ter_rate",
+    "resolve_tax_status_bulk",
     "get_biaya_jabatan_rate",
     "get_biaya_jabatan_cap_yearly",
     "get_biaya_jabatan_cap_monthly",
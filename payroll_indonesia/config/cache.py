@@ -0,0 +1,79 @@
+"""
+Per-process caches for Payroll Indonesia lookup tables.
+
+Compiled tables (TER brackets, PTKP map, ...) are kept in a module level dict
+so a payroll run does not hit the database for every salary slip. Each entry is
+tagged with a version token stored in the site cache (Redis); saving Payroll
+Indonesia Settings (its child tables are saved with it) bumps the token, which
+makes every worker process rebuild its copy on the next lookup.
+"""
+
+from typing import Any, Callable, Dict, Tuple
+
+import frappe
+
+logger = frappe.logger("payroll_indonesia.config")
+
+# name -> (version token, compiled value)
+_local_cache: Dict[str, Tuple[str, Any]] = {}
+
+# Cache names invalidated together whenever Payroll Indonesia Settings changes
+SETTINGS_CACHES = ("ter_index", "tax_status_map")
+
+
+def _version_key(name: str) -> str:
+    return f"payroll_indonesia:{name}:version"
+
+
+def get_version(name: str) -> str:
+    """
+    Return the site-wide version token for a cached table.
+
+    A missing token (fresh site or flushed Redis) is replaced with a new one so
+    that values compiled before the flush are never reused.
+    """
+    key = _version_key(name)
+    try:
+        version = frappe.cache().get_value(key)
+        if not version:
+            version = frappe.generate_hash(length=10)
+            frappe.cache().set_value(key, version)
+        return str(version)
+    except Exception as e:
+        # Without Redis we can't coordinate processes; keep the local copy
+        logger.warning(f"Site cache unavailable for {name}: {str(e)}")
+        return "local"
+
+
+def get_cached(name: str, builder: Callable[[], Any]) -> Any:
+    """
+    Return the compiled value for ``name``, rebuilding it with ``builder`` when
+    the site-wide version token has changed.
+    """
+    version = get_version(name)
+    entry = _local_cache.get(name)
+    if entry and entry[0] == version:
+        return entry[1]
+
+    value = builder()
+    _local_cache[name] = (version, value)
+    return value
+
+
+def invalidate(*names: str) -> None:
+    """Drop local copies and bump the site-wide version of the given caches."""
+    for name in names:
+        _local_cache.pop(name, None)
+        try:
+            frappe.cache().set_value(_version_key(name), frappe.generate_hash(length=10))
+        except Exception as e:
+            logger.warning(f"Failed to bump cache version for {name}: {str(e)}")
+
+
+def clear_settings_cache(doc=None, method=None) -> None:
+    """
+    doc_events hook: invalidate all settings-derived caches.
+    Used for Payroll Indonesia Settings and its child table DocTypes.
+    """
+    invalidate(*SETTINGS_CACHES)
+    logger.debug(f"Payroll Indonesia caches invalidated ({method or 'manual'})")
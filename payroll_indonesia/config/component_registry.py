@@ -0,0 +1,84 @@
+"""
+Salary Component role registry.
+
+The PPh21 helpers used to lower-case every slip row's component name and
+substring-match it ("biaya jabatan", "bpjs jht employee", ...) for every row of
+every slip. The registry resolves each ``Salary Component`` once into a
+``ComponentRole`` and a ``ComponentFlag`` bitmask; the helpers then only test
+bits. It is cached per process and rebuilt when a Salary Component changes
+(see ``payroll_indonesia.config.cache``).
+
+The flag fields of a slip row (``is_tax_applicable``, ``statistical_component``,
+...) are read from the row itself, a missing field counting as 0, so existing
+slips compute the same amounts as before.
+
+Roles, flags and the row resolution are frappe-free and live in
+``payroll_indonesia.engine.components``; this module loads and caches them.
+"""
+
+from typing import Optional
+
+import frappe
+
+from payroll_indonesia.config import cache
+from payroll_indonesia.engine.components import (  # noqa: F401 (re-exported)
+    BIAYA_JABATAN,
+    BPJS,
+    BPJS_ROLES,
+    BPJS_SIDES,
+    BRUTO,
+    EMPLOYEE,
+    EMPLOYER,
+    EXEMPT,
+    FLAG_FIELDS,
+    NAME_FLAGS,
+    NOT_IN_TOTAL,
+    PENGURANG_NETTO,
+    PENGURANG_NETTO_NAME,
+    PENGURANG_NETTO_NAMES,
+    PPH21,
+    PPH21_NAMES,
+    STATISTICAL,
+    TAX_DEDUCTION,
+    ComponentFlag,
+    ComponentInfo,
+    ComponentRegistry,
+    ComponentRole,
+    build_component_registry,
+    classify_component_name,
+)
+
+logger = frappe.logger("payroll_indonesia.config")
+
+CACHE_NAME = "salary_component_registry"
+
+
+def load_component_registry() -> ComponentRegistry:
+    """Read every Salary Component with a single query."""
+    try:
+        meta = frappe.get_meta("Salary Component")
+        fields = ["name"] + [field for field, _ in FLAG_FIELDS if meta.has_field(field)]
+        rows = frappe.get_all("Salary Component", fields=fields)
+    except Exception as e:
+        # Name-based roles still work without the stored component flags
+        logger.warning(f"Failed to load Salary Component registry: {str(e)}")
+        return ComponentRegistry()
+
+    registry = build_component_registry(rows)
+    logger.info(f"Loaded Salary Component registry with {len(registry)} components")
+    return registry
+
+
+def get_component_registry() -> ComponentRegistry:
+    """Return the Salary Component registry for this process, rebuilding it if stale."""
+    return cache.get_cached(CACHE_NAME, load_component_registry)
+
+
+def resolve_registry(components: Optional[ComponentRegistry] = None) -> ComponentRegistry:
+    return components if components is not None else get_component_registry()
+
+
+def clear_component_registry(doc=None, method=None) -> None:
+    """doc_events hook for Salary Component: rebuild the registry on next use."""
+    cache.invalidate(CACHE_NAME)
+    logger.debug(f"Salary Component registry invalidated ({method or 'manual'})")
@@ -2,6 +2,9 @@ import frappe
 from frappe import ValidationError
 from frappe.utils import flt
 
+from payroll_indonesia.config.tax_status import get_tax_status_map, resolve_tax_statuses
+from payroll_indonesia.config.ter_index import get_ter_table
+
 # Define all defaults in one place for better maintenance
 DEFAULTS = {
     "SETTINGS_DOCTYPE": "Payroll Indonesia Settings",
@@ -79,7 +82,7 @@ def get_numeric(fieldname: str, default_key: str = None) -> float:
     
     # If value is None or empty and we have a default, log and return default
     if (value is None or value == "") and default is not None:
-        logger.info(
+        logger.debug(
             f"Field '{fieldname}' not found in {DEFAULTS['SETTINGS_DOCTYPE']}. Using default: {default}"
         )
         return float(default)
@@ -105,27 +108,18 @@ def get_ptkp_amount_from_tax_status(tax_status: str) -> float:
     """
     Return PTKP amount for the given tax_status from PTKP Table.
     Uses field 'ptkp_amount' as per latest migration.
+    Served from the cached tax_status map (no DB round trip per call).
     """
     if not tax_status:
         logger.error("PTKP amount lookup: tax_status is empty.")
         raise ValidationError("PTKP amount lookup: tax_status is empty.")
         
-    if not frappe.db.exists("PTKP Table", {"tax_status": tax_status}):
+    info = get_tax_status_map().get(tax_status)
+    if info is None or info.ptkp_amount is None:
         logger.error(f"PTKP Table: tax_status '{tax_status}' not found.")
         raise ValidationError(f"PTKP Table: tax_status '{tax_status}' not found.")
         
-    row = frappe.get_value(
-        "PTKP Table",
-        {"tax_status": tax_status},
-        ["ptkp_amount"],
-        as_dict=True,
-    )
-    
-    if row and row.get("ptkp_amount") is not None:
-        return flt(row["ptkp_amount"])
-        
-    logger.warning(f"PTKP Table: No ptkp_amount found for tax_status '{tax_status}'.")
-    return 0.0
+    return info.ptkp_amount
 
 def get_ptkp_amount(employee_doc) -> float:
     """
@@ -143,7 +137,7 @@ def get_ptkp_amount(employee_doc) -> float:
 def get_ter_code(employee_doc) -> str | None:
     """
     Get TER code for employee from TER Mapping Table based on tax_status.
-    Returns None if not found.
+    Served from the cached tax_status map. Returns None if not found.
     """
     if hasattr(employee_doc, "tax_status"):
         tax_status = getattr(employee_doc, "tax_status")
@@ -156,52 +150,48 @@ def get_ter_code(employee_doc) -> str | None:
         logger.warning("TER code lookup: Employee tax_status is empty.")
         return None
         
-    if not frappe.db.exists("TER Mapping Table", {"tax_status": tax_status}):
+    info = get_tax_status_map().get(tax_status)
+    if info is None:
         logger.warning(f"TER Mapping Table: tax_status '{tax_status}' not found.")
         return None
         
-    row = frappe.get_value(
-        "TER Mapping Table",
-        {"tax_status": tax_status},
-        ["ter_code"],
-        as_dict=True,
-    )
-    
-    if row and "ter_code" in row:
-        return row["ter_code"]
+    if info.ter_code:
+        return info.ter_code
         
     logger.warning(f"TER Mapping Table: No ter_code found for tax_status '{tax_status}'.")
     return None
 
+def resolve_tax_status_bulk(tax_statuses) -> dict:
+    """
+    Resolve PTKP amount and TER code for many tax statuses in one call.
+    Returns {tax_status: {"ptkp_amount": float | None, "ter_code": str | None}};
+    unknown statuses map to None.
+    """
+    return {
+        status: info.as_dict() if info else None
+        for status, info in resolve_tax_statuses(tax_statuses).items()
+    }
+
 def get_ter_rate(ter_code: str, monthly_income: float) -> float:
     """
     Get TER rate from TER Bracket Table for given ter_code and monthly_income.
-    Returns rate_percent (float), 0.0 if not found.
+    Uses the compiled bracket index (one bisect per lookup, no DB query).
+    Returns rate_percent (float), 0.0 if ter_code is empty.
     """
     if not ter_code:
         logger.warning("TER rate lookup: ter_code is empty.")
         return 0.0
         
-    brackets = frappe.get_all(
-        "TER Bracket Table",
-        filters={"ter_code": ter_code},
-        fields=["min_income", "max_income", "rate_percent"],
-        order_by="min_income asc",
-    )
-    
-    if not brackets:
+    index = get_ter_table().get(ter_code)
+    if not index:
         error_msg = f"TER Bracket Table: No brackets found for ter_code '{ter_code}'."
         logger.error(error_msg)
         raise ValidationError(error_msg)
-        
-    for row in brackets:
-        min_income = flt(row.get("min_income") or 0)
-        max_income = flt(row.get("max_income") or 0)
-        rate = flt(row.get("rate_percent") or 0)
-        # If max_income == 0, treat as infinity
-        if monthly_income >= min_income and (max_income == 0 or monthly_income <= max_income):
-            return rate
-            
+
+    rate = index.lookup(flt(monthly_income))
+    if rate is not None:
+        return rate
+
     error_msg = f"TER Bracket Table: No bracket match for ter_code '{ter_code}' and monthly_income {monthly_income}."
     logger.error(error_msg)
     raise ValidationError(error_msg)
@@ -231,6 +221,19 @@ def is_auto_queue_salary_slip() -> bool:
     """
     return bool(int(get_value("auto_queue_salary_slip", 0)))
 
+def get_calculation_process_workers() -> int:
+    """
+    Return the number of worker processes for PPh21 TER calculation (0 = in-process).
+    """
+    return max(int(get_value("calculation_process_workers", 0) or 0), 0)
+
+def is_annual_history_write_behind() -> bool:
+    """
+    Return True if Salary Slip submit/cancel only queue their Annual Payroll History
+    update (annual_history_write_behind checked); a scheduled job applies the queue.
+    """
+    return bool(int(get_value("annual_history_write_behind", 0) or 0))
+
 def is_salary_slip_use_component_cache() -> bool:
     """
     Return True if salary slip should use component cache (salary_slip_use_component_cache checked).
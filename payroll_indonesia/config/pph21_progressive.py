@@ -1,70 +1,53 @@
+"""
+PPh21 progresif setahun (Pasal 17).
+
+Adapter di atas ``payroll_indonesia.engine.progressive``: PTKP, slab dan
+registry komponen diambil dari cache settings, perhitungannya di engine.
+"""
+
 import frappe
 from frappe.utils import flt
 from payroll_indonesia.config import config
-
-# Default progressive tax slabs PMK 168/2023 (berlaku 2024)
-DEFAULT_TAX_SLABS = [
-    (60_000_000, 5),
-    (250_000_000, 15),
-    (500_000_000, 25),
-    (5_000_000_000, 30),
-    (float("inf"), 35),
-]
+from payroll_indonesia.config import component_registry as cr
+from payroll_indonesia.config.component_registry import get_component_registry, resolve_registry
+from payroll_indonesia.config.tax_slabs import (
+    DEFAULT_TAX_SLABS,
+    CompiledTaxSlabs,
+    compile_tax_slabs,
+    get_compiled_tax_slabs,
+)
+from payroll_indonesia.config.tax_status import get_tax_status_map
+from payroll_indonesia.engine import progressive
+from payroll_indonesia.engine.progressive import calculate_pkp_annual  # noqa: F401 (re-exported)
+from payroll_indonesia.utils.rupiah import to_rupiah
 
 def get_tax_slabs():
     """Ambil daftar tax slab dari dokumen Income Tax Slab di settings, fallback ke DEFAULT_TAX_SLABS."""
-    slab_name = config.get_value("fallback_income_tax_slab")
-    if not slab_name:
-        return DEFAULT_TAX_SLABS
-
-    try:
-        slab_doc = frappe.get_cached_doc("Income Tax Slab", slab_name)
-    except Exception:
-        frappe.logger().warning("Income Tax Slab %s tidak ditemukan", slab_name)
-        return DEFAULT_TAX_SLABS
-
-    slabs = []
-    for row in slab_doc.get("slabs", []):
-        batas = flt(row.to_amount or 0)
-        if batas == 0:
-            batas = float("inf")
-        rate = flt(row.percent_deduction or 0)
-        slabs.append((batas, rate))
-
-    if not slabs:
-        return DEFAULT_TAX_SLABS
-
-    slabs.sort(key=lambda x: x[0])
-    return slabs
+    return get_compiled_tax_slabs().slabs
 
 def get_ptkp_amount(tax_status):
-    """Ambil PTKP dari table di settings."""
-    settings = config.get_settings()
-    for row in settings.get("ptkp_table", []):
-        if row.tax_status == tax_status:
-            return flt(row.ptkp_amount)
+    """Ambil PTKP dari map tax_status yang di-cache (PTKP Table)."""
+    info = get_tax_status_map().get(tax_status) if tax_status else None
+    if info and info.ptkp_amount is not None:
+        return info.ptkp_amount
     return 0.0
 
-def sum_bruto_earnings(salary_slip):
+def sum_bruto_earnings(salary_slip, components=None):
     """
     Jumlahkan seluruh komponen earning yang menambah penghasilan bruto (termasuk natura taxable).
     - is_tax_applicable = 1 (atau is_income_tax_component/variable_based_on_taxable_salary = 1)
     - statistical_component = 0
     - exempted_from_income_tax = 0 (jika field ada)
     """
+    registry = resolve_registry(components)
     total = 0.0
     for row in salary_slip.get("earnings", []):
-        if (
-            (row.get("is_tax_applicable", 0) == 1 or
-             row.get("is_income_tax_component", 0) == 1 or
-             row.get("variable_based_on_taxable_salary", 0) == 1)
-            and row.get("statistical_component", 0) == 0
-            and row.get("exempted_from_income_tax", 0) == 0
-        ):
+        flags = registry.row_flags(row)
+        if flags & cr.BRUTO and not flags & (cr.STATISTICAL | cr.EXEMPT):
             total += flt(row.amount)
     return total
 
-def sum_income_tax_deductions(salary_slip):
+def sum_income_tax_deductions(salary_slip, components=None):
     """
     Jumlahkan deduction pengurang netto (BPJS Kesehatan Employee, BPJS JHT Employee, BPJS JP Employee, dsb).
     - is_income_tax_component = 1 atau variable_based_on_taxable_salary = 1
@@ -72,54 +55,39 @@ def sum_income_tax_deductions(salary_slip):
     - statistical_component = 0
     - EXCLUDE biaya jabatan!
     """
+    registry = resolve_registry(components)
     total = 0.0
     for row in salary_slip.get("deductions", []):
+        flags = registry.row_flags(row)
         if (
-            (row.get("is_income_tax_component", 0) == 1 or
-             row.get("variable_based_on_taxable_salary", 0) == 1)
-            and row.get("do_not_include_in_total", 0) == 0
-            and row.get("statistical_component", 0) == 0
-            and "biaya jabatan" not in row.get("salary_component", "").lower()
+            flags & cr.TAX_DEDUCTION
+            and not flags & (cr.NOT_IN_TOTAL | cr.STATISTICAL | cr.BIAYA_JABATAN)
         ):
             total += flt(row.amount)
     return total
 
-def get_biaya_jabatan_from_component(salary_slip):
+def get_biaya_jabatan_from_component(salary_slip, components=None):
     """
     Ambil nilai biaya jabatan dari komponen deduction 'Biaya Jabatan' jika tersedia pada salary slip.
     Jika tidak ditemukan, return 0.
     """
+    registry = resolve_registry(components)
     for row in salary_slip.get("deductions", []):
-        if "biaya jabatan" in row.get("salary_component", "").lower():
+        if registry.get(row.get("salary_component")).flags & cr.BIAYA_JABATAN:
             return flt(row.amount)
     return 0.0
 
-def calculate_pkp_annual(netto_total, ptkp_annual):
-    """
-    PKP tahunan = (total netto setahun - PTKP setahun), dibulatkan ke ribuan terdekat.
-    """
-    pkp = max(netto_total - ptkp_annual, 0)
-    return int(round(pkp / 1000.0)) * 1000
-
-def calculate_pph21_progressive(pkp_annual):
+def calculate_pph21_progressive(pkp_annual, slabs=None):
     """
     Hitung PPh 21 setahun dengan metode progresif (slab).
+    Tanpa ``slabs`` dipakai slab dari settings (``fallback_income_tax_slab``).
     Return: total pph setahun
     """
-    pajak = 0
-    pkp_left = pkp_annual
-    lower_limit = 0
-
-    for batas, rate in get_tax_slabs():
-        if pkp_left <= 0:
-            break
-        lapisan = min(pkp_left, batas - lower_limit)
-        pajak += lapisan * rate / 100
-        pkp_left -= lapisan
-        lower_limit = batas
-    return pajak
+    if slabs is None:
+        slabs = get_compiled_tax_slabs()
+    return progressive.calculate_pph21_progressive(pkp_annual, slabs)
 
-def calculate_pph21_progressive_year(employee, salary_slips, pph21_paid_jan_nov=0):
+def calculate_pph21_progressive_year(employee, salary_slips, pph21_paid_jan_nov=0, settings=None):
     """
     Hitung PPh 21 progressive/normal (Desember/final year) berdasarkan income tax slab.
     Hanya untuk Employment Type: Full-time.
@@ -128,6 +96,9 @@ def calculate_pph21_progressive_year(employee, salary_slips, pph21_paid_jan_nov=
         employee: dict atau doc Employee (punya tax_status dan employment_type)
         salary_slips: list of dict, slip seluruh tahun berjalan (Jan–Des)
         pph21_paid_jan_nov: float, total PPh21 yang sudah dipotong/dibayar Jan–Nov
+        settings: snapshot Payroll Indonesia Settings (opsional); bila diberikan
+                  PTKP, slab dan registry komponen diambil dari snapshot, dan bila
+                  ``integer_rupiah`` aktif semua nominal dihitung dalam rupiah bulat
 
     Returns:
         dict: {
@@ -151,63 +122,29 @@ def calculate_pph21_progressive_year(employee, salary_slips, pph21_paid_jan_nov=
         employment_type = employee.get("employment_type")
 
     if employment_type != "Full-time":
-        return {
-            "bruto_total": 0.0,
-            "netto_total": 0.0,
-            "ptkp_annual": 0.0,
-            "pkp_annual": 0.0,
-            "rate": "",
-            "pph21_annual": 0.0,
-            "pph21_bulan": 0.0,
-            "income_tax_deduction_total": 0.0,
-            "biaya_jabatan_total": 0.0,
-            "koreksi_pph21": 0.0,
-            "employment_type_checked": False,
-            "message": "PPh21 Progressive hanya dihitung untuk Employment Type: Full-time"
-        }
-
-    # 1. PTKP tahunan
-    tax_status = getattr(employee, "tax_status", None) if hasattr(employee, "tax_status") else employee.get("tax_status")
-    ptkp_annual = get_ptkp_amount(tax_status)
-
-    # 2. Jumlah slip gaji tahun berjalan (Jan–Des)
-    bruto_total = 0.0
-    income_tax_deduction_total = 0.0
-    biaya_jabatan_total = 0.0
-    netto_total = 0.0
-
-    for slip in salary_slips:
-        bruto = sum_bruto_earnings(slip)
-        pengurang_netto = sum_income_tax_deductions(slip)
-        biaya_jabatan = get_biaya_jabatan_from_component(slip)
-        netto = bruto - pengurang_netto - biaya_jabatan
-        bruto_total += bruto
-        income_tax_deduction_total += pengurang_netto
-        biaya_jabatan_total += biaya_jabatan
-        netto_total += netto
-
-    # 3. PKP tahunan
-    pkp_annual = calculate_pkp_annual(netto_total, ptkp_annual)
-
-    # 4. Hitung PPh progresif setahun
-    pph21_annual = calculate_pph21_progressive(pkp_annual)
-    # 5. Pajak bulan Desember/final
-    koreksi_pph21 = pph21_annual - pph21_paid_jan_nov
-    pph21_bulan = koreksi_pph21
-
-    # 6. Rate info (for audit only)
-    rates = "/".join([f"{rate}%" for _, rate in get_tax_slabs()])
-
-    return {
-        "bruto_total": bruto_total,
-        "netto_total": netto_total,
-        "ptkp_annual": ptkp_annual,
-        "pkp_annual": pkp_annual,
-        "rate": rates,
-        "pph21_annual": pph21_annual,
-        "pph21_bulan": pph21_bulan,
-        "income_tax_deduction_total": income_tax_deduction_total,
-        "biaya_jabatan_total": biaya_jabatan_total,
-        "koreksi_pph21": koreksi_pph21,
-        "employment_type_checked": True
-    }
\ No newline at end of file
+        return dict(progressive.NOT_FULL_TIME)
+
+    if settings is None:
+        # PTKP tahunan
+        tax_status = getattr(employee, "tax_status", None) if hasattr(employee, "tax_status") else employee.get("tax_status")
+        return progressive.calculate_progressive_year(
+            salary_slips,
+            get_ptkp_amount(tax_status),
+            pph21_paid_jan_nov,
+            slabs=get_compiled_tax_slabs(),
+            registry=get_component_registry(),
+        )
+
+    # PTKP, slab dan registry dari snapshot yang sama untuk seluruh run
+    ptkp_annual = settings.get_ptkp_amount(employee)
+    if settings.integer_rupiah:
+        ptkp_annual = to_rupiah(ptkp_annual)
+        pph21_paid_jan_nov = to_rupiah(pph21_paid_jan_nov)
+    return progressive.calculate_progressive_year(
+        salary_slips,
+        ptkp_annual,
+        pph21_paid_jan_nov,
+        slabs=settings.tax_slabs,
+        registry=settings.components,
+        integer=settings.integer_rupiah,
+    )
@@ -6,6 +6,9 @@ It uses the TER method (monthly table) for tax calculation.
 
 IMPORTANT: This module only handles monthly TER calculations.
            December/annual calculations must use pph21_ter_december.py
+
+The arithmetic is ``payroll_indonesia.engine.ter``; this module validates the
+input, resolves PTKP and TER code from the settings snapshot and logs.
 """
 
 import frappe
@@ -14,29 +17,22 @@ from frappe.utils import flt
 from typing import Dict, Any, Optional, Union, List
 
 # Prevent circular imports - only import config constants
-from payroll_indonesia.config import (
-    get_ptkp_amount,
-    get_ter_code,
-    get_ter_rate,
-    get_biaya_jabatan_rate,
-    get_biaya_jabatan_cap_monthly,
+from payroll_indonesia.config import component_registry as cr
+from payroll_indonesia.config.component_registry import (
+    PENGURANG_NETTO_NAMES,
+    ComponentRegistry,
+    resolve_registry,
 )
-from payroll_indonesia.utils import round_half_up
-
-# Constants for component identification
-PENGURANG_NETTO_NAMES = {
-    "bpjs kesehatan employee",   # 1% karyawan
-    "bpjs jht employee",         # 2% karyawan
-    "bpjs jp employee",          # 1% karyawan
-    # tambahkan jika ada iuran pensiun lain:
-    "iuran pensiun",
-    "dana pensiun",
-}
+from payroll_indonesia.config.slip_reducer import SlipAggregates
+from payroll_indonesia.config.snapshot import PayrollSettingsSnapshot, get_settings_snapshot
+from payroll_indonesia.engine import ter
 
 def calculate_pph21_TER(taxable_income: Union[float, Dict[str, Any]],
                         employee: Union[Dict[str, Any], Any],
                         company: str,
-                        bulan: int = None) -> Dict[str, Any]:
+                        bulan: int = None,
+                        settings: Optional[PayrollSettingsSnapshot] = None,
+                        aggregates: Optional[SlipAggregates] = None) -> Dict[str, Any]:
     """
     Calculate monthly PPh21 using TER (Tabel Pajak Bulanan) method.
     
@@ -45,6 +41,9 @@ def calculate_pph21_TER(taxable_income: Union[float, Dict[str, Any]],
         employee: Employee document or dictionary with employee data
         company: Company name or ID
         bulan: Nomor bulan (1-12), optional if provided in taxable_income
+        settings: Settings snapshot of the payroll run; defaults to the
+                  snapshot of the current request
+        aggregates: ``reduce_slip`` result of the slip, if the caller already has it
         
     Returns:
         Dictionary with calculation results including pph21 amount
@@ -88,68 +87,44 @@ def calculate_pph21_TER(taxable_income: Union[float, Dict[str, Any]],
     if emp_type != "Full-time":
         return {"employment_type_checked": False, "pph21": 0.0}
     
-    # Calculate bruto income
-    if slip_data:
-        bruto = sum_bruto_earnings(slip_data)
-    else:
-        # Use provided taxable_income as gross value
-        bruto = flt(taxable_income)
-    
-    # Calculate biaya jabatan (occupational deduction)
-    bj_rate = get_biaya_jabatan_rate()
-    bj_cap = get_biaya_jabatan_cap_monthly()
-    
-    if slip_data:
-        biaya_jabatan = get_biaya_jabatan_from_component(slip_data) or min(
-            bruto * bj_rate / 100, bj_cap
-        )
-        # Calculate other deductions from slip
-        pengurang_netto = sum_pengurang_netto(slip_data)
-    else:
-        # Standard calculations if no slip data
-        biaya_jabatan = min(bruto * bj_rate / 100, bj_cap)
-        pengurang_netto = 0.0  # No deductions available without slip data
-    
-    # Calculate netto income
-    netto = bruto - biaya_jabatan - pengurang_netto
-    
+    if settings is None:
+        settings = get_settings_snapshot()
+
     # Get PTKP (non-taxable income threshold)
     try:
-        ptkp = flt(get_ptkp_amount(employee) / 12)
-    except ValidationError as e:
-        frappe.logger().warning(str(e))
-        ptkp = 0.0
-    
-    # Calculate PKP (taxable income after PTKP)
-    pkp = max(netto - ptkp, 0)
-    
-    # Get TER rate based on employee code and bruto
-    ter_code = get_ter_code(employee)
-    try:
-        rate = get_ter_rate(ter_code, bruto)
+        ptkp_annual = settings.get_ptkp_amount(employee)
     except ValidationError as e:
         frappe.logger().warning(str(e))
-        rate = 0.0
-    
-    # Calculate tax amount
-    pph21 = round_half_up(bruto * rate / 100)
-    
-    # Prepare result
-    result = {
-        "ptkp": ptkp,
-        "bruto": bruto,
-        "pengurang_netto": pengurang_netto,
-        "biaya_jabatan": biaya_jabatan,
-        "netto": netto,
-        "pkp": pkp,
-        "rate": rate,
-        "pph21": pph21,
-        "employment_type_checked": True,
-    }
+        ptkp_annual = 0.0
+
+    # Bruto, biaya jabatan, netto, PKP and the TER rate are computed by the engine
+    result, _, unmatched = ter.calculate_ter_slip(
+        ter.TERSlipInput(
+            slip_data if slip_data else taxable_income,
+            True,
+            ptkp_annual,
+            settings.get_ter_code(employee),
+        ),
+        ter.TERParams.from_settings(settings),
+        settings.components,
+        aggregates if slip_data else None,
+    )
+    if unmatched:
+        ter_code, found = unmatched
+        if found:
+            frappe.logger().warning(
+                f"TER Bracket Table: No bracket match for ter_code '{ter_code}' "
+                f"and monthly_income {result['bruto']}."
+            )
+        else:
+            frappe.logger().warning(
+                f"TER Bracket Table: No brackets found for ter_code '{ter_code}'."
+            )
     
     return result
 
-def sum_bruto_earnings(salary_slip: Dict[str, Any]) -> float:
+def sum_bruto_earnings(salary_slip: Dict[str, Any],
+                       components: Optional[ComponentRegistry] = None) -> float:
     """
     Sum all earning components contributing to bruto pay (including taxable natura).
     Criteria:
@@ -159,43 +134,41 @@ def sum_bruto_earnings(salary_slip: Dict[str, Any]) -> float:
       - statistical_component = 0
       - exempted_from_income_tax = 0 (if field exists)
     """
+    registry = resolve_registry(components)
     total = 0.0
     earnings = salary_slip.get("earnings", [])
     for row in earnings:
-        if (
-            (row.get("is_tax_applicable", 0) == 1 or
-             row.get("is_income_tax_component", 0) == 1 or
-             row.get("variable_based_on_taxable_salary", 0) == 1)
-            and row.get("statistical_component", 0) == 0
-            and row.get("exempted_from_income_tax", 0) == 0
-        ):
+        flags = registry.row_flags(row)
+        if flags & cr.BRUTO and not flags & (cr.STATISTICAL | cr.EXEMPT):
             total += flt(row.get("amount", 0))
     return total
 
-def sum_pengurang_netto(slip: Dict[str, Any]) -> float:
+def sum_pengurang_netto(slip: Dict[str, Any],
+                        components: Optional[ComponentRegistry] = None) -> float:
     """
     Total pengurang netto:
       • baris deduction ber-flag is_pengurang_netto = 1  ──► fleksibel
       • ATAU nama komponen ada di PENGURANG_NETTO_NAMES
     Abaikan baris 'Biaya Jabatan'.
     """
+    registry = resolve_registry(components)
     total = 0.0
     for row in slip.get("deductions", []):
-        if "biaya jabatan" in (row.get("salary_component") or "").lower():
+        flags = registry.row_flags(row)
+        if flags & cr.BIAYA_JABATAN:
             continue
-        if (
-            row.get("is_pengurang_netto", 0) == 1
-            or (row.get("salary_component") or "").lower() in PENGURANG_NETTO_NAMES
-        ):
+        if flags & (cr.PENGURANG_NETTO | cr.PENGURANG_NETTO_NAME):
             total += flt(row.get("amount", 0))
     return total
 
-def get_biaya_jabatan_from_component(salary_slip: Dict[str, Any]) -> float:
+def get_biaya_jabatan_from_component(salary_slip: Dict[str, Any],
+                                     components: Optional[ComponentRegistry] = None) -> float:
     """
     Get 'Biaya Jabatan' deduction from salary slip, return 0 if not present.
     """
+    registry = resolve_registry(components)
     deductions = salary_slip.get("deductions", [])
     for row in deductions:
-        if "biaya jabatan" in row.get("salary_component", "").lower():
+        if registry.get(row.get("salary_component")).flags & cr.BIAYA_JABATAN:
             return flt(row.get("amount", 0))
-    return 0.0
\ No newline at end of file
+    return 0.0
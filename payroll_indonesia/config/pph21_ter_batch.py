@@ -0,0 +1,268 @@
+"""
+Batch PPh21 TER calculation for a whole payroll run.
+
+``calculate_pph21_TER`` works on one employee at a time. For a Payroll Entry with
+thousands of slips the per-slip inputs (bruto, biaya jabatan component,
+pengurang netto, PTKP, TER code) are collected once into columns and the
+arithmetic and TER rate lookup run over the whole column: with NumPy the rate is
+found with one ``searchsorted`` per TER code, without it the columns are
+``array('d')`` and each rate is a ``bisect`` on the compiled TER index followed
+by ``engine.ter.ter_result``. In integer-rupiah mode (``use_integer_rupiah``)
+the arithmetic runs on whole rupiah.
+
+Results are the same dictionaries ``calculate_pph21_TER`` returns, to the rupiah.
+"""
+
+from array import array
+from typing import Any, Dict, List, Optional, Sequence
+
+import frappe
+from frappe import ValidationError
+from frappe.utils import flt
+
+from payroll_indonesia.config.slip_reducer import SlipAggregates, reduce_slip
+from payroll_indonesia.config.snapshot import (
+    PayrollSettingsSnapshot,
+    _employee_tax_status,
+    get_settings_snapshot,
+)
+from payroll_indonesia.engine.ter import NOT_ELIGIBLE, TERParams, ter_result
+from payroll_indonesia.utils import round_half_up
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; the array/bisect path gives the same results
+    np = None
+
+logger = frappe.logger("payroll_indonesia.config")
+
+
+class TERBatchColumns:
+    """Columnar inputs of a batch; row ``i`` belongs to ``slips[i]``."""
+
+    __slots__ = (
+        "size",
+        "eligible",
+        "bruto",
+        "biaya_jabatan_component",
+        "pengurang_netto",
+        "ptkp_annual",
+        "ter_codes",
+    )
+
+    def __init__(self, size: int):
+        self.size = size
+        self.eligible = array("b", bytes(size))
+        self.bruto = array("d", bytes(8 * size))
+        self.biaya_jabatan_component = array("d", bytes(8 * size))
+        self.pengurang_netto = array("d", bytes(8 * size))
+        self.ptkp_annual = array("d", bytes(8 * size))
+        self.ter_codes: List[Optional[str]] = [None] * size
+
+
+def _employment_type(employee: Any) -> Optional[str]:
+    if isinstance(employee, dict):
+        return employee.get("employment_type")
+    return getattr(employee, "employment_type", None)
+
+
+def collect_ter_columns(
+    slips: Sequence[Any],
+    employees: Sequence[Any],
+    settings: PayrollSettingsSnapshot,
+    aggregates: Optional[Sequence[Optional[SlipAggregates]]] = None,
+) -> TERBatchColumns:
+    """
+    Read every slip once into columns.
+
+    ``slips[i]`` is either a slip dict with ``earnings``/``deductions`` (as passed
+    to ``calculate_pph21_TER``) or a plain gross amount. ``aggregates[i]``, when
+    given, is the ``reduce_slip`` result of ``slips[i]``.
+    """
+    if len(slips) != len(employees) or (aggregates is not None and len(aggregates) != len(slips)):
+        raise ValidationError(
+            f"PPh21 TER batch: {len(slips)} slips but {len(employees)} employees."
+        )
+
+    cols = TERBatchColumns(len(slips))
+    missing_ptkp: Dict[str, int] = {}
+
+    for i, (slip, employee) in enumerate(zip(slips, employees)):
+        if _employment_type(employee) != "Full-time":
+            continue
+        cols.eligible[i] = 1
+
+        if isinstance(slip, dict) and slip.get("earnings") is not None:
+            agg = aggregates[i] if aggregates is not None else None
+            if agg is None or agg.integer != settings.integer_rupiah:
+                agg = reduce_slip(slip, settings.components, integer=settings.integer_rupiah)
+            cols.bruto[i] = agg.bruto
+            cols.biaya_jabatan_component[i] = agg.biaya_jabatan
+            cols.pengurang_netto[i] = agg.pengurang_netto
+        else:
+            cols.bruto[i] = flt(slip)
+
+        try:
+            cols.ptkp_annual[i] = settings.get_ptkp_amount(employee)
+        except ValidationError:
+            status = _employee_tax_status(employee) or ""
+            missing_ptkp[status] = missing_ptkp.get(status, 0) + 1
+
+        cols.ter_codes[i] = settings.get_ter_code(employee)
+
+    for status, count in missing_ptkp.items():
+        logger.warning(
+            f"PTKP Table: tax_status '{status}' not found ({count} slips), PTKP set to 0."
+        )
+
+    return cols
+
+
+def _group_by_ter_code(cols: TERBatchColumns) -> Dict[str, List[int]]:
+    groups: Dict[str, List[int]] = {}
+    for i, ter_code in enumerate(cols.ter_codes):
+        if cols.eligible[i] and ter_code:
+            groups.setdefault(ter_code, []).append(i)
+    return groups
+
+
+def _warn_unmatched(ter_code: str, count: int, found: bool) -> None:
+    if not found:
+        logger.warning(
+            f"TER Bracket Table: No brackets found for ter_code '{ter_code}' ({count} slips)."
+        )
+    else:
+        logger.warning(
+            f"TER Bracket Table: No bracket match for ter_code '{ter_code}' ({count} slips)."
+        )
+
+
+def _compute_numpy(cols: TERBatchColumns, settings: PayrollSettingsSnapshot) -> Dict[str, List]:
+    bruto = np.frombuffer(cols.bruto, dtype=np.float64)
+    bj_component = np.frombuffer(cols.biaya_jabatan_component, dtype=np.float64)
+    pengurang = np.frombuffer(cols.pengurang_netto, dtype=np.float64)
+    ptkp_annual = np.frombuffer(cols.ptkp_annual, dtype=np.float64)
+
+    biaya_jabatan = np.where(
+        bj_component != 0,
+        bj_component,
+        np.minimum(bruto * settings.biaya_jabatan_rate / 100, settings.biaya_jabatan_cap_monthly),
+    )
+    netto = bruto - biaya_jabatan - pengurang
+    ptkp = ptkp_annual / 12
+    pkp = np.maximum(netto - ptkp, 0.0)
+
+    rate = np.zeros(cols.size, dtype=np.float64)
+    for ter_code, positions in _group_by_ter_code(cols).items():
+        index = settings.ter_table.get(ter_code)
+        if not index:
+            _warn_unmatched(ter_code, len(positions), False)
+            continue
+        pos = np.asarray(positions, dtype=np.intp)
+        income = bruto[pos]
+        mins = np.asarray(index.mins, dtype=np.float64)
+        maxs = np.asarray(index.maxs, dtype=np.float64)
+        rates = np.asarray(index.rates, dtype=np.float64)
+
+        slot = np.searchsorted(mins, income, side="right") - 1
+        safe = np.clip(slot, 0, None)
+        matched = (slot >= 0) & (income <= maxs[safe])
+        rate[pos] = np.where(matched, rates[safe], 0.0)
+        unmatched = int(np.count_nonzero(~matched))
+        if unmatched:
+            _warn_unmatched(ter_code, unmatched, True)
+
+    return {
+        "biaya_jabatan": biaya_jabatan.tolist(),
+        "netto": netto.tolist(),
+        "ptkp": ptkp.tolist(),
+        "pkp": pkp.tolist(),
+        "rate": rate.tolist(),
+        "tax_base": (bruto * rate / 100).tolist(),
+    }
+
+
+def _compute_python_rates(cols: TERBatchColumns, settings: PayrollSettingsSnapshot) -> array:
+    rate = array("d", bytes(8 * cols.size))
+    for ter_code, positions in _group_by_ter_code(cols).items():
+        index = settings.ter_table.get(ter_code)
+        if not index:
+            _warn_unmatched(ter_code, len(positions), False)
+            continue
+        unmatched = 0
+        for i in positions:
+            found = index.lookup(cols.bruto[i])
+            if found is None:
+                unmatched += 1
+            else:
+                rate[i] = found
+        if unmatched:
+            _warn_unmatched(ter_code, unmatched, True)
+    return rate
+
+
+def calculate_pph21_TER_batch(
+    slips: Sequence[Any],
+    employees: Sequence[Any],
+    settings: Optional[PayrollSettingsSnapshot] = None,
+    aggregates: Optional[Sequence[Optional[SlipAggregates]]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Calculate monthly PPh21 TER for many slips in one pass.
+
+    Args:
+        slips: Slip dicts (``earnings``/``deductions``) or gross amounts
+        employees: Employee docs/dicts, parallel to ``slips``
+        settings: Settings snapshot of the payroll run; defaults to the
+                  snapshot of the current request
+        aggregates: Optional ``reduce_slip`` results, parallel to ``slips``
+
+    Returns:
+        One result dict per slip, identical to ``calculate_pph21_TER``
+    """
+    if settings is None:
+        settings = get_settings_snapshot()
+
+    cols = collect_ter_columns(slips, employees, settings, aggregates)
+    if not cols.size:
+        return []
+
+    if settings.integer_rupiah or np is None:
+        # Per-slip formula of the calculation core (also used by the process pool)
+        params = TERParams.from_settings(settings)
+        rates = _compute_python_rates(cols, settings)
+        return [
+            ter_result(
+                cols.bruto[i],
+                cols.biaya_jabatan_component[i],
+                cols.pengurang_netto[i],
+                cols.ptkp_annual[i],
+                rates[i],
+                params,
+            )
+            if cols.eligible[i]
+            else dict(NOT_ELIGIBLE)
+            for i in range(cols.size)
+        ]
+
+    computed = _compute_numpy(cols, settings)
+
+    results: List[Dict[str, Any]] = []
+    for i in range(cols.size):
+        if not cols.eligible[i]:
+            results.append({"employment_type_checked": False, "pph21": 0.0})
+            continue
+        results.append(
+            {
+                "ptkp": computed["ptkp"][i],
+                "bruto": cols.bruto[i],
+                "pengurang_netto": cols.pengurang_netto[i],
+                "biaya_jabatan": computed["biaya_jabatan"][i],
+                "netto": computed["netto"][i],
+                "pkp": computed["pkp"][i],
+                "rate": computed["rate"][i],
+                "pph21": round_half_up(computed["tax_base"][i]),
+                "employment_type_checked": True,
+            }
+        )
+    return results
@@ -7,132 +7,107 @@ December calculations, not regular monthly TER calculations.
 
 IMPORTANT: This module only handles December/annual calculations.
            Regular monthly calculations must use pph21_ter.py
+
+The arithmetic is ``payroll_indonesia.engine.december``; this module validates
+the input and resolves PTKP, slabs and the component registry.
 """
 
 from typing import Dict, Any, List, Union, Tuple, Optional
 import frappe
 from frappe import ValidationError
 from frappe.utils import flt, getdate
-from decimal import Decimal, ROUND_HALF_UP
 
 from payroll_indonesia.config import get_ptkp_amount, config
-
-DEFAULT_TAX_SLABS = [
-    (60_000_000, 5),
-    (250_000_000, 15),
-    (500_000_000, 25),
-    (5_000_000_000, 30),
-    (float("inf"), 35),
-]
+from payroll_indonesia.config import component_registry as cr
+from payroll_indonesia.config.component_registry import (
+    ComponentRegistry,
+    ComponentRole,
+    resolve_registry,
+)
+from payroll_indonesia.config.snapshot import PayrollSettingsSnapshot, get_settings_snapshot
+from payroll_indonesia.config.tax_slabs import (
+    DEFAULT_TAX_SLABS,
+    CompiledTaxSlabs,
+    get_compiled_tax_slabs,
+)
+from payroll_indonesia.engine import december
+from payroll_indonesia.engine.december import (  # noqa: F401 (re-exported)
+    BIAYA_JABATAN_BP,
+    BIAYA_JABATAN_CAP_MONTHLY,
+    biaya_jabatan_bulanan,
+    calculate_pkp_annual,
+    floor_to_thousand,
+    round_rupiah,
+)
+
+JP_JHT_ROLES = (ComponentRole.BPJS_JHT, ComponentRole.BPJS_JP)
 
 # ---------------------------------------------------------------------------
 # HELPERS
 # ---------------------------------------------------------------------------
 
 def get_tax_slabs() -> List[Tuple[float, float]]:
-    slab_name = config.get_value("fallback_income_tax_slab")
-    if not slab_name:
-        return DEFAULT_TAX_SLABS
-    try:
-        slab_doc = frappe.get_cached_doc("Income Tax Slab", slab_name)
-    except Exception:
-        frappe.logger().warning(f"Income Tax Slab {slab_name} tidak ditemukan")
-        return DEFAULT_TAX_SLABS
-
-    slabs: List[Tuple[float, float]] = []
-    for row in slab_doc.get("slabs", []) or []:
-        batas = flt(row.get("to_amount", 0)) or 0.0
-        if batas == 0:
-            batas = float("inf")
-        rate = flt(row.get("percent_deduction", 0)) or 0.0
-        slabs.append((batas, rate))
-    if not slabs:
-        return DEFAULT_TAX_SLABS
-    slabs.sort(key=lambda x: x[0])
-    return slabs
-
-
-def sum_bruto_earnings(salary_slip: Dict[str, Any]) -> float:
+    return get_compiled_tax_slabs().slabs
+
+
+def sum_bruto_earnings(salary_slip: Dict[str, Any],
+                       components: Optional[ComponentRegistry] = None) -> float:
+    registry = resolve_registry(components)
     total = 0.0
     for row in salary_slip.get("earnings", []) or []:
-        if (
-            (row.get("is_tax_applicable", 0) == 1
-             or row.get("is_income_tax_component", 0) == 1
-             or row.get("variable_based_on_taxable_salary", 0) == 1)
-            and row.get("statistical_component", 0) == 0
-            and row.get("exempted_from_income_tax", 0) == 0
-        ):
+        flags = registry.row_flags(row)
+        if flags & cr.BRUTO and not flags & (cr.STATISTICAL | cr.EXEMPT):
             total += flt(row.get("amount", 0))
     return total
 
 
-def sum_pengurang_netto_bulanan(salary_slip: Dict[str, Any]) -> float:
+def sum_pengurang_netto_bulanan(salary_slip: Dict[str, Any],
+                                components: Optional[ComponentRegistry] = None) -> float:
+    registry = resolve_registry(components)
     total = 0.0
     for row in salary_slip.get("deductions", []) or []:
+        flags = registry.row_flags(row)
         if (
-            (row.get("is_income_tax_component", 0) == 1
-             or row.get("variable_based_on_taxable_salary", 0) == 1
-             or row.get("is_pengurang_netto", 0) == 1)
-            and row.get("do_not_include_in_total", 0) == 0
-            and row.get("statistical_component", 0) == 0
-            and "biaya jabatan" not in (row.get("salary_component", "") or "").lower()
+            flags & (cr.TAX_DEDUCTION | cr.PENGURANG_NETTO)
+            and not flags & (cr.NOT_IN_TOTAL | cr.STATISTICAL | cr.BIAYA_JABATAN)
         ):
             total += flt(row.get("amount", 0))
     return total
 
 
-def biaya_jabatan_bulanan(bruto_bulan: float) -> float:
-    return min(flt(bruto_bulan) * 0.05, 500_000.0)
-
-
-def _get_monthly_jp_jht_employee(slip_dict: Optional[Dict[str, Any]]) -> float:
+def _get_monthly_jp_jht_employee(slip_dict: Optional[Dict[str, Any]],
+                                 components: Optional[ComponentRegistry] = None) -> float:
     if not slip_dict:
         return 0.0
+    registry = resolve_registry(components)
     tot = 0.0
     for row in slip_dict.get("deductions", []) or []:
-        nm = (row.get("salary_component") or "").strip().lower()
-        if nm in {"bpjs jht employee", "bpjs jp employee"}:
+        info = registry.get(row.get("salary_component"))
+        if info.role in JP_JHT_ROLES and info.flags & cr.EMPLOYEE:
             tot += flt(row.get("amount", 0))
     return tot
 
 
-def _pph21_paid_in_slip(slip_dict: Dict[str, Any]) -> float:
+def _pph21_paid_in_slip(slip_dict: Dict[str, Any],
+                        components: Optional[ComponentRegistry] = None) -> float:
     paid = flt(slip_dict.get("tax", 0))
     if paid:
         return paid
-    names = {"pph 21", "pph21", "pph-21"}
+    registry = resolve_registry(components)
     return sum(
         flt(d.get("amount", 0))
         for d in (slip_dict.get("deductions") or [])
-        if (d.get("salary_component") or "").strip().lower() in names
+        if registry.get(d.get("salary_component")).role == ComponentRole.PPH21
     )
 
 
-# --- pembulatan yang benar untuk PKP & PPh ---
-def floor_to_thousand(x: float) -> int:
-    return int(flt(x) // 1000) * 1000
-
-def round_rupiah(x: float) -> int:
-    return int(Decimal(x).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
-
-
-def calculate_pkp_annual(netto_total: float, ptkp_annual: float) -> float:
-    pkp = max(flt(netto_total) - flt(ptkp_annual), 0.0)
-    return floor_to_thousand(pkp)
-
-
-def calculate_pph21_progressive(pkp_annual: float) -> float:
-    pajak = 0.0
-    pkp_left = flt(pkp_annual)
-    lower = 0.0
-    for batas, rate in get_tax_slabs():
-        if pkp_left <= 0:
-            break
-        lap = min(pkp_left, batas - lower)
-        pajak += lap * rate / 100.0
-        pkp_left -= lap
-        lower = batas
-    return pajak
+def calculate_pph21_progressive(
+    pkp_annual: float,
+    slabs: Optional[Union[CompiledTaxSlabs, List[Tuple[float, float]]]] = None,
+) -> float:
+    if slabs is None:
+        slabs = get_compiled_tax_slabs()
+    return december.calculate_pph21_progressive(pkp_annual, slabs)
 
 # ---------------------------------------------------------------------------
 # MAIN (DECEMBER-ONLY FLOW)
@@ -153,6 +128,8 @@ def calculate_pph21_december(
     # Opsional (salah satu boleh diisi):
     december_slip: Optional[Dict[str, Any]] = None,
     jp_jht_employee_month: Optional[float] = None,
+    # Snapshot Payroll Indonesia Settings untuk satu payroll run:
+    settings: Optional[PayrollSettingsSnapshot] = None,
 ) -> Dict[str, Any]:
 
     if not employee:
@@ -162,78 +139,33 @@ def calculate_pph21_december(
 
     emp_type = employee.get("employment_type") if isinstance(employee, dict) else getattr(employee, "employment_type", None)
     if emp_type != "Full-time":
-        return {
-            "bruto_total": 0.0, "netto_total": 0.0, "ptkp_annual": 0.0, "pkp_annual": 0.0,
-            "rate": "", "pph21_annual": 0.0, "pph21_bulan": 0.0, "koreksi_pph21": 0.0,
-            "employment_type_checked": False,
-            "message": "PPh21 December hanya dihitung untuk Employment Type: Full-time",
-        }
+        return dict(december.NOT_FULL_TIME)
 
-    # --- December-only annualization ---
-    bruto_des = flt(bruto_desember)
-    # pastikan biaya jabatan bulanan sesuai formula (kalau caller kirim lebih dari 500k, kita clamp)
-    bj_month = min(flt(biaya_jabatan_desember), 500_000.0, bruto_des * 0.05)
-    bj_annual = min(bj_month * 12.0, 6_000_000.0)
+    if settings is None:
+        settings = get_settings_snapshot()
 
-    # JP+JHT (EE) bulan Desember (ambil dari argumen atau dari slip)
     if jp_jht_employee_month is None:
-        jp_jht_employee_month = _get_monthly_jp_jht_employee(december_slip)
-    jp_jht_employee_month = flt(jp_jht_employee_month)
-    jp_jht_employee_annual = jp_jht_employee_month * 12.0
+        jp_jht_employee_month = _get_monthly_jp_jht_employee(december_slip, settings.components)
 
-    # Bruto tahunan dari Desember
-    bruto_annual = bruto_des * 12.0
-
-    # Netto tahunan = Bruto tahunan - BJ tahunan - (JP+JHT EE × 12)
-    # CATATAN: pengurang_netto_desember TIDAK di-annualize (sesuai arahan),
-    # ia hanya informasi breakdown bulanan.
-    netto_annual = bruto_annual - bj_annual - jp_jht_employee_annual
-
-    # PTKP, PKP, PPh
     try:
-        ptkp_annual = get_ptkp_amount(employee)
+        ptkp_annual = settings.get_ptkp_amount(employee)
     except ValidationError:
         ptkp_annual = 0.0
 
-    pkp_annual = calculate_pkp_annual(netto_annual, ptkp_annual)
-    pph21_annual = round_rupiah(calculate_pph21_progressive(pkp_annual))
-
-    koreksi_pph21 = pph21_annual - flt(ytd_tax_paid_jan_nov)
-    pph21_bulan_des = koreksi_pph21
-
-    rates = "/".join([f"{rate}%" for _, rate in get_tax_slabs()])
-
-    # nilai netto_desember hanya untuk display (bukan dasar tahunan)
-    netto_desember = bruto_des - bj_month - flt(pengurang_netto_desember)
-
-    return {
-        # breakdown Jan–Nov (display/audit)
-        "bruto_jan_nov": flt(ytd_bruto_jan_nov),
-        "netto_jan_nov": flt(ytd_netto_jan_nov),
-        "pph21_paid_jan_nov": flt(ytd_tax_paid_jan_nov),
-
-        # Desember (display)
-        "bruto_desember": bruto_des,
-        "pengurang_netto_desember": flt(pengurang_netto_desember),
-        "biaya_jabatan_desember": bj_month,
-        "netto_desember": netto_desember,
-        "jp_jht_employee_month": jp_jht_employee_month,
-        "jp_jht_employee_annual": jp_jht_employee_annual,
-
-        # tahunan (DECEMBER-ONLY)
-        "bruto_total": bruto_annual,
-        "netto_total": netto_annual,
-
-        # pajak
-        "ptkp_annual": flt(ptkp_annual),
-        "pkp_annual": flt(pkp_annual),
-        "rate": rates,
-        "pph21_annual": flt(pph21_annual),
-        "pph21_bulan": flt(pph21_bulan_des),   # yang masuk ke slip Desember
-        "koreksi_pph21": flt(koreksi_pph21),
-
-        "employment_type_checked": True,
-    }
+    return december.calculate_december(
+        december.DecemberInput(
+            ytd_bruto_jan_nov=ytd_bruto_jan_nov,
+            ytd_netto_jan_nov=ytd_netto_jan_nov,
+            ytd_tax_paid_jan_nov=ytd_tax_paid_jan_nov,
+            bruto_desember=bruto_desember,
+            pengurang_netto_desember=pengurang_netto_desember,
+            biaya_jabatan_desember=biaya_jabatan_desember,
+            jp_jht_employee_month=jp_jht_employee_month,
+            ptkp_annual=ptkp_annual,
+        ),
+        settings.tax_slabs,
+        integer=settings.integer_rupiah,
+    )
 
 
 def calculate_pph21_december_from_slips(
@@ -275,56 +207,15 @@ def calculate_pph21_december_from_slips(
         else:
             jan_nov_slips.append(s)
 
-    # total PPh Jan–Nov (untuk koreksi)
-    pph21_paid_jan_nov = 0.0
-    for s in jan_nov_slips:
-        pph21_paid_jan_nov += _pph21_paid_in_slip(s)
-
-    # annualization dari Desember saja (agregasi bila lebih dari 1 slip)
-    bruto_desember = 0.0
-    jp_jht_month = 0.0
-    for s in desember_slips:
-        bruto_desember += sum_bruto_earnings(s)
-        jp_jht_month += _get_monthly_jp_jht_employee(s)
-
-    bj_month = biaya_jabatan_bulanan(bruto_desember)
-    bj_annual = min(bj_month * 12.0, 6_000_000.0)
-    bruto_annual = bruto_desember * 12.0
-    jp_jht_annual = jp_jht_month * 12.0
-    netto_annual = bruto_annual - bj_annual - jp_jht_annual
-
     try:
         ptkp_annual = get_ptkp_amount(employee)
     except ValidationError:
         ptkp_annual = 0.0
-    pkp_annual = calculate_pkp_annual(netto_annual, ptkp_annual)
-    pph21_annual = round_rupiah(calculate_pph21_progressive(pkp_annual))
-
-    koreksi_pph21 = pph21_annual - pph21_paid_jan_nov
-    rates = "/".join([f"{rate}%" for _, rate in get_tax_slabs()])
-
-    # netto_desember (display only)
-    netto_desember_display = bruto_desember - bj_month
-
-    return {
-        "bruto_jan_nov": sum(sum_bruto_earnings(s) for s in jan_nov_slips),
-        "netto_jan_nov": 0.0,  # tidak relevan untuk annualization Desember
-        "pph21_paid_jan_nov": pph21_paid_jan_nov,
-
-        "bruto_desember": bruto_desember,
-        "pengurang_netto_desember": 0.0,
-        "biaya_jabatan_desember": bj_month,
-        "netto_desember": netto_desember_display,
-        "jp_jht_employee_month": jp_jht_month,
-        "jp_jht_employee_annual": jp_jht_annual,
-
-        "bruto_total": bruto_annual,
-        "netto_total": netto_annual,
-        "ptkp_annual": ptkp_annual,
-        "pkp_annual": pkp_annual,
-        "rate": rates,
-        "pph21_annual": pph21_annual,
-        "pph21_bulan": koreksi_pph21,
-        "koreksi_pph21": koreksi_pph21,
-        "employment_type_checked": True,
-    }
+
+    return december.calculate_december_from_slips(
+        jan_nov_slips,
+        desember_slips,
+        ptkp_annual,
+        slabs=get_compiled_tax_slabs(),
+        registry=resolve_registry(),
+    )
@@ -0,0 +1,149 @@
+"""
+PPh21 TER calculation of a payroll chunk in worker processes.
+
+The main process resolves everything that needs frappe or the settings
+snapshot (eligibility, PTKP, TER code) and turns each slip into a
+``TERSlipInput`` with plain ``earnings``/``deductions`` rows. The reduce and
+the TER arithmetic then run in a ``ProcessPoolExecutor`` through
+``payroll_indonesia.engine.ter.calculate_ter_slips``, which does not import
+frappe. Results are identical to ``calculate_pph21_TER_batch``.
+
+Salary structure formulas are still evaluated by HRMS inside the Salary Slip
+document (one ``eval_condition_and_formula`` per row during validate), so they
+stay in-process; only the tax math is moved to the pool.
+"""
+
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import frappe
+from frappe import ValidationError
+
+from payroll_indonesia.config.pph21_ter_batch import _employment_type, _warn_unmatched
+from payroll_indonesia.config.snapshot import (
+    PayrollSettingsSnapshot,
+    _employee_tax_status,
+    get_settings_snapshot,
+)
+from payroll_indonesia.engine.components import FLAG_FIELDS, _row_value
+from payroll_indonesia.engine.reducer import SlipAggregates
+from payroll_indonesia.engine.ter import TERParams, TERSlipInput, calculate_ter_slips
+
+logger = frappe.logger("payroll_indonesia.config")
+
+# Slips per pool task: large enough to amortise pickling, small enough to spread
+POOL_CHUNK_SIZE = 200
+
+# Row fields the reducer reads; everything else stays in the main process
+ROW_FIELDS = ("salary_component", "amount") + tuple(field for field, _ in FLAG_FIELDS)
+
+
+def plain_rows(rows: Optional[Sequence[Any]]) -> List[Dict[str, Any]]:
+    """Child table rows (documents or dicts) as picklable dicts of ``ROW_FIELDS``."""
+    plain = []
+    for row in rows or []:
+        values = {}
+        for field in ROW_FIELDS:
+            value = _row_value(row, field)
+            if value is not None:
+                values[field] = value
+        plain.append(values)
+    return plain
+
+
+def create_executor(workers: int) -> ProcessPoolExecutor:
+    """
+    Process pool for TER calculation.
+
+    ``spawn`` is used so workers never inherit the parent's database
+    connection or frappe request state.
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def _slip_input(slip: Any, employee: Any, settings: PayrollSettingsSnapshot,
+                missing_ptkp: Dict[str, int]) -> TERSlipInput:
+    if _employment_type(employee) != "Full-time":
+        return TERSlipInput(None, False)
+
+    if isinstance(slip, dict) and slip.get("earnings") is not None:
+        slip = {
+            "earnings": plain_rows(slip.get("earnings")),
+            "deductions": plain_rows(slip.get("deductions")),
+        }
+
+    ptkp_annual = 0.0
+    try:
+        ptkp_annual = settings.get_ptkp_amount(employee)
+    except ValidationError:
+        status = _employee_tax_status(employee) or ""
+        missing_ptkp[status] = missing_ptkp.get(status, 0) + 1
+
+    return TERSlipInput(slip, True, ptkp_annual, settings.get_ter_code(employee))
+
+
+def calculate_pph21_TER_pool(
+    slips: Sequence[Any],
+    employees: Sequence[Any],
+    executor: Executor,
+    settings: Optional[PayrollSettingsSnapshot] = None,
+    chunk_size: int = POOL_CHUNK_SIZE,
+) -> Tuple[List[Dict[str, Any]], List[Optional[SlipAggregates]]]:
+    """
+    Calculate monthly PPh21 TER for many slips on ``executor``.
+
+    Args:
+        slips: Slip dicts (``earnings``/``deductions``) or gross amounts
+        employees: Employee docs/dicts, parallel to ``slips``
+        executor: Process (or thread) pool running ``calculate_ter_slips``
+        settings: Settings snapshot of the payroll run
+        chunk_size: Slips per pool task
+
+    Returns:
+        (results, aggregates): one ``calculate_pph21_TER`` result dict and one
+        ``SlipAggregates`` (None for gross amounts and ineligible slips) per slip
+    """
+    if len(slips) != len(employees):
+        raise ValidationError(
+            f"PPh21 TER pool: {len(slips)} slips but {len(employees)} employees."
+        )
+    if settings is None:
+        settings = get_settings_snapshot()
+
+    missing_ptkp: Dict[str, int] = {}
+    inputs = [
+        _slip_input(slip, employee, settings, missing_ptkp)
+        for slip, employee in zip(slips, employees)
+    ]
+    for status, count in missing_ptkp.items():
+        logger.warning(
+            f"PTKP Table: tax_status '{status}' not found ({count} slips), PTKP set to 0."
+        )
+
+    params = TERParams.from_settings(settings)
+    chunk_size = max(int(chunk_size or POOL_CHUNK_SIZE), 1)
+    futures = [
+        executor.submit(
+            calculate_ter_slips, inputs[start:start + chunk_size], params, settings.components
+        )
+        for start in range(0, len(inputs), chunk_size)
+    ]
+
+    results: List[Dict[str, Any]] = []
+    aggregates: List[Optional[SlipAggregates]] = []
+    unmatched: Dict[str, List[Any]] = {}
+    for future in futures:
+        chunk_results, chunk_aggregates, chunk_unmatched = future.result()
+        results.extend(chunk_results)
+        aggregates.extend(chunk_aggregates)
+        for ter_code, (count, found) in chunk_unmatched.items():
+            entry = unmatched.setdefault(ter_code, [0, found])
+            entry[0] += count
+
+    for ter_code, (count, found) in unmatched.items():
+        _warn_unmatched(ter_code, count, found)
+
+    return results, aggregates
@@ -0,0 +1,33 @@
+"""
+Single-pass reducer for the PPh21 aggregates of one salary slip.
+
+The TER and December calculations each used to walk ``earnings`` and
+``deductions`` several times (bruto, pengurang netto, biaya jabatan, JP+JHT,
+looking up the PPh 21 row). ``reduce_slip`` walks both tables once and returns
+every aggregate in a ``SlipAggregates``; the per-purpose ``sum_*`` helpers in
+``config/pph21_*.py`` remain for callers that need a single value.
+"""
+
+from typing import Any, Optional
+
+from payroll_indonesia.config.component_registry import ComponentRegistry, resolve_registry
+from payroll_indonesia.engine import reducer
+from payroll_indonesia.engine.reducer import (  # noqa: F401 (re-exported)
+    JP_JHT_ROLES,
+    PPH21_COMPONENT,
+    SlipAggregates,
+)
+
+
+def reduce_slip(
+    slip: Any,
+    components: Optional[ComponentRegistry] = None,
+    integer: bool = False,
+) -> SlipAggregates:
+    """
+    Walk ``earnings`` and ``deductions`` of ``slip`` (dict or document) once.
+
+    ``components`` defaults to the cached Salary Component registry; the walk
+    itself is ``payroll_indonesia.engine.reducer.reduce_slip``.
+    """
+    return reducer.reduce_slip(slip, resolve_registry(components), integer=integer)
@@ -0,0 +1,261 @@
+"""
+Immutable snapshot of Payroll Indonesia Settings for a whole payroll run.
+
+Reading settings through ``config.get_numeric`` costs an ``exists`` query plus a
+cached-doc lookup per call, and a long payroll run could pick up a Settings edit
+halfway through. A ``PayrollSettingsSnapshot`` reads everything once (rates,
+caps, PTKP map, TER index and tax slabs) and is then passed explicitly to the
+PPh21 calculators, so every slip in the run sees the same values.
+"""
+
+import hashlib
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Tuple, Union
+
+import frappe
+from frappe import ValidationError
+from frappe.utils import flt
+
+from payroll_indonesia.config import config
+from payroll_indonesia.config.component_registry import ComponentRegistry, get_component_registry
+from payroll_indonesia.config.tax_slabs import (
+    CompiledTaxSlabs,
+    compile_tax_slabs,
+    get_compiled_tax_slabs,
+)
+from payroll_indonesia.config.tax_status import TaxStatusInfo, get_tax_status_map
+from payroll_indonesia.config.ter_index import TERTable, get_ter_table
+from payroll_indonesia.utils.rupiah import to_basis_points, to_rupiah
+
+logger = frappe.logger("payroll_indonesia.config")
+
+# Numeric settings fields captured in the snapshot, with their DEFAULTS key
+NUMERIC_FIELDS = {
+    "biaya_jabatan_rate": "BIAYA_JABATAN_RATE",
+    "biaya_jabatan_cap_yearly": "BIAYA_JABATAN_CAP_YEARLY",
+    "bpjs_health_employer_rate": None,
+    "bpjs_health_employer_cap": None,
+    "bpjs_health_employee_rate": None,
+    "bpjs_health_employee_cap": None,
+    "bpjs_jht_employer_rate": None,
+    "bpjs_jht_employer_cap": None,
+    "bpjs_jht_employee_rate": None,
+    "bpjs_jht_employee_cap": None,
+    "bpjs_jkk_rate": None,
+    "bpjs_jkk_cap": None,
+    "bpjs_jkm_rate": None,
+    "bpjs_jkm_cap": None,
+    "bpjs_pension_employer_rate": None,
+    "bpjs_pension_employer_cap": None,
+    "bpjs_pension_employee_rate": None,
+    "bpjs_pension_employee_cap": None,
+}
+
+# Tables read into the snapshot besides the Settings document itself. The first
+# three are Settings child tables; their modified values are compared too, in
+# case a row was changed without saving Settings.
+VERSION_SOURCES = ("TER Bracket Table", "PTKP Table", "TER Mapping Table", "Salary Component")
+
+# Request-level snapshot attribute on frappe.local
+_LOCAL_ATTR = "payroll_indonesia_settings_snapshot"
+
+
+def _employee_tax_status(employee: Any) -> Optional[str]:
+    if hasattr(employee, "tax_status"):
+        return getattr(employee, "tax_status")
+    if isinstance(employee, dict):
+        return employee.get("tax_status")
+    return None
+
+
+class PayrollSettingsSnapshot:
+    """
+    Frozen view of Payroll Indonesia Settings.
+
+    Attributes are assigned once in ``__init__``; any later assignment raises
+    AttributeError. Lookup helpers mirror the functions in ``config.config`` and
+    raise the same ValidationErrors.
+    """
+
+    __slots__ = (
+        "version",
+        "values",
+        "pph21_method",
+        "biaya_jabatan_rate",
+        "biaya_jabatan_cap_yearly",
+        "biaya_jabatan_cap_monthly",
+        "ptkp_map",
+        "ter_table",
+        "tax_slabs",
+        "rate_display",
+        "components",
+        "integer_rupiah",
+        "biaya_jabatan_bp",
+        "biaya_jabatan_cap_monthly_rupiah",
+    )
+
+    def __init__(
+        self,
+        *,
+        version: str,
+        values: Mapping[str, float],
+        pph21_method: str,
+        ptkp_map: Mapping[str, TaxStatusInfo],
+        ter_table: TERTable,
+        tax_slabs: Union[CompiledTaxSlabs, List[Tuple[float, float]]],
+        components: Optional[ComponentRegistry] = None,
+        integer_rupiah: bool = False,
+    ):
+        setter = object.__setattr__
+        setter(self, "version", version)
+        setter(self, "values", MappingProxyType(dict(values)))
+        setter(self, "pph21_method", pph21_method)
+        setter(self, "biaya_jabatan_rate", flt(values.get("biaya_jabatan_rate")))
+        setter(self, "biaya_jabatan_cap_yearly", flt(values.get("biaya_jabatan_cap_yearly")))
+        setter(self, "biaya_jabatan_cap_monthly", self.biaya_jabatan_cap_yearly / 12.0)
+        setter(self, "ptkp_map", MappingProxyType(dict(ptkp_map)))
+        setter(self, "ter_table", ter_table)
+        if not isinstance(tax_slabs, CompiledTaxSlabs):
+            tax_slabs = compile_tax_slabs(tax_slabs)
+        setter(self, "tax_slabs", tax_slabs)
+        setter(self, "rate_display", tax_slabs.rate_display)
+        # Without a loaded registry, components are classified by name only
+        setter(self, "components", components if components is not None else ComponentRegistry())
+        # Integer-rupiah arithmetic (opt-in): amounts in whole rupiah, rates in basis points
+        setter(self, "integer_rupiah", bool(integer_rupiah))
+        setter(self, "biaya_jabatan_bp", to_basis_points(self.biaya_jabatan_rate))
+        setter(self, "biaya_jabatan_cap_monthly_rupiah", to_rupiah(self.biaya_jabatan_cap_monthly))
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"PayrollSettingsSnapshot is immutable (tried to set '{name}')")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"PayrollSettingsSnapshot is immutable (tried to delete '{name}')")
+
+    def __reduce__(self):
+        return (_restore_snapshot, (self._state(),))
+
+    def _state(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "values": dict(self.values),
+            "pph21_method": self.pph21_method,
+            "ptkp_map": dict(self.ptkp_map),
+            "ter_table": self.ter_table,
+            "tax_slabs": self.tax_slabs,
+            "components": self.components,
+            "integer_rupiah": self.integer_rupiah,
+        }
+
+    # -------------------------
+    # Lookups
+    # -------------------------
+    def get_numeric(self, fieldname: str) -> float:
+        if fieldname in self.values:
+            return self.values[fieldname]
+        # Not captured in the snapshot: fall back to live settings
+        return config.get_numeric(fieldname)
+
+    def get_bpjs_rate(self, fieldname: str) -> float:
+        return self.get_numeric(fieldname)
+
+    def get_bpjs_cap(self, fieldname: str) -> float:
+        return self.get_numeric(fieldname)
+
+    def get_ptkp_amount(self, employee: Any) -> float:
+        tax_status = _employee_tax_status(employee)
+        if not tax_status:
+            raise ValidationError("PTKP amount lookup: tax_status is empty.")
+        info = self.ptkp_map.get(tax_status)
+        if info is None or info.ptkp_amount is None:
+            raise ValidationError(f"PTKP Table: tax_status '{tax_status}' not found.")
+        return info.ptkp_amount
+
+    def get_ter_code(self, employee: Any) -> Optional[str]:
+        tax_status = _employee_tax_status(employee)
+        info = self.ptkp_map.get(tax_status) if tax_status else None
+        return info.ter_code if info else None
+
+    def get_ter_rate(self, ter_code: Optional[str], monthly_income: float) -> float:
+        if not ter_code:
+            return 0.0
+        index = self.ter_table.get(ter_code)
+        if not index:
+            raise ValidationError(f"TER Bracket Table: No brackets found for ter_code '{ter_code}'.")
+        rate = index.lookup(flt(monthly_income))
+        if rate is None:
+            raise ValidationError(
+                f"TER Bracket Table: No bracket match for ter_code '{ter_code}' "
+                f"and monthly_income {monthly_income}."
+            )
+        return rate
+
+
+def _restore_snapshot(state: Dict[str, Any]) -> PayrollSettingsSnapshot:
+    return PayrollSettingsSnapshot(**state)
+
+
+def _read_numeric(settings: Any, fieldname: str, default_key: Optional[str]) -> float:
+    value = settings.get(fieldname)
+    if value is None or value == "":
+        default = config.DEFAULTS.get(default_key) if default_key else None
+        return flt(default) if default is not None else 0.0
+    return flt(value)
+
+
+def get_settings_version(settings: Any = None) -> str:
+    """
+    Version of the persisted settings: Settings ``modified`` plus a digest of the
+    row count and max(``modified``) of every table in ``VERSION_SOURCES``.
+
+    Built from the database only, so the same settings give the same version
+    after a Redis flush or a restart (checkpoints and input fingerprints compare
+    it across runs). Equal to ``build_settings_snapshot().version`` without
+    loading the tables.
+    """
+    if settings is None:
+        settings = config.get_settings()
+    query = " UNION ALL ".join(
+        f"SELECT COUNT(*), MAX(modified) FROM `tab{doctype}`" for doctype in VERSION_SOURCES
+    )
+    rows = frappe.db.sql(query)
+    digest = hashlib.sha1(
+        "|".join(f"{count}:{modified or ''}" for count, modified in rows).encode()
+    ).hexdigest()[:10]
+    return f"{settings.get('modified') or 'default'}-{digest}"
+
+
+def build_settings_snapshot() -> PayrollSettingsSnapshot:
+    """Read Payroll Indonesia Settings and all lookup tables once into a snapshot."""
+    settings = config.get_settings()
+    values = {
+        fieldname: _read_numeric(settings, fieldname, default_key)
+        for fieldname, default_key in NUMERIC_FIELDS.items()
+    }
+
+    snapshot = PayrollSettingsSnapshot(
+        version=get_settings_version(settings),
+        values=values,
+        pph21_method=settings.get("pph21_method") or "TER",
+        ptkp_map=get_tax_status_map(),
+        ter_table=get_ter_table(),
+        tax_slabs=get_compiled_tax_slabs(settings.get("fallback_income_tax_slab") or ""),
+        components=get_component_registry(),
+        integer_rupiah=bool(flt(settings.get("use_integer_rupiah"))),
+    )
+    logger.debug(f"Built Payroll Indonesia settings snapshot {snapshot.version}")
+    return snapshot
+
+
+def get_settings_snapshot() -> PayrollSettingsSnapshot:
+    """
+    Return the snapshot for the current request/job, building it on first use.
+    Callers running a whole payroll should build one explicitly and pass it on.
+    """
+    local = getattr(frappe, "local", None)
+    snapshot = getattr(local, _LOCAL_ATTR, None) if local is not None else None
+    if snapshot is None:
+        snapshot = build_settings_snapshot()
+        if local is not None:
+            setattr(local, _LOCAL_ATTR, snapshot)
+    return snapshot
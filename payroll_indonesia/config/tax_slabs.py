@@ -0,0 +1,71 @@
+"""
+Compiled progressive tax slabs (PPh 21 Pasal 17).
+
+The slab list from ``Income Tax Slab`` (or ``DEFAULT_TAX_SLABS``) is compiled
+once into upper boundaries, rates and the cumulative tax owed at each boundary,
+so annual tax is a single ``bisect`` plus one multiply. Compiled slabs are
+cached per (slab name, ``modified``) and also carry the rate display string
+used in ``pph21_info`` (``"5%/15%/..."``). Compilation itself is
+``payroll_indonesia.engine.slabs``.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import frappe
+from frappe.utils import flt
+
+from payroll_indonesia.config import config
+from payroll_indonesia.engine.slabs import (  # noqa: F401 (re-exported)
+    DEFAULT_COMPILED_SLABS,
+    DEFAULT_TAX_SLABS,
+    CompiledTaxSlabs,
+    compile_tax_slabs,
+)
+
+# (slab name, modified) -> CompiledTaxSlabs
+_compiled_cache: Dict[Tuple[str, str], "CompiledTaxSlabs"] = {}
+
+
+def _row_value(row: Any, field: str) -> Any:
+    if isinstance(row, dict):
+        return row.get(field)
+    return getattr(row, field, None)
+
+
+def _slabs_from_doc(slab_doc: Any) -> List[Tuple[float, float]]:
+    slabs: List[Tuple[float, float]] = []
+    for row in slab_doc.get("slabs", []) or []:
+        batas = flt(_row_value(row, "to_amount") or 0)
+        if batas == 0:
+            batas = float("inf")
+        rate = flt(_row_value(row, "percent_deduction") or 0)
+        slabs.append((batas, rate))
+    return slabs
+
+
+def get_compiled_tax_slabs(slab_name: Optional[str] = None) -> CompiledTaxSlabs:
+    """
+    Return compiled slabs for ``slab_name`` (default: ``fallback_income_tax_slab``
+    from settings), falling back to DEFAULT_TAX_SLABS.
+    """
+    if slab_name is None:
+        slab_name = config.get_value("fallback_income_tax_slab")
+    if not slab_name:
+        return DEFAULT_COMPILED_SLABS
+
+    try:
+        slab_doc = frappe.get_cached_doc("Income Tax Slab", slab_name)
+    except Exception:
+        frappe.logger().warning(f"Income Tax Slab {slab_name} tidak ditemukan")
+        return DEFAULT_COMPILED_SLABS
+
+    key = (slab_name, str(slab_doc.get("modified") or ""))
+    compiled = _compiled_cache.get(key)
+    if compiled is None:
+        slabs = _slabs_from_doc(slab_doc)
+        compiled = compile_tax_slabs(slabs) if slabs else DEFAULT_COMPILED_SLABS
+        # Older versions of the same slab are never needed again
+        for stale in [k for k in _compiled_cache if k[0] == slab_name]:
+            del _compiled_cache[stale]
+        _compiled_cache[key] = compiled
+    return compiled
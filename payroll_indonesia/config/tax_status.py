@@ -0,0 +1,85 @@
+"""
+In-memory PTKP and TER mapping lookup keyed by ``tax_status``.
+
+PTKP Table and TER Mapping Table are small and rarely change, so both are
+loaded with one query each into a per-process map. The map is versioned through
+the site cache and rebuilt after Payroll Indonesia Settings (with its PTKP and
+TER Mapping rows) is saved (see ``payroll_indonesia.config.cache``).
+"""
+
+from typing import Dict, Iterable, Optional
+
+import frappe
+from frappe.utils import flt
+
+from payroll_indonesia.config import cache
+
+logger = frappe.logger("payroll_indonesia.config")
+
+CACHE_NAME = "tax_status_map"
+
+
+class TaxStatusInfo:
+    """
+    PTKP amount and TER code resolved for a single tax_status.
+    ``ptkp_amount`` is None when the status is missing from PTKP Table and
+    ``ter_code`` is None when it is missing from TER Mapping Table.
+    """
+
+    __slots__ = ("tax_status", "ptkp_amount", "ter_code")
+
+    def __init__(self, tax_status: str, ptkp_amount: Optional[float] = None, ter_code: Optional[str] = None):
+        self.tax_status = tax_status
+        self.ptkp_amount = ptkp_amount
+        self.ter_code = ter_code
+
+    def as_dict(self) -> Dict[str, object]:
+        return {
+            "tax_status": self.tax_status,
+            "ptkp_amount": self.ptkp_amount,
+            "ter_code": self.ter_code,
+        }
+
+
+def load_tax_status_map() -> Dict[str, TaxStatusInfo]:
+    """Read PTKP Table and TER Mapping Table (one query each) into a single map."""
+    result: Dict[str, TaxStatusInfo] = {}
+
+    for row in frappe.get_all("PTKP Table", fields=["tax_status", "ptkp_amount"]):
+        tax_status = row.get("tax_status")
+        if not tax_status or tax_status in result:
+            continue
+        if row.get("ptkp_amount") is None:
+            logger.warning(f"PTKP Table: No ptkp_amount found for tax_status '{tax_status}'.")
+        result[tax_status] = TaxStatusInfo(tax_status, flt(row.get("ptkp_amount") or 0))
+
+    for row in frappe.get_all("TER Mapping Table", fields=["tax_status", "ter_code"]):
+        tax_status = row.get("tax_status")
+        if not tax_status:
+            continue
+        info = result.setdefault(tax_status, TaxStatusInfo(tax_status))
+        if info.ter_code is None:
+            info.ter_code = row.get("ter_code")
+
+    logger.info(f"Loaded PTKP/TER mapping for {len(result)} tax statuses")
+    return result
+
+
+def get_tax_status_map() -> Dict[str, TaxStatusInfo]:
+    """Return the cached tax_status map for this process, rebuilding it if stale."""
+    return cache.get_cached(CACHE_NAME, load_tax_status_map)
+
+
+def resolve_tax_statuses(tax_statuses: Iterable[str]) -> Dict[str, Optional[TaxStatusInfo]]:
+    """
+    Bulk lookup of PTKP amount and TER code for many tax statuses at once.
+
+    Args:
+        tax_statuses: Iterable of tax_status values (duplicates and empties allowed)
+
+    Returns:
+        Dict mapping each distinct tax_status to its TaxStatusInfo, or None when
+        the status is not present in either table
+    """
+    table = get_tax_status_map()
+    return {status: table.get(status) for status in set(tax_statuses) if status}
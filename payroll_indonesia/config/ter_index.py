@@ -0,0 +1,46 @@
+"""
+Compiled TER bracket index.
+
+TER Bracket Table rows are compiled once per process into sorted boundary
+arrays per ``ter_code`` so that a rate lookup is a single ``bisect`` instead of
+a database query and a linear scan for every salary slip. The compiled table is
+rebuilt only when Payroll Indonesia Settings (with its TER Bracket Table rows)
+is saved (see ``payroll_indonesia.config.cache``).
+
+Overlapping or gapped brackets are reported when the table is compiled. The
+index itself lives in ``payroll_indonesia.engine.ter_index``; this module loads
+and caches it.
+"""
+
+import frappe
+
+from payroll_indonesia.config import cache
+from payroll_indonesia.engine.ter_index import (  # noqa: F401 (re-exported)
+    GAP_TOLERANCE,
+    TERBracketIndex,
+    TERTable,
+    compile_ter_brackets,
+)
+
+logger = frappe.logger("payroll_indonesia.config")
+
+CACHE_NAME = "ter_index"
+
+
+def load_ter_table() -> TERTable:
+    """Read every TER Bracket Table row with a single query and compile it."""
+    rows = frappe.get_all(
+        "TER Bracket Table",
+        fields=["ter_code", "min_income", "max_income", "rate_percent"],
+        order_by="ter_code asc, min_income asc",
+    )
+    indexes, issues = compile_ter_brackets(rows)
+    for issue in issues:
+        logger.warning(f"TER Bracket Table: {issue}")
+    logger.info(f"Compiled TER index for {len(indexes)} TER codes from {len(rows)} brackets")
+    return TERTable(indexes, issues)
+
+
+def get_ter_table() -> TERTable:
+    """Return the compiled TER table for this process, rebuilding it if stale."""
+    return cache.get_cached(CACHE_NAME, load_ter_table)
@@ -0,0 +1,7 @@
+"""
+Calculation core of Payroll Indonesia.
+
+Modules in this package work on plain data (dicts, lists, numbers) and must
+not import frappe, so they can run in worker processes and be tested without a
+site. The ``config`` modules are the frappe-facing adapters around them.
+"""
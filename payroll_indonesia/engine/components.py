@@ -0,0 +1,192 @@
+"""
+Salary Component roles and flags, and the per-row flag resolution.
+
+Each ``Salary Component`` is resolved once into a ``ComponentRole`` and a
+``ComponentFlag`` bitmask; the PPh21 reducers then only test bits. A slip row's
+flags are its name-derived flags plus the flag fields stored on the row
+(``is_tax_applicable``, ``statistical_component``, ...); a field missing from the
+row counts as 0, as before the registry. Loading and caching the registry from the
+database lives in ``payroll_indonesia.config.component_registry``.
+"""
+
+from enum import IntEnum, IntFlag
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+class ComponentRole(IntEnum):
+    OTHER = 0
+    BIAYA_JABATAN = 1
+    PPH21 = 2
+    BPJS_KESEHATAN = 3
+    BPJS_JHT = 4
+    BPJS_JP = 5
+    BPJS_JKK = 6
+    BPJS_JKM = 7
+
+
+class ComponentFlag(IntFlag):
+    NONE = 0
+    # Flags mirrored from Salary Component / Salary Detail fields
+    TAX_APPLICABLE = 1 << 0
+    INCOME_TAX_COMPONENT = 1 << 1
+    VARIABLE_TAXABLE = 1 << 2
+    STATISTICAL = 1 << 3
+    EXEMPT = 1 << 4
+    NOT_IN_TOTAL = 1 << 5
+    PENGURANG_NETTO = 1 << 6
+    # Flags derived from the component name
+    PENGURANG_NETTO_NAME = 1 << 7
+    BIAYA_JABATAN = 1 << 8
+    PPH21 = 1 << 9
+    BPJS = 1 << 10
+    EMPLOYEE = 1 << 11
+    EMPLOYER = 1 << 12
+
+
+# Plain int masks for the per-row hot loops (IntFlag arithmetic is slow)
+BRUTO = int(
+    ComponentFlag.TAX_APPLICABLE | ComponentFlag.INCOME_TAX_COMPONENT | ComponentFlag.VARIABLE_TAXABLE
+)
+TAX_DEDUCTION = int(ComponentFlag.INCOME_TAX_COMPONENT | ComponentFlag.VARIABLE_TAXABLE)
+STATISTICAL = int(ComponentFlag.STATISTICAL)
+EXEMPT = int(ComponentFlag.EXEMPT)
+NOT_IN_TOTAL = int(ComponentFlag.NOT_IN_TOTAL)
+PENGURANG_NETTO = int(ComponentFlag.PENGURANG_NETTO)
+PENGURANG_NETTO_NAME = int(ComponentFlag.PENGURANG_NETTO_NAME)
+BIAYA_JABATAN = int(ComponentFlag.BIAYA_JABATAN)
+PPH21 = int(ComponentFlag.PPH21)
+BPJS = int(ComponentFlag.BPJS)
+EMPLOYEE = int(ComponentFlag.EMPLOYEE)
+EMPLOYER = int(ComponentFlag.EMPLOYER)
+# Flags derived from the component name (classify_component_name)
+NAME_FLAGS = PENGURANG_NETTO_NAME | BIAYA_JABATAN | PPH21 | BPJS | EMPLOYEE | EMPLOYER
+
+# (fieldname, flag) read from Salary Component and, when present, from slip rows
+FLAG_FIELDS: Tuple[Tuple[str, int], ...] = (
+    ("is_tax_applicable", int(ComponentFlag.TAX_APPLICABLE)),
+    ("is_income_tax_component", int(ComponentFlag.INCOME_TAX_COMPONENT)),
+    ("variable_based_on_taxable_salary", int(ComponentFlag.VARIABLE_TAXABLE)),
+    ("statistical_component", STATISTICAL),
+    ("exempted_from_income_tax", EXEMPT),
+    ("do_not_include_in_total", NOT_IN_TOTAL),
+    ("is_pengurang_netto", PENGURANG_NETTO),
+)
+
+# Deductions treated as pengurang netto by name
+PENGURANG_NETTO_NAMES = {
+    "bpjs kesehatan employee",   # 1% karyawan
+    "bpjs jht employee",         # 2% karyawan
+    "bpjs jp employee",          # 1% karyawan
+    # tambahkan jika ada iuran pensiun lain:
+    "iuran pensiun",
+    "dana pensiun",
+}
+
+PPH21_NAMES = {"pph 21", "pph21", "pph-21"}
+
+BPJS_ROLES = {
+    "kesehatan": ComponentRole.BPJS_KESEHATAN,
+    "jht": ComponentRole.BPJS_JHT,
+    "jp": ComponentRole.BPJS_JP,
+    "jkk": ComponentRole.BPJS_JKK,
+    "jkm": ComponentRole.BPJS_JKM,
+}
+
+BPJS_SIDES = {"employee": EMPLOYEE, "employer": EMPLOYER}
+
+
+class ComponentInfo:
+    """Resolved role and flags of one Salary Component."""
+
+    __slots__ = ("name", "role", "flags")
+
+    def __init__(self, name: str, role: ComponentRole, flags: int):
+        self.name = name
+        self.role = role
+        self.flags = flags
+
+    def has(self, flag: int) -> bool:
+        return bool(self.flags & flag)
+
+
+def classify_component_name(name: str) -> Tuple[ComponentRole, int]:
+    """Role and name-derived flags for a component name."""
+    key = (name or "").strip().lower()
+    role = ComponentRole.OTHER
+    flags = 0
+
+    if "biaya jabatan" in key:
+        role = ComponentRole.BIAYA_JABATAN
+        flags |= BIAYA_JABATAN
+    elif key in PPH21_NAMES:
+        role = ComponentRole.PPH21
+        flags |= PPH21
+    else:
+        parts = key.split()
+        if len(parts) == 3 and parts[0] == "bpjs" and parts[1] in BPJS_ROLES and parts[2] in BPJS_SIDES:
+            role = BPJS_ROLES[parts[1]]
+            flags |= BPJS | BPJS_SIDES[parts[2]]
+
+    if key in PENGURANG_NETTO_NAMES:
+        flags |= PENGURANG_NETTO_NAME
+    return role, flags
+
+
+def _row_value(row: Any, field: str) -> Any:
+    if isinstance(row, dict):
+        return row.get(field)
+    return getattr(row, field, None)
+
+
+class ComponentRegistry:
+    """Salary Component name -> ComponentInfo, plus per-row flag resolution."""
+
+    __slots__ = ("components",)
+
+    def __init__(self, components: Optional[Dict[str, ComponentInfo]] = None):
+        self.components = dict(components or {})
+
+    def get(self, name: Optional[str]) -> ComponentInfo:
+        """Return the info for ``name``; unknown names are classified by name (not stored)."""
+        name = name or ""
+        info = self.components.get(name)
+        if info is None:
+            role, flags = classify_component_name(name)
+            info = ComponentInfo(name, role, flags)
+        return info
+
+    def resolve_row(self, row: Any) -> Tuple[ComponentInfo, int]:
+        """
+        Component info and flags of a slip row: the component's name-derived
+        flags plus the flag fields set to 1 on the row. A flag field missing
+        from the row counts as 0 (not the Salary Component's value).
+        """
+        get = row.get
+        info = self.get(get("salary_component"))
+        flags = info.flags & NAME_FLAGS
+        for field, flag in FLAG_FIELDS:
+            if get(field) == 1:
+                flags |= flag
+        return info, flags
+
+    def row_flags(self, row: Any) -> int:
+        """Flags of a slip row (see ``resolve_row``)."""
+        return self.resolve_row(row)[1]
+
+    def __len__(self) -> int:
+        return len(self.components)
+
+
+def build_component_registry(rows: Iterable[Any]) -> ComponentRegistry:
+    """Build a registry from Salary Component rows."""
+    components: Dict[str, ComponentInfo] = {}
+    for row in rows:
+        name = _row_value(row, "name")
+        if not name:
+            continue
+        role, flags = classify_component_name(name)
+        for field, flag in FLAG_FIELDS:
+            if _row_value(row, field) == 1:
+                flags |= flag
+        components[name] = ComponentInfo(name, role, flags)
+    return ComponentRegistry(components)
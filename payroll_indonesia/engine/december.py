@@ -0,0 +1,267 @@
+"""
+PPh21 Desember (koreksi tahunan) over plain data.
+
+Annualisation is done from the December slip only: bruto, biaya jabatan and
+JP+JHT (employee) of December × 12, PKP floored to the thousand, progressive
+slabs, minus the PPh21 already withheld Jan–Nov. Employee lookups (PTKP,
+employment type) and the Jan–Nov YTD are resolved by the caller.
+"""
+
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, Optional, Sequence
+
+from payroll_indonesia.engine.components import ComponentRegistry
+from payroll_indonesia.engine.numbers import flt
+from payroll_indonesia.engine.progressive import calculate_pph21_progressive
+from payroll_indonesia.engine.reducer import reduce_slip
+from payroll_indonesia.engine.slabs import DEFAULT_COMPILED_SLABS, CompiledTaxSlabs
+from payroll_indonesia.utils.rupiah import apply_basis_points, to_rupiah
+
+# Biaya jabatan Desember: 5% bruto, maks. Rp500.000/bulan (Rp6.000.000/tahun)
+BIAYA_JABATAN_BP = 500
+BIAYA_JABATAN_CAP_MONTHLY = 500_000
+
+NOT_FULL_TIME = {
+    "bruto_total": 0.0, "netto_total": 0.0, "ptkp_annual": 0.0, "pkp_annual": 0.0,
+    "rate": "", "pph21_annual": 0.0, "pph21_bulan": 0.0, "koreksi_pph21": 0.0,
+    "employment_type_checked": False,
+    "message": "PPh21 December hanya dihitung untuk Employment Type: Full-time",
+}
+
+
+class DecemberInput:
+    """Inputs of one December calculation; amounts as stored on the slip / APH."""
+
+    __slots__ = (
+        "ytd_bruto_jan_nov",
+        "ytd_netto_jan_nov",
+        "ytd_tax_paid_jan_nov",
+        "bruto_desember",
+        "pengurang_netto_desember",
+        "biaya_jabatan_desember",
+        "jp_jht_employee_month",
+        "ptkp_annual",
+    )
+
+    def __init__(
+        self,
+        *,
+        ytd_bruto_jan_nov: float = 0.0,
+        ytd_netto_jan_nov: float = 0.0,
+        ytd_tax_paid_jan_nov: float = 0.0,
+        bruto_desember: float = 0.0,
+        pengurang_netto_desember: float = 0.0,
+        biaya_jabatan_desember: float = 0.0,
+        jp_jht_employee_month: float = 0.0,
+        ptkp_annual: float = 0.0,
+    ):
+        self.ytd_bruto_jan_nov = ytd_bruto_jan_nov
+        self.ytd_netto_jan_nov = ytd_netto_jan_nov
+        self.ytd_tax_paid_jan_nov = ytd_tax_paid_jan_nov
+        self.bruto_desember = bruto_desember
+        self.pengurang_netto_desember = pengurang_netto_desember
+        self.biaya_jabatan_desember = biaya_jabatan_desember
+        self.jp_jht_employee_month = jp_jht_employee_month
+        self.ptkp_annual = ptkp_annual
+
+
+# --- pembulatan yang benar untuk PKP & PPh ---
+def floor_to_thousand(x: float) -> int:
+    return int(flt(x) // 1000) * 1000
+
+
+def round_rupiah(x: float) -> int:
+    return int(Decimal(x).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+
+
+def biaya_jabatan_bulanan(bruto_bulan: float) -> float:
+    return min(flt(bruto_bulan) * 0.05, 500_000.0)
+
+
+def calculate_pkp_annual(netto_total: float, ptkp_annual: float) -> float:
+    pkp = max(flt(netto_total) - flt(ptkp_annual), 0.0)
+    return floor_to_thousand(pkp)
+
+
+def calculate_december(
+    inp: DecemberInput,
+    slabs: Optional[CompiledTaxSlabs] = None,
+    integer: bool = False,
+) -> Dict[str, Any]:
+    """
+    PPh21 Desember dari input Desember (annualisasi Desember × 12).
+
+    ``pengurang_netto_desember`` tidak di-annualize; ia hanya informasi
+    breakdown bulanan.
+    """
+    if slabs is None:
+        slabs = DEFAULT_COMPILED_SLABS
+    if integer:
+        return _calculate_december_rupiah(inp, slabs)
+
+    bruto_des = flt(inp.bruto_desember)
+    # pastikan biaya jabatan bulanan sesuai formula (kalau caller kirim lebih dari 500k, kita clamp)
+    bj_month = min(flt(inp.biaya_jabatan_desember), 500_000.0, bruto_des * 0.05)
+    bj_annual = min(bj_month * 12.0, 6_000_000.0)
+
+    jp_jht_employee_month = flt(inp.jp_jht_employee_month)
+    jp_jht_employee_annual = jp_jht_employee_month * 12.0
+
+    bruto_annual = bruto_des * 12.0
+    # Netto tahunan = Bruto tahunan - BJ tahunan - (JP+JHT EE × 12)
+    netto_annual = bruto_annual - bj_annual - jp_jht_employee_annual
+
+    ptkp_annual = inp.ptkp_annual
+    pkp_annual = calculate_pkp_annual(netto_annual, ptkp_annual)
+    pph21_annual = round_rupiah(calculate_pph21_progressive(pkp_annual, slabs))
+
+    koreksi_pph21 = pph21_annual - flt(inp.ytd_tax_paid_jan_nov)
+
+    # nilai netto_desember hanya untuk display (bukan dasar tahunan)
+    netto_desember = bruto_des - bj_month - flt(inp.pengurang_netto_desember)
+
+    return {
+        # breakdown Jan–Nov (display/audit)
+        "bruto_jan_nov": flt(inp.ytd_bruto_jan_nov),
+        "netto_jan_nov": flt(inp.ytd_netto_jan_nov),
+        "pph21_paid_jan_nov": flt(inp.ytd_tax_paid_jan_nov),
+
+        # Desember (display)
+        "bruto_desember": bruto_des,
+        "pengurang_netto_desember": flt(inp.pengurang_netto_desember),
+        "biaya_jabatan_desember": bj_month,
+        "netto_desember": netto_desember,
+        "jp_jht_employee_month": jp_jht_employee_month,
+        "jp_jht_employee_annual": jp_jht_employee_annual,
+
+        # tahunan (DECEMBER-ONLY)
+        "bruto_total": bruto_annual,
+        "netto_total": netto_annual,
+
+        # pajak
+        "ptkp_annual": flt(ptkp_annual),
+        "pkp_annual": flt(pkp_annual),
+        "rate": slabs.rate_display,
+        "pph21_annual": flt(pph21_annual),
+        "pph21_bulan": flt(koreksi_pph21),   # yang masuk ke slip Desember
+        "koreksi_pph21": flt(koreksi_pph21),
+
+        "employment_type_checked": True,
+    }
+
+
+def _calculate_december_rupiah(inp: DecemberInput, slabs: CompiledTaxSlabs) -> Dict[str, Any]:
+    """
+    Versi integer-rupiah (``use_integer_rupiah``): semua nominal rupiah bulat,
+    tarif basis point, pembulatan half-up integer.
+    """
+    bruto_des = to_rupiah(inp.bruto_desember)
+    bj_month = min(
+        to_rupiah(inp.biaya_jabatan_desember),
+        BIAYA_JABATAN_CAP_MONTHLY,
+        apply_basis_points(bruto_des, BIAYA_JABATAN_BP),
+    )
+    bj_annual = min(bj_month * 12, BIAYA_JABATAN_CAP_MONTHLY * 12)
+
+    jp_jht_month = to_rupiah(inp.jp_jht_employee_month)
+    jp_jht_annual = jp_jht_month * 12
+
+    bruto_annual = bruto_des * 12
+    netto_annual = bruto_annual - bj_annual - jp_jht_annual
+
+    ptkp_annual = to_rupiah(inp.ptkp_annual)
+    pkp_annual = max(netto_annual - ptkp_annual, 0) // 1000 * 1000
+    pph21_annual = slabs.tax_for_rupiah(pkp_annual)
+
+    pph21_paid_jan_nov = to_rupiah(inp.ytd_tax_paid_jan_nov)
+    koreksi_pph21 = pph21_annual - pph21_paid_jan_nov
+    pengurang_netto_des = to_rupiah(inp.pengurang_netto_desember)
+
+    return {
+        "bruto_jan_nov": to_rupiah(inp.ytd_bruto_jan_nov),
+        "netto_jan_nov": to_rupiah(inp.ytd_netto_jan_nov),
+        "pph21_paid_jan_nov": pph21_paid_jan_nov,
+
+        "bruto_desember": bruto_des,
+        "pengurang_netto_desember": pengurang_netto_des,
+        "biaya_jabatan_desember": bj_month,
+        "netto_desember": bruto_des - bj_month - pengurang_netto_des,
+        "jp_jht_employee_month": jp_jht_month,
+        "jp_jht_employee_annual": jp_jht_annual,
+
+        "bruto_total": bruto_annual,
+        "netto_total": netto_annual,
+
+        "ptkp_annual": ptkp_annual,
+        "pkp_annual": pkp_annual,
+        "rate": slabs.rate_display,
+        "pph21_annual": pph21_annual,
+        "pph21_bulan": koreksi_pph21,
+        "koreksi_pph21": koreksi_pph21,
+
+        "employment_type_checked": True,
+    }
+
+
+def calculate_december_from_slips(
+    jan_nov_slips: Sequence[Dict[str, Any]],
+    december_slips: Sequence[Dict[str, Any]],
+    ptkp_annual: float,
+    slabs: Optional[CompiledTaxSlabs] = None,
+    registry: Optional[ComponentRegistry] = None,
+) -> Dict[str, Any]:
+    """
+    Versi uji cepat (tanpa APH): bruto, BJ dan JP+JHT (EE) untuk annualisasi
+    diambil dari slip Desember, total PPh Jan–Nov dari slip Jan–Nov.
+    """
+    if slabs is None:
+        slabs = DEFAULT_COMPILED_SLABS
+
+    # total PPh & bruto Jan–Nov (untuk koreksi), satu pass per slip
+    pph21_paid_jan_nov = 0.0
+    bruto_jan_nov = 0.0
+    for s in jan_nov_slips:
+        agg = reduce_slip(s, registry)
+        pph21_paid_jan_nov += flt(s.get("tax", 0)) or agg.pph21_amount
+        bruto_jan_nov += agg.bruto
+
+    # annualization dari Desember saja (agregasi bila lebih dari 1 slip)
+    bruto_desember = 0.0
+    jp_jht_month = 0.0
+    for s in december_slips:
+        agg = reduce_slip(s, registry)
+        bruto_desember += agg.bruto
+        jp_jht_month += agg.jp_jht_employee
+
+    bj_month = biaya_jabatan_bulanan(bruto_desember)
+    bj_annual = min(bj_month * 12.0, 6_000_000.0)
+    bruto_annual = bruto_desember * 12.0
+    jp_jht_annual = jp_jht_month * 12.0
+    netto_annual = bruto_annual - bj_annual - jp_jht_annual
+
+    pkp_annual = calculate_pkp_annual(netto_annual, ptkp_annual)
+    pph21_annual = round_rupiah(calculate_pph21_progressive(pkp_annual, slabs))
+    koreksi_pph21 = pph21_annual - pph21_paid_jan_nov
+
+    return {
+        "bruto_jan_nov": bruto_jan_nov,
+        "netto_jan_nov": 0.0,  # tidak relevan untuk annualization Desember
+        "pph21_paid_jan_nov": pph21_paid_jan_nov,
+
+        "bruto_desember": bruto_desember,
+        "pengurang_netto_desember": 0.0,
+        "biaya_jabatan_desember": bj_month,
+        "netto_desember": bruto_desember - bj_month,  # display only
+        "jp_jht_employee_month": jp_jht_month,
+        "jp_jht_employee_annual": jp_jht_annual,
+
+        "bruto_total": bruto_annual,
+        "netto_total": netto_annual,
+        "ptkp_annual": ptkp_annual,
+        "pkp_annual": pkp_annual,
+        "rate": slabs.rate_display,
+        "pph21_annual": pph21_annual,
+        "pph21_bulan": koreksi_pph21,
+        "koreksi_pph21": koreksi_pph21,
+        "employment_type_checked": True,
+    }
@@ -0,0 +1,19 @@
+"""
+Number helpers of the calculation core, mirroring ``frappe.utils`` without
+importing frappe.
+"""
+
+from typing import Any
+
+from payroll_indonesia.utils import round_half_up  # noqa: F401 (re-exported)
+
+
+def flt(value: Any) -> float:
+    """``frappe.utils.flt`` without precision: thousands separators are dropped,
+    anything that is not a number becomes 0.0."""
+    if isinstance(value, str):
+        value = value.replace(",", "")
+    try:
+        return float(value)
+    except Exception:
+        return 0.0
@@ -0,0 +1,160 @@
+"""
+Annual progressive PPh21 (Pasal 17) over a year of plain salary slips.
+
+``calculate_progressive_year`` sums bruto, income tax deductions and biaya
+jabatan of every slip, annualises PKP and applies the compiled slabs. Employee
+lookups (PTKP, employment type) are done by the caller.
+"""
+
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+from payroll_indonesia.engine.components import ComponentRegistry
+from payroll_indonesia.engine.reducer import reduce_slip
+from payroll_indonesia.engine.slabs import (
+    DEFAULT_COMPILED_SLABS,
+    CompiledTaxSlabs,
+    compile_tax_slabs,
+)
+from payroll_indonesia.utils.rupiah import div_half_up
+
+NOT_FULL_TIME = {
+    "bruto_total": 0.0,
+    "netto_total": 0.0,
+    "ptkp_annual": 0.0,
+    "pkp_annual": 0.0,
+    "rate": "",
+    "pph21_annual": 0.0,
+    "pph21_bulan": 0.0,
+    "income_tax_deduction_total": 0.0,
+    "biaya_jabatan_total": 0.0,
+    "koreksi_pph21": 0.0,
+    "employment_type_checked": False,
+    "message": "PPh21 Progressive hanya dihitung untuk Employment Type: Full-time",
+}
+
+
+def calculate_pkp_annual(netto_total: float, ptkp_annual: float) -> int:
+    """
+    PKP tahunan = (total netto setahun - PTKP setahun), dibulatkan ke ribuan terdekat.
+    """
+    pkp = max(netto_total - ptkp_annual, 0)
+    return int(round(pkp / 1000.0)) * 1000
+
+
+def calculate_pph21_progressive(
+    pkp_annual: float,
+    slabs: Optional[Union[CompiledTaxSlabs, Sequence[Tuple[float, float]]]] = None,
+) -> float:
+    """
+    Hitung PPh 21 setahun dengan metode progresif (slab).
+    Memakai slab terkompilasi: satu bisect + satu perkalian.
+    """
+    if slabs is None:
+        slabs = DEFAULT_COMPILED_SLABS
+    elif not isinstance(slabs, CompiledTaxSlabs):
+        slabs = compile_tax_slabs(slabs)
+    return slabs.tax_for(pkp_annual)
+
+
+def calculate_progressive_year(
+    salary_slips: Sequence[Any],
+    ptkp_annual: float,
+    pph21_paid_jan_nov: float = 0,
+    slabs: Optional[CompiledTaxSlabs] = None,
+    registry: Optional[ComponentRegistry] = None,
+    integer: bool = False,
+) -> Dict[str, Any]:
+    """
+    PPh 21 progresif setahun dari slip Jan–Des.
+
+    Args:
+        salary_slips: slip dicts (``earnings``/``deductions``) of the year
+        ptkp_annual: PTKP setahun karyawan
+        pph21_paid_jan_nov: PPh21 yang sudah dipotong Jan–Nov
+        slabs: compiled tax slabs; defaults to ``DEFAULT_TAX_SLABS``
+        registry: Salary Component registry; without it components are
+                  classified by name only
+        integer: nominal rupiah bulat, PKP dibulatkan half-up ke ribuan,
+                 slab dengan basis point
+
+    Returns:
+        dict with bruto/netto/PTKP/PKP totals, rate display, annual tax and koreksi
+    """
+    if slabs is None:
+        slabs = DEFAULT_COMPILED_SLABS
+
+    if integer:
+        return _calculate_progressive_year_rupiah(
+            salary_slips, ptkp_annual, pph21_paid_jan_nov, slabs, registry
+        )
+
+    bruto_total = 0.0
+    income_tax_deduction_total = 0.0
+    biaya_jabatan_total = 0.0
+    netto_total = 0.0
+
+    for slip in salary_slips:
+        agg = reduce_slip(slip, registry)
+        bruto = agg.bruto
+        pengurang_netto = agg.income_tax_deductions
+        biaya_jabatan = agg.biaya_jabatan
+        netto = bruto - pengurang_netto - biaya_jabatan
+        bruto_total += bruto
+        income_tax_deduction_total += pengurang_netto
+        biaya_jabatan_total += biaya_jabatan
+        netto_total += netto
+
+    pkp_annual = calculate_pkp_annual(netto_total, ptkp_annual)
+    pph21_annual = calculate_pph21_progressive(pkp_annual, slabs)
+    koreksi_pph21 = pph21_annual - pph21_paid_jan_nov
+
+    return {
+        "bruto_total": bruto_total,
+        "netto_total": netto_total,
+        "ptkp_annual": ptkp_annual,
+        "pkp_annual": pkp_annual,
+        "rate": slabs.rate_display,
+        "pph21_annual": pph21_annual,
+        "pph21_bulan": koreksi_pph21,
+        "income_tax_deduction_total": income_tax_deduction_total,
+        "biaya_jabatan_total": biaya_jabatan_total,
+        "koreksi_pph21": koreksi_pph21,
+        "employment_type_checked": True
+    }
+
+
+def _calculate_progressive_year_rupiah(
+    salary_slips: Sequence[Any],
+    ptkp_annual: int,
+    pph21_paid_jan_nov: int,
+    slabs: CompiledTaxSlabs,
+    registry: Optional[ComponentRegistry],
+) -> Dict[str, Any]:
+    bruto_total = 0
+    income_tax_deduction_total = 0
+    biaya_jabatan_total = 0
+
+    for slip in salary_slips:
+        agg = reduce_slip(slip, registry, integer=True)
+        bruto_total += agg.bruto
+        income_tax_deduction_total += agg.income_tax_deductions
+        biaya_jabatan_total += agg.biaya_jabatan
+
+    netto_total = bruto_total - income_tax_deduction_total - biaya_jabatan_total
+    pkp_annual = div_half_up(max(netto_total - ptkp_annual, 0), 1000) * 1000
+    pph21_annual = slabs.tax_for_rupiah(pkp_annual)
+    koreksi_pph21 = pph21_annual - pph21_paid_jan_nov
+
+    return {
+        "bruto_total": bruto_total,
+        "netto_total": netto_total,
+        "ptkp_annual": ptkp_annual,
+        "pkp_annual": pkp_annual,
+        "rate": slabs.rate_display,
+        "pph21_annual": pph21_annual,
+        "pph21_bulan": koreksi_pph21,
+        "income_tax_deduction_total": income_tax_deduction_total,
+        "biaya_jabatan_total": biaya_jabatan_total,
+        "koreksi_pph21": koreksi_pph21,
+        "employment_type_checked": True
+    }
@@ -0,0 +1,123 @@
+"""
+Single-pass reducer for the PPh21 aggregates of one salary slip.
+
+``reduce_slip`` walks ``earnings`` and ``deductions`` once and returns every
+aggregate the TER, December and progressive calculations need (bruto,
+pengurang netto, biaya jabatan, JP+JHT, the PPh 21 row, totals) in a
+``SlipAggregates``. Rows may be dicts or documents; only ``row.get`` is used.
+"""
+
+from typing import Any, Optional
+
+from payroll_indonesia.engine import components as cr
+from payroll_indonesia.engine.components import ComponentRegistry, ComponentRole
+from payroll_indonesia.engine.numbers import flt
+from payroll_indonesia.utils.rupiah import to_rupiah
+
+# Deduction row that holds the PPh 21 withheld on the slip
+PPH21_COMPONENT = "PPh 21"
+
+JP_JHT_ROLES = (ComponentRole.BPJS_JHT, ComponentRole.BPJS_JP)
+
+_NOT_COUNTED = cr.NOT_IN_TOTAL | cr.STATISTICAL
+
+
+class SlipAggregates:
+    """PPh21 inputs and totals of one slip."""
+
+    __slots__ = (
+        # Bruto: taxable, non-statistical, non-exempt earnings
+        "bruto",
+        # TER: deductions flagged/named pengurang netto (excl. Biaya Jabatan)
+        "pengurang_netto",
+        # December: income-tax/pengurang-netto deductions counted in total
+        "pengurang_netto_bulanan",
+        # Progressive: income-tax deductions counted in total
+        "income_tax_deductions",
+        # Amount of the first Biaya Jabatan row (0 if none)
+        "biaya_jabatan",
+        # BPJS JHT + JP employee deductions
+        "jp_jht_employee",
+        # Sum of PPh 21 deduction rows and index of the PPh 21 row, if any
+        "pph21_amount",
+        "pph21_row_index",
+        # Totals excluding do_not_include_in_total / statistical rows
+        "gross_pay",
+        "total_deduction",
+        # True when every amount above is whole rupiah (int)
+        "integer",
+    )
+
+    def __init__(self, integer: bool = False):
+        zero = 0 if integer else 0.0
+        self.bruto = zero
+        self.pengurang_netto = zero
+        self.pengurang_netto_bulanan = zero
+        self.income_tax_deductions = zero
+        self.biaya_jabatan = zero
+        self.jp_jht_employee = zero
+        self.pph21_amount = zero
+        self.pph21_row_index: Optional[int] = None
+        self.gross_pay = zero
+        self.total_deduction = zero
+        self.integer = integer
+
+    @property
+    def net_pay(self) -> float:
+        return self.gross_pay - self.total_deduction
+
+
+def reduce_slip(
+    slip: Any,
+    registry: Optional[ComponentRegistry] = None,
+    integer: bool = False,
+) -> SlipAggregates:
+    """
+    Walk ``earnings`` and ``deductions`` of ``slip`` (dict or document) once.
+
+    Row selection is identical to the ``sum_*`` helpers of the PPh21 modules.
+    Without ``registry`` components are classified by name only. With
+    ``integer`` every row amount is converted to whole rupiah first.
+    """
+    if registry is None:
+        registry = ComponentRegistry()
+    agg = SlipAggregates(integer)
+    amount_of = to_rupiah if integer else flt
+
+    for row in slip.get("earnings") or []:
+        flags = registry.row_flags(row)
+        amount = amount_of(row.get("amount", 0))
+        if flags & cr.BRUTO and not flags & (cr.STATISTICAL | cr.EXEMPT):
+            agg.bruto += amount
+        if not flags & _NOT_COUNTED:
+            agg.gross_pay += amount
+
+    biaya_jabatan_found = False
+    for i, row in enumerate(slip.get("deductions") or []):
+        info, flags = registry.resolve_row(row)
+        amount = amount_of(row.get("amount", 0))
+
+        if flags & cr.BIAYA_JABATAN:
+            if not biaya_jabatan_found:
+                agg.biaya_jabatan = amount
+                biaya_jabatan_found = True
+        else:
+            if flags & (cr.PENGURANG_NETTO | cr.PENGURANG_NETTO_NAME):
+                agg.pengurang_netto += amount
+            if not flags & _NOT_COUNTED:
+                if flags & (cr.TAX_DEDUCTION | cr.PENGURANG_NETTO):
+                    agg.pengurang_netto_bulanan += amount
+                if flags & cr.TAX_DEDUCTION:
+                    agg.income_tax_deductions += amount
+
+        if info.role in JP_JHT_ROLES and flags & cr.EMPLOYEE:
+            agg.jp_jht_employee += amount
+        elif info.role == ComponentRole.PPH21:
+            agg.pph21_amount += amount
+        if agg.pph21_row_index is None and info.name == PPH21_COMPONENT:
+            agg.pph21_row_index = i
+
+        if not flags & _NOT_COUNTED:
+            agg.total_deduction += amount
+
+    return agg
@@ -0,0 +1,109 @@
+"""
+Compiled progressive tax slabs (PPh 21 Pasal 17).
+
+A slab list is compiled once into upper boundaries, rates and the cumulative
+tax owed at each boundary, so annual tax is a single ``bisect`` plus one
+multiply. Compiled slabs also carry the rate display string used in
+``pph21_info`` (``"5%/15%/..."``).
+"""
+
+from bisect import bisect_left
+from typing import Sequence, Tuple
+
+from payroll_indonesia.engine.numbers import flt
+from payroll_indonesia.utils.rupiah import BP_SCALE, div_half_up, to_basis_points, to_rupiah
+
+# Default progressive tax slabs PMK 168/2023 (berlaku 2024)
+DEFAULT_TAX_SLABS = [
+    (60_000_000, 5),
+    (250_000_000, 15),
+    (500_000_000, 25),
+    (5_000_000_000, 30),
+    (float("inf"), 35),
+]
+
+
+class CompiledTaxSlabs:
+    """Progressive slabs with precomputed cumulative tax at every boundary."""
+
+    __slots__ = (
+        "slabs",
+        "uppers",
+        "rates",
+        "cumulative",
+        "rate_display",
+        "rates_bp",
+        "cumulative_scaled",
+    )
+
+    def __init__(self, slabs: Sequence[Tuple[float, float]]):
+        self.slabs = list(slabs)
+        self.uppers = [batas for batas, _ in self.slabs]
+        self.rates = [rate for _, rate in self.slabs]
+
+        # cumulative[i] = tax owed for PKP exactly at the lower bound of slab i
+        self.cumulative = [0.0]
+        lower = 0.0
+        for batas, rate in self.slabs:
+            if batas == float("inf"):
+                break
+            self.cumulative.append(self.cumulative[-1] + (batas - lower) * rate / 100.0)
+            lower = batas
+
+        self.rate_display = "/".join(f"{rate}%" for rate in self.rates)
+
+        # Integer-rupiah mode: rates in basis points, cumulative tax × BP_SCALE (exact)
+        self.rates_bp = [to_basis_points(rate) for rate in self.rates]
+        self.cumulative_scaled = [0]
+        lower_int = 0
+        for batas, rate_bp in zip(self.uppers, self.rates_bp):
+            if batas == float("inf"):
+                break
+            upper_int = to_rupiah(batas)
+            self.cumulative_scaled.append(
+                self.cumulative_scaled[-1] + (upper_int - lower_int) * rate_bp
+            )
+            lower_int = upper_int
+
+    def tax_for(self, pkp_annual: float) -> float:
+        """Annual progressive tax for ``pkp_annual``."""
+        pkp = flt(pkp_annual)
+        if pkp <= 0 or not self.uppers:
+            return 0.0
+        i = bisect_left(self.uppers, pkp)
+        if i >= len(self.uppers):
+            # PKP above the last finite slab: the excess is not taxed further
+            return self.cumulative[-1]
+        lower = self.uppers[i - 1] if i else 0.0
+        return self.cumulative[i] + (pkp - lower) * self.rates[i] / 100.0
+
+    def tax_for_rupiah(self, pkp_annual: int) -> int:
+        """Annual progressive tax for whole-rupiah ``pkp_annual``, rounded once half-up."""
+        pkp = to_rupiah(pkp_annual)
+        if pkp <= 0 or not self.uppers:
+            return 0
+        i = bisect_left(self.uppers, pkp)
+        if i >= len(self.uppers):
+            return div_half_up(self.cumulative_scaled[-1], BP_SCALE)
+        lower = to_rupiah(self.uppers[i - 1]) if i else 0
+        return div_half_up(
+            self.cumulative_scaled[i] + (pkp - lower) * self.rates_bp[i], BP_SCALE
+        )
+
+    def __iter__(self):
+        return iter(self.slabs)
+
+    def __len__(self) -> int:
+        return len(self.slabs)
+
+
+def compile_tax_slabs(slabs: Sequence[Tuple[float, float]]) -> CompiledTaxSlabs:
+    """Compile a list of (batas, rate) tuples; ``batas`` of 0 means no upper limit."""
+    normalized = [
+        (float("inf") if not batas else batas, rate) for batas, rate in slabs
+    ]
+    normalized.sort(key=lambda x: x[0])
+    return CompiledTaxSlabs(normalized)
+
+
+DEFAULT_COMPILED_SLABS = compile_tax_slabs(DEFAULT_TAX_SLABS)
@@ -0,0 +1,190 @@
+"""
+Monthly PPh21 TER arithmetic over plain data.
+
+``ter_result`` is the per-slip formula shared by ``calculate_pph21_TER``,
+``calculate_pph21_TER_batch`` and the process pool. ``calculate_ter_slip``
+reduces and taxes one ``TERSlipInput``; ``calculate_ter_slips`` does a list of
+them in one call and is what worker processes run.
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from payroll_indonesia.engine.components import ComponentRegistry
+from payroll_indonesia.engine.numbers import flt, round_half_up
+from payroll_indonesia.engine.reducer import SlipAggregates, reduce_slip
+from payroll_indonesia.engine.ter_index import TERBracketIndex
+from payroll_indonesia.utils.rupiah import (
+    apply_basis_points,
+    div_half_up,
+    to_basis_points,
+    to_rupiah,
+)
+
+NOT_ELIGIBLE = {"employment_type_checked": False, "pph21": 0.0}
+
+
+class TERParams:
+    """Settings the TER arithmetic needs, as plain picklable values."""
+
+    __slots__ = (
+        "biaya_jabatan_rate",
+        "biaya_jabatan_cap_monthly",
+        "integer_rupiah",
+        "biaya_jabatan_bp",
+        "biaya_jabatan_cap_monthly_rupiah",
+        "brackets",
+    )
+
+    def __init__(
+        self,
+        biaya_jabatan_rate: float,
+        biaya_jabatan_cap_monthly: float,
+        brackets: Optional[Dict[str, TERBracketIndex]] = None,
+        integer_rupiah: bool = False,
+    ):
+        self.biaya_jabatan_rate = biaya_jabatan_rate
+        self.biaya_jabatan_cap_monthly = biaya_jabatan_cap_monthly
+        self.integer_rupiah = bool(integer_rupiah)
+        self.biaya_jabatan_bp = to_basis_points(biaya_jabatan_rate)
+        self.biaya_jabatan_cap_monthly_rupiah = to_rupiah(biaya_jabatan_cap_monthly)
+        self.brackets = dict(brackets or {})
+
+    @classmethod
+    def from_settings(cls, settings: Any) -> "TERParams":
+        """Build from a ``PayrollSettingsSnapshot`` (duck-typed, no import needed)."""
+        return cls(
+            settings.biaya_jabatan_rate,
+            settings.biaya_jabatan_cap_monthly,
+            brackets=getattr(settings.ter_table, "indexes", None),
+            integer_rupiah=settings.integer_rupiah,
+        )
+
+
+class TERSlipInput:
+    """
+    Inputs of one slip: ``slip`` is a dict with plain ``earnings``/``deductions``
+    rows or a gross amount; PTKP and TER code are already resolved.
+    """
+
+    __slots__ = ("slip", "eligible", "ptkp_annual", "ter_code")
+
+    def __init__(self, slip: Any, eligible: bool, ptkp_annual: float = 0.0, ter_code: Optional[str] = None):
+        self.slip = slip
+        self.eligible = eligible
+        self.ptkp_annual = ptkp_annual
+        self.ter_code = ter_code
+
+
+def ter_result(
+    bruto: float,
+    biaya_jabatan_component: float,
+    pengurang_netto: float,
+    ptkp_annual: float,
+    rate: float,
+    params: TERParams,
+) -> Dict[str, Any]:
+    """PPh21 TER result of one eligible slip, identical to ``calculate_pph21_TER``."""
+    if params.integer_rupiah:
+        bruto = to_rupiah(bruto)
+        pengurang_netto = to_rupiah(pengurang_netto)
+        biaya_jabatan = to_rupiah(biaya_jabatan_component) or min(
+            apply_basis_points(bruto, params.biaya_jabatan_bp),
+            params.biaya_jabatan_cap_monthly_rupiah,
+        )
+        netto = bruto - biaya_jabatan - pengurang_netto
+        ptkp = div_half_up(to_rupiah(ptkp_annual), 12)
+        pkp = max(netto - ptkp, 0)
+        pph21 = apply_basis_points(bruto, to_basis_points(rate))
+    else:
+        biaya_jabatan = biaya_jabatan_component or min(
+            bruto * params.biaya_jabatan_rate / 100, params.biaya_jabatan_cap_monthly
+        )
+        netto = bruto - biaya_jabatan - pengurang_netto
+        ptkp = ptkp_annual / 12
+        pkp = max(netto - ptkp, 0.0)
+        pph21 = round_half_up(bruto * rate / 100)
+
+    return {
+        "ptkp": ptkp,
+        "bruto": bruto,
+        "pengurang_netto": pengurang_netto,
+        "biaya_jabatan": biaya_jabatan,
+        "netto": netto,
+        "pkp": pkp,
+        "rate": rate,
+        "pph21": pph21,
+        "employment_type_checked": True,
+    }
+
+
+def calculate_ter_slip(
+    item: TERSlipInput,
+    params: TERParams,
+    registry: Optional[ComponentRegistry] = None,
+    aggregates: Optional[SlipAggregates] = None,
+) -> Tuple[Dict[str, Any], Optional[SlipAggregates], Optional[Tuple[str, bool]]]:
+    """
+    Reduce and tax one input.
+
+    ``aggregates`` is reused when it was reduced in the same (float/integer)
+    mode as ``params``.
+
+    Returns:
+        (result, aggregates, unmatched): ``aggregates`` is None for gross
+        amounts and ineligible slips; ``unmatched`` is (ter_code, code found)
+        when the slip has a TER code but no rate
+    """
+    if not item.eligible:
+        return dict(NOT_ELIGIBLE), None, None
+
+    slip = item.slip
+    agg = None
+    if isinstance(slip, dict) and slip.get("earnings") is not None:
+        agg = aggregates
+        if agg is None or agg.integer != params.integer_rupiah:
+            agg = reduce_slip(slip, registry, integer=params.integer_rupiah)
+        bruto, bj_component, pengurang = agg.bruto, agg.biaya_jabatan, agg.pengurang_netto
+    else:
+        bruto, bj_component, pengurang = flt(slip), 0.0, 0.0
+
+    rate = 0.0
+    unmatched = None
+    if item.ter_code:
+        index = params.brackets.get(item.ter_code)
+        found = index.lookup(bruto) if index else None
+        if found is None:
+            unmatched = (item.ter_code, bool(index))
+        else:
+            rate = found
+
+    result = ter_result(bruto, bj_component, pengurang, item.ptkp_annual, rate, params)
+    return result, agg, unmatched
+
+
+def calculate_ter_slips(
+    inputs: Sequence[TERSlipInput],
+    params: TERParams,
+    registry: Optional[ComponentRegistry] = None,
+) -> Tuple[List[Dict[str, Any]], List[Optional[SlipAggregates]], Dict[str, List[Any]]]:
+    """
+    Reduce and tax every input.
+
+    Returns:
+        (results, aggregates, unmatched): one result dict and one
+        ``SlipAggregates`` (None for gross amounts and ineligible slips) per
+        input, and ter_code -> [slip count, code found] for slips without a rate
+    """
+    results: List[Dict[str, Any]] = []
+    aggregates: List[Optional[SlipAggregates]] = []
+    unmatched: Dict[str, List[Any]] = {}
+
+    for item in inputs:
+        result, agg, missing = calculate_ter_slip(item, params, registry)
+        results.append(result)
+        aggregates.append(agg)
+        if missing is not None:
+            ter_code, found = missing
+            entry = unmatched.setdefault(ter_code, [0, found])
+            entry[0] += 1
+
+    return results, aggregates, unmatched
@@ -0,0 +1,130 @@
+"""
+TER bracket index over plain rows.
+
+Bracket rows are compiled into sorted boundary arrays per ``ter_code`` so that a
+rate lookup is a single ``bisect``. Overlapping or gapped brackets are reported
+as issues while compiling.
+"""
+
+import math
+from bisect import bisect_right
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from payroll_indonesia.engine.numbers import flt
+
+# Brackets are stored in whole rupiah (max 5.400.000 -> next min 5.400.001),
+# so a step of up to one rupiah between two brackets is not a gap.
+GAP_TOLERANCE = 1.0
+
+
+class TERBracketIndex:
+    """Sorted bracket boundaries for a single TER code."""
+
+    __slots__ = ("ter_code", "mins", "maxs", "rates")
+
+    def __init__(self, ter_code: str, mins: List[float], maxs: List[float], rates: List[float]):
+        self.ter_code = ter_code
+        self.mins = mins
+        self.maxs = maxs
+        self.rates = rates
+
+    def lookup(self, monthly_income: float) -> Optional[float]:
+        """Return rate_percent for ``monthly_income`` or None if no bracket matches."""
+        i = bisect_right(self.mins, monthly_income) - 1
+        if i < 0 or monthly_income > self.maxs[i]:
+            return None
+        return self.rates[i]
+
+    def __len__(self) -> int:
+        return len(self.mins)
+
+
+class TERTable:
+    """All compiled TER indexes plus the issues found while compiling them."""
+
+    __slots__ = ("indexes", "issues")
+
+    def __init__(self, indexes: Dict[str, TERBracketIndex], issues: List[str]):
+        self.indexes = indexes
+        self.issues = issues
+
+    def get(self, ter_code: str) -> Optional[TERBracketIndex]:
+        return self.indexes.get(ter_code)
+
+
+def _row_value(row: Any, field: str) -> Any:
+    if isinstance(row, dict):
+        return row.get(field)
+    return getattr(row, field, None)
+
+
+def compile_ter_brackets(rows: Iterable[Any]) -> Tuple[Dict[str, TERBracketIndex], List[str]]:
+    """
+    Compile TER Bracket Table rows into per-code indexes.
+
+    Lookup semantics match the former linear scan: brackets are tried in
+    ascending ``min_income`` order, the first one containing the income wins and
+    ``max_income == 0`` means no upper limit. Overlapping brackets are clipped so
+    the lower bracket keeps priority; brackets that can never match are dropped.
+
+    Returns:
+        Tuple of (indexes keyed by ter_code, list of human readable issues)
+    """
+    grouped: Dict[str, List[Tuple[float, float, float]]] = {}
+    for row in rows:
+        ter_code = _row_value(row, "ter_code")
+        if not ter_code:
+            continue
+        min_income = flt(_row_value(row, "min_income") or 0)
+        max_income = flt(_row_value(row, "max_income") or 0)
+        rate = flt(_row_value(row, "rate_percent") or 0)
+        if max_income == 0:
+            max_income = math.inf
+        grouped.setdefault(ter_code, []).append((min_income, max_income, rate))
+
+    indexes: Dict[str, TERBracketIndex] = {}
+    issues: List[str] = []
+
+    for ter_code, brackets in grouped.items():
+        brackets.sort(key=lambda b: b[0])
+        mins: List[float] = []
+        maxs: List[float] = []
+        rates: List[float] = []
+
+        for min_income, max_income, rate in brackets:
+            if max_income < min_income:
+                issues.append(
+                    f"TER {ter_code}: bracket {min_income:,.0f} has max_income "
+                    f"{max_income:,.0f} below min_income and is ignored"
+                )
+                continue
+
+            if maxs:
+                prev_max = maxs[-1]
+                if min_income <= prev_max:
+                    if max_income <= prev_max:
+                        issues.append(
+                            f"TER {ter_code}: bracket {min_income:,.0f}-{max_income:,.0f} "
+                            f"is covered by the previous bracket and is ignored"
+                        )
+                        continue
+                    issues.append(
+                        f"TER {ter_code}: bracket starting at {min_income:,.0f} overlaps "
+                        f"previous bracket ending at {prev_max:,.0f}"
+                    )
+                    min_income = math.nextafter(prev_max, math.inf)
+                elif min_income - prev_max > GAP_TOLERANCE:
+                    issues.append(
+                        f"TER {ter_code}: gap between {prev_max:,.0f} and {min_income:,.0f}"
+                    )
+
+            mins.append(min_income)
+            maxs.append(max_income)
+            rates.append(rate)
+
+        if mins and mins[0] > 0:
+            issues.append(f"TER {ter_code}: first bracket starts at {mins[0]:,.0f}, not 0")
+
+        indexes[ter_code] = TERBracketIndex(ter_code, mins, maxs, rates)
+
+    return indexes, issues
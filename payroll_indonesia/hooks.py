@@ -131,6 +131,16 @@ doc_events = {
         "on_submit": "payroll_indonesia.override.salary_slip.on_submit",
         "on_cancel": "payroll_indonesia.override.salary_slip.on_cancel",
     },
+    # Rebuild compiled lookup tables (TER index, ...) when settings change; its
+    # child tables are saved with it (child rows fire no doc_events of their own)
+    "Payroll Indonesia Settings": {
+        "on_update": "payroll_indonesia.config.cache.clear_settings_cache",
+    },
+    # Rebuild the Salary Component role registry
+    "Salary Component": {
+        "on_update": "payroll_indonesia.config.component_registry.clear_component_registry",
+        "on_trash": "payroll_indonesia.config.component_registry.clear_component_registry",
+    },
 }
 
 # Scheduled Tasks
@@ -154,6 +164,16 @@ doc_events = {
 #	],
 # }
 
+scheduler_events = {
+    # Write-behind Annual Payroll History queue (annual_history_write_behind)
+    "all": [
+        "payroll_indonesia.payroll_indonesia.doctype.annual_payroll_history_queue.annual_payroll_history_queue.run_annual_history_queue"
+    ],
+    "hourly": [
+        "payroll_indonesia.payroll_indonesia.doctype.payroll_run_checkpoint.payroll_run_checkpoint.mark_stalled_runs"
+    ],
+}
+
 # Testing
 # -------
 
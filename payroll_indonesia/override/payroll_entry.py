@@ -10,12 +10,35 @@ except ImportError:
     )
 
 import frappe
+import json
 import traceback
-from typing import Callable, Dict, List, Any, Optional, Tuple
+from collections import Counter
+from typing import Callable, Dict, List, Any, Optional, Set, Tuple
 from payroll_indonesia.override.salary_slip import CustomSalarySlip
 from payroll_indonesia.config import get_value
+from payroll_indonesia.config.config import (
+    get_calculation_process_workers,
+    is_annual_history_write_behind,
+    is_auto_queue_salary_slip,
+)
+from payroll_indonesia.config.pph21_ter_batch import calculate_pph21_TER_batch
+from payroll_indonesia.config.snapshot import build_settings_snapshot, get_settings_version
 from payroll_indonesia.utils.sync_annual_payroll_history import sync_annual_payroll_history
-from frappe.utils import file_lock
+from payroll_indonesia.utils.annual_history_bulk import sync_annual_payroll_history_bulk
+from payroll_indonesia.utils.annual_history_lock import (
+    get_lock_contention,
+    local_contention,
+    reraise_lock_conflict,
+    run_with_lock_retry,
+)
+from payroll_indonesia.utils.fingerprint import FINGERPRINT_FIELD, compute_input_fingerprints
+from payroll_indonesia.utils.light_writer import LightFieldWriter
+from payroll_indonesia.utils.query_counter import QueryCounter
+from payroll_indonesia.utils import run_metrics
+from payroll_indonesia.utils.run_metrics import RunMetrics, save_run_metrics
+from payroll_indonesia.utils.slip_loader import load_salary_slips
+from payroll_indonesia.utils.ytd import YTDPrefetch, get_ytd_jan_nov_bulk
+from frappe.utils import file_lock, flt, getdate
 import os
 import time
 from datetime import datetime, timedelta
@@ -24,6 +47,42 @@ from datetime import datetime, timedelta
 # This logs to logs/payroll_indonesia.log via the site's configured loggers.
 logger = frappe.logger("payroll_indonesia")
 
+# Slips loaded and tax-calculated together per batch
+SLIP_BATCH_SIZE = 500
+
+# auto_queue_salary_slip: slips per background job, and the job timeout (seconds)
+QUEUE_CHUNK_SIZE = 250
+CHUNK_JOB_TIMEOUT = 3600
+# Chunk results and counter of a queued run expire this long after the last
+# finished chunk, so a run whose job was killed does not leave them behind
+CHUNK_RESULTS_TTL = 3 * CHUNK_JOB_TIMEOUT
+
+# Draft salary slips removed per set-based DELETE in delete_salary_slips
+DELETE_CHUNK_SIZE = 500
+DELETE_SAVEPOINT = "salary_slip_bulk_delete"
+
+TAX_MODE_TER = "TER"
+TAX_MODE_DECEMBER = "DECEMBER"
+
+# Salary Slip totals recomputed by update_pph21_row; a light-field UPDATE does not
+# write them, so a slip where any of them changed takes the full save
+TOTAL_FIELDS = ("gross_pay", "total_deduction", "net_pay", "rounded_total", "rounded_net_pay", "total")
+
+
+def _full_save_state(slip_obj: Any) -> Tuple[Any, ...]:
+    """
+    Values of ``slip_obj`` that only a full save writes: component and amount of
+    every earnings/deductions row (the PPh 21 deduction included), new rows, and
+    the totals. Compared before and after the tax calculation.
+    """
+    rows = tuple(
+        (row.get("salary_component"), row.get("amount"), bool(row.get("__islocal")))
+        for table in ("earnings", "deductions")
+        for row in (getattr(slip_obj, table, None) or [])
+    )
+    return rows + tuple(getattr(slip_obj, field, None) for field in TOTAL_FIELDS)
+
+
 class CustomPayrollEntry(PayrollEntry):
     """
     Custom Payroll Entry for Payroll Indonesia.
@@ -54,9 +113,16 @@ class CustomPayrollEntry(PayrollEntry):
         Override: generate salary slips with Indonesian tax logic.
         """
         try:
+            # Wall time, queries and rows per stage of this run (Payroll Run Metrics)
+            self._run_metrics = RunMetrics()
+            self._run_started = time.time()
+
             # Clean up any existing salary slips before creating new ones
-            # This prevents duplicate salary slip errors when retrying after cancel
-            self.delete_salary_slips(force_cleanup=True)
+            # This prevents duplicate salary slip errors when retrying after cancel.
+            # Draft slips whose input fingerprint is unchanged are kept (incremental re-run).
+            unchanged_slips = self._prepare_incremental_rerun()
+            with self._get_run_metrics().stage(run_metrics.STAGE_DELETE):
+                self.delete_salary_slips(force_cleanup=True, keep=unchanged_slips)
             
             if getattr(self, "run_payroll_indonesia_december", False):
                 logger.info(
@@ -90,11 +156,13 @@ class CustomPayrollEntry(PayrollEntry):
         try:
             logger.debug(f"Starting base salary slip creation for {self.name}")
             
-            # Call super to create base slips
-            super().create_salary_slips()
-            
-            # Get and return slips created by super method
-            actual_slips = self.get_salary_slips()
+            with self._get_run_metrics().stage(run_metrics.STAGE_BASE_SLIPS) as stage:
+                # Call super to create base slips
+                super().create_salary_slips()
+                
+                # Get and return slips created by super method
+                actual_slips = self.get_salary_slips()
+                stage.rows = len(actual_slips)
             logger.debug(f"Created {len(actual_slips)} base salary slips")
             return actual_slips
         except Exception as e:
@@ -130,11 +198,8 @@ class CustomPayrollEntry(PayrollEntry):
                 logger.warning(f"No base salary slips created for {self.name}")
                 return []
             
-            def calculate_ter_tax(slip_obj: Any) -> None:
-                """Calculate regular monthly TER tax for the slip."""
-                slip_obj.calculate_income_tax()
-            
-            return self._process_salary_slips(calculate_ter_tax)
+            tax_calculator, batch_calculator = self._get_tax_calculators(TAX_MODE_TER)
+            return self._process_salary_slips(tax_calculator, batch_calculator, tax_mode=TAX_MODE_TER)
         except Exception as e:
             error_trace = traceback.format_exc()
             frappe.log_error(
@@ -156,149 +221,679 @@ class CustomPayrollEntry(PayrollEntry):
                 logger.warning(f"No base salary slips created for December mode {self.name}")
                 return []
             
-            # Get Salary Slip doctype metadata once
-            salary_slip_meta = frappe.get_meta("Salary Slip")
+            tax_calculator, batch_calculator = self._get_tax_calculators(TAX_MODE_DECEMBER)
+            return self._process_salary_slips(
+                tax_calculator, batch_calculator, tax_mode=TAX_MODE_DECEMBER
+            )
+        except Exception as e:
+            error_trace = traceback.format_exc()
+            frappe.log_error(
+                message=f"Failed to create Indonesian December salary slips for {self.name}: {str(e)}\n{error_trace}",
+                title="Payroll Indonesia December Creation Error"
+            )
+            return []
+
+    def _get_tax_calculators(
+        self, tax_mode: str
+    ) -> Tuple[Callable[[Any], None], Optional[Callable[[List[Any], Any], None]]]:
+        """
+        Return (tax_calculator, batch_calculator) for TAX_MODE_TER or TAX_MODE_DECEMBER.
+        Background chunk jobs rebuild them from the tax mode.
+        """
+        if tax_mode == TAX_MODE_DECEMBER:
+            # Jan–Nov YTD of every employee in the entry, one grouped query
+            ytd_prefetch = self._prefetch_ytd_jan_nov()
             
             def calculate_december_tax(slip_obj: Any) -> None:
                 """Calculate December (annual progressive) tax for the slip."""
                 # Ensure December tax type is set before validation or calculation
                 setattr(slip_obj, "tax_type", "DECEMBER")
+                slip_obj._ytd_prefetch = ytd_prefetch
                 
-                # Calculate December (annual progressive) tax
+                # Calculate December (annual progressive) tax; tax, tax_type and
+                # pph21_info are persisted by _process_slip_chunk (save or light-field UPDATE)
                 slip_obj.calculate_income_tax_december()
-                
-                # Persist tax-related fields so subsequent operations use the new values
-                for field in ("tax", "tax_type", "pph21_info"):
-                    try:
-                        # Check if the field exists in the doctype before setting
-                        if salary_slip_meta.has_field(field):
-                            slip_obj.db_set(field, getattr(slip_obj, field))
-                    except Exception as field_error:
-                        # Best effort: attribute might not be saved yet
-                        setattr(slip_obj, field, getattr(slip_obj, field))
-            
-            return self._process_salary_slips(calculate_december_tax)
+
+            return calculate_december_tax, None
+
+        def calculate_ter_batch(slip_objs: List[Any], settings_snapshot: Any) -> None:
+            """Calculate TER tax for a whole batch of slips in one pass."""
+            taxable = [slip_obj._calculate_taxable_income() for slip_obj in slip_objs]
+            if self._calculate_ter_in_pool(slip_objs, taxable, settings_snapshot):
+                return
+            results = calculate_pph21_TER_batch(
+                taxable,
+                [slip_obj.get_employee_doc() for slip_obj in slip_objs],
+                settings=settings_snapshot,
+                # Reduced once here so update_pph21_row can reuse the PPh 21 row index
+                aggregates=[
+                    slip_obj._reduce_slip(settings_snapshot, t)
+                    for slip_obj, t in zip(slip_objs, taxable)
+                ],
+            )
+            for slip_obj, result in zip(slip_objs, results):
+                slip_obj.set_pph21_ter_result(result)
+
+        def calculate_ter_tax(slip_obj: Any) -> None:
+            """Calculate regular monthly TER tax for the slip."""
+            slip_obj.calculate_income_tax()
+
+        return calculate_ter_tax, calculate_ter_batch
+
+    def _calculate_ter_in_pool(
+        self, slip_objs: List[Any], taxable: List[Any], settings_snapshot: Any
+    ) -> bool:
+        """
+        Run the TER reduce and tax math of ``slip_objs`` in the calculation process
+        pool. Returns False (caller calculates in-process) when no pool is
+        configured or the pool failed.
+        """
+        executor = self._get_calculation_pool()
+        if executor is None:
+            return False
+
+        from payroll_indonesia.config.pph21_ter_pool import calculate_pph21_TER_pool
+
+        try:
+            results, aggregates = calculate_pph21_TER_pool(
+                taxable,
+                [slip_obj.get_employee_doc() for slip_obj in slip_objs],
+                executor,
+                settings=settings_snapshot,
+            )
         except Exception as e:
-            error_trace = traceback.format_exc()
-            frappe.log_error(
-                message=f"Failed to create Indonesian December salary slips for {self.name}: {str(e)}\n{error_trace}",
-                title="Payroll Indonesia December Creation Error"
+            logger.warning(
+                f"Calculation process pool failed for {self.name}, calculating in-process: {str(e)}"
             )
+            self._shutdown_calculation_pool()
+            self._calculation_pool_disabled = True
+            return False
+
+        for slip_obj, result, aggregate in zip(slip_objs, results, aggregates):
+            if aggregate is not None:
+                slip_obj._slip_aggregates = aggregate
+            slip_obj.set_pph21_ter_result(result)
+        return True
+
+    def _get_calculation_pool(self) -> Any:
+        """Process pool of this run (created on first use), or None when disabled."""
+        pool = getattr(self, "_calculation_pool", None)
+        if pool is not None or getattr(self, "_calculation_pool_disabled", False):
+            return pool
+
+        workers = get_calculation_process_workers()
+        if workers < 1:
+            self._calculation_pool_disabled = True
+            return None
+
+        from payroll_indonesia.config.pph21_ter_pool import create_executor
+
+        self._calculation_pool = create_executor(workers)
+        logger.info(f"Payroll run {self.name}: calculating PPh21 TER in {workers} worker processes")
+        return self._calculation_pool
+
+    def _shutdown_calculation_pool(self) -> None:
+        pool = getattr(self, "_calculation_pool", None)
+        self._calculation_pool = None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def preview_salary_slips(self) -> List[Dict[str, Any]]:
+        """
+        Dry run of the PPh21 TER / December calculation for every eligible employee.
+
+        Salary slips are built and calculated in memory only: nothing is inserted,
+        saved or submitted, so no Annual Payroll History rows are written either.
+        Queued Annual Payroll History updates are not flushed first: the December
+        YTD is read as it stands. Everything runs inside a savepoint that is
+        rolled back at the end.
+
+        Returns:
+            One row per employee with bruto, netto, pkp, rate, pph21 and koreksi
+            (``error`` is set instead when the slip could not be calculated)
+        """
+        tax_mode = (
+            TAX_MODE_DECEMBER if getattr(self, "run_payroll_indonesia_december", False) else TAX_MODE_TER
+        )
+        employees = self._get_preview_employees()
+        if not employees:
+            logger.warning(f"No eligible employees to preview for payroll entry {self.name}")
             return []
 
-    def _process_salary_slips(self, tax_calculator: Callable[[Any], None]) -> List[str]:
+        settings_snapshot = build_settings_snapshot()
+        rows: List[Dict[str, Any]] = []
+        savepoint = "payroll_indonesia_preview"
+        frappe.db.savepoint(savepoint)
+        self._preview = True
+        try:
+            tax_calculator, batch_calculator = self._get_tax_calculators(tax_mode)
+            for start in range(0, len(employees), SLIP_BATCH_SIZE):
+                slips = []
+                for employee in employees[start:start + SLIP_BATCH_SIZE]:
+                    try:
+                        slips.append(self._build_preview_slip(employee, settings_snapshot))
+                    except Exception as e:
+                        logger.warning(f"Preview: could not build salary slip for {employee}: {str(e)}")
+                        rows.append({"employee": employee, "error": str(e)})
+
+                if batch_calculator and slips:
+                    try:
+                        batch_calculator(slips, settings_snapshot)
+                    except Exception as e:
+                        logger.warning(
+                            f"Preview: batch tax calculation failed for {self.name}: {str(e)}. "
+                            f"Falling back to per-slip calculation."
+                        )
+
+                for slip_obj in slips:
+                    try:
+                        tax_calculator(slip_obj)
+                        rows.append(self._preview_row(slip_obj))
+                    except Exception as e:
+                        logger.warning(f"Preview: PPh21 failed for {slip_obj.employee}: {str(e)}")
+                        rows.append({"employee": slip_obj.employee, "error": str(e)})
+        finally:
+            self._preview = False
+            # Read without flushing the write-behind queue; a real run reads it again
+            self._ytd_prefetch_cache = None
+            self._shutdown_calculation_pool()
+            frappe.db.rollback(save_point=savepoint)
+
+        logger.info(f"Preview of {self.name} ({tax_mode}): {len(rows)} employees")
+        return rows
+
+    def _get_preview_employees(self) -> List[str]:
+        """Employees of the entry's table, or the entry's filters if it was not filled yet."""
+        employees = [row.employee for row in (getattr(self, "employees", None) or []) if row.employee]
+        if not employees and hasattr(self, "get_emp_list"):
+            employees = [row.get("employee") for row in (self.get_emp_list() or []) if row.get("employee")]
+        return list(dict.fromkeys(employees))
+
+    def _build_preview_slip(self, employee: str, settings_snapshot: Any) -> Any:
+        """Unsaved Salary Slip of ``employee`` with components pulled from the salary structure."""
+        slip_obj = frappe.get_doc({
+            "doctype": "Salary Slip",
+            "employee": employee,
+            "salary_slip_based_on_timesheet": getattr(self, "salary_slip_based_on_timesheet", 0),
+            "payroll_frequency": getattr(self, "payroll_frequency", None),
+            "start_date": self.start_date,
+            "end_date": self.end_date,
+            "posting_date": getattr(self, "posting_date", None),
+            "company": self.company,
+            "currency": getattr(self, "currency", None),
+            "exchange_rate": getattr(self, "exchange_rate", None),
+            "payroll_entry": self.name,
+        })
+        slip_obj._settings_snapshot = settings_snapshot
+        slip_obj._preview = True
+        # Pulls the salary structure and computes the components (make_salary_slip)
+        slip_obj.get_emp_and_working_day_details()
+        return slip_obj
+
+    def _preview_row(self, slip_obj: Any) -> Dict[str, Any]:
+        """Preview table row from the slip's pph21_info (TER or December keys)."""
+        try:
+            info = json.loads(getattr(slip_obj, "pph21_info", None) or "{}")
+        except Exception:
+            info = {}
+        return {
+            "employee": slip_obj.employee,
+            "employee_name": getattr(slip_obj, "employee_name", None),
+            "tax_type": getattr(slip_obj, "tax_type", None),
+            "bruto": flt(info.get("bruto", info.get("bruto_total", 0))),
+            "netto": flt(info.get("netto", info.get("netto_total", 0))),
+            "pkp": flt(info.get("pkp", info.get("pkp_annual", 0))),
+            "rate": info.get("rate", 0),
+            "pph21": flt(getattr(slip_obj, "tax", None) or info.get("pph21", info.get("pph21_bulan", 0))),
+            "koreksi": flt(info.get("koreksi_pph21", 0)),
+        }
+
+    def _prepare_incremental_rerun(self) -> Set[str]:
+        """
+        Fingerprint the slip inputs of every employee of the entry and return the
+        draft slips whose stored fingerprint still matches; those are kept and
+        skipped by the re-run, every other slip is regenerated.
+
+        With ``auto_submit_salary_slips`` nothing is kept: a kept draft would
+        skip the submit and its Annual Payroll History sync.
+        """
+        self._input_fingerprints = None
+        self._unchanged_slips = set()
+
+        december = bool(getattr(self, "run_payroll_indonesia_december", False))
+        if not (december or getattr(self, "run_payroll_indonesia", False)):
+            return self._unchanged_slips
+        if getattr(self, "auto_submit_salary_slips", False):
+            return self._unchanged_slips
+
+        try:
+            if not frappe.db.has_column("Salary Slip", FINGERPRINT_FIELD):
+                return self._unchanged_slips
+            employees = [row.employee for row in (getattr(self, "employees", None) or []) if row.employee]
+            self._input_fingerprints = compute_input_fingerprints(
+                employees,
+                self.start_date,
+                self.end_date,
+                get_settings_version(),
+                TAX_MODE_DECEMBER if december else TAX_MODE_TER,
+                ytd=self._prefetch_ytd_jan_nov() if december else None,
+            )
+            existing = frappe.get_all(
+                "Salary Slip",
+                filters={"payroll_entry": self.name},
+                fields=["name", "employee", "docstatus", FINGERPRINT_FIELD],
+            )
+        except Exception as e:
+            logger.warning(
+                f"Incremental re-run unavailable for {self.name}: {str(e)}. Regenerating all slips."
+            )
+            self._input_fingerprints = None
+            return self._unchanged_slips
+
+        slips_per_employee = Counter(row.employee for row in existing)
+        self._unchanged_slips = {
+            row.name
+            for row in existing
+            if row.docstatus == 0
+            and slips_per_employee[row.employee] == 1
+            and row.get(FINGERPRINT_FIELD)
+            and row.get(FINGERPRINT_FIELD) == self._input_fingerprints.get(row.employee)
+        }
+        logger.info(
+            f"Incremental re-run of {self.name}: {len(self._unchanged_slips)} of "
+            f"{len(existing)} existing salary slips unchanged"
+        )
+        return self._unchanged_slips
+
+    def _get_slip_fingerprints(self, slips: List[str]) -> Dict[str, str]:
+        """Input fingerprint of each slip in ``slips`` (see _prepare_incremental_rerun)."""
+        fingerprints = getattr(self, "_input_fingerprints", None)
+        if not fingerprints:
+            return {}
+        wanted = set(slips)
+        rows = frappe.get_all(
+            "Salary Slip", filters={"payroll_entry": self.name}, fields=["name", "employee"]
+        )
+        return {
+            row.name: fingerprints[row.employee]
+            for row in rows
+            if row.name in wanted and row.employee in fingerprints
+        }
+
+    def _prefetch_ytd_jan_nov(self) -> Optional[YTDPrefetch]:
+        """Prefetch Jan–Nov YTD from Annual Payroll History for the entry's employees."""
+        cached = getattr(self, "_ytd_prefetch_cache", None)
+        if cached is not None:
+            return cached
+
+        start_date = getattr(self, "start_date", None)
+        if not start_date:
+            return None
+        fiscal_year = str(getdate(start_date).year)
+
+        employees = [row.employee for row in (getattr(self, "employees", None) or []) if row.employee]
+        if not employees:
+            employees = frappe.get_all(
+                "Salary Slip", filters={"payroll_entry": self.name}, pluck="employee"
+            )
+        if is_annual_history_write_behind() and not getattr(self, "_preview", False):
+            # Apply queued Annual Payroll History updates before reading Jan–Nov
+            # (a preview reads YTD as it stands and writes nothing)
+            _history_queue().flush(employees=employees, fiscal_year=fiscal_year)
+        self._ytd_prefetch_cache = get_ytd_jan_nov_bulk(employees, fiscal_year)
+        return self._ytd_prefetch_cache
+
+    def _process_salary_slips(
+        self,
+        tax_calculator: Callable[[Any], None],
+        batch_calculator: Optional[Callable[[List[Any], Any], None]] = None,
+        tax_mode: Optional[str] = None,
+    ) -> List[str]:
         """
         Process salary slips with the provided tax calculation function.
         
         Args:
             tax_calculator: Callback function that calculates tax for a salary slip
                            Takes a salary slip object as parameter
+            batch_calculator: Optional callback called once per batch of up to
+                           SLIP_BATCH_SIZE loaded slips (and the settings snapshot)
+                           before tax_calculator runs on each of them
+            tax_mode: TAX_MODE_TER or TAX_MODE_DECEMBER; when given and
+                      auto_queue_salary_slip is enabled the slips are processed
+                      by parallel background jobs instead (_enqueue_salary_slip_chunks)
         
         Returns:
             List of successfully processed salary slip names
+            (empty when the slips were queued)
         """
         # Get slips linked to this payroll entry
         slips = self.get_salary_slips() or []
         if not slips:
             logger.warning(f"No salary slips found for payroll entry {self.name}")
             return []
+
+        # Draft slips kept by an incremental re-run are already up to date
+        unchanged_slips = getattr(self, "_unchanged_slips", None) or set()
+        kept_slips = [name for name in slips if name in unchanged_slips]
+        slips = [name for name in slips if name not in unchanged_slips]
+        if kept_slips:
+            logger.info(f"Keeping {len(kept_slips)} unchanged salary slips of {self.name}")
+        if not slips:
+            self._finalize_processed_slips(kept_slips, [])
+            return kept_slips
+        self._slip_fingerprints = self._get_slip_fingerprints(slips)
+
+        # One settings snapshot for the whole run, so every slip sees the same rates
+        settings_snapshot = build_settings_snapshot()
+        logger.info(f"Using settings snapshot {settings_snapshot.version} for {self.name}")
+
+        if tax_mode:
+            _start_checkpoint(self.name, slips, tax_mode, settings_snapshot.version, kept_slips)
+
+        return self._run_salary_slips(
+            slips, tax_calculator, batch_calculator, tax_mode, settings_snapshot, kept_slips
+        )
+
+    def _run_salary_slips(
+        self,
+        slips: List[str],
+        tax_calculator: Callable[[Any], None],
+        batch_calculator: Optional[Callable[[List[Any], Any], None]],
+        tax_mode: Optional[str],
+        settings_snapshot: Any,
+        kept_slips: Optional[List[str]] = None,
+        failed_slips: Optional[List[str]] = None,
+    ) -> List[str]:
+        """
+        Process ``slips`` in chunks (or queue them) and finalize the entry.
+
+        ``kept_slips`` count as processed and ``failed_slips`` as invalid without
+        being processed again (unchanged slips of a re-run, or slips a resumed run
+        already handled). Every chunk is committed together with its checkpoint.
+        """
+        kept_slips = list(kept_slips or [])
+        failed_slips = list(failed_slips or [])
+
+        metrics = self._get_run_metrics()
+
+        if tax_mode and is_auto_queue_salary_slip():
+            self._enqueue_salary_slip_chunks(slips, tax_mode, settings_snapshot, kept_slips, failed_slips)
+            return []
             
         logger.info(f"Processing {len(slips)} salary slips for payroll entry {self.name}")
-        processed_slips: List[str] = []
-        invalid_slips = []
-        
-        # Check if salary_slips child table exists before processing
-        has_child_table = hasattr(self, "salary_slips")
-        if has_child_table:
-            # Build a map of salary slip references in the child table
-            child_slip_map = {}
-            for i, row in enumerate(self.salary_slips):
-                slip_name = getattr(row, "salary_slip", None)
-                if slip_name:
-                    child_slip_map[slip_name] = i
+        processed_slips: List[str] = list(kept_slips)
+        invalid_slips: List[str] = list(failed_slips)
         
+        with QueryCounter() as queries:
+            try:
+                for start in range(0, len(slips), SLIP_BATCH_SIZE):
+                    result = self._process_slip_chunk(
+                        slips[start:start + SLIP_BATCH_SIZE],
+                        tax_calculator,
+                        batch_calculator,
+                        settings_snapshot,
+                    )
+                    processed_slips.extend(result["processed"])
+                    invalid_slips.extend(result["invalid"])
+                    metrics.merge(result.get("metrics"))
+                    if tax_mode:
+                        # A crash after this point resumes from the next chunk
+                        _record_checkpoint(self.name, result)
+                        frappe.db.commit()
+            finally:
+                self._shutdown_calculation_pool()
+
+            with metrics.stage(run_metrics.STAGE_FINALIZE):
+                self._finalize_processed_slips(processed_slips, invalid_slips)
+            if tax_mode:
+                _complete_checkpoint(self.name)
+
+        logger.info(
+            f"Payroll run {self.name}: {len(slips)} salary slips, {queries.count} database queries"
+        )
+        save_run_metrics(
+            self.name,
+            metrics,
+            time.time() - (getattr(self, "_run_started", None) or time.time()),
+            tax_mode=tax_mode,
+        )
+        return processed_slips
+
+    def _get_run_metrics(self) -> RunMetrics:
+        """Metrics of the current run (a resumed run starts its own)."""
+        if getattr(self, "_run_metrics", None) is None:
+            self._run_metrics = RunMetrics()
+            self._run_started = time.time()
+        return self._run_metrics
+
+    def resume_salary_slip_processing(
+        self, retry_failed: bool = False, ignore_settings_change: bool = False
+    ) -> List[str]:
+        """
+        Continue an interrupted run from its Payroll Run Checkpoint: only the
+        pending slips (and with ``retry_failed`` the failed ones) are processed.
+
+        Raises:
+            frappe.ValidationError: no checkpoint, nothing left to process, or the
+                Payroll Indonesia Settings changed since the run started (unless
+                ``ignore_settings_change``)
+        """
+        checkpoint = _get_checkpoint(self.name)
+        if checkpoint is None:
+            frappe.throw(
+                f"No payroll run checkpoint found for {self.name}. Create the salary slips again.",
+                title="Cannot Resume Payroll",
+            )
+
+        if retry_failed:
+            checkpoint.requeue_failed()
+        # Slips deleted or unlinked since the checkpoint was written are dropped
+        linked = set(self.get_salary_slips() or [])
+        pending = [name for name in checkpoint.get_pending() if name in linked]
+        if not pending:
+            frappe.throw(
+                f"Payroll run {self.name} has no pending salary slips to resume.",
+                title="Cannot Resume Payroll",
+            )
+
+        settings_snapshot = build_settings_snapshot()
+        if checkpoint.settings_version and checkpoint.settings_version != settings_snapshot.version:
+            if not ignore_settings_change:
+                frappe.throw(
+                    f"Payroll Indonesia Settings changed since payroll run {self.name} started "
+                    f"(snapshot {checkpoint.settings_version}, now {settings_snapshot.version}). "
+                    f"Resuming would mix rates; create the salary slips again or resume "
+                    f"with ignore_settings_change.",
+                    title="Cannot Resume Payroll",
+                )
+            logger.warning(
+                f"Resuming {self.name} with settings snapshot {settings_snapshot.version} "
+                f"instead of {checkpoint.settings_version}"
+            )
+
+        tax_mode = checkpoint.tax_mode or TAX_MODE_TER
+        checkpoint.status = _checkpoint_module().STATUS_IN_PROGRESS
+        checkpoint.settings_version = settings_snapshot.version
+        checkpoint.set_slips(checkpoint.get_processed(), checkpoint.get_failed(), pending)
+        checkpoint.save(ignore_permissions=True)
+
+        logger.info(
+            f"Resuming payroll run {self.name} ({tax_mode}): {len(pending)} pending salary slips"
+        )
+        tax_calculator, batch_calculator = self._get_tax_calculators(tax_mode)
+        return self._run_salary_slips(
+            pending,
+            tax_calculator,
+            batch_calculator,
+            tax_mode,
+            settings_snapshot,
+            kept_slips=checkpoint.get_processed(),
+            failed_slips=list(checkpoint.get_failed()),
+        )
+
+    def _process_slip_chunk(
+        self,
+        names: List[str],
+        tax_calculator: Callable[[Any], None],
+        batch_calculator: Optional[Callable[[List[Any], Any], None]],
+        settings_snapshot: Any,
+    ) -> Dict[str, Any]:
+        """
+        Load, calculate, save (and submit) one chunk of salary slips.
+
+        Returns:
+            Dict with ``processed`` and ``invalid`` slip names, ``errors``
+            (slip name -> error message), ``queries`` (database queries used)
+            and ``metrics`` (RunMetrics.to_dict of this chunk)
+        """
+        chunk_metrics = RunMetrics()
+        self._chunk_metrics = chunk_metrics
+        start = time.perf_counter()
+        with QueryCounter() as queries:
+            result = self._process_slip_chunk_counted(
+                names, tax_calculator, batch_calculator, settings_snapshot
+            )
+        result["queries"] = queries.count
+        chunk_metrics.add_chunk(len(names), time.perf_counter() - start, queries.count)
+        result["metrics"] = chunk_metrics.to_dict()
+        return result
+
+    def _process_slip_chunk_counted(
+        self,
+        names: List[str],
+        tax_calculator: Callable[[Any], None],
+        batch_calculator: Optional[Callable[[List[Any], Any], None]],
+        settings_snapshot: Any,
+    ) -> Dict[str, Any]:
+        """Body of _process_slip_chunk, run inside its QueryCounter."""
+        metrics = getattr(self, "_chunk_metrics", None) or RunMetrics()
+        processed_slips: List[str] = []
+        invalid_slips: List[str] = []
+        errors: Dict[str, str] = {}
+
         # Get Salary Slip doctype metadata once for field checks
         salary_slip_meta = frappe.get_meta("Salary Slip")
         
         # List of fields that are considered "light" (don't require full save)
-        light_fields = {"tax", "tax_type", "pph21_info"}
-        
-        for name in slips:
-            # First check if the slip exists to avoid unnecessary exceptions
-            if not frappe.db.exists("Salary Slip", name):
-                logger.warning(f"Salary Slip '{name}' not found in database. Skipping.")
-                invalid_slips.append(name)
-                continue
-                
+        light_fields = {"tax", "tax_type", "pph21_info", FINGERPRINT_FIELD}
+        slip_fingerprints = getattr(self, "_slip_fingerprints", None) or {}
+        # Light-field changes of the whole chunk, written together after the loop
+        light_writer = LightFieldWriter("Salary Slip", light_fields)
+        # Annual Payroll History rows of submitted slips, synced together after the loop
+        annual_history_rows: List[Dict[str, Any]] = []
+        auto_submit = bool(getattr(self, "auto_submit_salary_slips", False))
+
+        # Parents and child rows of the whole chunk with a fixed number of queries
+        try:
+            with metrics.stage(run_metrics.STAGE_LOAD) as stage:
+                docs = load_salary_slips(names)
+                stage.rows = len(docs)
+        except Exception as e:
+            logger.warning(
+                f"Bulk loading Salary Slips failed for {self.name}: {str(e)}. "
+                f"Falling back to loading them one by one."
+            )
+            docs = None
+
+        loaded = []
+        for name in names:
             try:
-                slip_obj = frappe.get_doc("Salary Slip", name)
-                
+                if docs is not None:
+                    slip_obj = docs.get(name)
+                elif frappe.db.exists("Salary Slip", name):
+                    slip_obj = frappe.get_doc("Salary Slip", name)
+                else:
+                    slip_obj = None
+                if slip_obj is None:
+                    logger.warning(f"Salary Slip '{name}' not found in database. Skipping.")
+                    invalid_slips.append(name)
+                    continue
+                slip_obj._settings_snapshot = settings_snapshot
+                slip_obj._run_metrics = metrics
+                slip_obj._defer_annual_history = auto_submit
+
                 # Store original values of light fields to check if they changed
                 original_values = {}
                 for field in light_fields:
                     if salary_slip_meta.has_field(field):
                         original_values[field] = getattr(slip_obj, field, None)
+                # Child rows and totals as loaded, to check the tax left them unchanged
+                loaded_state = _full_save_state(slip_obj)
+
+                # Inputs this slip is computed from, checked by the next re-run
+                if slip_fingerprints.get(name) and FINGERPRINT_FIELD in original_values:
+                    setattr(slip_obj, FINGERPRINT_FIELD, slip_fingerprints[name])
             except Exception as e:
                 logger.warning(f"Error fetching Salary Slip '{name}': {str(e)}. Skipping.")
                 invalid_slips.append(name)
                 continue
+            loaded.append((name, slip_obj, original_values, loaded_state))
 
+        # Whole-batch calculation first; slips without a batch result fall back
+        # to the per-slip calculation in tax_calculator
+        if batch_calculator and loaded:
+            try:
+                with metrics.stage(run_metrics.STAGE_CALCULATE_BATCH, rows=len(loaded)):
+                    batch_calculator([slip_obj for _, slip_obj, _, _ in loaded], settings_snapshot)
+            except Exception as e:
+                logger.warning(
+                    f"Batch tax calculation failed for {self.name}: {str(e)}. "
+                    f"Falling back to per-slip calculation."
+                )
+
+        for name, slip_obj, original_values, loaded_state in loaded:
             try:
                 # Apply the provided tax calculation function
-                tax_calculator(slip_obj)
-                
+                with metrics.stage(run_metrics.STAGE_CALCULATE, rows=1, slip=name):
+                    tax_calculator(slip_obj)
+
                 # Check if only light fields were modified
                 only_light_fields_changed = True
                 changed_fields = []
-                
+
                 # Check if light fields changed
                 for field in light_fields:
                     if salary_slip_meta.has_field(field):
                         new_value = getattr(slip_obj, field, None)
                         if field in original_values and original_values[field] != new_value:
                             changed_fields.append(field)
-                
-                # Check if earnings or deductions tables were modified
-                # This is more accurate than just checking for attribute existence
-                earnings_modified = False
-                deductions_modified = False
-                
-                # Check if earnings were modified (if the table exists)
-                if hasattr(slip_obj, "earnings") and getattr(slip_obj, "earnings", None):
-                    for row in slip_obj.earnings:
-                        if row.modified or row.get("__islocal"):
-                            earnings_modified = True
-                            break
-                
-                # Check if deductions were modified (if the table exists)
-                if hasattr(slip_obj, "deductions") and getattr(slip_obj, "deductions", None):
-                    for row in slip_obj.deductions:
-                        if row.modified or row.get("__islocal"):
-                            deductions_modified = True
-                            break
-                
-                # If no light fields changed OR earnings/deductions were modified, need full save
-                if not changed_fields or earnings_modified or deductions_modified:
+
+                # Check if the earnings/deductions rows (e.g. the PPh 21 amount) or
+                # the totals changed: a light-field UPDATE would not write them
+                rows_or_totals_changed = _full_save_state(slip_obj) != loaded_state
+
+                # If no light fields changed OR rows/totals were modified, need full save
+                if not changed_fields or rows_or_totals_changed:
                     only_light_fields_changed = False
-                
-                # If only light fields changed, use db_set for each field
+
+                # If only light fields changed, buffer them for the chunk-wide UPDATE
                 if only_light_fields_changed:
                     for field in changed_fields:
-                        slip_obj.db_set(field, getattr(slip_obj, field), update_modified=False)
-                    logger.debug(f"Updated light fields for slip {name}: {', '.join(changed_fields)}")
+                        light_writer.set(name, field, getattr(slip_obj, field))
+                    logger.debug(f"Buffered light fields for slip {name}: {', '.join(changed_fields)}")
                 else:
-                    # Full save needed
-                    slip_obj.save(ignore_permissions=True)
+                    # Full save needed (also writes the light fields)
+                    with metrics.stage(run_metrics.STAGE_SAVE, rows=1, slip=name):
+                        slip_obj.save(ignore_permissions=True)
+                    light_writer.discard(name)
                     logger.debug(f"Performed full save for slip {name}")
-                
+
                 # Submit the salary slip if auto_submit is enabled and slip is not already submitted
-                if hasattr(self, "auto_submit_salary_slips") and self.auto_submit_salary_slips and slip_obj.docstatus == 0:
-                    slip_obj.submit()
+                if auto_submit and slip_obj.docstatus == 0:
+                    with metrics.stage(run_metrics.STAGE_SUBMIT, rows=1, slip=name):
+                        slip_obj.submit()
+                    light_writer.discard(name)
                     logger.info(f"Submitted salary slip: {name}")
-                
+                    annual_history_row = getattr(slip_obj, "_annual_history_row", None)
+                    if annual_history_row:
+                        annual_history_rows.append(annual_history_row)
+
                 processed_slips.append(name)
                 logger.info(f"Successfully processed slip: {name}")
             except Exception as e:
+                # A deadlock lost the chunk's transaction: no logging or cleanup
+                # on it, process_salary_slip_chunk retries the chunk
+                reraise_lock_conflict(e)
                 error_trace = traceback.format_exc()
                 tax_mode = "December" if getattr(slip_obj, "tax_type", "") == "DECEMBER" else "TER"
                 frappe.log_error(
@@ -307,12 +902,13 @@ class CustomPayrollEntry(PayrollEntry):
                 )
                 logger.error(f"Error processing {tax_mode} Salary Slip '{name}': {str(e)}")
                 invalid_slips.append(name)
-                
+                errors[name] = str(e)
+
                 # Clean up any partial Annual Payroll History entries
                 try:
                     # Get employee and fiscal year info from the slip
                     employee_doc = self._get_employee_doc(slip_obj)
-                    
+
                     if employee_doc and employee_doc.get('name'):
                         fiscal_year = getattr(slip_obj, "fiscal_year", None)
                         if not fiscal_year and hasattr(slip_obj, "start_date") and slip_obj.start_date:
@@ -321,7 +917,7 @@ class CustomPayrollEntry(PayrollEntry):
                                 fiscal_year = str(getdate(slip_obj.start_date).year)
                             except Exception:
                                 pass
-                        
+
                         # If we have the necessary data, clean up the history entry
                         if fiscal_year:
                             sync_annual_payroll_history(
@@ -338,6 +934,7 @@ class CustomPayrollEntry(PayrollEntry):
                             )
                             logger.info(f"Cleaned up Annual Payroll History for failed slip {name}")
                 except Exception as cleanup_error:
+                    reraise_lock_conflict(cleanup_error)
                     # Log error but continue processing other slips
                     cleanup_trace = traceback.format_exc()
                     frappe.log_error(
@@ -345,7 +942,116 @@ class CustomPayrollEntry(PayrollEntry):
                         title="Payroll Indonesia History Cleanup Error"
                     )
                     logger.warning(f"Failed to clean up Annual Payroll History for {name}: {str(cleanup_error)}")
-        
+
+        with metrics.stage(run_metrics.STAGE_LIGHT_FIELDS, rows=len(light_writer)):
+            self._flush_light_fields(light_writer)
+
+        if annual_history_rows:
+            contention = local_contention()
+            with metrics.stage(run_metrics.STAGE_ANNUAL_HISTORY, rows=len(annual_history_rows)):
+                sync_annual_payroll_history_bulk(annual_history_rows)
+            locked = local_contention()
+            if locked["locks"] > contention["locks"]:
+                metrics.add(
+                    run_metrics.STAGE_ANNUAL_HISTORY_LOCK,
+                    (locked["lock_wait_ms"] - contention["lock_wait_ms"]) / 1000.0,
+                    rows=locked["locks"] - contention["locks"],
+                )
+
+        return {"processed": processed_slips, "invalid": invalid_slips, "errors": errors}
+
+    def _flush_light_fields(self, light_writer: LightFieldWriter) -> None:
+        """Write buffered light fields; fall back to db_set per field if the bulk UPDATE fails."""
+        if not len(light_writer):
+            return
+        pending = light_writer.pending
+        try:
+            light_writer.flush()
+        except Exception as e:
+            logger.warning(
+                f"Bulk light-field update failed for {self.name}: {str(e)}. "
+                f"Falling back to per-slip updates."
+            )
+            for name, values in pending.items():
+                for field, value in values.items():
+                    frappe.db.set_value("Salary Slip", name, field, value, update_modified=False)
+
+    def _enqueue_salary_slip_chunks(
+        self,
+        slips: List[str],
+        tax_mode: str,
+        settings_snapshot: Any,
+        kept_slips: Optional[List[str]] = None,
+        failed_slips: Optional[List[str]] = None,
+    ) -> str:
+        """
+        Split ``slips`` into chunks of QUEUE_CHUNK_SIZE and enqueue one background
+        job per chunk. Each job commits its own chunk; the last one to finish merges
+        all chunk results (see finalize_salary_slip_chunks).
+
+        ``kept_slips`` (unchanged slips of an incremental re-run) count as processed,
+        ``failed_slips`` (failed before a resume) as invalid.
+
+        Returns:
+            The run id identifying the chunk results in the cache
+        """
+        run_id = frappe.generate_hash(length=10)
+        chunks = [slips[i:i + QUEUE_CHUNK_SIZE] for i in range(0, len(slips), QUEUE_CHUNK_SIZE)]
+        fingerprints = getattr(self, "_slip_fingerprints", None) or {}
+        if kept_slips or failed_slips:
+            frappe.cache().hset(
+                _chunk_results_key(run_id),
+                KEPT_SLIPS_KEY,
+                {"processed": list(kept_slips or []), "invalid": list(failed_slips or [])},
+            )
+        # Stages timed in this request; the coordinator adds the chunk metrics
+        frappe.cache().hset(
+            _chunk_results_key(run_id),
+            RUN_METRICS_KEY,
+            {
+                "metrics": self._get_run_metrics().to_dict(),
+                "started": getattr(self, "_run_started", None) or time.time(),
+                "tax_mode": tax_mode,
+            },
+        )
+        _expire_chunk_keys(run_id)
+
+        for index, chunk in enumerate(chunks):
+            frappe.enqueue(
+                "payroll_indonesia.override.payroll_entry.process_salary_slip_chunk",
+                queue="long",
+                timeout=CHUNK_JOB_TIMEOUT,
+                job_name=f"{self.name}-slips-{index + 1}-of-{len(chunks)}",
+                # Base slips are created in this transaction; workers must see them
+                enqueue_after_commit=True,
+                payroll_entry=self.name,
+                run_id=run_id,
+                chunk_index=index,
+                chunk_count=len(chunks),
+                slips=chunk,
+                tax_mode=tax_mode,
+                settings_snapshot=settings_snapshot,
+                fingerprints={name: fingerprints[name] for name in chunk if name in fingerprints},
+            )
+
+        logger.info(
+            f"Queued {len(slips)} salary slips of {self.name} in {len(chunks)} chunks "
+            f"({tax_mode}, run {run_id})"
+        )
+        return run_id
+
+    def _finalize_processed_slips(self, processed_slips: List[str], invalid_slips: List[str]) -> None:
+        """Drop invalid slips from the child table and update salary_slips_created."""
+        # Check if salary_slips child table exists before processing
+        has_child_table = hasattr(self, "salary_slips")
+        if has_child_table:
+            # Build a map of salary slip references in the child table
+            child_slip_map = {}
+            for i, row in enumerate(self.salary_slips):
+                slip_name = getattr(row, "salary_slip", None)
+                if slip_name:
+                    child_slip_map[slip_name] = i
+
         # Remove invalid slips from the salary_slips child table
         child_table_modified = False
         if invalid_slips and has_child_table:
@@ -373,8 +1079,6 @@ class CustomPayrollEntry(PayrollEntry):
             logger.info(f"Successfully processed {len(processed_slips)} salary slips")
         else:
             logger.warning("No salary slips were successfully processed")
-            
-        return processed_slips
 
     def _get_employee_doc(self, slip):
         """
@@ -427,7 +1131,7 @@ class CustomPayrollEntry(PayrollEntry):
             # Re-raise the exception to notify the user
             raise
     
-    def delete_salary_slips(self, force_cleanup=False):
+    def delete_salary_slips(self, force_cleanup=False, bulk_drafts=True, keep=None):
         """
         Delete all salary slips linked to this Payroll Entry.
         This implementation ensures that all salary slips are completely removed,
@@ -436,6 +1140,10 @@ class CustomPayrollEntry(PayrollEntry):
         Args:
             force_cleanup: If True, performs cleanup of salary slips even if not canceling
                           Used when creating new salary slips to prevent duplicates
+            bulk_drafts: If True, draft slips are deleted with set-based DELETEs in
+                          chunks (_bulk_delete_draft_slips); submitted/cancelled slips
+                          always go through cancel + delete_doc one by one
+            keep: Optional names of draft slips to leave in place (incremental re-run)
         
         Implementation notes on locking:
             - Uses file_lock utility for reliable locking with auto-release on scope exit
@@ -456,6 +1164,10 @@ class CustomPayrollEntry(PayrollEntry):
             with file_lock(lock_path, timeout=lock_timeout):
                 # Get all salary slips linked to this Payroll Entry
                 salary_slips = self.get_linked_salary_slips()
+                if keep:
+                    salary_slips = [
+                        slip for slip in salary_slips if not (slip.name in keep and slip.docstatus == 0)
+                    ]
                 
                 if not salary_slips:
                     logger.info(f"No salary slips found to delete for Payroll Entry {self.name}")
@@ -463,8 +1175,27 @@ class CustomPayrollEntry(PayrollEntry):
                     
                 action = "Cleaning up" if force_cleanup else "Deleting"
                 logger.info(f"{action} {len(salary_slips)} salary slips for Payroll Entry {self.name}")
+
+                total = len(salary_slips)
+                if bulk_drafts:
+                    drafts = [slip.name for slip in salary_slips if slip.docstatus == 0]
+                    deleted = self._bulk_delete_draft_slips(drafts, total)
+                    salary_slips = [slip for slip in salary_slips if slip.name not in deleted]
+                    if len(deleted) < len(drafts):
+                        # Drafts submitted since they were listed are cancelled first
+                        docstatus = dict(
+                            frappe.get_all(
+                                "Salary Slip",
+                                filters={"name": ("in", [name for name in drafts if name not in deleted])},
+                                fields=["name", "docstatus"],
+                                as_list=True,
+                            )
+                        )
+                        for slip in salary_slips:
+                            slip.docstatus = docstatus.get(slip.name, slip.docstatus)
+                done = total - len(salary_slips)
                 
-                # Process each salary slip: cancel if submitted, then delete
+                # Process each remaining salary slip: cancel if submitted, then delete
                 for slip in salary_slips:
                     try:
                         slip_name = slip.name
@@ -490,6 +1221,8 @@ class CustomPayrollEntry(PayrollEntry):
                             title="Payroll Indonesia Salary Slip Deletion Error"
                         )
                         logger.warning(f"Error deleting Salary Slip {slip.name}: {str(slip_error)}")
+                    done += 1
+                    self._publish_delete_progress(done, total)
                 
                 logger.info(f"Successfully {action.lower()} all salary slips for Payroll Entry {self.name}")
                 
@@ -508,6 +1241,70 @@ class CustomPayrollEntry(PayrollEntry):
             )
             logger.error(f"Error in delete_salary_slips: {str(e)}")
             
+    def _bulk_delete_draft_slips(self, names: List[str], total: int) -> set:
+        """
+        Delete draft salary slips and their child rows (Salary Detail, ...) with
+        set-based DELETE statements, DELETE_CHUNK_SIZE slips at a time.
+
+        Each chunk first locks the slips that are still drafts; only those are
+        deleted, so a slip submitted since it was listed keeps its rows and goes
+        to the per-slip (cancel, then delete) path. Controller hooks (on_trash) do
+        not run for these drafts. A chunk that fails is rolled back to its
+        savepoint and left to the per-slip path.
+
+        Returns:
+            Names of the deleted slips
+        """
+        deleted = set()
+        if not names:
+            return deleted
+
+        child_doctypes = {"Salary Detail"}
+        child_doctypes.update(df.options for df in frappe.get_meta("Salary Slip").get_table_fields())
+
+        for start in range(0, len(names), DELETE_CHUNK_SIZE):
+            chunk = names[start:start + DELETE_CHUNK_SIZE]
+            frappe.db.savepoint(DELETE_SAVEPOINT)
+            try:
+                drafts = frappe.get_all(
+                    "Salary Slip",
+                    filters={"name": ("in", chunk), "docstatus": 0},
+                    pluck="name",
+                    order_by="name asc",
+                    for_update=True,
+                )
+                if drafts:
+                    for child_doctype in sorted(child_doctypes):
+                        frappe.db.delete(child_doctype, {"parenttype": "Salary Slip", "parent": ("in", drafts)})
+                    frappe.db.delete("Salary Slip", {"name": ("in", drafts)})
+                deleted.update(drafts)
+            except Exception as e:
+                frappe.db.rollback(save_point=DELETE_SAVEPOINT)
+                logger.warning(
+                    f"Bulk delete of {len(chunk)} draft Salary Slips failed for {self.name}: {str(e)}. "
+                    f"Deleting them one by one."
+                )
+            self._publish_delete_progress(start + len(chunk), total)
+
+        logger.info(f"Bulk deleted {len(deleted)} draft salary slips for Payroll Entry {self.name}")
+        return deleted
+
+    def _publish_delete_progress(self, done: int, total: int) -> None:
+        """Report salary slip deletion progress to the Payroll Entry form."""
+        if not total:
+            return
+        try:
+            frappe.publish_progress(
+                done * 100 / total,
+                title="Deleting Salary Slips",
+                doctype=self.doctype,
+                docname=self.name,
+                description=f"{done} / {total}",
+            )
+        except Exception:
+            # Progress is informational only
+            pass
+
     def _clear_stale_locks(self, lock_path):
         """
         Check for and clear stale locks to prevent deadlocks.
@@ -591,4 +1388,227 @@ class CustomPayrollEntry(PayrollEntry):
                 message=f"Failed to cancel journal entries for Payroll Entry {self.name}: {str(e)}\n{error_trace}",
                 title="Payroll Indonesia Journal Entry Cancellation Error"
             )
-            logger.error(f"Error in cancel_linked_journal_entries: {str(e)}")
\ No newline at end of file
+            logger.error(f"Error in cancel_linked_journal_entries: {str(e)}")
+
+
+# ---------------------------------------------------------------------------
+# Background chunk processing (auto_queue_salary_slip)
+# ---------------------------------------------------------------------------
+
+# Field of the chunk results hash holding the slips kept by an incremental re-run
+KEPT_SLIPS_KEY = "kept"
+# Field of the chunk results hash holding the metrics of the enqueuing request
+RUN_METRICS_KEY = "run_metrics"
+
+
+def _chunk_results_key(run_id: str) -> str:
+    return f"payroll_indonesia:slip_chunks:{run_id}"
+
+
+def _chunk_counter_key(run_id: str) -> str:
+    return frappe.cache().make_key(f"payroll_indonesia:slip_chunks_done:{run_id}")
+
+
+def _expire_chunk_keys(run_id: str) -> None:
+    """(Re)start the expiry of the chunk results and counter of ``run_id``."""
+    cache = frappe.cache()
+    try:
+        cache.expire(cache.make_key(_chunk_results_key(run_id)), CHUNK_RESULTS_TTL)
+        cache.expire(_chunk_counter_key(run_id), CHUNK_RESULTS_TTL)
+    except Exception as e:
+        logger.warning(f"Could not set expiry of queued run {run_id}: {str(e)}")
+
+
+def process_salary_slip_chunk(
+    payroll_entry: str,
+    run_id: str,
+    chunk_index: int,
+    chunk_count: int,
+    slips: List[str],
+    tax_mode: str,
+    settings_snapshot: Any = None,
+    fingerprints: Optional[Dict[str, str]] = None,
+) -> None:
+    """
+    Background job: process one chunk of salary slips of ``payroll_entry`` and
+    commit it. The result is stored under ``run_id``; the job finishing the last
+    chunk merges the results.
+    """
+    result: Dict[str, Any] = {"processed": [], "invalid": [], "errors": {}, "queries": 0}
+    entry = None
+    try:
+        entry = frappe.get_doc("Payroll Entry", payroll_entry)
+        if settings_snapshot is None:
+            settings_snapshot = build_settings_snapshot()
+        entry._slip_fingerprints = fingerprints or {}
+        tax_calculator, batch_calculator = entry._get_tax_calculators(tax_mode)
+
+        def process_chunk() -> Dict[str, Any]:
+            chunk_result = entry._process_slip_chunk(slips, tax_calculator, batch_calculator, settings_snapshot)
+            _record_checkpoint(payroll_entry, chunk_result)
+            frappe.db.commit()
+            return chunk_result
+
+        # The chunk is one transaction: a deadlock on its Annual Payroll History
+        # locks rolls all of it back, and the whole chunk runs again
+        result = run_with_lock_retry(
+            process_chunk,
+            label=f"Salary slip chunk {chunk_index + 1}/{chunk_count} of {payroll_entry}",
+            owns_transaction=True,
+        )
+    except Exception as e:
+        frappe.db.rollback()
+        error_trace = traceback.format_exc()
+        frappe.log_error(
+            message=(
+                f"Salary slip chunk {chunk_index + 1}/{chunk_count} of {payroll_entry} failed: "
+                f"{str(e)}\n{error_trace}"
+            ),
+            title="Payroll Indonesia Chunk Processing Error",
+        )
+        # Nothing of this chunk was committed; its slips stay pending in the checkpoint
+        result = {
+            "processed": [],
+            "invalid": [],
+            "errors": {name: str(e) for name in slips},
+            "queries": result.get("queries", 0),
+        }
+    finally:
+        if entry is not None and hasattr(entry, "_shutdown_calculation_pool"):
+            entry._shutdown_calculation_pool()
+
+    logger.info(
+        f"Chunk {chunk_index + 1}/{chunk_count} of {payroll_entry}: "
+        f"{len(result['processed'])} processed, {len(result['errors'])} errors, "
+        f"{result.get('queries', 0)} database queries"
+    )
+
+    cache = frappe.cache()
+    cache.hset(_chunk_results_key(run_id), str(chunk_index), result)
+    # Atomic counter: exactly one job sees the last chunk finish
+    done = cache.incr(_chunk_counter_key(run_id))
+    _expire_chunk_keys(run_id)
+    if done >= chunk_count:
+        finalize_salary_slip_chunks(payroll_entry, run_id, chunk_count)
+
+
+def finalize_salary_slip_chunks(payroll_entry: str, run_id: str, chunk_count: int) -> Dict[str, Any]:
+    """
+    Coordinator: merge the chunk results of ``run_id``, drop invalid slips from the
+    Payroll Entry and update ``salary_slips_created``.
+    """
+    cache = frappe.cache()
+    chunk_results = cache.hgetall(_chunk_results_key(run_id)) or {}
+
+    processed: List[str] = []
+    invalid: List[str] = []
+    errors: Dict[str, str] = {}
+    queries = 0
+    run_info = chunk_results.get(RUN_METRICS_KEY) or {}
+    metrics = RunMetrics.from_dict(run_info.get("metrics"))
+    kept = chunk_results.get(KEPT_SLIPS_KEY)
+    if kept:
+        processed.extend(kept.get("processed") or [])
+        invalid.extend(kept.get("invalid") or [])
+    for index in range(chunk_count):
+        result = chunk_results.get(str(index))
+        if not result:
+            logger.warning(f"Missing result of chunk {index + 1}/{chunk_count} for {payroll_entry}")
+            continue
+        processed.extend(result.get("processed") or [])
+        invalid.extend(result.get("invalid") or [])
+        errors.update(result.get("errors") or {})
+        queries += result.get("queries") or 0
+        metrics.merge(result.get("metrics"))
+
+    try:
+        entry = frappe.get_doc("Payroll Entry", payroll_entry)
+        with metrics.stage(run_metrics.STAGE_FINALIZE):
+            entry._finalize_processed_slips(processed, invalid)
+        _complete_checkpoint(payroll_entry)
+        frappe.db.commit()
+    except Exception as e:
+        error_trace = traceback.format_exc()
+        frappe.log_error(
+            message=f"Failed to finalize queued salary slips for {payroll_entry}: {str(e)}\n{error_trace}",
+            title="Payroll Indonesia Chunk Processing Error",
+        )
+
+    if errors:
+        frappe.log_error(
+            message="\n".join(f"{name}: {error}" for name, error in sorted(errors.items())),
+            title=f"Payroll Indonesia: {len(errors)} salary slips failed ({payroll_entry})",
+        )
+
+    cache.delete_value(_chunk_results_key(run_id))
+    cache.delete(_chunk_counter_key(run_id))
+
+    if run_info:
+        save_run_metrics(
+            payroll_entry,
+            metrics,
+            time.time() - (run_info.get("started") or time.time()),
+            tax_mode=run_info.get("tax_mode"),
+            queued=True,
+        )
+
+    logger.info(
+        f"Queued run {run_id} of {payroll_entry} finished: {len(processed)} processed, "
+        f"{len(invalid)} invalid, {len(errors)} errors, {queries} database queries; "
+        f"Annual Payroll History lock contention {get_lock_contention()}"
+    )
+    return {"processed": processed, "invalid": invalid, "errors": errors, "queries": queries}
+
+
+# ---------------------------------------------------------------------------
+# Resumable runs (Payroll Run Checkpoint)
+# ---------------------------------------------------------------------------
+
+def _history_queue():
+    from payroll_indonesia.payroll_indonesia.doctype.annual_payroll_history_queue import (
+        annual_payroll_history_queue,
+    )
+    return annual_payroll_history_queue
+
+
+def _checkpoint_module():
+    from payroll_indonesia.payroll_indonesia.doctype.payroll_run_checkpoint import (
+        payroll_run_checkpoint,
+    )
+    return payroll_run_checkpoint
+
+
+def _get_checkpoint(payroll_entry: str) -> Any:
+    return _checkpoint_module().get_checkpoint(payroll_entry, for_update=True)
+
+
+def _start_checkpoint(
+    payroll_entry: str,
+    slips: List[str],
+    tax_mode: str,
+    settings_version: str,
+    kept_slips: Optional[List[str]] = None,
+) -> None:
+    """Record every slip of a new run as pending; never blocks the run."""
+    try:
+        _checkpoint_module().start_checkpoint(
+            payroll_entry, slips, tax_mode, settings_version, processed=kept_slips
+        )
+    except Exception as e:
+        logger.warning(f"Could not start payroll run checkpoint for {payroll_entry}: {str(e)}")
+
+
+def _record_checkpoint(payroll_entry: str, result: Dict[str, Any]) -> None:
+    """Move the slips of a chunk out of pending, in the chunk's transaction."""
+    try:
+        _checkpoint_module().record_chunk(payroll_entry, result)
+    except Exception as e:
+        logger.warning(f"Could not update payroll run checkpoint for {payroll_entry}: {str(e)}")
+
+
+def _complete_checkpoint(payroll_entry: str) -> None:
+    try:
+        _checkpoint_module().complete_checkpoint(payroll_entry)
+    except Exception as e:
+        logger.warning(f"Could not complete payroll run checkpoint for {payroll_entry}: {str(e)}")
+
@@ -24,6 +24,7 @@ except ImportError:
 
 import json
 import traceback
+from contextlib import nullcontext
 import frappe
 from frappe.utils import flt
 try:
@@ -39,13 +40,21 @@ from frappe.utils.safe_exec import safe_eval
 from payroll_indonesia.config.pph21_ter import calculate_pph21_TER
 from payroll_indonesia.config.pph21_ter_december import (
     calculate_pph21_december,
-    sum_bruto_earnings,               # ambil bruto taxable slip ini (Desember)
-    sum_pengurang_netto_bulanan,      # pengurang netto bulanan (exclude Biaya Jabatan)
     biaya_jabatan_bulanan,            # min(5% × bruto_bulan, 500.000)
 )
+from payroll_indonesia.config.slip_reducer import PPH21_COMPONENT, reduce_slip
+
+from payroll_indonesia.config.config import is_annual_history_write_behind
+from payroll_indonesia.config.snapshot import get_settings_snapshot
 
 # Sinkronisasi Annual Payroll History
-from payroll_indonesia.utils.sync_annual_payroll_history import sync_annual_payroll_history
+from payroll_indonesia.utils.annual_history_lock import reraise_lock_conflict
+from payroll_indonesia.utils.monthly_detail_index import get_detail_index
+from payroll_indonesia.utils.sync_annual_payroll_history import (
+    history_values_from_result,
+    sync_annual_payroll_history,
+)
+from payroll_indonesia.utils.run_metrics import STAGE_ANNUAL_HISTORY
 from payroll_indonesia import _patch_salary_slip_globals
 
 logger = frappe.logger("payroll_indonesia")
@@ -101,6 +110,13 @@ class CustomSalarySlip(SalarySlip):
                 raise frappe.ValidationError(f"Employee '{emp}' not found.")
         return {}
 
+    def _get_settings_snapshot(self):
+        """Snapshot settings dari Payroll Entry (bila ada), atau snapshot request ini."""
+        snapshot = getattr(self, "_settings_snapshot", None)
+        if snapshot is None:
+            snapshot = get_settings_snapshot()
+        return snapshot
+
     # -------------------------
     # Evaluasi formula
     # -------------------------
@@ -108,6 +124,12 @@ class CustomSalarySlip(SalarySlip):
         context = data.copy()
         context.update(_patch_salary_slip_globals())
 
+        # Dalam payroll run, rate/cap BPJS dibaca dari snapshot yang sama
+        snapshot = getattr(self, "_settings_snapshot", None)
+        if snapshot is not None:
+            context["get_bpjs_rate"] = snapshot.get_bpjs_rate
+            context["get_bpjs_cap"] = snapshot.get_bpjs_cap
+
         ssa = getattr(self, "salary_structure_assignment", None)
         for f in ("meal_allowance", "transport_allowance"):
             v = getattr(self, f, None)
@@ -139,27 +161,30 @@ class CustomSalarySlip(SalarySlip):
             if not getattr(self, "company", None):
                 frappe.throw("Company is required for PPh21 calculation", title="Missing Company")
 
-            employee_doc = self.get_employee_doc()
-            bulan = self._get_bulan_number(
-                start_date=getattr(self, "start_date", None),
-                nama_bulan=getattr(self, "bulan", None),
-            )
-            taxable_income = self._calculate_taxable_income()
-
-            result = calculate_pph21_TER(
-                taxable_income=taxable_income, employee=employee_doc, company=self.company, bulan=bulan
-            )
-            tax_amount = flt(result.get("pph21", 0.0))
-
-            self.tax = tax_amount
-            try:
-                self.tax_type = "TER"
-            except AttributeError:
-                result["_tax_type"] = "TER"
-
-            self.pph21_info = json.dumps(result)
-            self.update_pph21_row(tax_amount)
-            return tax_amount
+            # Hasil batch Payroll Entry (set_pph21_ter_result) berlaku sampai save
+            # selesai (on_update), selama earnings/deductions tidak berubah;
+            # validate() di dalam save() tidak menghitung ulang.
+            result = getattr(self, "_pph21_ter_result", None)
+            if result is not None and getattr(self, "_pph21_ter_key", None) != self._pph21_ter_input_key():
+                result = self._pph21_ter_result = None
+            if result is None:
+                employee_doc = self.get_employee_doc()
+                bulan = self._get_bulan_number(
+                    start_date=getattr(self, "start_date", None),
+                    nama_bulan=getattr(self, "bulan", None),
+                )
+                taxable_income = self._calculate_taxable_income()
+                settings = self._get_settings_snapshot()
+
+                result = calculate_pph21_TER(
+                    taxable_income=taxable_income,
+                    employee=employee_doc,
+                    company=self.company,
+                    bulan=bulan,
+                    settings=settings,
+                    aggregates=self._reduce_slip(settings, taxable_income),
+                )
+            return self.apply_pph21_ter_result(result)
 
         except frappe.ValidationError:
             raise
@@ -170,6 +195,38 @@ class CustomSalarySlip(SalarySlip):
             )
             raise frappe.ValidationError(f"Error in PPh21 calculation: {e}")
 
+    def _pph21_ter_input_key(self):
+        """Komponen dan amount earnings/deductions (tanpa baris PPh 21) yang menentukan hasil TER."""
+        key = []
+        for table in ("earnings", "deductions"):
+            for row in getattr(self, table, None) or []:
+                if isinstance(row, dict):
+                    sc, amount = row.get("salary_component"), row.get("amount")
+                else:
+                    sc, amount = getattr(row, "salary_component", None), getattr(row, "amount", None)
+                if sc != PPH21_COMPONENT:
+                    key.append((table, sc, flt(amount or 0)))
+        return tuple(key)
+
+    def set_pph21_ter_result(self, result):
+        """Simpan hasil PPh21 TER batch/pool untuk calculate_income_tax berikutnya."""
+        self._pph21_ter_result = result
+        self._pph21_ter_key = self._pph21_ter_input_key()
+
+    def apply_pph21_ter_result(self, result):
+        """Tulis hasil PPh21 TER (scalar maupun batch) ke slip."""
+        tax_amount = flt(result.get("pph21", 0.0))
+
+        self.tax = tax_amount
+        try:
+            self.tax_type = "TER"
+        except AttributeError:
+            result["_tax_type"] = "TER"
+
+        self.pph21_info = json.dumps(result)
+        self.update_pph21_row(tax_amount)
+        return tax_amount
+
     # -------------------------
     # Helper: ambil YTD Jan–Nov dari APH
     # -------------------------
@@ -177,6 +234,7 @@ class CustomSalarySlip(SalarySlip):
         """
         Kembalikan (ytd_bruto_jan_nov, ytd_netto_jan_nov, ytd_tax_paid_jan_nov)
         yang diambil dari Annual Payroll History (monthly_details bulan < 12).
+        Bila Payroll Entry sudah mem-prefetch YTD (``_ytd_prefetch``), pakai itu.
         """
         ytd_bruto = 0.0
         ytd_netto = 0.0
@@ -188,7 +246,17 @@ class CustomSalarySlip(SalarySlip):
         if not fiscal_year:
             return ytd_bruto, ytd_netto, ytd_tax
 
+        prefetch = getattr(self, "_ytd_prefetch", None)
+        if prefetch is not None:
+            totals = prefetch.get(self.employee, fiscal_year)
+            if totals is not None:
+                return totals
+
         try:
+            if _annual_history_write_behind() and not getattr(self, "_preview", False):
+                # Queued submits/cancels of this employee first, so Jan–Nov is complete
+                # (a Payroll Entry preview reads YTD as it stands)
+                _history_queue().flush(employees=[self.employee], fiscal_year=fiscal_year)
             rows = frappe.get_all(
                 "Annual Payroll History",
                 filters={"employee": self.employee, "fiscal_year": fiscal_year},
@@ -197,18 +265,17 @@ class CustomSalarySlip(SalarySlip):
             )
             if rows:
                 hist = frappe.get_doc("Annual Payroll History", rows[0].name)
-                for r in hist.get("monthly_details", []) or []:
-                    bln = getattr(r, "bulan", 0)
-                    if bln and bln < 12:
-                        ytd_bruto += flt(getattr(r, "bruto", 0))
-                        # gunakan kolom netto jika tersedia; fallback: bruto - biaya_jabatan - pengurang_netto
-                        r_netto = flt(getattr(r, "netto", 0))
-                        if not r_netto:
-                            r_netto = flt(getattr(r, "bruto", 0)) \
-                                      - flt(getattr(r, "biaya_jabatan", 0)) \
-                                      - flt(getattr(r, "pengurang_netto", 0))
-                        ytd_netto += r_netto
-                        ytd_tax   += flt(getattr(r, "pph21", 0))
+                # Bulan Jan–Nov lewat index per bulan, tanpa memindai semua baris
+                for r in get_detail_index(hist).rows_in_months(1, 11):
+                    ytd_bruto += flt(getattr(r, "bruto", 0))
+                    # gunakan kolom netto jika tersedia; fallback: bruto - biaya_jabatan - pengurang_netto
+                    r_netto = flt(getattr(r, "netto", 0))
+                    if not r_netto:
+                        r_netto = flt(getattr(r, "bruto", 0)) \
+                                  - flt(getattr(r, "biaya_jabatan", 0)) \
+                                  - flt(getattr(r, "pengurang_netto", 0))
+                    ytd_netto += r_netto
+                    ytd_tax   += flt(getattr(r, "pph21", 0))
         except Exception as e:
             logger.warning(f"Error fetching YTD from Annual Payroll History: {e}")
 
@@ -230,18 +297,15 @@ class CustomSalarySlip(SalarySlip):
             # === 1) Ambil YTD Jan–Nov dari APH ===
             ytd_bruto_jan_nov, ytd_netto_jan_nov, ytd_tax_paid_jan_nov = self._get_ytd_from_aph()
 
-            # === 2) Ambil data Desember dari slip aktif ===
-            slip_dict = self.as_dict()
-            bruto_desember = sum_bruto_earnings(slip_dict)
-            pengurang_netto_desember = sum_pengurang_netto_bulanan(slip_dict)
+            # === 2) Ambil data Desember dari slip aktif (satu pass earnings + deductions) ===
+            settings = self._get_settings_snapshot()
+            aggregates = self._reduce_slip(settings)
+            bruto_desember = aggregates.bruto
+            pengurang_netto_desember = aggregates.pengurang_netto_bulanan
             biaya_jabatan_desember = biaya_jabatan_bulanan(bruto_desember)  # min(5% × bruto Des, 500k)
 
-            # >>> PENTING: Baca JP+JHT (EE) bulan Desember dari deduction slip <<<
-            jp_jht_employee_month = 0.0
-            for d in (slip_dict.get("deductions") or []):
-                name = (d.get("salary_component") or "").strip().lower()
-                if name in {"bpjs jht employee", "bpjs jp employee"}:
-                    jp_jht_employee_month += flt(d.get("amount", 0))
+            # >>> PENTING: JP+JHT (EE) bulan Desember dari deduction slip <<<
+            jp_jht_employee_month = aggregates.jp_jht_employee
 
             # === 3) Hitung PPh21 Desember berbasis tahunan (December-only) ===
             result = calculate_pph21_december(
@@ -256,6 +320,7 @@ class CustomSalarySlip(SalarySlip):
                 # Dua opsi (pilih salah satu, yang bawah lebih eksplisit):
                 # december_slip=slip_dict,
                 jp_jht_employee_month=jp_jht_employee_month,
+                settings=settings,
             )
 
             # Nilai pajak yang diposting untuk bulan Desember (koreksi)
@@ -301,21 +366,42 @@ class CustomSalarySlip(SalarySlip):
             "name": getattr(self, "name", None),
         }
 
+    def _reduce_slip(self, settings, taxable_income=None):
+        """Satu pass earnings + deductions; hasilnya juga dipakai update_pph21_row."""
+        if taxable_income is None:
+            taxable_income = self._calculate_taxable_income()
+        aggregates = reduce_slip(
+            taxable_income, settings.components, integer=settings.integer_rupiah
+        )
+        self._slip_aggregates = aggregates
+        return aggregates
+
+    def _find_pph21_row(self):
+        """Baris PPh 21 di deductions: pakai index dari reduce_slip bila masih valid."""
+        deductions = self.deductions or []
+        aggregates = getattr(self, "_slip_aggregates", None)
+        idx = aggregates.pph21_row_index if aggregates is not None else None
+        if idx is not None and idx < len(deductions):
+            d = deductions[idx]
+            sc = d.get("salary_component") if isinstance(d, dict) else getattr(d, "salary_component", None)
+            if sc == PPH21_COMPONENT:
+                return d
+        for d in deductions:
+            sc = d.get("salary_component") if isinstance(d, dict) else getattr(d, "salary_component", None)
+            if sc == PPH21_COMPONENT:
+                return d
+        return None
+
     def update_pph21_row(self, tax_amount: float):
         try:
-            target = "PPh 21"
-            found = False
-            for d in self.deductions:
-                sc = d.get("salary_component") if isinstance(d, dict) else getattr(d, "salary_component", None)
-                if sc == target:
-                    if isinstance(d, dict):
-                        d["amount"] = tax_amount
-                    else:
-                        d.amount = tax_amount
-                    found = True
-                    break
-            if not found:
-                self.append("deductions", {"salary_component": target, "amount": tax_amount})
+            d = self._find_pph21_row()
+            if d is not None:
+                if isinstance(d, dict):
+                    d["amount"] = tax_amount
+                else:
+                    d.amount = tax_amount
+            else:
+                self.append("deductions", {"salary_component": PPH21_COMPONENT, "amount": tax_amount})
             self._recalculate_totals()
         except Exception as e:
             frappe.log_error(
@@ -403,9 +489,22 @@ class CustomSalarySlip(SalarySlip):
             )
             raise frappe.ValidationError(f"Error calculating PPh21: {e}")
 
+    def on_update(self):
+        parent = getattr(super(), "on_update", None)
+        if callable(parent):
+            parent()
+        # Save selesai: save berikutnya menghitung PPh21 dari baris slip terbaru
+        self._pph21_ter_result = None
+        self._pph21_ter_key = None
+
     # -------------------------
     # Annual Payroll History sync
     # -------------------------
+    def _run_stage(self, name):
+        """Timing stage in the metrics of the payroll run processing this slip, if any."""
+        metrics = getattr(self, "_run_metrics", None)
+        return metrics.stage(name, rows=1) if metrics is not None else nullcontext()
+
     def sync_to_annual_payroll_history(self, result, mode="monthly"):
         # Catatan: Bila Anda TIDAK ingin menulis APH sama sekali,
         # Anda bisa menonaktifkan pemanggilan fungsi ini di on_submit/on_cancel.
@@ -436,36 +535,31 @@ class CustomSalarySlip(SalarySlip):
                 nama_bulan=getattr(self, "bulan", None),
             )
 
-            raw_rate = result.get("rate", 0)
-            numeric_rate = raw_rate if isinstance(raw_rate, (int, float)) else 0
-
-            monthly_result = {
-                "bulan": nomor_bulan,
-                "bruto": result.get("bruto", result.get("bruto_total", 0)),
-                "pengurang_netto": result.get("pengurang_netto", result.get("income_tax_deduction_total", 0)),
-                "biaya_jabatan": result.get("biaya_jabatan", result.get("biaya_jabatan_total", 0)),
-                "netto": result.get("netto", result.get("netto_total", 0)),
-                "pkp": result.get("pkp", result.get("pkp_annual", 0)),
-                "rate": flt(numeric_rate),
-                "pph21": result.get("pph21", result.get("pph21_bulan", 0)),
-                "salary_slip": self.name,
+            if mode not in ("monthly", "december"):
+                return
+            monthly_result, summary = history_values_from_result(
+                result, nomor_bulan, self.name, december=mode == "december"
+            )
+
+            row = {
+                "employee": employee_info["name"],
+                "company": employee_info["company"],
+                "employee_name": employee_info["employee_name"],
+                "fiscal_year": fiscal_year,
+                "monthly_result": monthly_result,
+                "summary": summary,
             }
+            if getattr(self, "_defer_annual_history", False):
+                # Payroll Entry writes the rows of a whole chunk with
+                # sync_annual_payroll_history_bulk after submitting it
+                self._annual_history_row = row
+                return
+            if _annual_history_write_behind():
+                _history_queue().enqueue_submit(row)
+                self._annual_history_queued = True
+                return
 
-            if mode == "monthly":
-                sync_annual_payroll_history(
-                    employee=employee_info, fiscal_year=fiscal_year, monthly_results=[monthly_result], summary=None
-                )
-            elif mode == "december":
-                summary = {
-                    "bruto_total": result.get("bruto_total", 0),
-                    "netto_total": result.get("netto_total", 0),
-                    "ptkp_annual": result.get("ptkp_annual", 0),
-                    "pkp_annual": result.get("pkp_annual", 0),
-                    "pph21_annual": result.get("pph21_annual", 0),
-                    "koreksi_pph21": result.get("koreksi_pph21", 0),
-                }
-                if isinstance(raw_rate, str) and raw_rate:
-                    summary["rate_slab"] = raw_rate
+            with self._run_stage(STAGE_ANNUAL_HISTORY):
                 sync_annual_payroll_history(
                     employee=employee_info, fiscal_year=fiscal_year, monthly_results=[monthly_result], summary=summary
                 )
@@ -475,6 +569,8 @@ class CustomSalarySlip(SalarySlip):
         except frappe.ValidationError:
             raise
         except Exception as e:
+            # A deadlock lost the transaction; its owner retries it
+            reraise_lock_conflict(e)
             frappe.log_error(
                 message=f"Failed to sync Annual Payroll History for {getattr(self, 'name', 'unknown')}: {e}\n{traceback.format_exc()}",
                 title="Payroll Indonesia Annual History Sync Error",
@@ -495,6 +591,8 @@ class CustomSalarySlip(SalarySlip):
         self.sync_to_annual_payroll_history(info, mode=mode)
         if getattr(self, "_annual_history_synced", False):
             frappe.logger().info(f"[SYNC] Salary Slip {self.name} synced to Annual Payroll History")
+        elif getattr(self, "_annual_history_queued", False):
+            frappe.logger().info(f"[SYNC] Salary Slip {self.name} queued for Annual Payroll History")
 
     def on_cancel(self):
         if getattr(self, "flags", {}).get("from_annual_payroll_cancel"):
@@ -521,6 +619,11 @@ class CustomSalarySlip(SalarySlip):
                     tax_type = "DECEMBER"
             mode = "december" if tax_type == "DECEMBER" else "monthly"
 
+            if _annual_history_write_behind():
+                _history_queue().enqueue_cancel(self.employee, fiscal_year, self.name)
+                frappe.logger().info(f"[SYNC] Salary Slip {self.name} queued for removal from Annual Payroll History")
+                return
+
             sync_annual_payroll_history(
                 employee=self.employee,
                 fiscal_year=fiscal_year,
@@ -533,6 +636,7 @@ class CustomSalarySlip(SalarySlip):
         except frappe.ValidationError:
             raise
         except Exception as e:
+            reraise_lock_conflict(e)
             frappe.log_error(
                 message=f"Failed to remove from Annual Payroll History on cancel for {getattr(self, 'name', 'unknown')}: {e}\n{traceback.format_exc()}",
                 title="Payroll Indonesia Annual History Cancel Error",
@@ -540,6 +644,20 @@ class CustomSalarySlip(SalarySlip):
             logger.warning(f"Failed to update Annual Payroll History when cancelling {self.name}: {e}")
 
 
+def _annual_history_write_behind() -> bool:
+    try:
+        return is_annual_history_write_behind()
+    except Exception:
+        return False
+
+
+def _history_queue():
+    from payroll_indonesia.payroll_indonesia.doctype.annual_payroll_history_queue import (
+        annual_payroll_history_queue,
+    )
+    return annual_payroll_history_queue
+
+
 def on_submit(doc, method=None):
     if isinstance(doc, CustomSalarySlip):
         return
@@ -5,74 +5,47 @@ import frappe
 from frappe.utils import flt, getdate
 from frappe.model.document import Document
 
+from payroll_indonesia.utils.annual_history_summary import rebuild_summary
+
 class AnnualPayrollHistory(Document):
     def validate(self):
         """
-        Calculate totals from monthly details during validation.
-        This ensures parent fields are always updated before saving.
+        Keep the parent totals in line with the monthly details.
+
+        The sync path maintains the totals with deltas (``flags.summary_maintained``,
+        see ``utils.annual_history_summary``); any other save re-sums every row.
         Applies formula: netto = bruto - pengurang_netto - biaya_jabatan
         """
-        # Initialize totals
-        self.bruto_total = 0
-        self.netto_total = 0
-        self.pkp_annual = 0
-        self.pph21_annual = 0
-        self.pengurang_netto_total = 0
-        self.biaya_jabatan_total = 0
-
-        # Process each monthly detail
-        for row in self.monthly_details or []:
-            # Get values with proper fallbacks
-            bruto = flt(row.bruto)
-            pengurang_netto = flt(getattr(row, "pengurang_netto", 0))
-            biaya_jabatan = flt(getattr(row, "biaya_jabatan", 0))
-
-            # Calculate expected netto based on the formula
-            calculated_netto = bruto - pengurang_netto - biaya_jabatan
-            stored_netto = flt(row.netto)
-
-            # Log warning if there's a significant discrepancy between stored and calculated netto
-            if abs(calculated_netto - stored_netto) > 0.1:
-                frappe.logger("payroll_indonesia").warning(
-                    f"Netto mismatch for month {row.bulan}: calculated={calculated_netto}, stored={stored_netto}, "
-                    f"difference={calculated_netto - stored_netto}"
-                )
-
-            # Accumulate totals
-            self.bruto_total += bruto
-            self.netto_total += stored_netto
-            self.pkp_annual += flt(row.pkp)
-            self.pph21_annual += flt(row.pph21)
-            self.pengurang_netto_total += pengurang_netto
-            self.biaya_jabatan_total += biaya_jabatan
+        if not self.flags.get("summary_maintained"):
+            self.rebuild_summary()
 
         # Set default values for required fields
         self.ptkp_annual = flt(self.ptkp_annual) or 0
         self.koreksi_pph21 = flt(self.koreksi_pph21) or 0
         self.rate = 0
 
+    def rebuild_summary(self):
+        """Full rescan of the monthly details into the totals and ``summary_checksum``."""
+        logger = frappe.logger("payroll_indonesia")
+        for row in self.monthly_details or []:
+            # Log warning if there's a significant discrepancy between stored and calculated netto
+            calculated_netto = flt(row.bruto) - flt(row.pengurang_netto) - flt(row.biaya_jabatan)
+            if row.netto and abs(calculated_netto - flt(row.netto)) > 0.1:
+                logger.warning(
+                    f"Netto mismatch for month {row.bulan}: calculated={calculated_netto}, stored={flt(row.netto)}, "
+                    f"difference={calculated_netto - flt(row.netto)}"
+                )
+
+        rebuild_summary(self)
+
         # Double-check the netto_total using the formula
         calculated_netto_total = self.bruto_total - self.pengurang_netto_total - self.biaya_jabatan_total
         if abs(calculated_netto_total - self.netto_total) > 1:
-            frappe.logger("payroll_indonesia").warning(
+            logger.warning(
                 f"Total netto mismatch: calculated={calculated_netto_total}, stored={self.netto_total}, "
                 f"difference={calculated_netto_total - self.netto_total}"
             )
 
-        # Log debug information
-        frappe.logger("payroll_indonesia").debug({
-            "document": self.name,
-            "bruto_total": self.bruto_total,
-            "pengurang_netto_total": self.pengurang_netto_total,
-            "biaya_jabatan_total": self.biaya_jabatan_total,
-            "calculated_netto_total": calculated_netto_total,
-            "stored_netto_total": self.netto_total,
-            "pkp_annual": self.pkp_annual,
-            "pph21_annual": self.pph21_annual,
-            "koreksi_pph21": self.koreksi_pph21,
-            "ptkp_annual": self.ptkp_annual,
-        })
-
     def on_cancel(self):
         """Cancel linked Salary Slips when this document is cancelled."""
         logger = frappe.logger("payroll_indonesia")
@@ -168,3 +141,8 @@ class AnnualPayrollHistory(Document):
         )
         frappe.msgprint(message, title="Ringkasan Pembatalan Salary Slip")
         logger.info(f"Cancellation summary for {self.name}: {message}")
+
+
+def on_doctype_update():
+    """(employee, fiscal_year) index: sync lookups and the ordered row locks of concurrent syncs."""
+    frappe.db.add_index("Annual Payroll History", ["employee", "fiscal_year"], "employee_fiscal_year_index")
@@ -3,4 +3,12 @@ from frappe.model.document import Document
 
 
 class AnnualPayrollHistoryChild(Document):
-    pass
\ No newline at end of file
+    pass
+
+
+def on_doctype_update():
+    """Composite indexes for month and salary-slip lookups within one history."""
+    frappe.db.add_index(
+        "Annual Payroll History Child", ["parent", "salary_slip"], "parent_salary_slip_index"
+    )
+    frappe.db.add_index("Annual Payroll History Child", ["parent", "bulan"], "parent_bulan_index")
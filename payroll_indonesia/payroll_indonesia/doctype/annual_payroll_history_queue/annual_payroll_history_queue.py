@@ -0,0 +1,304 @@
+import json
+import traceback
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import frappe
+from frappe.model.document import Document
+
+from payroll_indonesia.utils.annual_history_bulk import sync_annual_payroll_history_bulk
+from payroll_indonesia.utils.annual_history_lock import DEADLOCK, lock_conflict, run_with_lock_retry
+from payroll_indonesia.utils.annual_history_summary import prepare_summary
+from payroll_indonesia.utils.light_writer import LightFieldWriter
+from payroll_indonesia.utils.sync_annual_payroll_history import (
+    get_or_create_annual_payroll_history,
+    remove_monthly_detail_by_salary_slip,
+    update_annual_payroll_summary,
+    upsert_monthly_detail,
+)
+
+QUEUE_DOCTYPE = "Annual Payroll History Queue"
+
+EVENT_SUBMIT = "Submit"
+EVENT_CANCEL = "Cancel"
+
+STATUS_PENDING = "Pending"
+STATUS_FAILED = "Failed"
+
+# Events read per consumer run
+CONSUMER_BATCH_SIZE = 5000
+# Failed applies before an event is parked as Failed
+MAX_ATTEMPTS = 5
+
+logger = frappe.logger("payroll_indonesia")
+
+
+def _loads(value: Optional[str], default: Any) -> Any:
+    if not value:
+        return default
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class AnnualPayrollHistoryQueue(Document):
+    """
+    One Salary Slip submit or cancel waiting to be applied to its Annual Payroll
+    History (write-behind mode, ``annual_history_write_behind``).
+    """
+
+    def get_payload(self) -> Dict[str, Any]:
+        return _loads(self.payload, {})
+
+
+def _insert_event(employee: str, fiscal_year: str, salary_slip: Optional[str],
+                  event: str, payload: Optional[Dict[str, Any]] = None) -> None:
+    frappe.get_doc(
+        {
+            "doctype": QUEUE_DOCTYPE,
+            "employee": employee,
+            "fiscal_year": str(fiscal_year),
+            "salary_slip": salary_slip,
+            "event": event,
+            "status": STATUS_PENDING,
+            "payload": json.dumps(payload or {}, default=str),
+        }
+    ).insert(ignore_permissions=True)
+
+
+def enqueue_submit(row: Dict[str, Any]) -> None:
+    """Queue a submitted slip; ``row`` is a ``sync_annual_payroll_history_bulk`` row."""
+    _insert_event(
+        row["employee"],
+        row["fiscal_year"],
+        (row.get("monthly_result") or {}).get("salary_slip"),
+        EVENT_SUBMIT,
+        row,
+    )
+
+
+def enqueue_cancel(employee: str, fiscal_year: str, salary_slip: str) -> None:
+    """Queue the removal of a cancelled slip from its Annual Payroll History."""
+    _insert_event(employee, fiscal_year, salary_slip, EVENT_CANCEL)
+
+
+class _HistoryEvents:
+    """Pending events of one (employee, fiscal_year), coalesced per salary slip."""
+
+    __slots__ = ("names", "submits", "cancels")
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.submits: Dict[str, Dict[str, Any]] = {}
+        self.cancels: Dict[str, None] = {}
+
+    def add(self, event: Dict[str, Any]) -> None:
+        self.names.append(event["name"])
+        slip = event.get("salary_slip")
+        if event.get("event") == EVENT_CANCEL:
+            self.submits.pop(slip, None)
+            self.cancels[slip] = None
+        else:
+            # The last submit of a slip wins
+            self.cancels.pop(slip, None)
+            self.submits[slip] = _loads(event.get("payload"), {})
+
+
+def coalesce_events(events: Iterable[Dict[str, Any]]) -> Dict[Tuple[str, str], _HistoryEvents]:
+    """Group events (oldest first) by (employee, fiscal_year)."""
+    groups: Dict[Tuple[str, str], _HistoryEvents] = {}
+    for event in events:
+        key = (event.get("employee"), str(event.get("fiscal_year")))
+        groups.setdefault(key, _HistoryEvents()).add(event)
+    return groups
+
+
+def _apply_history_events(employee: str, fiscal_year: str, group: _HistoryEvents) -> Optional[str]:
+    """Apply a group with cancellations to its history with a single save."""
+    submits = list(group.submits.values())
+    history = get_or_create_annual_payroll_history(
+        employee, fiscal_year, create_if_missing=bool(submits), for_update=True
+    )
+    if history is None:
+        return None
+    prepare_summary(history, is_new=history.is_new())
+
+    for salary_slip in group.cancels:
+        remove_monthly_detail_by_salary_slip(history, salary_slip)
+
+    summary = None
+    for row in submits:
+        upsert_monthly_detail(history, row.get("monthly_result") or {})
+        summary = row.get("summary") or summary
+    if summary:
+        update_annual_payroll_summary(history, summary)
+
+    history.flags.ignore_links = True
+    history.flags.ignore_permissions = True
+    history.flags.ignore_validate_update_after_submit = True
+    if history.docstatus == 0:
+        # Submitted by the same write
+        history.docstatus = 1
+    history.save()
+    return history.name
+
+
+def _pending_events(employees: Optional[List[str]], fiscal_year: Optional[str],
+                    limit: int) -> List[Dict[str, Any]]:
+    filters: Dict[str, Any] = {"status": STATUS_PENDING}
+    if employees is not None:
+        filters["employee"] = ["in", list(employees)]
+    if fiscal_year:
+        filters["fiscal_year"] = str(fiscal_year)
+    return frappe.get_all(
+        QUEUE_DOCTYPE,
+        filters=filters,
+        fields=["name", "employee", "fiscal_year", "salary_slip", "event", "payload", "attempts"],
+        order_by="creation asc",
+        limit=limit,
+    )
+
+
+def process_annual_history_queue(
+    employees: Optional[List[str]] = None,
+    fiscal_year: Optional[str] = None,
+    limit: int = CONSUMER_BATCH_SIZE,
+) -> Dict[str, int]:
+    """
+    Apply pending events, oldest first, one write per (employee, fiscal_year).
+
+    Histories with only submitted slips are written together through
+    ``sync_annual_payroll_history_bulk``; histories with cancellations are
+    loaded, updated and saved once each. Applied events are deleted; events
+    that could not be applied stay pending until ``MAX_ATTEMPTS``.
+
+    Returns:
+        Dict with the number of ``events`` read, ``applied`` and ``failed``
+        events, and ``histories`` written
+    """
+    events = _pending_events(employees, fiscal_year, limit)
+    stats = {"events": len(events), "applied": 0, "failed": 0, "histories": 0}
+    if not events:
+        return stats
+
+    attempts = {event["name"]: int(event.get("attempts") or 0) for event in events}
+    groups = coalesce_events(events)
+    done: List[str] = []
+    failed: Dict[str, str] = {}
+
+    bulk_groups: List[_HistoryEvents] = []
+    # Histories are locked in (employee, fiscal_year) order, like every other writer
+    for (employee, year), group in sorted(groups.items()):
+        if not group.cancels:
+            bulk_groups.append(group)
+            continue
+
+        savepoint = "annual_history_queue_apply"
+        frappe.db.savepoint(savepoint)
+        try:
+            if _apply_history_events(employee, year, group):
+                stats["histories"] += 1
+            done.extend(group.names)
+        except Exception as e:
+            if lock_conflict(e) == DEADLOCK:
+                # The transaction is gone; run_annual_history_queue retries the run
+                raise
+            frappe.db.rollback(save_point=savepoint)
+            logger.warning(
+                f"Annual Payroll History queue: applying {employee}/{year} failed: {str(e)}"
+            )
+            failed.update((name, str(e)) for name in group.names)
+
+    if bulk_groups:
+        outcome = sync_annual_payroll_history_bulk(
+            [row for group in bulk_groups for row in group.submits.values()]
+        )
+        stats["histories"] += len(outcome["histories"])
+        skipped = set(outcome["skipped"])
+        for group in bulk_groups:
+            if skipped.intersection(group.submits):
+                failed.update((name, "Salary Slip not applied") for name in group.names)
+            else:
+                done.extend(group.names)
+
+    if done:
+        frappe.db.delete(QUEUE_DOCTYPE, {"name": ("in", done)})
+    if failed:
+        writer = LightFieldWriter(QUEUE_DOCTYPE, ("attempts", "status", "error"))
+        for name, error in failed.items():
+            tries = attempts.get(name, 0) + 1
+            writer.set(name, "attempts", tries)
+            writer.set(name, "error", error[:1000])
+            if tries >= MAX_ATTEMPTS:
+                writer.set(name, "status", STATUS_FAILED)
+        writer.flush()
+
+    stats["applied"] = len(done)
+    stats["failed"] = len(failed)
+    return stats
+
+
+def get_queue_lag() -> Dict[str, Any]:
+    """
+    Queue depth and lag: ``pending``/``failed`` event counts, creation time of
+    the oldest pending event and its age in seconds.
+    """
+    rows = frappe.get_all(
+        QUEUE_DOCTYPE,
+        fields=["status", "count(name) as count", "min(creation) as oldest"],
+        group_by="status",
+    )
+    by_status = {row.get("status"): row for row in rows}
+    pending = by_status.get(STATUS_PENDING) or {}
+    oldest = pending.get("oldest")
+    lag_seconds = 0.0
+    if oldest:
+        lag_seconds = max(
+            (frappe.utils.now_datetime() - frappe.utils.get_datetime(oldest)).total_seconds(), 0.0
+        )
+    return {
+        "pending": int(pending.get("count") or 0),
+        "failed": int((by_status.get(STATUS_FAILED) or {}).get("count") or 0),
+        "oldest_pending": oldest,
+        "lag_seconds": lag_seconds,
+    }
+
+
+def run_annual_history_queue() -> None:
+    """Scheduled consumer (``scheduler_events``)."""
+    try:
+        lag = get_queue_lag()
+        if not lag["pending"]:
+            return
+        stats = run_with_lock_retry(
+            process_annual_history_queue, label="Annual Payroll History queue", owns_transaction=True
+        )
+        logger.info(
+            f"Annual Payroll History queue: {stats['applied']} events applied to "
+            f"{stats['histories']} histories, {stats['failed']} failed; "
+            f"{lag['pending']} were pending, lag {lag['lag_seconds']:.0f}s"
+        )
+    except Exception as e:
+        frappe.log_error(
+            message=f"Annual Payroll History queue run failed: {str(e)}\n{traceback.format_exc()}",
+            title="Annual Payroll History Queue Error",
+        )
+
+
+def flush(employees: Optional[List[str]] = None, fiscal_year: Optional[str] = None) -> Dict[str, int]:
+    """
+    Apply every pending event now, in the caller's transaction (tests, year-end
+    processing and December YTD reads).
+
+    Args:
+        employees: Only events of these employees
+        fiscal_year: Only events of this fiscal year
+    """
+    totals = {"events": 0, "applied": 0, "failed": 0, "histories": 0}
+    while True:
+        stats = process_annual_history_queue(employees, fiscal_year)
+        for key, value in stats.items():
+            totals[key] += value
+        # Stop after the last batch, or when a batch made no progress
+        if stats["events"] < CONSUMER_BATCH_SIZE or not stats["applied"]:
+            return totals
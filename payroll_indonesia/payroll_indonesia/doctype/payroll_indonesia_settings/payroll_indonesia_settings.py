@@ -1,7 +1,18 @@
+import frappe
 from frappe.model.document import Document
 
+from payroll_indonesia.config.ter_index import compile_ter_brackets
+
 
 class PayrollIndonesiaSettings(Document):
     """Settings for Payroll Indonesia (BPJS/PPh21)."""
 
-    pass
+    def validate(self):
+        """Report overlapping or gapped TER brackets before they are saved."""
+        _, issues = compile_ter_brackets(self.get("ter_bracket_table") or [])
+        if issues:
+            frappe.msgprint(
+                "<br>".join(issues),
+                title="TER Bracket Warning",
+                indicator="orange",
+            )
@@ -0,0 +1,185 @@
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+import frappe
+from frappe.model.document import Document
+
+CHECKPOINT_DOCTYPE = "Payroll Run Checkpoint"
+
+STATUS_IN_PROGRESS = "In Progress"
+STATUS_COMPLETED = "Completed"
+STATUS_STALLED = "Stalled"
+
+# A run with pending slips and no committed chunk for this long is reported as
+# stalled (3x the chunk job timeout, when its chunk results expire as well)
+STALLED_AFTER = 3 * 3600
+
+
+def _loads(value: Optional[str], default: Any) -> Any:
+    if not value:
+        return default
+    try:
+        return json.loads(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class PayrollRunCheckpoint(Document):
+    """
+    Progress of the salary slip processing of one Payroll Entry.
+
+    Updated in the same transaction as every committed chunk, so after a crash
+    ``pending_slips`` holds exactly the slips that still have to be processed.
+    """
+
+    def validate(self):
+        self.processed_count = len(self.get_processed())
+        self.failed_count = len(self.get_failed())
+        self.pending_count = len(self.get_pending())
+        self.total_slips = self.processed_count + self.failed_count + self.pending_count
+
+    def get_processed(self) -> List[str]:
+        return _loads(self.processed_slips, [])
+
+    def get_failed(self) -> Dict[str, str]:
+        return _loads(self.failed_slips, {})
+
+    def get_pending(self) -> List[str]:
+        return _loads(self.pending_slips, [])
+
+    def set_slips(self, processed: List[str], failed: Dict[str, str], pending: List[str]) -> None:
+        self.processed_slips = json.dumps(processed)
+        self.failed_slips = json.dumps(failed, sort_keys=True)
+        self.pending_slips = json.dumps(pending)
+
+    def apply_chunk_result(self, result: Dict[str, Any]) -> None:
+        """Move the slips of a committed chunk from pending to processed / failed."""
+        errors = result.get("errors") or {}
+        failed_now = {name: errors.get(name) or "Invalid salary slip" for name in result.get("invalid") or []}
+        failed_now.update(errors)
+        processed_now = [name for name in result.get("processed") or [] if name not in failed_now]
+
+        done = set(processed_now) | set(failed_now)
+        processed = [name for name in self.get_processed() if name not in done] + processed_now
+        failed = {name: error for name, error in self.get_failed().items() if name not in done}
+        failed.update(failed_now)
+        pending = [name for name in self.get_pending() if name not in done]
+        self.set_slips(processed, failed, pending)
+        self.last_checkpoint = frappe.utils.now()
+
+    def requeue_failed(self) -> List[str]:
+        """Move failed slips back to pending; returns their names."""
+        failed = list(self.get_failed())
+        if failed:
+            pending = self.get_pending()
+            pending.extend(name for name in failed if name not in pending)
+            self.set_slips(self.get_processed(), {}, pending)
+        return failed
+
+
+def get_checkpoint(payroll_entry: str, for_update: bool = False) -> Optional[PayrollRunCheckpoint]:
+    """Checkpoint of ``payroll_entry``, or None if it never ran with checkpoints."""
+    if not frappe.db.exists(CHECKPOINT_DOCTYPE, payroll_entry):
+        return None
+    return frappe.get_doc(CHECKPOINT_DOCTYPE, payroll_entry, for_update=for_update)
+
+
+def start_checkpoint(
+    payroll_entry: str,
+    pending: Iterable[str],
+    tax_mode: str,
+    settings_version: str,
+    processed: Optional[Iterable[str]] = None,
+) -> PayrollRunCheckpoint:
+    """Create (or reset) the checkpoint of ``payroll_entry`` for a new run."""
+    checkpoint = get_checkpoint(payroll_entry, for_update=True)
+    if checkpoint is None:
+        checkpoint = frappe.get_doc({"doctype": CHECKPOINT_DOCTYPE, "payroll_entry": payroll_entry})
+
+    checkpoint.status = STATUS_IN_PROGRESS
+    checkpoint.tax_mode = tax_mode
+    checkpoint.settings_version = settings_version
+    checkpoint.set_slips(list(processed or []), {}, list(pending))
+    checkpoint.last_checkpoint = frappe.utils.now()
+    checkpoint.save(ignore_permissions=True)
+    return checkpoint
+
+
+def record_chunk(payroll_entry: str, result: Dict[str, Any]) -> None:
+    """
+    Apply a chunk result to the checkpoint. Call it before the chunk's commit;
+    the row lock serialises parallel chunk jobs of the same entry.
+    """
+    checkpoint = get_checkpoint(payroll_entry, for_update=True)
+    if checkpoint is None:
+        return
+    checkpoint.apply_chunk_result(result)
+    checkpoint.save(ignore_permissions=True)
+
+
+def complete_checkpoint(payroll_entry: str) -> None:
+    """Mark the run finished once no slips are pending."""
+    checkpoint = get_checkpoint(payroll_entry, for_update=True)
+    if checkpoint is None or checkpoint.get_pending():
+        return
+    checkpoint.status = STATUS_COMPLETED
+    checkpoint.save(ignore_permissions=True)
+
+
+def mark_stalled_runs() -> List[str]:
+    """
+    Scheduled (hourly): report runs whose chunk jobs stopped, e.g. killed by a
+    job timeout or out of memory, so they are found and resumed
+    (``resume_payroll_entry``). Returns the stalled Payroll Entries.
+    """
+    cutoff = frappe.utils.add_to_date(frappe.utils.now_datetime(), seconds=-STALLED_AFTER)
+    stalled = frappe.get_all(
+        CHECKPOINT_DOCTYPE,
+        filters={
+            "status": STATUS_IN_PROGRESS,
+            "pending_count": (">", 0),
+            "last_checkpoint": ("<", cutoff),
+        },
+        fields=["name", "payroll_entry", "pending_count", "last_checkpoint"],
+    )
+    for row in stalled:
+        frappe.db.set_value(CHECKPOINT_DOCTYPE, row.name, "status", STATUS_STALLED, update_modified=False)
+        frappe.log_error(
+            message=(
+                f"Payroll Entry {row.payroll_entry}: {row.pending_count} salary slips still pending, "
+                f"no chunk committed since {row.last_checkpoint}. Resume it with "
+                f"payroll_indonesia.payroll_indonesia.doctype.payroll_run_checkpoint."
+                f"payroll_run_checkpoint.resume_payroll_entry."
+            ),
+            title=f"Payroll Indonesia: stalled payroll run ({row.payroll_entry})",
+        )
+    if stalled:
+        frappe.db.commit()
+    return [row.payroll_entry for row in stalled]
+
+
+@frappe.whitelist()
+def resume_payroll_entry(
+    payroll_entry: str, retry_failed: Any = 0, ignore_settings_change: Any = 0
+) -> Dict[str, Any]:
+    """
+    Resume the salary slip processing of ``payroll_entry`` from its checkpoint.
+
+    Args:
+        payroll_entry: Payroll Entry name
+        retry_failed: Also process the slips that failed in the interrupted run
+        ignore_settings_change: Resume even if Payroll Indonesia Settings changed
+    """
+    frappe.only_for(["System Manager", "HR Manager"])
+    entry = frappe.get_doc("Payroll Entry", payroll_entry)
+    processed = entry.resume_salary_slip_processing(
+        retry_failed=bool(frappe.utils.cint(retry_failed)),
+        ignore_settings_change=bool(frappe.utils.cint(ignore_settings_change)),
+    )
+    checkpoint = get_checkpoint(payroll_entry)
+    return {
+        "payroll_entry": payroll_entry,
+        "processed": len(processed),
+        "status": checkpoint.status if checkpoint else None,
+        "pending": checkpoint.pending_count if checkpoint else 0,
+    }
@@ -0,0 +1,7 @@
+from frappe.model.document import Document
+
+
+class PayrollRunMetrics(Document):
+    """Per-stage timing of one Payroll Entry run (written by utils.run_metrics)."""
+
+    pass
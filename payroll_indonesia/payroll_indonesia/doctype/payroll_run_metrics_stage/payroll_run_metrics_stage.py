@@ -0,0 +1,7 @@
+from frappe.model.document import Document
+
+
+class PayrollRunMetricsStage(Document):
+    """Wall time, queries and rows of one stage of a payroll run."""
+
+    pass
@@ -0,0 +1,155 @@
+import types
+import importlib
+import re
+
+
+def _load(frappe, tables):
+    calls = {"get_all": [], "locked": [], "sql": [], "bulk_insert": [], "rollback": []}
+
+    def get_all(doctype, filters=None, fields=None, order_by=None, limit=None, for_update=False):
+        calls["get_all"].append(doctype)
+        rows = []
+        for row in tables.get(doctype, []):
+            if all(
+                row.get(key) in value[1] if isinstance(value, list) else row.get(key) == value
+                for key, value in (filters or {}).items()
+            ):
+                rows.append(dict(row))
+        return rows
+
+    def sql(query, values=None, as_dict=False):
+        if "FOR UPDATE" in query:
+            # lock_histories: (employee, fiscal_year) IN ((%s, %s), ...)
+            pairs = set(zip(values[0::2], values[1::2]))
+            calls["locked"].append(sorted(pairs))
+            return [
+                dict(row) for row in tables.get("Annual Payroll History", [])
+                if (row.get("employee"), row.get("fiscal_year")) in pairs
+            ]
+        calls["sql"].append((query, values))
+
+    hashes = iter(range(1000))
+    frappe.get_all = get_all
+    frappe.generate_hash = lambda length=10: f"new-{next(hashes)}"
+    frappe.utils.now = lambda: "2025-03-31 10:00:00"
+    frappe.db = types.SimpleNamespace(
+        sql=sql,
+        bulk_insert=lambda doctype, fields, values: calls["bulk_insert"].append(
+            (doctype, [dict(zip(fields, row)) for row in values])
+        ),
+        savepoint=lambda name: None,
+        rollback=lambda save_point=None: calls["rollback"].append(save_point),
+    )
+    return importlib.import_module("payroll_indonesia.utils.annual_history_bulk"), calls
+
+
+def _row(employee, slip, bulan, bruto, pph21):
+    return {
+        "employee": employee,
+        "company": "PT Test",
+        "employee_name": employee,
+        "fiscal_year": "2025",
+        "monthly_result": {
+            "bulan": bulan, "bruto": bruto, "pengurang_netto": 0, "biaya_jabatan": 0,
+            "netto": bruto, "pkp": 0, "rate": 5, "pph21": pph21, "salary_slip": slip,
+        },
+        "summary": None,
+    }
+
+
+TABLES = {
+    "Salary Slip": [
+        {"name": "SS-1", "docstatus": 1},
+        {"name": "SS-2", "docstatus": 1},
+        {"name": "SS-3", "docstatus": 1},
+        {"name": "SS-DRAFT", "docstatus": 0},
+    ],
+    "Annual Payroll History": [
+        {"name": "EMP-1-2025", "employee": "EMP-1", "fiscal_year": "2025", "docstatus": 1,
+         "ptkp_annual": 54_000_000, "koreksi_pph21": 0},
+        {"name": "EMP-9-2025", "employee": "EMP-9", "fiscal_year": "2025", "docstatus": 1},
+    ],
+    "Annual Payroll History Child": [
+        {"name": "row-1", "parent": "EMP-1-2025", "parenttype": "Annual Payroll History",
+         "parentfield": "monthly_details", "idx": 1, "bulan": 1, "salary_slip": "SS-OLD",
+         "bruto": 10_000_000, "netto": 10_000_000, "pph21": 200_000},
+        {"name": "row-2", "parent": "EMP-1-2025", "parenttype": "Annual Payroll History",
+         "parentfield": "monthly_details", "idx": 2, "bulan": 2, "salary_slip": "SS-1",
+         "bruto": 1, "netto": 1, "pph21": 1},
+    ],
+}
+
+
+def _updated(statement):
+    """Field -> value of a single-row LightFieldWriter UPDATE."""
+    query, values = statement
+    fields = re.findall(r"`(\w+)` = CASE", query)
+    return dict(zip(fields, values[1::2]))
+
+
+def test_bulk_sync_writes_chunk_with_fixed_statements(fake_frappe):
+    module, calls = _load(fake_frappe, TABLES)
+
+    outcome = module.sync_annual_payroll_history_bulk(
+        [
+            _row("EMP-1", "SS-1", 2, 10_000_000, 250_000),
+            _row("EMP-1", "SS-2", 3, 12_000_000, 300_000),
+            _row("EMP-2", "SS-3", 3, 8_000_000, 100_000),
+            _row("EMP-2", "SS-DRAFT", 4, 8_000_000, 100_000),
+        ]
+    )
+
+    assert calls["get_all"] == ["Salary Slip", "Annual Payroll History Child"]
+    assert calls["locked"] == [[("EMP-1", "2025"), ("EMP-2", "2025")]]
+    assert outcome == {
+        "synced": ["SS-1", "SS-2", "SS-3"],
+        "skipped": ["SS-DRAFT"],
+        "histories": ["EMP-1-2025", "EMP-2-2025"],
+    }
+
+    inserts = dict(calls["bulk_insert"])
+    (new_history,) = inserts["Annual Payroll History"]
+    assert new_history["name"] == "EMP-2-2025" and new_history["docstatus"] == 1
+    assert new_history["bruto_total"] == 8_000_000 and new_history["pph21_annual"] == 100_000
+    new_details = inserts["Annual Payroll History Child"]
+    assert [(d["parent"], d["salary_slip"], d["idx"]) for d in new_details] == [
+        ("EMP-1-2025", "SS-2", 3),
+        ("EMP-2-2025", "SS-3", 1),
+    ]
+
+    # One UPDATE for the existing history, one for its updated child row
+    assert len(calls["sql"]) == 2
+    history = _updated(next(q for q in calls["sql"] if "tabAnnual Payroll History`" in q[0]))
+    assert history["bruto_total"] == 32_000_000
+    assert history["pph21_annual"] == 750_000
+    assert history["ptkp_annual"] == 54_000_000
+    assert history["modified"] == "2025-03-31 10:00:00"
+    assert "docstatus" not in history
+    detail = _updated(next(q for q in calls["sql"] if "Child" in q[0]))
+    assert detail["bruto"] == 10_000_000 and detail["pph21"] == 250_000
+
+
+def test_bulk_sync_falls_back_per_slip_when_write_fails(fake_frappe, monkeypatch):
+    module, calls = _load(fake_frappe, TABLES)
+
+    def failing_insert(*a, **k):
+        raise RuntimeError("deadlock")
+
+    synced = []
+    monkeypatch.setattr(module.frappe.db, "bulk_insert", failing_insert)
+    monkeypatch.setattr(
+        module,
+        "sync_annual_payroll_history",
+        lambda employee, fiscal_year, monthly_results, summary: synced.append(
+            monthly_results[0]["salary_slip"]
+        ) or f"{employee['name']}-{fiscal_year}",
+    )
+
+    outcome = module.sync_annual_payroll_history_bulk(
+        [_row("EMP-1", "SS-2", 3, 12_000_000, 300_000), _row("EMP-2", "SS-3", 3, 8_000_000, 0)]
+    )
+
+    assert calls["rollback"] == [module.SAVEPOINT]
+    assert synced == ["SS-2", "SS-3"]
+    assert outcome["synced"] == ["SS-2", "SS-3"]
+    assert outcome["histories"] == ["EMP-1-2025", "EMP-2-2025"]
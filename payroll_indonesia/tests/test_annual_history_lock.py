@@ -0,0 +1,106 @@
+import types
+import importlib
+
+import pytest
+
+
+class DeadlockError(Exception):
+    pass
+
+
+class DuplicateEntryError(Exception):
+    pass
+
+
+def _load(frappe, monkeypatch):
+    calls = {"sql": [], "rollback": []}
+
+    def sql(query, values=None, as_dict=False):
+        calls["sql"].append((query, values))
+        return [{"name": "EMP-1-2025"}]
+
+    frappe.QueryDeadlockError = DeadlockError
+    frappe.DuplicateEntryError = DuplicateEntryError
+    frappe.db = types.SimpleNamespace(
+        sql=sql, rollback=lambda save_point=None: calls["rollback"].append(save_point)
+    )
+    module = importlib.import_module("payroll_indonesia.utils.annual_history_lock")
+    monkeypatch.setattr(module.time, "sleep", lambda seconds: None)
+    return module, calls
+
+
+def _failing(errors):
+    attempts = []
+
+    def fn():
+        attempts.append(1)
+        if errors:
+            raise errors.pop(0)
+        return "ok"
+
+    return fn, attempts
+
+
+def test_lock_histories_locks_exact_pairs_in_key_order(fake_frappe, monkeypatch):
+    module, calls = _load(fake_frappe, monkeypatch)
+    rows = module.lock_histories([("EMP-2", "2025"), ("EMP-1", 2024), ("EMP-2", "2025")])
+
+    assert rows == [{"name": "EMP-1-2025"}]
+    ((query, values),) = calls["sql"]
+    assert "FOR UPDATE" in query
+    assert "ORDER BY `employee` ASC, `fiscal_year` ASC" in query
+    # Only the requested pairs, not EMP-1/2025 or EMP-2/2024
+    assert "(`employee`, `fiscal_year`) IN ((%s, %s), (%s, %s))" in query
+    assert values == ["EMP-1", "2024", "EMP-2", "2025"]
+    assert module.local_contention()["locks"] == 1
+    assert module.lock_histories([]) == [] and len(calls["sql"]) == 1
+
+
+def test_conflicts_are_classified(fake_frappe, monkeypatch):
+    module, _ = _load(fake_frappe, monkeypatch)
+    assert module.lock_conflict(DeadlockError()) == module.DEADLOCK
+    assert module.lock_conflict(Exception(1205, "Lock wait timeout exceeded")) == module.LOCK_TIMEOUT
+    assert module.lock_conflict(Exception(1213, "Deadlock found")) == module.DEADLOCK
+    assert module.lock_conflict(RuntimeError("deadlock")) is None
+    assert module.lock_conflict(DuplicateEntryError("Annual Payroll History", "EMP-1-2025")) == module.DUPLICATE
+    assert module.lock_conflict(DuplicateEntryError("Salary Slip", "SS-1")) is None
+
+
+def test_concurrent_history_creation_is_retried(fake_frappe, monkeypatch):
+    module, calls = _load(fake_frappe, monkeypatch)
+    fn, attempts = _failing([DuplicateEntryError("Annual Payroll History", "EMP-1-2025")])
+    assert module.run_with_lock_retry(fn, "test") == "ok" and len(attempts) == 2
+    assert module.local_contention()["duplicates"] == 1
+
+    with pytest.raises(DuplicateEntryError):
+        module.reraise_lock_conflict(DuplicateEntryError("Annual Payroll History", "EMP-1-2025"), "sp")
+    assert calls["rollback"] == ["sp"]
+
+
+def test_transaction_owner_retries_deadlocks_with_backoff(fake_frappe, monkeypatch):
+    module, calls = _load(fake_frappe, monkeypatch)
+    delays = []
+    monkeypatch.setattr(module.time, "sleep", delays.append)
+    fn, attempts = _failing([DeadlockError(), Exception(1205, "timeout")])
+
+    assert module.run_with_lock_retry(fn, "test", owns_transaction=True) == "ok"
+    assert len(attempts) == 3 and calls["rollback"] == [None, None]
+    assert 0.05 <= delays[0] <= 0.1 and 0.1 <= delays[1] <= 0.2
+    counters = module.local_contention()
+    assert (counters["deadlocks"], counters["lock_timeouts"], counters["retries"]) == (1, 1, 2)
+
+
+def test_inner_code_retries_only_lock_timeouts(fake_frappe, monkeypatch):
+    module, calls = _load(fake_frappe, monkeypatch)
+    fn, attempts = _failing([Exception(1205, "timeout")])
+    assert module.run_with_lock_retry(fn, "test") == "ok" and len(attempts) == 2
+
+    fn, attempts = _failing([DeadlockError()])
+    with pytest.raises(DeadlockError):
+        module.run_with_lock_retry(fn, "test")
+    assert len(attempts) == 1 and calls["rollback"] == []
+
+    fn, attempts = _failing([Exception(1205, "timeout") for _ in range(module.MAX_ATTEMPTS)])
+    with pytest.raises(Exception):
+        module.run_with_lock_retry(fn, "test")
+    assert len(attempts) == module.MAX_ATTEMPTS and module.local_contention()["gave_up"] == 1
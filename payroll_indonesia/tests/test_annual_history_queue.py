@@ -0,0 +1,103 @@
+import json
+import types
+import importlib
+
+
+def _load(frappe, events):
+    calls = {"deleted": [], "sql": [], "rollback": []}
+
+    def get_all(doctype, filters=None, fields=None, order_by=None, limit=None, group_by=None):
+        rows = [dict(e) for e in events if e.get("status", "Pending") == filters["status"]]
+        return rows[:limit]
+
+    def delete(doctype, filters):
+        names = set(filters["name"][1])
+        calls["deleted"].extend(sorted(names))
+        events[:] = [e for e in events if e["name"] not in names]
+
+    frappe.get_all = get_all
+    frappe.db = types.SimpleNamespace(
+        delete=delete,
+        sql=lambda query, values=None: calls["sql"].append((query, values)),
+        savepoint=lambda name: None,
+        rollback=lambda save_point=None: calls["rollback"].append(save_point),
+    )
+    module = importlib.import_module(
+        "payroll_indonesia.payroll_indonesia.doctype.annual_payroll_history_queue.annual_payroll_history_queue"
+    )
+    return module, calls
+
+
+def _event(name, employee, slip, event="Submit", bulan=1):
+    payload = {
+        "employee": employee,
+        "fiscal_year": "2025",
+        "monthly_result": {"bulan": bulan, "bruto": 1000, "salary_slip": slip},
+    }
+    return {
+        "name": name, "employee": employee, "fiscal_year": "2025", "salary_slip": slip,
+        "event": event, "payload": json.dumps(payload) if event == "Submit" else "{}",
+        "attempts": 0, "status": "Pending",
+    }
+
+
+def test_coalesce_keeps_last_event_per_slip(fake_frappe):
+    module, _ = _load(fake_frappe, [])
+    groups = module.coalesce_events(
+        [
+            _event("Q1", "EMP-1", "SS-1"),
+            _event("Q2", "EMP-1", "SS-1", "Cancel"),
+            _event("Q3", "EMP-1", "SS-2"),
+            _event("Q4", "EMP-2", "SS-3", "Cancel"),
+            _event("Q5", "EMP-2", "SS-3"),
+        ]
+    )
+
+    first = groups[("EMP-1", "2025")]
+    assert first.names == ["Q1", "Q2", "Q3"]
+    assert list(first.submits) == ["SS-2"] and list(first.cancels) == ["SS-1"]
+    second = groups[("EMP-2", "2025")]
+    assert list(second.submits) == ["SS-3"] and not second.cancels
+
+
+def test_process_applies_one_write_per_history(fake_frappe, monkeypatch):
+    events = [
+        _event("Q1", "EMP-1", "SS-1"),
+        _event("Q2", "EMP-1", "SS-1", "Cancel"),
+        _event("Q3", "EMP-2", "SS-2", bulan=2),
+        _event("Q4", "EMP-2", "SS-2", bulan=3),
+        _event("Q5", "EMP-3", "SS-3"),
+    ]
+    module, calls = _load(fake_frappe, events)
+
+    applied, bulk = [], []
+    monkeypatch.setattr(
+        module, "_apply_history_events",
+        lambda employee, fiscal_year, group: applied.append((employee, list(group.cancels))) or "H",
+    )
+
+    def fake_bulk(rows):
+        bulk.append([(r["employee"], r["monthly_result"]["bulan"]) for r in rows])
+        return {"synced": ["SS-2"], "skipped": ["SS-3"], "histories": ["EMP-2-2025"]}
+
+    monkeypatch.setattr(module, "sync_annual_payroll_history_bulk", fake_bulk)
+
+    stats = module.process_annual_history_queue()
+
+    assert applied == [("EMP-1", ["SS-1"])]
+    # Only the last submit of SS-2 is written, in one bulk call with EMP-3
+    assert bulk == [[("EMP-2", 3), ("EMP-3", 1)]]
+    assert calls["deleted"] == ["Q1", "Q2", "Q3", "Q4"]
+    assert stats == {"events": 5, "applied": 4, "failed": 1, "histories": 2}
+    # The event of the skipped slip stays pending with one attempt
+    (query, values), = calls["sql"]
+    assert "`attempts` = CASE" in query and "`status`" not in query
+    assert values[:2] == ["Q5", 1]
+    assert [e["name"] for e in events] == ["Q5"]
+
+    # flush stops once a batch makes no progress
+    monkeypatch.setattr(
+        module, "sync_annual_payroll_history_bulk",
+        lambda rows: {"synced": [], "skipped": ["SS-3"], "histories": []},
+    )
+    assert module.flush()["applied"] == 0
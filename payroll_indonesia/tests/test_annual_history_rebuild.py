@@ -0,0 +1,129 @@
+import json
+import types
+import datetime
+import importlib
+
+
+class Cache:
+    def __init__(self):
+        self.hashes, self.counters = {}, {}
+
+    def make_key(self, key):
+        return key
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field] = value
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def incr(self, key):
+        self.counters[key] = self.counters.get(key, 0) + 1
+        return self.counters[key]
+
+    def delete(self, key):
+        self.counters.pop(key, None)
+
+
+class History(types.SimpleNamespace):
+    def __init__(self, name, rows, new=False, **values):
+        super().__init__(name=name, monthly_details=rows, flags=types.SimpleNamespace(),
+                         docstatus=0 if new else 1, new=new, saved=0, **values)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def set(self, key, value):
+        setattr(self, key, list(value) if isinstance(value, list) else value)
+
+    def append(self, key, row):
+        getattr(self, key).append(dict(row))
+
+    def is_new(self):
+        return self.new
+
+    def save(self):
+        self.saved += 1
+
+
+def _slip(name, employee, month, pph21, tax_type="TER", **info):
+    info.update(bruto=1000 * month, pph21=pph21)
+    return {"name": name, "employee": employee, "employee_name": employee,
+            "start_date": datetime.date(2025, month, 1), "tax_type": tax_type,
+            "pph21_info": json.dumps(info)}
+
+
+def _load(frappe, monkeypatch, slips, histories):
+    cache = Cache()
+
+    def get_all(doctype, filters=None, pluck=None, distinct=False):
+        if doctype == "Salary Slip":
+            return [s["employee"] for s in slips]
+        return list(histories)
+
+    def sql(query, values=None, as_dict=False):
+        return [s for s in slips if s["employee"] in values["employees"]]
+
+    frappe.utils.flt = lambda v, precision=None: round(float(v or 0), precision) if precision else float(v or 0)
+    frappe.generate_hash = lambda length=10: "RB1"
+    frappe.cache = lambda: cache
+    frappe.get_all = get_all
+    frappe.publish_progress = lambda *a, **k: None
+    frappe.db = types.SimpleNamespace(sql=sql, savepoint=lambda n: None, commit=lambda: None,
+                                      rollback=lambda save_point=None: None)
+    module = importlib.import_module("payroll_indonesia.utils.annual_history_rebuild")
+    monkeypatch.setattr(
+        module, "get_or_create_annual_payroll_history",
+        lambda employee, fiscal_year, create_if_missing=True, for_update=False: histories.get(employee)
+        or (History(f"{employee}-2025", [], new=True) if create_if_missing else None),
+    )
+    return module, cache
+
+
+def test_shards_are_stable_and_cover_every_employee(fake_frappe, monkeypatch):
+    module, _ = _load(fake_frappe, monkeypatch, [], {})
+    employees = [f"EMP-{i:04d}" for i in range(200)]
+    shards = [module.shard_of(e, 4) for e in employees]
+    assert shards == [module.shard_of(e, 4) for e in employees]
+    assert set(shards) == {0, 1, 2, 3}
+
+
+def test_rebuild_replaces_rows_and_reports_diff(fake_frappe, monkeypatch):
+    slips = [
+        _slip("SS-1", "EMP-1", 1, 10),
+        _slip("SS-2", "EMP-1", 2, 25),
+        _slip("SS-3", "EMP-2", 1, 10),
+    ]
+    module, _ = _load(fake_frappe, monkeypatch, slips, {})
+    synced = {}
+
+    # EMP-1: SS-2 is stale and SS-9 was cancelled out of band; EMP-2 matches its slips
+    for employee in ("EMP-1", "EMP-2"):
+        history = History(f"{employee}-2025", [])
+        rows, summary = module._history_values([s for s in slips if s["employee"] == employee])
+        history.monthly_details = [dict(r) for r in rows]
+        module.rebuild_summary(history)
+        module.update_annual_payroll_summary(history, summary)
+        synced[employee] = history
+    synced["EMP-1"].monthly_details[1]["pph21"] = 20
+    synced["EMP-1"].monthly_details.append({"salary_slip": "SS-9", "bulan": 3, "pph21": 30})
+    module.rebuild_summary(synced["EMP-1"])
+    histories = {**synced, "EMP-3": History("EMP-3-2025", [{"salary_slip": "SS-7", "bulan": 1}])}
+    module, cache = _load(fake_frappe, monkeypatch, slips, histories)
+
+    rebuild_id = module.rebuild_annual_payroll_history("PT A", 2025, shards=2, now=True)
+
+    status = module.get_rebuild_status(rebuild_id)
+    assert status["percent"] == 100.0 and status["employees"] == 3
+    diff = status["summary"]["diff"]
+    assert (diff["updated"], diff["unchanged"], diff["created"]) == (2, 1, 0)
+    assert (diff["rows_added"], diff["rows_removed"], diff["rows_changed"]) == (0, 2, 1)
+    assert diff["pph21_annual_delta"] == -25.0
+    assert sorted(diff["changed"]) == ["EMP-1", "EMP-3"]
+
+    emp1 = histories["EMP-1"]
+    assert emp1.saved == 1 and emp1.pph21_annual == 35.0
+    assert emp1.flags.summary_maintained is True
+    assert [r["salary_slip"] for r in emp1.monthly_details] == ["SS-1", "SS-2"]
+    assert histories["EMP-2"].saved == 0
+    assert histories["EMP-3"].monthly_details == [] and histories["EMP-3"].saved == 1
@@ -0,0 +1,77 @@
+import types
+import importlib
+
+
+def _load(frappe):
+    warnings = []
+
+    class DummyLogger:
+        def warning(self, msg, *a, **k):
+            warnings.append(msg)
+
+    frappe.logger = lambda *a, **k: DummyLogger()
+    return importlib.import_module("payroll_indonesia.utils.annual_history_summary"), warnings
+
+
+class History(types.SimpleNamespace):
+    def __init__(self, rows, **values):
+        super().__init__(monthly_details=rows, name="EMP-1-2025", flags={}, **values)
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+
+def _row(slip, bulan, bruto, pph21):
+    return {"salary_slip": slip, "bulan": bulan, "bruto": bruto, "pengurang_netto": 100,
+            "biaya_jabatan": 50, "netto": bruto - 150, "pkp": 0, "pph21": pph21}
+
+
+def test_deltas_match_full_rescan(fake_frappe):
+    summary, warnings = _load(fake_frappe)
+    rows = [_row("SS-1", 1, 1000, 10), _row("SS-2", 2, 2000, 20)]
+    history = History(rows)
+    summary.prepare_summary(history)
+    assert history.flags["summary_maintained"]
+    assert history["bruto_total"] == 3000 and history["summary_checksum"].startswith("2:")
+
+    # Replace month 2, insert month 3, remove month 1
+    before = summary.row_snapshot(rows[1])
+    rows[1].update(bruto=2500, netto=2350, pph21=25)
+    summary.apply_row_delta(history, before, summary.row_snapshot(rows[1]))
+    rows.append(_row("SS-3", 3, 4000, 40))
+    summary.apply_row_delta(history, None, summary.row_snapshot(rows[2]))
+    summary.apply_row_delta(history, summary.row_snapshot(rows.pop(0)), None)
+
+    rescanned = History([dict(r) for r in rows])
+    summary.rebuild_summary(rescanned)
+    for field in summary.TOTAL_FIELDS + (summary.CHECKSUM_FIELD,):
+        assert history[field] == rescanned[field], field
+    assert history["pph21_annual"] == 65 and history["netto_total"] == 6200
+    # Matching checksum: no rebuild, no warning
+    summary.prepare_summary(history)
+    assert warnings == []
+
+
+def test_checksum_mismatch_rebuilds(fake_frappe):
+    summary, warnings = _load(fake_frappe)
+    rows = [_row("SS-1", 1, 1000, 10)]
+    history = History(rows)
+    summary.prepare_summary(history)
+
+    # Row edited outside the sync path; totals are stale until the next prepare
+    rows[0]["pph21"] = 99
+    assert history["pph21_annual"] == 10
+    summary.prepare_summary(history)
+    assert history["pph21_annual"] == 99
+    assert len(warnings) == 1 and "checksum mismatch" in warnings[0]
+
+
+def test_new_history_starts_from_zero(fake_frappe):
+    summary, _ = _load(fake_frappe)
+    history = History([], bruto_total=None)
+    summary.prepare_summary(history, is_new=True)
+    assert history["bruto_total"] == 0.0
+    assert history["summary_checksum"] == summary.summary_checksum([])
@@ -0,0 +1,94 @@
+import types
+import importlib
+
+
+def _load(frappe, drafts=None, failing_delete=None):
+    calls = {"delete": [], "delete_doc": [], "cancel": [], "progress": [], "locked": [], "rollback": []}
+
+    def get_all(doctype, filters=None, pluck=None, order_by=None, for_update=False):
+        # Locking read of the chunk's slips that are still drafts
+        calls["locked"].append(for_update)
+        names = filters["name"][1]
+        return [name for name in names if drafts is None or name in drafts]
+
+    def delete(doctype, filters):
+        if doctype == failing_delete:
+            raise RuntimeError("delete failed")
+        calls["delete"].append((doctype, filters))
+
+    frappe.get_site_path = lambda *a: "/nonexistent"
+    frappe.get_meta = lambda doctype: types.SimpleNamespace(
+        get_table_fields=lambda: [
+            types.SimpleNamespace(fieldname="earnings", options="Salary Detail"),
+            types.SimpleNamespace(fieldname="timesheets", options="Salary Slip Timesheet"),
+        ]
+    )
+    frappe.get_all = get_all
+    frappe.db = types.SimpleNamespace(
+        delete=delete,
+        exists=lambda doctype, name: True,
+        savepoint=lambda name: None,
+        rollback=lambda save_point=None: calls["rollback"].append(save_point),
+    )
+    frappe.delete_doc = lambda doctype, name, **k: calls["delete_doc"].append(name)
+    frappe.get_doc = lambda doctype, name: types.SimpleNamespace(
+        cancel=lambda: calls["cancel"].append(name)
+    )
+    frappe.publish_progress = lambda percent, **k: calls["progress"].append(round(percent))
+
+    module = importlib.import_module("payroll_indonesia.override.payroll_entry")
+    return module, calls
+
+
+def test_drafts_deleted_in_bulk_submitted_one_by_one(fake_frappe, monkeypatch):
+    module, calls = _load(fake_frappe)
+    monkeypatch.setattr(module, "DELETE_CHUNK_SIZE", 4)
+
+    slips = [types.SimpleNamespace(name=f"SS-{i}", docstatus=0) for i in range(10)]
+    slips.append(types.SimpleNamespace(name="SS-SUB", docstatus=1))
+
+    entry = module.CustomPayrollEntry.__new__(module.CustomPayrollEntry)
+    entry.name = "PE-1"
+    entry.doctype = "Payroll Entry"
+    entry.get_linked_salary_slips = lambda: slips
+
+    entry.delete_salary_slips(force_cleanup=True)
+
+    # 3 chunks x (2 child DocTypes + parent)
+    assert len(calls["delete"]) == 9
+    assert calls["delete"][0] == (
+        "Salary Detail", {"parenttype": "Salary Slip", "parent": ("in", ["SS-0", "SS-1", "SS-2", "SS-3"])}
+    )
+    assert calls["delete"][2] == ("Salary Slip", {"name": ("in", ["SS-0", "SS-1", "SS-2", "SS-3"])})
+    assert calls["locked"] == [True, True, True]
+    assert calls["cancel"] == ["SS-SUB"]
+    assert calls["delete_doc"] == ["SS-SUB"]
+    assert calls["progress"] == [36, 73, 91, 100]
+
+
+def _entry(module, slips):
+    entry = module.CustomPayrollEntry.__new__(module.CustomPayrollEntry)
+    entry.name = "PE-1"
+    entry.doctype = "Payroll Entry"
+    entry.get_linked_salary_slips = lambda: slips
+    return entry
+
+
+def test_slip_submitted_after_listing_is_not_bulk_deleted(fake_frappe):
+    module, calls = _load(fake_frappe, drafts={"SS-0", "SS-2"})
+
+    deleted = _entry(module, [])._bulk_delete_draft_slips(["SS-0", "SS-1", "SS-2"], 3)
+
+    # SS-1 was submitted meanwhile: its rows stay and it is left to the per-slip path
+    assert deleted == {"SS-0", "SS-2"}
+    assert calls["delete"][0] == ("Salary Detail", {"parenttype": "Salary Slip", "parent": ("in", ["SS-0", "SS-2"])})
+    assert calls["delete"][-1] == ("Salary Slip", {"name": ("in", ["SS-0", "SS-2"])})
+
+
+def test_failed_chunk_is_rolled_back_to_its_savepoint(fake_frappe):
+    module, calls = _load(fake_frappe, failing_delete="Salary Slip")
+
+    deleted = _entry(module, [])._bulk_delete_draft_slips(["SS-0", "SS-1"], 2)
+
+    assert deleted == set()
+    assert calls["rollback"] == [module.DELETE_SAVEPOINT]
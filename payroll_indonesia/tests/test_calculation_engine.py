@@ -0,0 +1,70 @@
+import subprocess
+import sys
+
+from payroll_indonesia.engine import december, progressive, ter
+from payroll_indonesia.engine.ter_index import TERTable, compile_ter_brackets
+
+
+def test_engine_imports_without_frappe():
+    code = (
+        "import sys; sys.modules['frappe'] = None\n"
+        "import payroll_indonesia.engine.ter, payroll_indonesia.engine.december, "
+        "payroll_indonesia.engine.progressive, payroll_indonesia.engine.ter_index"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def _slip(gaji):
+    return {
+        "earnings": [{"salary_component": "Gaji Pokok", "amount": gaji, "is_tax_applicable": 1}],
+        "deductions": [],
+    }
+
+
+def test_december_float_and_rupiah_agree():
+    inp = december.DecemberInput(
+        ytd_tax_paid_jan_nov=1_000_000,
+        bruto_desember=10_000_000,
+        biaya_jabatan_desember=750_000,  # clamped to 500.000
+        jp_jht_employee_month=300_000,
+        ptkp_annual=54_000_000,
+    )
+    as_float = december.calculate_december(inp)
+    as_rupiah = december.calculate_december(inp, integer=True)
+
+    # 120.000.000 - 6.000.000 - 3.600.000 - 54.000.000 = 56.400.000 PKP at 5%
+    assert as_float["pkp_annual"] == as_rupiah["pkp_annual"] == 56_400_000
+    assert as_float["pph21_annual"] == as_rupiah["pph21_annual"] == 2_820_000
+    assert as_float["koreksi_pph21"] == as_rupiah["koreksi_pph21"] == 1_820_000
+    assert as_float["rate"] == "5%/15%/25%/30%/35%"
+
+
+def test_progressive_year_over_plain_slips():
+    result = progressive.calculate_progressive_year(
+        [_slip(10_000_000)] * 12, 54_000_000, pph21_paid_jan_nov=3_000_000
+    )
+    # PKP 66.000.000: 60.000.000 × 5% + 6.000.000 × 15%
+    assert result["pph21_annual"] == 3_900_000
+    assert result["koreksi_pph21"] == 900_000
+    rupiah = progressive.calculate_progressive_year(
+        [_slip(10_000_000)] * 12, 54_000_000, pph21_paid_jan_nov=3_000_000, integer=True
+    )
+    assert rupiah["pph21_annual"] == 3_900_000
+
+
+def test_ter_slip_reports_missing_rate():
+    indexes, _ = compile_ter_brackets(
+        [{"ter_code": "A", "min_income": 5_000_000, "max_income": 0, "rate_percent": 2}]
+    )
+    params = ter.TERParams(5.0, 500_000.0, brackets=TERTable(indexes, []).indexes)
+
+    result, agg, unmatched = ter.calculate_ter_slip(
+        ter.TERSlipInput(_slip(10_000_000), True, 54_000_000, "A"), params
+    )
+    assert (result["pph21"], result["biaya_jabatan"], unmatched) == (200_000, 500_000.0, None)
+    assert agg.bruto == 10_000_000
+
+    result, _, unmatched = ter.calculate_ter_slip(ter.TERSlipInput(1_000_000, True, 0, "A"), params)
+    assert (result["rate"], unmatched) == (0.0, ("A", True))
+    _, _, unmatched = ter.calculate_ter_slip(ter.TERSlipInput(1_000_000, True, 0, "B"), params)
+    assert unmatched == ("B", False)
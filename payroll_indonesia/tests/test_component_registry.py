@@ -0,0 +1,104 @@
+import types
+import importlib
+
+
+def _load(frappe, component_rows=()):
+    class Meta:
+        def has_field(self, fieldname):
+            return fieldname != "is_pengurang_netto"
+
+    store = {}
+    calls = {"get_all": 0}
+
+    def get_all(doctype, fields=None, **kwargs):
+        calls["get_all"] += 1
+        return [dict(r) for r in component_rows]
+
+    frappe.get_meta = lambda doctype: Meta()
+    frappe.get_all = get_all
+    frappe.generate_hash = lambda length=10: str(len(store) + calls["get_all"] + 1)
+    frappe.cache = lambda: types.SimpleNamespace(
+        get_value=store.get, set_value=lambda k, v: store.__setitem__(k, v)
+    )
+
+    return importlib.import_module("payroll_indonesia.config.component_registry"), calls
+
+
+def test_component_roles_from_names(fake_frappe):
+    registry_mod, _ = _load(fake_frappe)
+    Role = registry_mod.ComponentRole
+    registry = registry_mod.ComponentRegistry()
+
+    jht = registry.get("BPJS JHT Employee")
+    assert jht.role == Role.BPJS_JHT
+    assert jht.has(registry_mod.EMPLOYEE) and jht.has(registry_mod.PENGURANG_NETTO_NAME)
+    assert registry.get("BPJS JKK Employer").has(registry_mod.EMPLOYER)
+    assert registry.get("Contra BPJS JHT Employer").role == Role.OTHER
+    assert registry.get("Tunjangan Biaya Jabatan").role == Role.BIAYA_JABATAN
+    assert registry.get(" PPh-21 ").role == Role.PPH21
+    assert registry.get("Gaji Pokok").flags == 0
+    # Unknown names are classified without growing the shared registry
+    assert len(registry) == 0
+
+    # Row fields override the component flags
+    row = {"salary_component": "Gaji Pokok", "is_tax_applicable": 1, "statistical_component": 0}
+    assert registry.row_flags(row) == registry_mod.ComponentFlag.TAX_APPLICABLE
+
+
+def test_registry_flags_feed_helpers_and_refresh(fake_frappe):
+    rows = [
+        {"name": "Iuran Koperasi", "is_income_tax_component": 0, "is_pengurang_netto": 1},
+        {"name": "Gaji Pokok", "is_tax_applicable": 1},
+    ]
+    registry_mod, calls = _load(fake_frappe, rows)
+    pph21_ter = importlib.import_module("payroll_indonesia.config.pph21_ter")
+
+    registry = registry_mod.build_component_registry(rows)
+    slip = {
+        "deductions": [
+            {"salary_component": "Iuran Koperasi", "amount": 100, "is_pengurang_netto": 1},
+            {"salary_component": "BPJS JP Employee", "amount": 50},
+            {"salary_component": "Biaya Jabatan", "amount": 25, "is_pengurang_netto": 1},
+        ],
+        "earnings": [
+            {"salary_component": "Gaji Pokok", "amount": 1_000, "is_tax_applicable": 1},
+            {"salary_component": "Gaji Pokok", "amount": 7, "statistical_component": 1},
+        ],
+    }
+    assert pph21_ter.sum_pengurang_netto(slip, registry) == 150
+    assert pph21_ter.sum_bruto_earnings(slip, registry) == 1_000
+    assert pph21_ter.get_biaya_jabatan_from_component(slip, registry) == 25
+
+    first = registry_mod.get_component_registry()
+    assert registry_mod.get_component_registry() is first
+    assert calls["get_all"] == 1
+
+    registry_mod.clear_component_registry()
+    assert registry_mod.get_component_registry() is not first
+    assert calls["get_all"] == 2
+
+
+def test_missing_row_flags_count_as_zero(fake_frappe):
+    # Regression: flag fields absent from a Salary Detail row are 0, as before
+    # the registry, even when the Salary Component itself has them set
+    rows = [
+        {"name": "Iuran Koperasi", "is_pengurang_netto": 1},
+        {"name": "Tunjangan Makan", "is_income_tax_component": 1, "is_tax_applicable": 1},
+    ]
+    registry_mod, _ = _load(fake_frappe, rows)
+    pph21_ter = importlib.import_module("payroll_indonesia.config.pph21_ter")
+
+    registry = registry_mod.build_component_registry(rows)
+    slip = {
+        "deductions": [
+            {"salary_component": "Iuran Koperasi", "amount": 100},
+            {"salary_component": "BPJS JP Employee", "amount": 50},
+        ],
+        "earnings": [
+            {"salary_component": "Tunjangan Makan", "amount": 300},
+            {"salary_component": "Gaji Pokok", "amount": 1_000, "is_tax_applicable": 1},
+        ],
+    }
+    assert pph21_ter.sum_pengurang_netto(slip, registry) == 50
+    assert pph21_ter.sum_bruto_earnings(slip, registry) == 1_000
+    assert registry.row_flags(slip["earnings"][0]) == 0
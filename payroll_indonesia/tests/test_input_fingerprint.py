@@ -0,0 +1,83 @@
+import types
+import copy
+import importlib
+
+
+BASE_TABLES = {
+    "Salary Structure Assignment": [
+        {"employee": "EMP1", "name": "SSA-2", "salary_structure": "Staff", "from_date": "2024-06-01",
+         "base": 9_000_000, "variable": 0, "modified": "2024-06-01 10:00:00"},
+        {"employee": "EMP1", "name": "SSA-1", "salary_structure": "Staff", "from_date": "2024-01-01",
+         "base": 8_000_000, "variable": 0, "modified": "2024-01-01 10:00:00"},
+        {"employee": "EMP2", "name": "SSA-3", "salary_structure": "Staff", "from_date": "2024-01-01",
+         "base": 7_000_000, "variable": 0, "modified": "2024-01-01 10:00:00"},
+    ],
+    "Additional Salary": [
+        {"employee": "EMP2", "name": "ADS-1", "salary_component": "Bonus", "amount": 500_000,
+         "payroll_date": "2024-07-15", "is_recurring": 0, "modified": "2024-07-01"},
+        {"employee": "EMP1", "name": "ADS-2", "salary_component": "Tunjangan", "amount": 100_000,
+         "is_recurring": 1, "from_date": "2023-01-01", "to_date": "2023-12-31", "modified": "2023-01-01"},
+    ],
+    "Employee": [
+        {"name": "EMP1", "tax_status": "TK/0", "employment_type": "Full-time", "status": "Active"},
+        {"name": "EMP2", "tax_status": "K/1", "employment_type": "Full-time", "status": "Active"},
+    ],
+    "Attendance": [],
+    "Leave Application": [],
+}
+
+
+def _load(frappe, tables):
+    queries = []
+
+    def get_all(doctype, **kwargs):
+        queries.append(doctype)
+        return [dict(row) for row in tables[doctype]]
+
+    frappe.get_all = get_all
+    frappe.get_meta = lambda doctype: types.SimpleNamespace(has_field=lambda f: f != "npwp_no")
+    return importlib.import_module("payroll_indonesia.utils.fingerprint"), queries
+
+
+def _fingerprints(frappe, tables, **kwargs):
+    module, queries = _load(frappe, tables)
+    args = dict(settings_version="v1", tax_mode="TER")
+    args.update(kwargs)
+    return module.compute_input_fingerprints(["EMP2", "EMP1"], "2024-07-01", "2024-07-31", **args), queries
+
+
+def test_fingerprint_is_stable_and_uses_fixed_queries(fake_frappe):
+    first, queries = _fingerprints(fake_frappe, BASE_TABLES)
+    second, _ = _fingerprints(fake_frappe, copy.deepcopy(BASE_TABLES))
+
+    assert first == second
+    assert set(first) == {"EMP1", "EMP2"} and first["EMP1"] != first["EMP2"]
+    assert len(queries) == 5
+
+
+def test_fingerprint_changes_only_for_changed_employee(fake_frappe):
+    base, _ = _fingerprints(fake_frappe, BASE_TABLES)
+
+    tables = copy.deepcopy(BASE_TABLES)
+    tables["Salary Structure Assignment"][0]["base"] = 9_500_000
+    changed, _ = _fingerprints(fake_frappe, tables)
+    assert changed["EMP1"] != base["EMP1"]
+    assert changed["EMP2"] == base["EMP2"]
+
+    # Superseded assignment and a recurring salary outside the period do not matter
+    tables = copy.deepcopy(BASE_TABLES)
+    tables["Salary Structure Assignment"][1]["base"] = 1
+    tables["Additional Salary"][1]["amount"] = 1
+    unchanged, _ = _fingerprints(fake_frappe, tables)
+    assert unchanged == base
+
+    tables = copy.deepcopy(BASE_TABLES)
+    tables["Employee"][1]["tax_status"] = "K/2"
+    changed, _ = _fingerprints(fake_frappe, tables)
+    assert changed["EMP2"] != base["EMP2"] and changed["EMP1"] == base["EMP1"]
+
+    # Settings version and tax mode apply to everyone
+    changed, _ = _fingerprints(fake_frappe, BASE_TABLES, settings_version="v2")
+    assert changed["EMP1"] != base["EMP1"] and changed["EMP2"] != base["EMP2"]
+    changed, _ = _fingerprints(fake_frappe, BASE_TABLES, tax_mode="DECEMBER")
+    assert changed["EMP1"] != base["EMP1"]
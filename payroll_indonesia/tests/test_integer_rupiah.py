@@ -0,0 +1,118 @@
+import types
+import random
+import importlib
+
+import pytest
+
+
+def _load(frappe):
+    def fail(*a, **k):
+        pytest.fail("settings must not be read during the calculation")
+
+    frappe.get_all = fail
+    frappe.get_cached_doc = fail
+    frappe.db = types.SimpleNamespace(exists=fail)
+
+    snapshot_mod = importlib.import_module("payroll_indonesia.config.snapshot")
+    ter_index = importlib.import_module("payroll_indonesia.config.ter_index")
+    tax_status = importlib.import_module("payroll_indonesia.config.tax_status")
+
+    indexes, issues = ter_index.compile_ter_brackets(
+        [
+            {"ter_code": "A", "min_income": 0, "max_income": 5_400_000, "rate_percent": 0},
+            {"ter_code": "A", "min_income": 5_400_001, "max_income": 5_650_000, "rate_percent": 0.25},
+            {"ter_code": "A", "min_income": 5_650_001, "max_income": 0, "rate_percent": 1.75},
+            {"ter_code": "B", "min_income": 0, "max_income": 0, "rate_percent": 2},
+        ]
+    )
+
+    def make(integer_rupiah):
+        return snapshot_mod.PayrollSettingsSnapshot(
+            version="test",
+            values={"biaya_jabatan_rate": 5.0, "biaya_jabatan_cap_yearly": 6_000_000.0},
+            pph21_method="TER",
+            ptkp_map={
+                "TK/0": tax_status.TaxStatusInfo("TK/0", 54_000_000.0, "A"),
+                "K/1": tax_status.TaxStatusInfo("K/1", 63_000_000.0, "B"),
+            },
+            ter_table=ter_index.TERTable(indexes, issues),
+            tax_slabs=[(60_000_000, 5), (250_000_000, 15), (float("inf"), 25)],
+            integer_rupiah=integer_rupiah,
+        )
+
+    return make(False), make(True)
+
+
+def test_rupiah_helpers():
+    from payroll_indonesia.utils import rupiah
+
+    assert rupiah.to_rupiah(2.5) == 3
+    assert rupiah.to_rupiah(-2.5) == -3
+    assert rupiah.to_rupiah(None) == 0
+    assert rupiah.to_rupiah("1000.49") == 1000
+    assert rupiah.div_half_up(5, 2) == 3
+    assert rupiah.div_half_up(-5, 2) == -3
+    assert rupiah.to_basis_points(1.75) == 175
+    assert rupiah.apply_basis_points(1_000_001, 175) == 17_500
+
+
+def test_tax_for_rupiah_matches_float(fake_frappe):
+    float_settings, int_settings = _load(fake_frappe)
+    slabs = int_settings.tax_slabs
+    for pkp in (0, 1_000, 59_999_000, 60_000_000, 60_001_000, 249_999_000, 600_000_000):
+        result = slabs.tax_for_rupiah(pkp)
+        assert isinstance(result, int)
+        assert result == round(float_settings.tax_slabs.tax_for(pkp))
+
+
+def test_ter_integer_mode_matches_float_and_batch(fake_frappe):
+    float_settings, int_settings = _load(fake_frappe)
+    pph21_ter = importlib.import_module("payroll_indonesia.config.pph21_ter")
+    batch = importlib.import_module("payroll_indonesia.config.pph21_ter_batch")
+
+    rng = random.Random(8)
+    slips, employees = [], []
+    for _ in range(200):
+        slips.append(
+            {
+                "earnings": [
+                    {"salary_component": "Gaji Pokok", "amount": rng.randrange(1_000_000, 40_000_000),
+                     "is_tax_applicable": 1},
+                ],
+                "deductions": [
+                    {"salary_component": "BPJS JHT Employee", "amount": rng.randrange(0, 400_000)},
+                ],
+            }
+        )
+        employees.append({"employment_type": "Full-time", "tax_status": rng.choice(["TK/0", "K/1"])})
+
+    batch_results = batch.calculate_pph21_TER_batch(slips, employees, settings=int_settings)
+    for slip, employee, from_batch in zip(slips, employees, batch_results):
+        exact = pph21_ter.calculate_pph21_TER(slip, employee, "CMP", bulan=5, settings=int_settings)
+        legacy = pph21_ter.calculate_pph21_TER(slip, employee, "CMP", bulan=5, settings=float_settings)
+        assert exact == from_batch
+        assert isinstance(exact["pph21"], int) and isinstance(exact["netto"], int)
+        assert exact["pph21"] == legacy["pph21"]
+
+
+def test_december_integer_mode(fake_frappe):
+    float_settings, int_settings = _load(fake_frappe)
+    december = importlib.import_module("payroll_indonesia.config.pph21_ter_december")
+    kwargs = dict(
+        employee={"employment_type": "Full-time", "tax_status": "TK/0"},
+        company="CMP",
+        ytd_bruto_jan_nov=110_000_000,
+        ytd_netto_jan_nov=104_500_000,
+        ytd_tax_paid_jan_nov=2_750_000.4,
+        bruto_desember=12_345_678.6,
+        pengurang_netto_desember=200_000,
+        biaya_jabatan_desember=500_000,
+        jp_jht_employee_month=300_000,
+    )
+    exact = december.calculate_pph21_december(settings=int_settings, **kwargs)
+    legacy = december.calculate_pph21_december(settings=float_settings, **kwargs)
+
+    assert isinstance(exact["pph21_annual"], int)
+    assert exact["pkp_annual"] == legacy["pkp_annual"]
+    assert exact["pph21_annual"] == legacy["pph21_annual"]
+    assert exact["koreksi_pph21"] == exact["pph21_annual"] - 2_750_000
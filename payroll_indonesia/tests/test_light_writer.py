@@ -0,0 +1,45 @@
+import types
+import importlib
+
+import pytest
+
+
+def _load(frappe):
+    statements = []
+    frappe.db = types.SimpleNamespace(sql=lambda query, values=None: statements.append((query, values)))
+    return importlib.import_module("payroll_indonesia.utils.light_writer"), statements
+
+
+def test_flush_writes_chunk_in_one_statement(fake_frappe):
+    module, statements = _load(fake_frappe)
+    writer = module.LightFieldWriter("Salary Slip", {"tax", "tax_type", "pph21_info"})
+    for i in range(100):
+        writer.set(f"SS-{i}", "tax", i * 1000)
+        writer.set(f"SS-{i}", "tax_type", "DECEMBER")
+    writer.set("SS-0", "pph21_info", "{}")
+    writer.discard("SS-99")
+
+    assert writer.flush() == 1
+    assert len(writer) == 0
+
+    query, values = statements[0]
+    assert query.startswith("UPDATE `tabSalary Slip` SET `pph21_info` = CASE `name` WHEN %s THEN %s ELSE `pph21_info` END")
+    assert "`tax` = CASE `name`" in query and "`tax_type` = CASE `name`" in query
+    assert "modified" not in query
+    assert query.count("%s") == len(values)
+    # pph21_info (1 slip) + tax (99) + tax_type (99), then the 99 names of the WHERE
+    assert values[:2] == ["SS-0", "{}"]
+    assert values[-99:] == [f"SS-{i}" for i in range(99)]
+
+
+def test_flush_batches_and_rejects_unknown_fields(fake_frappe, monkeypatch):
+    module, statements = _load(fake_frappe)
+    monkeypatch.setattr(module, "FLUSH_BATCH_SIZE", 40)
+    writer = module.LightFieldWriter("Salary Slip", {"tax"})
+    for i in range(100):
+        writer.set(f"SS-{i}", "tax", i)
+
+    assert writer.flush() == 3
+    assert writer.flush() == 0
+    with pytest.raises(ValueError):
+        writer.set("SS-1", "net_pay; DROP TABLE x", 0)
@@ -0,0 +1,48 @@
+import types
+
+from payroll_indonesia.utils.monthly_detail_index import MonthlyDetailIndex, get_detail_index
+
+
+class HistoryDoc:
+    def __init__(self, rows):
+        self.monthly_details = rows
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+
+def _row(slip, bulan):
+    return types.SimpleNamespace(salary_slip=slip, bulan=bulan)
+
+
+def test_lookups_follow_row_order_and_edits():
+    rows = [_row("SS-1", 1), _row(None, 2), _row("SS-3", 2), _row("SS-1", 3)]
+    history = HistoryDoc(rows)
+    index = get_detail_index(history)
+
+    assert index.find_slip("SS-1") is rows[0]
+    assert index.find_month(2) is rows[1]
+    assert index.rows_for_slip("SS-1") == [rows[0], rows[3]]
+    assert list(index.rows_in_months(1, 2)) == [rows[0], rows[1], rows[2]]
+    assert get_detail_index(history) is index
+
+    # Re-keyed row moves between months
+    rows[1].bulan = 4
+    index.update(rows[1])
+    assert index.find_month(2) is rows[2] and index.find_month(4) is rows[1]
+
+    index.remove(rows[0])
+    assert history.monthly_details[0].bulan == 4
+    assert index.rows_for_slip("SS-1") == [history.monthly_details[2]]
+
+    # Rows changed behind the index's back: rebuilt on the next lookup
+    history.monthly_details.append(_row("SS-5", 5))
+    rebuilt = get_detail_index(history)
+    assert rebuilt is not index and rebuilt.find_slip("SS-5").bulan == 5
+
+
+def test_dict_rows():
+    details = [{"salary_slip": "SS-1", "bulan": "1"}]
+    index = MonthlyDetailIndex(details)
+    assert index.find_month(1) is details[0]
+    assert index.find_slip("SS-2") is None and index.rows_for_slip(None) == []
@@ -0,0 +1,154 @@
+import datetime
+import json
+import types
+import importlib
+
+import pytest
+
+
+def _load(frappe, monkeypatch):
+    calls = {"savepoint": [], "rollback": [], "built": []}
+
+    class FakeSlip:
+        def __init__(self, data):
+            self.__dict__.update(data)
+            self.tax = 0
+            self.pph21_info = None
+
+        def get_emp_and_working_day_details(self):
+            if self.employee == "EMP-NOSTRUCT":
+                raise Exception("No salary structure")
+            calls["built"].append(self.employee)
+
+        def save(self, *a, **k):
+            raise AssertionError("preview must not save")
+
+        def insert(self, *a, **k):
+            raise AssertionError("preview must not insert")
+
+    frappe.db = types.SimpleNamespace(
+        sql=lambda *a, **k: [],
+        savepoint=lambda name: calls["savepoint"].append(name),
+        rollback=lambda save_point=None: calls["rollback"].append(save_point),
+    )
+    frappe.get_doc = lambda data: FakeSlip(data)
+
+    module = importlib.import_module("payroll_indonesia.override.payroll_entry")
+    monkeypatch.setattr(module, "build_settings_snapshot", lambda: types.SimpleNamespace(version="v1"))
+    return module, calls
+
+
+def _entry(module, december=False, employees=("EMP-1", "EMP-2")):
+    entry = module.CustomPayrollEntry()
+    entry.name = "PE-1"
+    entry.company = "PT Test"
+    entry.start_date = "2025-12-01"
+    entry.end_date = "2025-12-31"
+    entry.run_payroll_indonesia_december = december
+    entry.employees = [types.SimpleNamespace(employee=e) for e in employees]
+    modes = []
+
+    def ter(slip_obj):
+        slip_obj.tax = 250000.0
+        slip_obj.tax_type = "TER"
+        slip_obj.pph21_info = json.dumps(
+            {"bruto": 10000000, "netto": 9500000, "pkp": 0, "rate": 2.5, "pph21": 250000}
+        )
+
+    def december_calc(slip_obj):
+        slip_obj.tax = -100000.0
+        slip_obj.tax_type = "DECEMBER"
+        slip_obj.pph21_info = json.dumps({
+            "bruto_total": 120000000, "netto_total": 114000000, "pkp_annual": 60000000,
+            "rate": "5%", "pph21_bulan": -100000, "koreksi_pph21": -100000,
+        })
+
+    def get_tax_calculators(tax_mode):
+        modes.append(tax_mode)
+        return (december_calc if tax_mode == module.TAX_MODE_DECEMBER else ter), None
+
+    entry._get_tax_calculators = get_tax_calculators
+    return entry, modes
+
+
+def test_preview_ter_rows_without_persisting(fake_frappe, monkeypatch):
+    module, calls = _load(fake_frappe, monkeypatch)
+    entry, modes = _entry(module, employees=("EMP-1", "EMP-NOSTRUCT", "EMP-2"))
+
+    rows = entry.preview_salary_slips()
+
+    assert modes == [module.TAX_MODE_TER]
+    assert calls["built"] == ["EMP-1", "EMP-2"]
+    by_employee = {row["employee"]: row for row in rows}
+    assert by_employee["EMP-1"]["bruto"] == 10000000
+    assert by_employee["EMP-1"]["pph21"] == 250000
+    assert by_employee["EMP-1"]["rate"] == 2.5
+    assert by_employee["EMP-1"]["koreksi"] == 0
+    assert by_employee["EMP-NOSTRUCT"]["error"] == "No salary structure"
+    # Everything ran inside a savepoint that was rolled back
+    assert calls["savepoint"] == ["payroll_indonesia_preview"]
+    assert calls["rollback"] == ["payroll_indonesia_preview"]
+
+
+def test_preview_december_uses_annual_keys(fake_frappe, monkeypatch):
+    module, _ = _load(fake_frappe, monkeypatch)
+    entry, modes = _entry(module, december=True, employees=("EMP-1",))
+
+    rows = entry.preview_salary_slips()
+
+    assert modes == [module.TAX_MODE_DECEMBER]
+    assert rows == [{
+        "employee": "EMP-1",
+        "employee_name": None,
+        "tax_type": "DECEMBER",
+        "bruto": 120000000,
+        "netto": 114000000,
+        "pkp": 60000000,
+        "rate": "5%",
+        "pph21": -100000,
+        "koreksi": -100000,
+    }]
+
+
+def test_preview_requires_payroll_role(fake_frappe, monkeypatch):
+    module, _ = _load(fake_frappe, monkeypatch)
+    frappe = module.frappe
+    checked = []
+
+    def only_for(roles):
+        checked.append(roles)
+        raise frappe.ValidationError("Not permitted")
+
+    frappe.only_for = only_for
+    frappe.get_doc = lambda doctype, name: pytest.fail("entry must not be read without the role")
+    preview = importlib.import_module("payroll_indonesia.utils.payroll_preview")
+
+    with pytest.raises(frappe.ValidationError):
+        preview.preview_payroll_entry("PE-1")
+    assert checked == [["System Manager", "HR Manager"]]
+
+
+def test_december_preview_does_not_flush_history_queue(fake_frappe, monkeypatch):
+    module, _ = _load(fake_frappe, monkeypatch)
+    entry, _ = _entry(module, december=True, employees=("EMP-1",))
+    flushed, prefetched = [], []
+    monkeypatch.setattr(module, "is_annual_history_write_behind", lambda: True)
+    monkeypatch.setattr(
+        module, "_history_queue", lambda: types.SimpleNamespace(flush=lambda **k: flushed.append(k))
+    )
+    monkeypatch.setattr(
+        module, "get_ytd_jan_nov_bulk", lambda employees, fiscal_year: prefetched.append(employees) or {}
+    )
+
+    def december_calc(slip_obj):
+        entry._prefetch_ytd_jan_nov()
+        slip_obj.pph21_info = "{}"
+
+    entry._get_tax_calculators = lambda tax_mode: (december_calc, None)
+    entry.start_date = datetime.date(2025, 12, 1)
+    entry.preview_salary_slips()
+
+    assert prefetched == [["EMP-1"]] and flushed == []
+    # A real run afterwards flushes and reads YTD again
+    entry._prefetch_ytd_jan_nov()
+    assert len(flushed) == 1 and len(prefetched) == 2
@@ -0,0 +1,160 @@
+import json
+import types
+import importlib
+
+import pytest
+
+
+def _load(frappe, monkeypatch):
+    class Document:
+        def __init__(self, data=None):
+            for key, value in (data or {}).items():
+                setattr(self, key, value)
+
+        def save(self, ignore_permissions=False):
+            self.validate()
+            calls["saves"] += 1
+
+    calls = {"commit": 0, "saves": 0}
+    state = {"checkpoint": None}
+
+    def throw(message, title=None):
+        raise frappe.ValidationError(message)
+
+    def commit():
+        calls["commit"] += 1
+
+    frappe.throw = throw
+    frappe.db = types.SimpleNamespace(
+        commit=commit,
+        sql=lambda *a, **k: [],
+        exists=lambda doctype, name: state["checkpoint"] is not None,
+    )
+    frappe.get_doc = lambda doctype, name=None, for_update=False: state["checkpoint"]
+    frappe.model.document.Document = Document
+
+    checkpoint_mod = importlib.import_module(
+        "payroll_indonesia.payroll_indonesia.doctype.payroll_run_checkpoint.payroll_run_checkpoint"
+    )
+    entry_mod = importlib.import_module("payroll_indonesia.override.payroll_entry")
+    monkeypatch.setattr(entry_mod, "is_auto_queue_salary_slip", lambda: False)
+    return checkpoint_mod, entry_mod, state, calls
+
+
+def _checkpoint(checkpoint_mod, processed, failed, pending, version="v1"):
+    checkpoint = checkpoint_mod.PayrollRunCheckpoint(
+        {"payroll_entry": "PE-1", "status": "In Progress", "tax_mode": "TER", "settings_version": version}
+    )
+    checkpoint.set_slips(processed, failed, pending)
+    return checkpoint
+
+
+def test_chunk_result_moves_slips_out_of_pending(fake_frappe, monkeypatch):
+    checkpoint_mod, _, _, _ = _load(fake_frappe, monkeypatch)
+    checkpoint = _checkpoint(checkpoint_mod, ["SS-0"], {}, ["SS-1", "SS-2", "SS-3", "SS-4"])
+
+    checkpoint.apply_chunk_result(
+        {"processed": ["SS-1", "SS-2"], "invalid": ["SS-3"], "errors": {"SS-3": "boom"}}
+    )
+    checkpoint.validate()
+
+    assert checkpoint.get_processed() == ["SS-0", "SS-1", "SS-2"]
+    assert checkpoint.get_failed() == {"SS-3": "boom"}
+    assert checkpoint.get_pending() == ["SS-4"]
+    assert (checkpoint.processed_count, checkpoint.failed_count, checkpoint.pending_count) == (3, 1, 1)
+    assert checkpoint.total_slips == 5
+    assert json.loads(checkpoint.pending_slips) == ["SS-4"]
+
+
+def _entry(entry_mod, slips, processed_chunks):
+    entry = entry_mod.CustomPayrollEntry()
+    entry.name = "PE-1"
+    entry.finalized = []
+    entry.get_salary_slips = lambda: slips
+    entry._get_tax_calculators = lambda tax_mode: (None, None)
+
+    def process_chunk(names, tax_calculator, batch_calculator, settings_snapshot):
+        processed_chunks.append(list(names))
+        return {"processed": list(names), "invalid": [], "errors": {}, "queries": 0}
+
+    entry._process_slip_chunk = process_chunk
+    entry._finalize_processed_slips = lambda processed, invalid: entry.finalized.append(
+        (list(processed), list(invalid))
+    )
+    return entry
+
+
+def test_resume_processes_only_pending_slips(fake_frappe, monkeypatch):
+    checkpoint_mod, entry_mod, state, calls = _load(fake_frappe, monkeypatch)
+    monkeypatch.setattr(entry_mod, "build_settings_snapshot", lambda: types.SimpleNamespace(version="v1"))
+    state["checkpoint"] = _checkpoint(
+        checkpoint_mod, ["SS-1", "SS-2"], {"SS-3": "boom"}, ["SS-4", "SS-5"]
+    )
+    chunks = []
+    entry = _entry(entry_mod, ["SS-1", "SS-2", "SS-3", "SS-4", "SS-5"], chunks)
+
+    processed = entry.resume_salary_slip_processing()
+
+    assert chunks == [["SS-4", "SS-5"]]
+    assert processed == ["SS-1", "SS-2", "SS-4", "SS-5"]
+    assert entry.finalized == [(["SS-1", "SS-2", "SS-4", "SS-5"], ["SS-3"])]
+    checkpoint = state["checkpoint"]
+    assert checkpoint.get_pending() == []
+    assert checkpoint.status == checkpoint_mod.STATUS_COMPLETED
+    # The chunk was committed together with its checkpoint
+    assert calls["commit"] == 1
+
+
+def test_resume_retry_failed_and_settings_change(fake_frappe, monkeypatch):
+    checkpoint_mod, entry_mod, state, _ = _load(fake_frappe, monkeypatch)
+    monkeypatch.setattr(entry_mod, "build_settings_snapshot", lambda: types.SimpleNamespace(version="v2"))
+    state["checkpoint"] = _checkpoint(checkpoint_mod, ["SS-1"], {"SS-3": "boom"}, [], version="v1")
+    chunks = []
+    entry = _entry(entry_mod, ["SS-1", "SS-3"], chunks)
+
+    # Settings changed since the run started
+    with pytest.raises(entry_mod.frappe.ValidationError):
+        entry.resume_salary_slip_processing(retry_failed=True)
+    assert chunks == []
+
+    state["checkpoint"] = _checkpoint(checkpoint_mod, ["SS-1"], {"SS-3": "boom"}, [], version="v1")
+    entry.resume_salary_slip_processing(retry_failed=True, ignore_settings_change=True)
+    assert chunks == [["SS-3"]]
+    assert state["checkpoint"].get_failed() == {}
+    assert state["checkpoint"].settings_version == "v2"
+
+
+def test_resume_without_pending_slips_raises(fake_frappe, monkeypatch):
+    checkpoint_mod, entry_mod, state, _ = _load(fake_frappe, monkeypatch)
+    monkeypatch.setattr(entry_mod, "build_settings_snapshot", lambda: types.SimpleNamespace(version="v1"))
+    state["checkpoint"] = _checkpoint(checkpoint_mod, ["SS-1"], {"SS-3": "boom"}, [])
+    entry = _entry(entry_mod, ["SS-1", "SS-3"], [])
+
+    with pytest.raises(entry_mod.frappe.ValidationError):
+        entry.resume_salary_slip_processing()
+
+
+def test_stalled_runs_are_marked_and_logged(fake_frappe, monkeypatch):
+    checkpoint_mod, _, _, calls = _load(fake_frappe, monkeypatch)
+    queries, updates, errors = [], [], []
+    checkpoint_mod.frappe.utils.now_datetime = lambda: "now"
+    checkpoint_mod.frappe.utils.add_to_date = lambda date, seconds=0: f"{date}{seconds:+d}s"
+    checkpoint_mod.frappe.get_all = lambda doctype, filters=None, fields=None: queries.append(filters) or [
+        types.SimpleNamespace(
+            name="PE-1", payroll_entry="PE-1", pending_count=4, last_checkpoint="2026-01-31 01:00:00"
+        )
+    ]
+    checkpoint_mod.frappe.db.set_value = lambda doctype, name, field, value, update_modified=True: updates.append(
+        (name, field, value)
+    )
+    checkpoint_mod.frappe.log_error = lambda message=None, title=None: errors.append(title)
+
+    assert checkpoint_mod.mark_stalled_runs() == ["PE-1"]
+    assert queries == [{
+        "status": "In Progress",
+        "pending_count": (">", 0),
+        "last_checkpoint": ("<", f"now-{checkpoint_mod.STALLED_AFTER}s"),
+    }]
+    assert updates == [("PE-1", "status", checkpoint_mod.STATUS_STALLED)]
+    assert errors == ["Payroll Indonesia: stalled payroll run (PE-1)"]
+    assert calls["commit"] == 1
@@ -0,0 +1,153 @@
+import sys
+import types
+import random
+import importlib
+
+import pytest
+
+
+def _load(frappe):
+    def fail(*a, **k):
+        pytest.fail("settings must not be read during the calculation")
+
+    frappe.get_all = fail
+    frappe.get_cached_doc = fail
+    frappe.db = types.SimpleNamespace(exists=fail)
+
+    snapshot_mod = importlib.import_module("payroll_indonesia.config.snapshot")
+    ter_index = importlib.import_module("payroll_indonesia.config.ter_index")
+    tax_status = importlib.import_module("payroll_indonesia.config.tax_status")
+
+    indexes, issues = ter_index.compile_ter_brackets(
+        [
+            {"ter_code": "A", "min_income": 0, "max_income": 5_400_000, "rate_percent": 0},
+            {"ter_code": "A", "min_income": 5_400_001, "max_income": 5_650_000, "rate_percent": 0.25},
+            {"ter_code": "A", "min_income": 5_650_001, "max_income": 0, "rate_percent": 1.75},
+            {"ter_code": "B", "min_income": 6_200_001, "max_income": 0, "rate_percent": 2},
+        ]
+    )
+    snapshot = snapshot_mod.PayrollSettingsSnapshot(
+        version="test",
+        values={"biaya_jabatan_rate": 5.0, "biaya_jabatan_cap_yearly": 6_000_000.0},
+        pph21_method="TER",
+        ptkp_map={
+            "TK/0": tax_status.TaxStatusInfo("TK/0", 54_000_000.0, "A"),
+            "K/1": tax_status.TaxStatusInfo("K/1", 63_000_000.0, "B"),
+            "K/9": tax_status.TaxStatusInfo("K/9", None, "C"),
+        },
+        ter_table=ter_index.TERTable(indexes, issues),
+        tax_slabs=[(60_000_000, 5), (float("inf"), 15)],
+    )
+    pph21_ter = importlib.import_module("payroll_indonesia.config.pph21_ter")
+    batch = importlib.import_module("payroll_indonesia.config.pph21_ter_batch")
+    return pph21_ter, batch, snapshot
+
+
+def _random_slip(rng):
+    earnings = [
+        {"salary_component": "Gaji Pokok", "amount": rng.randrange(1_000_000, 40_000_000),
+         "is_tax_applicable": 1},
+        {"salary_component": "Tunjangan", "amount": rng.randrange(0, 3_000_000) + 0.5,
+         "is_tax_applicable": rng.choice([0, 1])},
+    ]
+    deductions = [
+        {"salary_component": "BPJS JHT Employee", "amount": rng.randrange(0, 400_000)},
+    ]
+    if rng.random() < 0.3:
+        deductions.append({"salary_component": "Biaya Jabatan", "amount": rng.randrange(1, 500_000)})
+    return {"earnings": earnings, "deductions": deductions}
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_batch_matches_scalar(fake_frappe, monkeypatch, use_numpy):
+    pph21_ter, batch, snapshot = _load(fake_frappe)
+    if use_numpy:
+        if batch.np is None:
+            pytest.skip("numpy not installed")
+    else:
+        monkeypatch.setattr(batch, "np", None)
+
+    rng = random.Random(21)
+    slips, employees = [], []
+    for _ in range(300):
+        slips.append(_random_slip(rng))
+        employees.append(
+            {
+                "employment_type": rng.choice(["Full-time", "Full-time", "Part-time"]),
+                "tax_status": rng.choice(["TK/0", "K/1", "K/9", "", "X"]),
+            }
+        )
+    slips.append(7_000_000)
+    employees.append({"employment_type": "Full-time", "tax_status": "TK/0"})
+
+    results = batch.calculate_pph21_TER_batch(slips, employees, settings=snapshot)
+
+    assert len(results) == len(slips)
+    for slip, employee, result in zip(slips, employees, results):
+        expected = pph21_ter.calculate_pph21_TER(
+            slip, employee, "CMP", bulan=5, settings=snapshot
+        )
+        assert result == expected
+
+
+def test_batch_rejects_mismatched_lengths(fake_frappe):
+    _, batch, snapshot = _load(fake_frappe)
+    with pytest.raises(fake_frappe.ValidationError):
+        batch.calculate_pph21_TER_batch([1_000_000], [], settings=snapshot)
+
+
+def _load_slip(frappe, monkeypatch):
+    pph21_ter, batch, snapshot = _load(frappe)
+
+    class SalarySlip:
+        # save() as in frappe: validate, write, then on_update
+        def save(self, ignore_permissions=False):
+            self.validate()
+            self.on_update()
+
+        def validate(self):
+            pass
+
+    hrms_slip = sys.modules["hrms.payroll.doctype.salary_slip.salary_slip"]
+    monkeypatch.setattr(hrms_slip, "SalarySlip", SalarySlip)
+    slip_mod = importlib.import_module("payroll_indonesia.override.salary_slip")
+
+    slip = slip_mod.CustomSalarySlip()
+    slip.name = "SS-1"
+    slip.employee = {"employment_type": "Full-time", "tax_status": "TK/0"}
+    slip.company = "CMP"
+    slip.start_date = None
+    slip.bulan = "Mei"
+    slip.earnings = [{"salary_component": "Gaji Pokok", "amount": 10_000_000, "is_tax_applicable": 1}]
+    slip.deductions = [{"salary_component": "PPh 21", "amount": 0}]
+    slip._settings_snapshot = snapshot
+    slip._recalculate_totals = lambda: None
+    return slip_mod, batch, snapshot, slip
+
+
+def test_batch_result_is_kept_through_save(fake_frappe, monkeypatch):
+    slip_mod, batch, snapshot, slip = _load_slip(fake_frappe, monkeypatch)
+    scalar = []
+    monkeypatch.setattr(
+        slip_mod, "calculate_pph21_TER", lambda **kwargs: scalar.append(kwargs) or {"pph21": 1.0}
+    )
+    result, = batch.calculate_pph21_TER_batch(
+        [slip._calculate_taxable_income()], [slip.employee], settings=snapshot
+    )
+    slip.set_pph21_ter_result(result)
+
+    # Payroll Entry applies the batch result, then save() validates again
+    slip.calculate_income_tax()
+    slip.save()
+
+    assert scalar == []
+    assert slip.tax == result["pph21"] == slip.deductions[0]["amount"]
+    # After the save, or once the rows change, the slip is recalculated
+    assert slip._pph21_ter_result is None
+    slip.save()
+    assert len(scalar) == 1
+
+    slip.set_pph21_ter_result(result)
+    slip.earnings[0]["amount"] = 12_000_000
+    slip.calculate_income_tax()
+    assert len(scalar) == 2 and slip.tax == 1.0
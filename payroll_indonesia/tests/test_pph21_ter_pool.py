@@ -0,0 +1,184 @@
+import sys
+import types
+import random
+import importlib
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+
+def _load(frappe, integer_rupiah=False):
+    class WarningLog:
+        def __init__(self):
+            self.warnings = []
+
+        def warning(self, msg, *a, **k):
+            self.warnings.append(msg)
+
+        def __getattr__(self, name):
+            return lambda *a, **k: None
+
+    def fail(*a, **k):
+        pytest.fail("settings must not be read during the calculation")
+
+    log = WarningLog()
+    frappe.logger = lambda *a, **k: log
+    frappe.get_all = fail
+    frappe.get_cached_doc = fail
+    frappe.db = types.SimpleNamespace(exists=fail)
+
+    snapshot_mod = importlib.import_module("payroll_indonesia.config.snapshot")
+    ter_index = importlib.import_module("payroll_indonesia.config.ter_index")
+    tax_status = importlib.import_module("payroll_indonesia.config.tax_status")
+
+    indexes, issues = ter_index.compile_ter_brackets(
+        [
+            {"ter_code": "A", "min_income": 0, "max_income": 5_400_000, "rate_percent": 0},
+            {"ter_code": "A", "min_income": 5_400_001, "max_income": 5_650_000, "rate_percent": 0.25},
+            {"ter_code": "A", "min_income": 5_650_001, "max_income": 0, "rate_percent": 1.75},
+            {"ter_code": "B", "min_income": 6_200_001, "max_income": 0, "rate_percent": 2},
+        ]
+    )
+    snapshot = snapshot_mod.PayrollSettingsSnapshot(
+        version="test",
+        values={"biaya_jabatan_rate": 5.0, "biaya_jabatan_cap_yearly": 6_000_000.0},
+        pph21_method="TER",
+        ptkp_map={
+            "TK/0": tax_status.TaxStatusInfo("TK/0", 54_000_000.0, "A"),
+            "K/1": tax_status.TaxStatusInfo("K/1", 63_000_000.0, "B"),
+            "K/9": tax_status.TaxStatusInfo("K/9", None, "C"),
+        },
+        ter_table=ter_index.TERTable(indexes, issues),
+        tax_slabs=[(60_000_000, 5), (float("inf"), 15)],
+        integer_rupiah=integer_rupiah,
+    )
+    batch = importlib.import_module("payroll_indonesia.config.pph21_ter_batch")
+    pool = importlib.import_module("payroll_indonesia.config.pph21_ter_pool")
+    return batch, pool, snapshot, log
+
+
+class Row(types.SimpleNamespace):
+    """Child table row as a document: attributes plus ``get``."""
+
+    def get(self, field, default=None):
+        return getattr(self, field, default)
+
+
+def _inputs(count, seed=18):
+    rng = random.Random(seed)
+    slips, employees = [], []
+    for _ in range(count):
+        deductions = [
+            Row(salary_component="BPJS JHT Employee", amount=rng.randrange(0, 400_000)),
+            {"salary_component": "PPh 21", "amount": 0},
+        ]
+        if rng.random() < 0.3:
+            deductions.append({"salary_component": "Biaya Jabatan", "amount": rng.randrange(1, 500_000)})
+        slips.append({
+            "earnings": [
+                {"salary_component": "Gaji Pokok", "amount": rng.randrange(1_000_000, 40_000_000),
+                 "is_tax_applicable": 1},
+                {"salary_component": "Tunjangan", "amount": rng.randrange(0, 3_000_000) + 0.5,
+                 "is_tax_applicable": rng.choice([0, 1])},
+            ],
+            "deductions": deductions,
+        })
+        employees.append({
+            "employment_type": rng.choice(["Full-time", "Full-time", "Part-time"]),
+            "tax_status": rng.choice(["TK/0", "K/1", "K/9", "", "X"]),
+        })
+    slips.append(7_000_000)
+    employees.append({"employment_type": "Full-time", "tax_status": "TK/0"})
+    return slips, employees
+
+
+@pytest.mark.parametrize("integer_rupiah", [False, True])
+def test_pool_matches_batch(fake_frappe, integer_rupiah):
+    batch, pool, snapshot, _ = _load(fake_frappe, integer_rupiah)
+    slips, employees = _inputs(250)
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results, aggregates = pool.calculate_pph21_TER_pool(
+            slips, employees, executor, settings=snapshot, chunk_size=40
+        )
+
+    assert results == batch.calculate_pph21_TER_batch(slips, employees, settings=snapshot)
+    for slip, employee, aggregate in zip(slips, employees, aggregates):
+        if employee["employment_type"] != "Full-time" or not isinstance(slip, dict):
+            assert aggregate is None
+        else:
+            assert aggregate.pph21_row_index == 1
+
+
+def test_pool_merges_warnings_across_chunks(fake_frappe):
+    _, pool, snapshot, log = _load(fake_frappe)
+    slips = [{"earnings": [{"salary_component": "Gaji Pokok", "amount": 1_000_000}], "deductions": []}] * 5
+    employees = [{"employment_type": "Full-time", "tax_status": "K/9"}] * 5
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        pool.calculate_pph21_TER_pool(slips, employees, executor, settings=snapshot, chunk_size=2)
+
+    assert log.warnings == [
+        "PTKP Table: tax_status 'K/9' not found (5 slips), PTKP set to 0.",
+        "TER Bracket Table: No brackets found for ter_code 'C' (5 slips).",
+    ]
+
+
+def test_process_pool_runs_without_frappe(fake_frappe):
+    # Spawned workers import only payroll_indonesia.engine, never the frappe stub
+    batch, pool, snapshot, _ = _load(fake_frappe)
+    slips, employees = _inputs(30, seed=7)
+
+    executor = pool.create_executor(2)
+    try:
+        results, _ = pool.calculate_pph21_TER_pool(slips, employees, executor, settings=snapshot, chunk_size=10)
+    finally:
+        executor.shutdown(wait=True)
+
+    assert results == batch.calculate_pph21_TER_batch(slips, employees, settings=snapshot)
+
+
+def test_pool_result_is_persisted_by_save(fake_frappe, monkeypatch):
+    batch, pool, snapshot, _ = _load(fake_frappe)
+    saved = []
+
+    class SalarySlip:
+        # save() as in frappe: validate, write the fields, then on_update
+        def save(self, ignore_permissions=False):
+            self.validate()
+            saved.append((self.tax, self.deductions[0]["amount"]))
+            self.on_update()
+
+        def validate(self):
+            pass
+
+    hrms_slip = sys.modules["hrms.payroll.doctype.salary_slip.salary_slip"]
+    monkeypatch.setattr(hrms_slip, "SalarySlip", SalarySlip)
+    entry_mod = importlib.import_module("payroll_indonesia.override.payroll_entry")
+    slip_mod = importlib.import_module("payroll_indonesia.override.salary_slip")
+    # Any in-process recalculation would persist this instead of the pool result
+    monkeypatch.setattr(slip_mod, "calculate_pph21_TER", lambda **kwargs: {"pph21": 1.0})
+
+    slip = slip_mod.CustomSalarySlip()
+    slip.name = "SS-1"
+    slip.employee = {"employment_type": "Full-time", "tax_status": "TK/0"}
+    slip.company = "CMP"
+    slip.earnings = [{"salary_component": "Gaji Pokok", "amount": 10_000_000, "is_tax_applicable": 1}]
+    slip.deductions = [{"salary_component": "PPh 21", "amount": 0}]
+    slip._settings_snapshot = snapshot
+    slip._recalculate_totals = lambda: None
+
+    entry = entry_mod.CustomPayrollEntry()
+    entry.name = "PE-1"
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        entry._calculation_pool = executor
+        taxable = [slip._calculate_taxable_income()]
+        assert entry._calculate_ter_in_pool([slip], taxable, snapshot)
+    expected = batch.calculate_pph21_TER_batch(taxable, [slip.employee], settings=snapshot)[0]["pph21"]
+
+    # Payroll Entry applies the pool result, then saves the slip
+    slip.calculate_income_tax()
+    slip.save()
+
+    assert expected > 1.0
+    assert saved == [(expected, expected)]
@@ -0,0 +1,218 @@
+import types
+import importlib
+
+
+class FakeCache:
+    def __init__(self):
+        self.hashes = {}
+        self.counters = {}
+        self.expiry = {}
+
+    def make_key(self, key):
+        return f"site|{key}"
+
+    def hset(self, name, key, value):
+        self.hashes.setdefault(name, {})[key] = value
+
+    def hgetall(self, name):
+        return dict(self.hashes.get(name, {}))
+
+    def incr(self, key):
+        self.counters[key] = self.counters.get(key, 0) + 1
+        return self.counters[key]
+
+    def delete_value(self, name):
+        self.hashes.pop(name, None)
+
+    def delete(self, key):
+        self.counters.pop(key, None)
+
+    def expire(self, key, seconds):
+        self.expiry[key] = seconds
+
+
+def _load(frappe):
+    cache = FakeCache()
+    calls = {"commit": 0, "rollback": 0, "errors": []}
+
+    def commit():
+        calls["commit"] += 1
+
+    def rollback():
+        calls["rollback"] += 1
+
+    frappe.log_error = lambda *a, **k: calls["errors"].append(k.get("title"))
+    frappe.cache = lambda: cache
+    frappe.db = types.SimpleNamespace(commit=commit, rollback=rollback, sql=lambda *a, **k: [])
+
+    module = importlib.import_module("payroll_indonesia.override.payroll_entry")
+    return module, frappe, cache, calls
+
+
+class FakeEntry:
+    def __init__(self, failing_slip=None):
+        self.failing_slip = failing_slip
+        self.finalized = []
+
+    def _get_tax_calculators(self, tax_mode):
+        return None, None
+
+    def _process_slip_chunk(self, names, tax_calculator, batch_calculator, settings_snapshot):
+        if self.failing_slip in names:
+            raise RuntimeError("worker died")
+        return {"processed": [n for n in names if n != "SS-BAD"], "invalid": ["SS-BAD"] if "SS-BAD" in names else [],
+                "errors": {"SS-BAD": "boom"} if "SS-BAD" in names else {}}
+
+    def _finalize_processed_slips(self, processed, invalid):
+        self.finalized.append((list(processed), list(invalid)))
+
+
+def test_last_chunk_merges_results(fake_frappe):
+    module, frappe, cache, calls = _load(fake_frappe)
+    entry = FakeEntry()
+    frappe.get_doc = lambda doctype, name: entry
+
+    chunks = [["SS-1", "SS-2"], ["SS-3", "SS-BAD"], ["SS-4"]]
+    for index, chunk in enumerate(chunks):
+        module.process_salary_slip_chunk("PE-1", "run1", index, len(chunks), chunk, "TER", settings_snapshot=object())
+        # Only the job completing the last chunk finalizes
+        assert len(entry.finalized) == (1 if index == len(chunks) - 1 else 0)
+
+    processed, invalid = entry.finalized[0]
+    assert processed == ["SS-1", "SS-2", "SS-3", "SS-4"]
+    assert invalid == ["SS-BAD"]
+    assert calls["commit"] == len(chunks) + 1
+    # Results hash and counter expire in case a chunk job never finishes
+    assert cache.expiry == {
+        "site|payroll_indonesia:slip_chunks:run1": module.CHUNK_RESULTS_TTL,
+        "site|payroll_indonesia:slip_chunks_done:run1": module.CHUNK_RESULTS_TTL,
+    }
+    # Per-chunk state is cleaned up
+    assert cache.hashes == {} and cache.counters == {}
+
+
+def test_failed_chunk_rolls_back_and_reports(fake_frappe):
+    module, frappe, cache, calls = _load(fake_frappe)
+    entry = FakeEntry(failing_slip="SS-3")
+    frappe.get_doc = lambda doctype, name: entry
+
+    module.process_salary_slip_chunk("PE-1", "run2", 0, 2, ["SS-1"], "DECEMBER", settings_snapshot=object())
+    module.process_salary_slip_chunk("PE-1", "run2", 1, 2, ["SS-3"], "DECEMBER", settings_snapshot=object())
+
+    assert calls["rollback"] == 1
+    assert entry.finalized == [(["SS-1"], [])]
+    assert "Payroll Indonesia Chunk Processing Error" in calls["errors"]
+    assert any(title and "1 salary slips failed" in title for title in calls["errors"])
+
+
+class DeadlockError(Exception):
+    pass
+
+
+class FakeSlip:
+    def __init__(self, name, submit_errors):
+        self.name = name
+        self.docstatus = 0
+        self.submit_errors = submit_errors
+        self.submitted = 0
+
+    def save(self, ignore_permissions=False):
+        pass
+
+    def submit(self):
+        # The slip's Annual Payroll History sync hits a deadlock once
+        if self.submit_errors:
+            raise self.submit_errors.pop(0)
+        self.submitted += 1
+        self.docstatus = 1
+
+
+def test_deadlock_in_slip_sync_retries_the_chunk(fake_frappe, monkeypatch):
+    module, frappe, cache, calls = _load(fake_frappe)
+    frappe.QueryDeadlockError = DeadlockError
+    frappe.get_meta = lambda doctype: types.SimpleNamespace(has_field=lambda field: False)
+    submit_errors = [DeadlockError("Deadlock found when trying to get lock")]
+    slips = []
+
+    def load_salary_slips(names):
+        # Every attempt reloads the chunk from the database
+        slips[:] = [FakeSlip(name, submit_errors) for name in names]
+        return {slip.name: slip for slip in slips}
+
+    monkeypatch.setattr(module, "load_salary_slips", load_salary_slips)
+    monkeypatch.setattr(module, "_record_checkpoint", lambda payroll_entry, result: None)
+    monkeypatch.setattr(module.time, "sleep", lambda seconds: None)
+    cleanups = []
+    monkeypatch.setattr(module, "sync_annual_payroll_history", lambda **kwargs: cleanups.append(kwargs))
+
+    entry = module.CustomPayrollEntry.__new__(module.CustomPayrollEntry)
+    entry.name = "PE-1"
+    entry.auto_submit_salary_slips = 1
+    entry._get_tax_calculators = lambda tax_mode: (lambda slip: None, None)
+    finalized = []
+    entry._finalize_processed_slips = lambda processed, invalid: finalized.append((processed, invalid))
+    frappe.get_doc = lambda doctype, name: entry
+
+    module.process_salary_slip_chunk("PE-1", "run3", 0, 1, ["SS-1", "SS-2"], "TER", settings_snapshot=object())
+
+    # Rolled back and run again instead of cleaning up on the dead transaction
+    assert calls["rollback"] == 1 and cleanups == []
+    assert [slip.submitted for slip in slips] == [1, 1]
+    assert finalized == [(["SS-1", "SS-2"], [])]
+
+
+class Row(dict):
+    # Loaded child rows carry their DB timestamp, as frappe.get_doc rows do
+    def __init__(self, **values):
+        super().__init__(modified="2026-01-31 10:00:00", **values)
+
+
+class LoadedSlip:
+    def __init__(self, name, pph21):
+        self.name = name
+        self.docstatus = 0
+        self.tax = pph21
+        self.tax_type = "TER"
+        self.pph21_info = "{}"
+        self.earnings = [Row(salary_component="Gaji Pokok", amount=10_000_000)]
+        self.deductions = [Row(salary_component="PPh 21", amount=pph21)]
+        self.gross_pay = 10_000_000
+        self.total_deduction = pph21
+        self.net_pay = 10_000_000 - pph21
+        self.saved = 0
+
+    def save(self, ignore_permissions=False):
+        self.saved += 1
+
+    def calculate(self, pph21):
+        self.tax = pph21
+        self.pph21_info = f'{{"pph21": {pph21}}}'
+        self.deductions[0]["amount"] = pph21
+        self.total_deduction = pph21
+        self.net_pay = self.gross_pay - pph21
+
+
+def test_unchanged_rows_take_the_light_path(fake_frappe, monkeypatch):
+    module, frappe, cache, calls = _load(fake_frappe)
+    statements = []
+    frappe.db.sql = lambda query, values=None: statements.append((query, values))
+    frappe.get_meta = lambda doctype: types.SimpleNamespace(
+        has_field=lambda field: field != module.FINGERPRINT_FIELD
+    )
+    slips = {"SS-1": LoadedSlip("SS-1", 250_000), "SS-2": LoadedSlip("SS-2", 250_000)}
+    monkeypatch.setattr(module, "load_salary_slips", lambda names: {name: slips[name] for name in names})
+
+    def tax_calculator(slip):
+        # SS-1: same PPh 21 as stored, only pph21_info changes; SS-2: PPh 21 changes
+        slip.calculate(250_000 if slip.name == "SS-1" else 300_000)
+
+    entry = module.CustomPayrollEntry.__new__(module.CustomPayrollEntry)
+    entry.name = "PE-1"
+    result = entry._process_slip_chunk(["SS-1", "SS-2"], tax_calculator, None, object())
+
+    assert result["processed"] == ["SS-1", "SS-2"]
+    assert slips["SS-1"].saved == 0 and slips["SS-2"].saved == 1
+    # SS-1 is written by the chunk's bulk UPDATE, SS-2 by its save
+    (query, values), = statements
+    assert query.startswith("UPDATE `tabSalary Slip`") and "`pph21_info`" in query
+    assert "SS-1" in values and "SS-2" not in values
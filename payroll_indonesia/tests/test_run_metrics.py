@@ -0,0 +1,83 @@
+import json
+import types
+import importlib
+
+
+def _load(frappe):
+    inserted = []
+
+    class FakeDoc(dict):
+        name = "PRM-PE-1-001"
+
+        def insert(self, ignore_permissions=False):
+            inserted.append(dict(self))
+
+    frappe.db = types.SimpleNamespace(sql=lambda *a, **k: [])
+    frappe.get_doc = lambda data: FakeDoc(data)
+    module = importlib.import_module("payroll_indonesia.utils.run_metrics")
+    return module, frappe, inserted
+
+
+def test_stage_counts_time_queries_and_slips(fake_frappe):
+    module, frappe, _ = _load(fake_frappe)
+    metrics = module.RunMetrics()
+
+    with metrics.stage(module.STAGE_SAVE, rows=1, slip="SS-1"):
+        frappe.db.sql("select 1")
+        frappe.db.sql("select 2")
+    with metrics.stage(module.STAGE_LOAD) as stage:
+        stage.rows = 25
+    # Nested stage without slip does not count twice towards the slip
+    with metrics.stage(module.STAGE_SUBMIT, rows=1, slip="SS-1"):
+        with metrics.stage(module.STAGE_ANNUAL_HISTORY, rows=1):
+            frappe.db.sql("select 3")
+
+    assert metrics.stages[module.STAGE_SAVE]["queries"] == 2
+    assert metrics.stages[module.STAGE_SAVE]["calls"] == 1
+    assert metrics.stages[module.STAGE_LOAD]["rows"] == 25
+    assert metrics.stages[module.STAGE_SUBMIT]["queries"] == 1
+    assert metrics.stages[module.STAGE_ANNUAL_HISTORY]["queries"] == 1
+    expected = metrics.stages[module.STAGE_SAVE]["seconds"] + metrics.stages[module.STAGE_SUBMIT]["seconds"]
+    assert abs(metrics.slips["SS-1"] - expected) < 1e-9
+
+
+def test_merge_and_summary(fake_frappe):
+    module, _, _ = _load(fake_frappe)
+    run = module.RunMetrics()
+    for index in range(2):
+        chunk = module.RunMetrics()
+        for slip in range(10):
+            chunk.add(module.STAGE_CALCULATE, 0.01 * (index * 10 + slip + 1), queries=2, rows=1,
+                      slip=f"SS-{index * 10 + slip + 1}")
+        chunk.add_chunk(10, 1.0, 20)
+        run.merge(chunk.to_dict())
+
+    summary = run.summary()
+    assert run.stages[module.STAGE_CALCULATE]["calls"] == 20
+    assert run.stages[module.STAGE_CALCULATE]["queries"] == 40
+    assert len(run.chunks) == 2
+    assert summary["slip_count"] == 20
+    assert abs(summary["slip_p50"] - 0.10) < 1e-9
+    assert abs(summary["slip_p95"] - 0.19) < 1e-9
+    assert abs(summary["slip_max"] - 0.20) < 1e-9
+    assert [row["salary_slip"] for row in summary["slowest"][:3]] == ["SS-20", "SS-19", "SS-18"]
+    assert len(summary["slowest"]) == module.SLOWEST_SLIPS
+    assert module.percentile([], 95) == 0.0
+
+
+def test_save_run_metrics_record(fake_frappe):
+    module, _, inserted = _load(fake_frappe)
+    metrics = module.RunMetrics()
+    metrics.add(module.STAGE_SAVE, 0.5, queries=4, rows=1, slip="SS-1")
+    metrics.add_chunk(1, 0.6, 7)
+
+    name = module.save_run_metrics("PE-1", metrics, 2.0, tax_mode="TER", queued=True)
+
+    assert name == "PRM-PE-1-001"
+    record = inserted[0]
+    assert record["payroll_entry"] == "PE-1" and record["queued"] == 1
+    assert record["total_queries"] == 7 and record["chunk_count"] == 1
+    assert record["stages"] == [
+        {"stage": module.STAGE_SAVE, "calls": 1, "rows": 1, "seconds": 0.5, "queries": 4}
+    ]
+    assert json.loads(record["slowest_slips"]) == [{"salary_slip": "SS-1", "seconds": 0.5}]
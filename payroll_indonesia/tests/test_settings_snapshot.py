@@ -0,0 +1,123 @@
+import types
+import pickle
+import importlib
+
+import pytest
+
+
+def _load(frappe):
+    def fail(*a, **k):
+        pytest.fail("settings must not be read during the calculation")
+
+    frappe.get_all = fail
+    frappe.get_cached_doc = fail
+    frappe.db = types.SimpleNamespace(exists=fail)
+
+    snapshot_mod = importlib.import_module("payroll_indonesia.config.snapshot")
+    ter_index = importlib.import_module("payroll_indonesia.config.ter_index")
+    tax_status = importlib.import_module("payroll_indonesia.config.tax_status")
+
+    indexes, issues = ter_index.compile_ter_brackets(
+        [
+            {"ter_code": "A", "min_income": 0, "max_income": 5_400_000, "rate_percent": 0},
+            {"ter_code": "A", "min_income": 5_400_001, "max_income": 0, "rate_percent": 2},
+        ]
+    )
+    snapshot = snapshot_mod.PayrollSettingsSnapshot(
+        version="test",
+        values={"biaya_jabatan_rate": 5.0, "biaya_jabatan_cap_yearly": 6_000_000.0},
+        pph21_method="TER",
+        ptkp_map={"TK/0": tax_status.TaxStatusInfo("TK/0", 54_000_000.0, "A")},
+        ter_table=ter_index.TERTable(indexes, issues),
+        tax_slabs=[(60_000_000, 5), (float("inf"), 15)],
+    )
+    return snapshot_mod, snapshot
+
+
+def test_snapshot_is_frozen_and_picklable(fake_frappe):
+    snapshot_mod, snapshot = _load(fake_frappe)
+
+    with pytest.raises(AttributeError):
+        snapshot.biaya_jabatan_rate = 10
+    with pytest.raises(TypeError):
+        snapshot.values["biaya_jabatan_rate"] = 10
+
+    assert snapshot.biaya_jabatan_cap_monthly == 500_000.0
+    assert snapshot.rate_display == "5%/15%"
+
+    restored = pickle.loads(pickle.dumps(snapshot))
+    assert restored.version == "test"
+    assert restored.get_ter_rate("A", 6_000_000) == 2
+    assert restored.get_ptkp_amount({"tax_status": "TK/0"}) == 54_000_000.0
+
+
+def test_calculate_pph21_ter_uses_snapshot(fake_frappe):
+    snapshot_mod, snapshot = _load(fake_frappe)
+    pph21_ter = importlib.import_module("payroll_indonesia.config.pph21_ter")
+
+    result = pph21_ter.calculate_pph21_TER(
+        10_000_000,
+        {"employment_type": "Full-time", "tax_status": "TK/0"},
+        "CMP",
+        bulan=5,
+        settings=snapshot,
+    )
+    assert result["biaya_jabatan"] == 500_000.0
+    assert result["ptkp"] == 4_500_000.0
+    assert result["rate"] == 2
+    assert result["pph21"] == 200_000
+
+
+def test_progressive_year_uses_snapshot(fake_frappe):
+    snapshot_mod, snapshot = _load(fake_frappe)
+    pph21_progressive = importlib.import_module("payroll_indonesia.config.pph21_progressive")
+
+    slips = [
+        {"earnings": [{"salary_component": "Gaji Pokok", "amount": 10_000_000, "is_tax_applicable": 1}], "deductions": []}
+        for _ in range(12)
+    ]
+    result = pph21_progressive.calculate_pph21_progressive_year(
+        {"employment_type": "Full-time", "tax_status": "TK/0"}, slips, settings=snapshot
+    )
+    # PTKP and slabs come from the snapshot; reading live settings fails the test
+    assert result["ptkp_annual"] == 54_000_000.0
+    assert result["rate"] == "5%/15%"
+    assert result["pph21_annual"] == 3_900_000
+
+
+def test_snapshot_version_comes_from_persisted_tables(fake_frappe, monkeypatch):
+    snapshot_mod, snapshot = _load(fake_frappe)
+    tables = {"rows": [
+        (3, "2026-01-02 10:00:00"),
+        (8, "2026-01-01 09:00:00"),
+        (8, None),
+        (40, "2026-01-05 08:00:00"),
+    ]}
+    queries = []
+    snapshot_mod.frappe.db.sql = lambda query: queries.append(query) or list(tables["rows"])
+    settings = {"modified": "2026-01-03 11:00:00"}
+    monkeypatch.setattr(snapshot_mod.config, "get_settings", lambda: settings)
+    monkeypatch.setattr(snapshot_mod, "get_tax_status_map", lambda: snapshot.ptkp_map)
+    monkeypatch.setattr(snapshot_mod, "get_ter_table", lambda: snapshot.ter_table)
+    monkeypatch.setattr(snapshot_mod, "get_compiled_tax_slabs", lambda name: snapshot.tax_slabs)
+    monkeypatch.setattr(snapshot_mod, "get_component_registry", lambda: snapshot.components)
+    # Redis version tokens play no part: a cache flush must not change the version
+    snapshot_mod.frappe.cache = lambda: pytest.fail("version must not read the cache")
+
+    first = snapshot_mod.build_settings_snapshot().version
+    assert first.startswith("2026-01-03 11:00:00-")
+    assert snapshot_mod.build_settings_snapshot().version == first
+    # Input fingerprints read the same version without loading the tables
+    monkeypatch.setattr(snapshot_mod, "get_ter_table", lambda: pytest.fail("tables must not be loaded"))
+    assert snapshot_mod.get_settings_version() == first
+    monkeypatch.setattr(snapshot_mod, "get_ter_table", lambda: snapshot.ter_table)
+    assert all(f"`tab{doctype}`" in queries[0] for doctype in snapshot_mod.VERSION_SOURCES)
+
+    # An edited or deleted Salary Component changes the version
+    tables["rows"][3] = (40, "2026-01-06 08:00:00")
+    assert snapshot_mod.build_settings_snapshot().version != first
+    tables["rows"][3] = (39, "2026-01-05 08:00:00")
+    assert snapshot_mod.build_settings_snapshot().version != first
+    settings["modified"] = "2026-01-04 11:00:00"
+    tables["rows"][3] = (40, "2026-01-05 08:00:00")
+    assert snapshot_mod.build_settings_snapshot().version != first
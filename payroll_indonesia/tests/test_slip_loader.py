@@ -0,0 +1,78 @@
+import types
+import importlib
+
+
+def _load(frappe, tables):
+    queries = []
+
+    def get_all(doctype, filters=None, fields=None, order_by=None):
+        queries.append(doctype)
+        return [dict(row) for row in tables.get(doctype, []) if _match(row, filters)]
+
+    def _match(row, filters):
+        for key, value in (filters or {}).items():
+            if isinstance(value, list) and value[0] == "in":
+                if row.get(key) not in value[1]:
+                    return False
+            elif row.get(key) != value:
+                return False
+        return True
+
+    table_fields = [
+        types.SimpleNamespace(fieldname="earnings", options="Salary Detail"),
+        types.SimpleNamespace(fieldname="deductions", options="Salary Detail"),
+        types.SimpleNamespace(fieldname="timesheets", options="Salary Slip Timesheet"),
+    ]
+    frappe.get_all = get_all
+    frappe.get_meta = lambda doctype: types.SimpleNamespace(get_table_fields=lambda: table_fields)
+    frappe.get_doc = lambda data: data
+    frappe.db = types.SimpleNamespace(sql=lambda *a, **k: queries.append("sql"))
+
+    return (
+        importlib.import_module("payroll_indonesia.utils.slip_loader"),
+        importlib.import_module("payroll_indonesia.utils.query_counter"),
+        frappe,
+        queries,
+    )
+
+
+def test_bulk_load_uses_one_query_per_doctype(fake_frappe):
+    names = [f"SS-{i}" for i in range(50)]
+    tables = {
+        "Salary Slip": [{"name": n, "employee": f"EMP-{i}"} for i, n in enumerate(names)],
+        "Salary Detail": [
+            {"parenttype": "Salary Slip", "parent": n, "parentfield": field, "idx": idx,
+             "salary_component": f"{field}-{idx}", "amount": idx}
+            for n in names
+            for field in ("earnings", "deductions")
+            for idx in (1, 2)
+        ],
+    }
+    loader, _, _, queries = _load(fake_frappe, tables)
+
+    docs = loader.load_salary_slips(names + ["SS-MISSING"])
+
+    assert queries == ["Salary Slip", "Salary Detail", "Salary Slip Timesheet"]
+    assert set(docs) == set(names)
+    doc = docs["SS-7"]
+    assert doc["doctype"] == "Salary Slip"
+    assert [r["salary_component"] for r in doc["earnings"]] == ["earnings-1", "earnings-2"]
+    assert [r["salary_component"] for r in doc["deductions"]] == ["deductions-1", "deductions-2"]
+    assert all(r["doctype"] == "Salary Detail" for r in doc["earnings"])
+    # Tables without rows are present and empty, so a save keeps them empty
+    assert doc["timesheets"] == []
+
+
+def test_query_counter_counts_and_restores(fake_frappe):
+    _, query_counter, frappe, queries = _load(fake_frappe, {})
+    original = frappe.db.sql
+
+    with query_counter.QueryCounter() as outer:
+        frappe.db.sql("SELECT 1")
+        with query_counter.QueryCounter() as inner:
+            frappe.db.sql("SELECT 2")
+            frappe.db.sql("SELECT 3")
+
+    assert (outer.count, inner.count) == (3, 2)
+    assert frappe.db.sql is original
+    assert queries == ["sql", "sql", "sql"]
@@ -0,0 +1,85 @@
+import random
+import importlib
+
+import pytest
+
+
+def _load(frappe):
+    def fail(*a, **k):
+        pytest.fail("the reducer must not query the database")
+
+    frappe.get_all = fail
+    frappe.get_meta = fail
+    return importlib.import_module("payroll_indonesia.config.slip_reducer")
+
+
+class Row(dict):
+    """Dict row that also exposes fields as attributes, like a child Document."""
+
+    __getattr__ = dict.get
+
+
+DEDUCTIONS = [
+    "BPJS Kesehatan Employee", "BPJS JHT Employee", "BPJS JP Employee", "Iuran Pensiun",
+    "Biaya Jabatan", "PPh 21", "Kasbon", "BPJS JHT Employer",
+]
+
+
+def _random_row(rng, names):
+    row = Row(salary_component=rng.choice(names), amount=rng.randrange(0, 1_000_000))
+    for field in ("is_tax_applicable", "is_income_tax_component", "variable_based_on_taxable_salary",
+                  "statistical_component", "do_not_include_in_total", "is_pengurang_netto"):
+        if rng.random() < 0.4:
+            row[field] = rng.choice([0, 1])
+    return row
+
+
+def test_reducer_matches_individual_helpers(fake_frappe):
+    slip_reducer = _load(fake_frappe)
+    registry_mod = importlib.import_module("payroll_indonesia.config.component_registry")
+    pph21_ter = importlib.import_module("payroll_indonesia.config.pph21_ter")
+    december = importlib.import_module("payroll_indonesia.config.pph21_ter_december")
+    progressive = importlib.import_module("payroll_indonesia.config.pph21_progressive")
+
+    rng = random.Random(7)
+    registry = registry_mod.ComponentRegistry()
+    for _ in range(200):
+        slip = {
+            "earnings": [_random_row(rng, ["Gaji Pokok", "Bonus", "Natura"]) for _ in range(5)],
+            "deductions": [_random_row(rng, DEDUCTIONS) for _ in range(rng.randrange(0, 8))],
+        }
+        agg = slip_reducer.reduce_slip(slip, registry)
+
+        assert agg.bruto == pph21_ter.sum_bruto_earnings(slip, registry)
+        assert agg.bruto == december.sum_bruto_earnings(slip, registry)
+        assert agg.pengurang_netto == pph21_ter.sum_pengurang_netto(slip, registry)
+        assert agg.pengurang_netto_bulanan == december.sum_pengurang_netto_bulanan(slip, registry)
+        assert agg.income_tax_deductions == progressive.sum_income_tax_deductions(slip, registry)
+        assert agg.biaya_jabatan == pph21_ter.get_biaya_jabatan_from_component(slip, registry)
+        assert agg.biaya_jabatan == progressive.get_biaya_jabatan_from_component(slip, registry)
+        assert agg.jp_jht_employee == december._get_monthly_jp_jht_employee(slip, registry)
+        assert agg.pph21_amount == december._pph21_paid_in_slip(slip, registry)
+
+        names = [r["salary_component"] for r in slip["deductions"]]
+        expected_index = names.index("PPh 21") if "PPh 21" in names else None
+        assert agg.pph21_row_index == expected_index
+
+
+def test_reducer_totals_skip_excluded_rows(fake_frappe):
+    slip_reducer = _load(fake_frappe)
+    slip = {
+        "earnings": [
+            {"salary_component": "Gaji Pokok", "amount": 1000},
+            {"salary_component": "Mobil", "amount": 200, "do_not_include_in_total": 1},
+            {"salary_component": "Natura", "amount": 300, "statistical_component": 1},
+        ],
+        "deductions": [
+            {"salary_component": "PPh 21", "amount": 100},
+            {"salary_component": "Biaya Jabatan", "amount": 50, "do_not_include_in_total": 1},
+        ],
+    }
+    registry_mod = importlib.import_module("payroll_indonesia.config.component_registry")
+    agg = slip_reducer.reduce_slip(slip, registry_mod.ComponentRegistry())
+    assert (agg.gross_pay, agg.total_deduction, agg.net_pay) == (1000, 100, 900)
+    assert agg.pph21_row_index == 0
+    assert agg.biaya_jabatan == 50
@@ -0,0 +1,57 @@
+import importlib
+
+
+def _load(frappe, slab_docs=None):
+    frappe.get_cached_doc = lambda doctype, name: slab_docs[name]
+    return importlib.import_module("payroll_indonesia.config.tax_slabs")
+
+
+def _layered(pkp, slabs):
+    # Reference: the per-layer loop the calculators used before compilation
+    tax = 0.0
+    lower = 0.0
+    for batas, rate in slabs:
+        if pkp > lower:
+            taxable = min(pkp, batas) - lower
+            tax += taxable * rate / 100
+            lower = batas
+        else:
+            break
+    return tax
+
+
+def test_compiled_slabs_match_layer_loop(fake_frappe):
+    tax_slabs = _load(fake_frappe)
+    compiled = tax_slabs.DEFAULT_COMPILED_SLABS
+
+    for pkp in (0, 1, 59_999_000, 60_000_000, 60_001_000, 250_000_000,
+                487_654_000, 500_000_000, 5_000_000_000, 7_250_000_000):
+        assert compiled.tax_for(pkp) == _layered(pkp, tax_slabs.DEFAULT_TAX_SLABS)
+
+    capped = tax_slabs.compile_tax_slabs([(100, 10), (50, 5)])
+    assert capped.slabs == [(50, 5), (100, 10)]
+    assert capped.tax_for(1_000) == _layered(1_000, capped.slabs) == 7.5
+    assert compiled.rate_display == "5%/15%/25%/30%/35%"
+
+
+def test_compiled_slabs_cached_per_modified(fake_frappe):
+    doc = {
+        "modified": "2024-01-01",
+        "slabs": [
+            {"to_amount": 60_000_000, "percent_deduction": 5},
+            {"to_amount": 0, "percent_deduction": 15},
+        ],
+    }
+    tax_slabs = _load(fake_frappe, {"PPh 21": doc})
+
+    first = tax_slabs.get_compiled_tax_slabs("PPh 21")
+    assert tax_slabs.get_compiled_tax_slabs("PPh 21") is first
+    assert first.rate_display == "5.0%/15.0%"
+    assert first.tax_for(100_000_000) == 9_000_000
+
+    doc["modified"] = "2024-02-01"
+    doc["slabs"][1]["percent_deduction"] = 20
+    second = tax_slabs.get_compiled_tax_slabs("PPh 21")
+    assert second is not first
+    assert second.tax_for(100_000_000) == 11_000_000
+    assert len(tax_slabs._compiled_cache) == 1
@@ -0,0 +1,65 @@
+import types
+import importlib
+
+import pytest
+
+
+TABLES = {
+    "PTKP Table": [
+        {"tax_status": "TK/0", "ptkp_amount": 54_000_000},
+        {"tax_status": "K/1", "ptkp_amount": 63_000_000},
+    ],
+    "TER Mapping Table": [
+        {"tax_status": "TK/0", "ter_code": "A"},
+        {"tax_status": "K/1", "ter_code": "B"},
+        {"tax_status": "K/3", "ter_code": "C"},
+    ],
+}
+
+
+def _load_config(frappe):
+    store = {}
+    calls = []
+
+    def get_all(doctype, **kwargs):
+        calls.append(doctype)
+        return list(TABLES.get(doctype, []))
+
+    frappe.get_all = get_all
+    frappe.generate_hash = lambda length=10: f"v{len(calls)}"
+    frappe.cache = lambda: types.SimpleNamespace(
+        get_value=store.get, set_value=lambda k, v: store.__setitem__(k, v)
+    )
+    frappe.db = types.SimpleNamespace(
+        exists=lambda *a, **k: pytest.fail("exists() must not be called")
+    )
+
+    config = importlib.import_module("payroll_indonesia.config.config")
+    return config, frappe, calls
+
+
+def test_ptkp_and_ter_code_from_cached_map(fake_frappe):
+    config, frappe, calls = _load_config(fake_frappe)
+
+    for _ in range(3):
+        assert config.get_ptkp_amount({"tax_status": "TK/0"}) == 54_000_000
+        assert config.get_ter_code({"tax_status": "K/1"}) == "B"
+
+    assert config.get_ter_code({"tax_status": "X/9"}) is None
+    with pytest.raises(frappe.ValidationError):
+        # Mapped to a TER code but missing from PTKP Table
+        config.get_ptkp_amount({"tax_status": "K/3"})
+
+    assert sorted(calls) == ["PTKP Table", "TER Mapping Table"]
+
+
+def test_resolve_tax_status_bulk(fake_frappe):
+    config, frappe, calls = _load_config(fake_frappe)
+
+    result = config.resolve_tax_status_bulk(["TK/0", "K/3", "TK/0", "", "X/9"])
+    assert result["TK/0"] == {"tax_status": "TK/0", "ptkp_amount": 54_000_000, "ter_code": "A"}
+    assert result["K/3"]["ptkp_amount"] is None
+    assert result["K/3"]["ter_code"] == "C"
+    assert result["X/9"] is None
+    assert "" not in result
+    assert len(calls) == 2
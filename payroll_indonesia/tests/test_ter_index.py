@@ -0,0 +1,75 @@
+import types
+import importlib
+
+import pytest
+
+
+def _load_config(frappe, brackets):
+    store = {}
+    calls = []
+
+    def get_all(doctype, **kwargs):
+        calls.append(doctype)
+        return list(brackets)
+
+    frappe.get_all = get_all
+    frappe.generate_hash = lambda length=10: str(len(store) + len(calls) + 1)
+    frappe.cache = lambda: types.SimpleNamespace(
+        get_value=store.get, set_value=lambda k, v: store.__setitem__(k, v)
+    )
+
+    config = importlib.import_module("payroll_indonesia.config.config")
+    return config, frappe, calls
+
+
+BRACKETS = [
+    {"ter_code": "A", "min_income": 0, "max_income": 5_400_000, "rate_percent": 0},
+    {"ter_code": "A", "min_income": 5_400_001, "max_income": 5_650_000, "rate_percent": 0.25},
+    {"ter_code": "A", "min_income": 5_650_001, "max_income": 0, "rate_percent": 0.5},
+    {"ter_code": "B", "min_income": 0, "max_income": 6_200_000, "rate_percent": 0},
+]
+
+
+def test_ter_rate_uses_compiled_index_once(fake_frappe):
+    config, frappe, calls = _load_config(fake_frappe, BRACKETS)
+
+    assert config.get_ter_rate("A", 5_000_000) == 0
+    assert config.get_ter_rate("A", 5_400_001) == 0.25
+    assert config.get_ter_rate("A", 900_000_000) == 0.5
+    assert config.get_ter_rate("B", 6_200_000) == 0
+    assert calls == ["TER Bracket Table"]
+
+    with pytest.raises(frappe.ValidationError):
+        config.get_ter_rate("B", 7_000_000)
+    with pytest.raises(frappe.ValidationError):
+        config.get_ter_rate("C", 1_000_000)
+
+
+def test_ter_index_rebuilt_after_invalidation(fake_frappe):
+    config, frappe, calls = _load_config(fake_frappe, BRACKETS)
+    from payroll_indonesia.config import cache
+
+    config.get_ter_rate("A", 1)
+    config.get_ter_rate("A", 2)
+    cache.clear_settings_cache()
+    config.get_ter_rate("A", 3)
+    assert len(calls) == 2
+
+
+def test_compile_reports_overlap_and_gap(fake_frappe):
+    _load_config(fake_frappe, [])
+    from payroll_indonesia.config.ter_index import compile_ter_brackets
+
+    indexes, issues = compile_ter_brackets(
+        [
+            {"ter_code": "A", "min_income": 0, "max_income": 1_000, "rate_percent": 1},
+            {"ter_code": "A", "min_income": 900, "max_income": 2_000, "rate_percent": 2},
+            {"ter_code": "A", "min_income": 5_000, "max_income": 0, "rate_percent": 3},
+        ]
+    )
+    assert any("overlaps" in i for i in issues)
+    assert any("gap" in i for i in issues)
+    # Lower bracket keeps priority inside the overlap, like the old linear scan
+    assert indexes["A"].lookup(950) == 1
+    assert indexes["A"].lookup(1_500) == 2
+    assert indexes["A"].lookup(3_000) is None
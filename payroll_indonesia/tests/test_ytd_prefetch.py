@@ -0,0 +1,38 @@
+import types
+import importlib
+
+
+def _load(frappe, sql):
+    frappe.db = types.SimpleNamespace(sql=sql)
+    return importlib.import_module("payroll_indonesia.utils.ytd")
+
+
+def test_bulk_prefetch_uses_one_query(fake_frappe):
+    calls = []
+
+    def sql(query, values=None, as_dict=False):
+        calls.append(values)
+        return [
+            {"employee": "EMP1", "bruto": 110_000_000, "netto": 104_500_000, "pph21": 2_750_000},
+        ]
+
+    ytd = _load(fake_frappe, sql)
+    prefetch = ytd.get_ytd_jan_nov_bulk(["EMP2", "EMP1", "EMP1", None], 2024)
+
+    assert len(calls) == 1
+    assert calls[0] == {"fiscal_year": "2024", "employees": ("EMP1", "EMP2")}
+    assert prefetch.get("EMP1", "2024") == (110_000_000.0, 104_500_000.0, 2_750_000.0)
+    # Prefetched without history: zero, not a fallback
+    assert prefetch.get("EMP2", "2024") == ytd.ZERO_YTD
+    # Not prefetched or other fiscal year: caller falls back to the per-slip reader
+    assert prefetch.get("EMP3", "2024") is None
+    assert prefetch.get("EMP1", "2023") is None
+
+
+def test_bulk_prefetch_failure_returns_none(fake_frappe):
+    def sql(*a, **k):
+        raise RuntimeError("db down")
+
+    ytd = _load(fake_frappe, sql)
+    assert ytd.get_ytd_jan_nov_bulk(["EMP1"], "2024") is None
+    assert ytd.get_ytd_jan_nov_bulk([], "2024") is None
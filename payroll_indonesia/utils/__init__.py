@@ -7,5 +7,8 @@ __all__ = ["round_half_up"]
 
 def round_half_up(value: float) -> int:
     """Round value to nearest integer using the HALF_UP rule."""
+    if isinstance(value, int):
+        # Already whole rupiah (integer-rupiah mode): no Decimal needed
+        return value
     return int(Decimal(str(value)).quantize(0, rounding=ROUND_HALF_UP))
 
@@ -0,0 +1,409 @@
+"""
+Batched Annual Payroll History sync for many salary slips at once.
+
+``sync_annual_payroll_history`` handles one slip per call: a savepoint, a
+lookup of the history, slip validation queries, a full document save and
+possibly a submit. ``sync_annual_payroll_history_bulk`` takes the rows of a
+whole chunk, groups them by (employee, fiscal_year), loads the existing
+histories and their child rows with two queries, upserts the monthly details
+and moves the totals with deltas (``utils.annual_history_summary``), then
+writes everything back with multi-row INSERTs (``frappe.db.bulk_insert``) and
+``CASE``-based UPDATEs (``LightFieldWriter``).
+
+New or draft histories are written as submitted, like the per-slip sync does.
+Histories the bulk path cannot write (cancelled ones) and every row of a batch
+whose bulk write failed go through ``sync_annual_payroll_history`` one by one.
+The loaded histories stay locked until the transaction ends
+(``utils.annual_history_lock``); lock conflicts are not retried per slip.
+"""
+
+import json
+import traceback
+from typing import Any, Dict, List, Optional, Tuple
+
+import frappe
+
+from payroll_indonesia.utils.annual_history_summary import (
+    CHECKSUM_FIELD,
+    TOTAL_FIELDS,
+    apply_row_delta,
+    prepare_summary,
+    row_snapshot,
+)
+from payroll_indonesia.utils.annual_history_lock import (
+    lock_histories,
+    reraise_lock_conflict,
+    run_with_lock_retry,
+)
+from payroll_indonesia.utils.light_writer import LightFieldWriter
+from payroll_indonesia.utils.monthly_detail_index import MonthlyDetailIndex
+from payroll_indonesia.utils.sync_annual_payroll_history import (
+    cint,
+    flt,
+    sync_annual_payroll_history,
+    truncate_doc_name,
+)
+
+logger = frappe.logger("payroll_indonesia")
+
+HISTORY_DOCTYPE = "Annual Payroll History"
+DETAIL_DOCTYPE = "Annual Payroll History Child"
+DETAIL_FIELD = "monthly_details"
+
+DETAIL_NUMERIC_FIELDS = ("bruto", "pengurang_netto", "biaya_jabatan", "netto", "pkp", "rate", "pph21")
+DETAIL_FIELDS = ("bulan", "salary_slip", "error_state") + DETAIL_NUMERIC_FIELDS
+
+HISTORY_FIELDS = (
+    "company",
+    "employee_name",
+    "error_state",
+    "ptkp_annual",
+    "koreksi_pph21",
+    CHECKSUM_FIELD,
+) + TOTAL_FIELDS
+
+# Written on every touched row besides the data fields
+AUDIT_FIELDS = ("docstatus", "modified", "modified_by")
+
+SAVEPOINT = "annual_history_bulk_sync"
+
+
+def _dump_error_state(value: Any) -> str:
+    if isinstance(value, str):
+        try:
+            json.loads(value)
+            return value
+        except Exception:
+            pass
+    return json.dumps(value)
+
+
+def _normalize_bulan(bulan: Any) -> int:
+    try:
+        return min(max(cint(bulan), 1), 12)
+    except (ValueError, TypeError):
+        return 1
+
+
+def _submitted_slips(names: List[str]) -> Dict[str, int]:
+    if not names:
+        return {}
+    rows = frappe.get_all(
+        "Salary Slip", filters={"name": ["in", names]}, fields=["name", "docstatus"]
+    )
+    return {row.get("name"): cint(row.get("docstatus")) for row in rows}
+
+
+def _load_histories(
+    keys: List[Tuple[str, str]]
+) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """
+    (employee, fiscal_year) -> {"parent": row, "details": [rows]} with two queries.
+    The parents are locked, in (employee, fiscal_year) order, until the transaction ends.
+    """
+    if not keys:
+        return {}
+    parents = lock_histories(keys, ["name", "employee", "fiscal_year", "docstatus"] + list(HISTORY_FIELDS))
+    wanted = set(keys)
+    histories: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for parent in parents:
+        key = (parent.get("employee"), str(parent.get("fiscal_year")))
+        if key not in wanted:
+            continue
+        current = histories.get(key)
+        # A live history wins over a cancelled one
+        if current is None or (cint(current["parent"].get("docstatus")) == 2 and cint(parent.get("docstatus")) != 2):
+            histories[key] = {"parent": dict(parent), "details": []}
+
+    by_name = {entry["parent"]["name"]: entry for entry in histories.values()}
+    if by_name:
+        details = frappe.get_all(
+            DETAIL_DOCTYPE,
+            filters={
+                "parenttype": HISTORY_DOCTYPE,
+                "parentfield": DETAIL_FIELD,
+                "parent": ["in", list(by_name)],
+            },
+            fields=["name", "parent", "idx"] + list(DETAIL_FIELDS),
+            order_by="idx asc",
+            # Locking read: rows as committed by the previous lock holder
+            for_update=True,
+        )
+        for detail in details:
+            by_name[detail.get("parent")]["details"].append(dict(detail))
+    return histories
+
+
+class _BulkWrites:
+    """Pending inserts and updates of one bulk sync."""
+
+    def __init__(self):
+        self.now = frappe.utils.now()
+        self.user = getattr(getattr(frappe, "session", None), "user", None) or "Administrator"
+        self.new_histories: List[Dict[str, Any]] = []
+        self.new_details: List[Dict[str, Any]] = []
+        self.histories = LightFieldWriter(HISTORY_DOCTYPE, HISTORY_FIELDS + AUDIT_FIELDS)
+        self.details = LightFieldWriter(DETAIL_DOCTYPE, DETAIL_FIELDS + AUDIT_FIELDS)
+
+    def update(self, writer: LightFieldWriter, name: str, values: Dict[str, Any]) -> None:
+        for field, value in values.items():
+            writer.set(name, field, value)
+        writer.set(name, "modified", self.now)
+        writer.set(name, "modified_by", self.user)
+
+    def flush(self) -> int:
+        """Write everything; returns the number of statements issued."""
+        statements = 0
+        statements += self._insert(HISTORY_DOCTYPE, self.new_histories)
+        statements += self._insert(DETAIL_DOCTYPE, self.new_details)
+        statements += self.histories.flush()
+        statements += self.details.flush()
+        return statements
+
+    def _insert(self, doctype: str, rows: List[Dict[str, Any]]) -> int:
+        if not rows:
+            return 0
+        fields = list(rows[0])
+        frappe.db.bulk_insert(doctype, fields, [[row[f] for f in fields] for row in rows])
+        return 1
+
+    def audit(self, name: str) -> Dict[str, Any]:
+        return {
+            "name": name,
+            "creation": self.now,
+            "modified": self.now,
+            "owner": self.user,
+            "modified_by": self.user,
+            "docstatus": 1,
+        }
+
+
+def _apply_detail(detail: Dict[str, Any], month: Dict[str, Any], bulan: int) -> None:
+    detail["bulan"] = bulan
+    if month.get("salary_slip"):
+        detail["salary_slip"] = month["salary_slip"]
+    if month.get("error_state") is not None:
+        detail["error_state"] = _dump_error_state(month["error_state"])
+    for field in DETAIL_NUMERIC_FIELDS:
+        if field in month:
+            detail[field] = flt(month.get(field) or 0)
+
+
+def _upsert_group(
+    key: Tuple[str, str],
+    rows: List[Dict[str, Any]],
+    entry: Optional[Dict[str, Any]],
+    writes: _BulkWrites,
+) -> str:
+    """Upsert ``rows`` into the history of ``key`` and queue its writes; returns its name."""
+    employee, fiscal_year = key
+    if entry is None:
+        first = rows[0]
+        parent = {
+            "name": truncate_doc_name(f"{employee}-{fiscal_year}"),
+            "employee": employee,
+            "fiscal_year": fiscal_year,
+            "company": first.get("company") or _default_company(),
+            "employee_name": first.get("employee_name") or employee,
+            "docstatus": 0,
+        }
+        details: List[Dict[str, Any]] = []
+        is_new = True
+    else:
+        parent, details, is_new = entry["parent"], entry["details"], False
+
+    prepare_summary(parent, is_new, rows=details)
+    submit = cint(parent.get("docstatus")) == 0
+    changed: Dict[str, Dict[str, Any]] = {}
+    index = MonthlyDetailIndex(details)
+    for row in rows:
+        month = row.get("monthly_result") or {}
+        bulan = _normalize_bulan(month.get("bulan"))
+        salary_slip = month.get("salary_slip")
+
+        found = index.find_slip(salary_slip) if salary_slip else index.find_month(bulan)
+        if found is None:
+            found = {"name": frappe.generate_hash(length=10), "idx": len(details) + 1, "__new": True}
+            details.append(found)
+            index.add(found)
+            before = None
+        else:
+            before = row_snapshot(found)
+        _apply_detail(found, month, bulan)
+        index.update(found)
+        apply_row_delta(parent, before, row_snapshot(found))
+        if not found.get("__new"):
+            changed[found["name"]] = found
+
+        # Totals follow the monthly rows; the summary sets the other fields
+        for field, value in (row.get("summary") or {}).items():
+            if value is not None and field in HISTORY_FIELDS and field not in TOTAL_FIELDS:
+                parent[field] = value
+
+    parent["ptkp_annual"] = flt(parent.get("ptkp_annual") or 0)
+    parent["koreksi_pph21"] = flt(parent.get("koreksi_pph21") or 0)
+
+    if is_new:
+        record = writes.audit(parent["name"])
+        record.update({field: parent.get(field) for field in ("employee", "fiscal_year") + HISTORY_FIELDS})
+        writes.new_histories.append(record)
+    else:
+        values = {field: parent.get(field) for field in HISTORY_FIELDS}
+        if submit:
+            values["docstatus"] = 1
+        writes.update(writes.histories, parent["name"], values)
+
+    for detail in details:
+        if detail.get("__new"):
+            record = writes.audit(detail["name"])
+            record.update(
+                {
+                    "parent": parent["name"],
+                    "parenttype": HISTORY_DOCTYPE,
+                    "parentfield": DETAIL_FIELD,
+                    "idx": detail["idx"],
+                }
+            )
+            record.update({field: detail.get(field) for field in DETAIL_FIELDS})
+            writes.new_details.append(record)
+        elif detail["name"] in changed:
+            values = {field: detail.get(field) for field in DETAIL_FIELDS}
+            if submit:
+                values["docstatus"] = 1
+            writes.update(writes.details, detail["name"], values)
+        elif submit:
+            writes.update(writes.details, detail["name"], {"docstatus": 1})
+
+    return parent["name"]
+
+
+def _default_company() -> Optional[str]:
+    try:
+        company = frappe.defaults.get_global_default("company")
+        if company:
+            return company
+        first = frappe.get_all("Company", fields=["name"], limit=1)
+        return first[0].get("name") if first else None
+    except Exception:
+        return None
+
+
+def _sync_one(row: Dict[str, Any]) -> Optional[str]:
+    """Per-slip fallback through ``sync_annual_payroll_history``."""
+    month = row.get("monthly_result") or {}
+    try:
+        return sync_annual_payroll_history(
+            employee={
+                "name": row.get("employee"),
+                "company": row.get("company"),
+                "employee_name": row.get("employee_name"),
+            },
+            fiscal_year=row.get("fiscal_year"),
+            monthly_results=[month],
+            summary=row.get("summary"),
+        )
+    except Exception as e:
+        # A deadlock lost the transaction; its owner retries it
+        reraise_lock_conflict(e)
+        frappe.log_error(
+            message=(
+                f"Failed to sync Annual Payroll History for {month.get('salary_slip')}: "
+                f"{str(e)}\n{traceback.format_exc()}"
+            ),
+            title="Payroll Indonesia Annual History Sync Error",
+        )
+        return None
+
+
+def sync_annual_payroll_history_bulk(rows: List[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Sync the Annual Payroll History rows of many submitted salary slips.
+
+    Args:
+        rows: One dict per slip with ``employee``, ``fiscal_year``,
+              ``monthly_result`` (the ``monthly_results`` row of
+              ``sync_annual_payroll_history``), optional ``summary``, and
+              ``company``/``employee_name`` for histories that do not exist yet
+
+    Returns:
+        Dict with ``synced`` and ``skipped`` salary slip names and the
+        ``histories`` written
+    """
+    outcome: Dict[str, List[str]] = {"synced": [], "skipped": [], "histories": []}
+    rows = [row for row in rows or [] if row]
+    if not rows:
+        return outcome
+
+    fallback: List[Dict[str, Any]] = []
+    groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    try:
+        slips = [
+            (row.get("monthly_result") or {}).get("salary_slip") for row in rows
+        ]
+        docstatus = _submitted_slips([name for name in slips if name])
+        for row, slip in zip(rows, slips):
+            if (
+                not row.get("employee")
+                or not row.get("fiscal_year")
+                or (row.get("monthly_result") or {}).get("bulan") is None
+            ):
+                logger.warning(
+                    f"Annual Payroll History bulk sync: no employee, fiscal year or bulan for {slip}"
+                )
+                outcome["skipped"].append(slip)
+                continue
+            if slip and docstatus.get(slip) != 1:
+                logger.warning(
+                    f"Annual Payroll History bulk sync: skipping {slip}, not a submitted Salary Slip"
+                )
+                outcome["skipped"].append(slip)
+                continue
+            groups.setdefault((row["employee"], str(row["fiscal_year"])), []).append(row)
+
+        histories = run_with_lock_retry(
+            lambda: _load_histories(list(groups)), label="Annual Payroll History bulk sync"
+        )
+    except Exception as e:
+        reraise_lock_conflict(e)
+        logger.warning(f"Annual Payroll History bulk load failed, syncing per slip: {str(e)}")
+        groups, histories, fallback = {}, {}, rows
+
+    if groups:
+        frappe.db.savepoint(SAVEPOINT)
+        try:
+            writes = _BulkWrites()
+            written: List[str] = []
+            synced: List[str] = []
+            for key, group_rows in groups.items():
+                entry = histories.get(key)
+                if entry is not None and cint(entry["parent"].get("docstatus")) == 2:
+                    fallback.extend(group_rows)
+                    continue
+                written.append(_upsert_group(key, group_rows, entry, writes))
+                synced.extend(
+                    (row.get("monthly_result") or {}).get("salary_slip") for row in group_rows
+                )
+            statements = writes.flush()
+            outcome["histories"].extend(written)
+            outcome["synced"].extend(synced)
+            logger.info(
+                f"Annual Payroll History bulk sync: {len(synced)} slips into "
+                f"{len(written)} histories with {statements} write statements"
+            )
+        except Exception as e:
+            reraise_lock_conflict(e, SAVEPOINT)
+            frappe.db.rollback(save_point=SAVEPOINT)
+            logger.warning(f"Annual Payroll History bulk write failed, syncing per slip: {str(e)}")
+            fallback = [row for group_rows in groups.values() for row in group_rows]
+
+    for row in fallback:
+        slip = (row.get("monthly_result") or {}).get("salary_slip")
+        name = _sync_one(row)
+        if name:
+            outcome["synced"].append(slip)
+            if name not in outcome["histories"]:
+                outcome["histories"].append(name)
+        else:
+            outcome["skipped"].append(slip)
+
+    return outcome
@@ -0,0 +1,215 @@
+"""
+Row locks on Annual Payroll History for concurrent syncs.
+
+Two workers syncing slips of the same employee used to read the history, change
+it and save it without a lock, so the second save could drop the rows of the
+first. Every writer now reads the parent rows it changes with ``SELECT ... FOR
+UPDATE`` (``lock_histories``), ordered by (employee, fiscal_year) over the
+composite index of that name, so workers locking several histories always
+take the locks in the same order.
+
+Remaining lock-wait timeouts and deadlocks are retried with bounded
+exponential backoff (``run_with_lock_retry``). A lock-wait timeout only undoes
+the statement and is retried in place; a deadlock rolls back the whole
+transaction, so only the code owning the transaction (a chunk job, the queue
+consumer, a rebuild batch) retries it. Two workers creating the same missing
+history race on its unique name: the loser waits for the winner's insert, gets
+a duplicate-entry error (``DUPLICATE``) and is retried like a lock-wait
+timeout, re-reading the now existing history with a lock. Locks, wait time, conflicts and
+retries are counted per process and in the cache (``get_lock_contention``),
+to tune chunk sizes against.
+"""
+
+import random
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+import frappe
+
+logger = frappe.logger("payroll_indonesia")
+
+HISTORY_DOCTYPE = "Annual Payroll History"
+
+DEADLOCK = "deadlock"
+LOCK_TIMEOUT = "lock_timeout"
+DUPLICATE = "duplicate"
+
+# MariaDB/MySQL error codes
+_ER_LOCK_DEADLOCK = 1213
+_ER_LOCK_WAIT_TIMEOUT = 1205
+
+MAX_ATTEMPTS = 4
+# Backoff before retry n: BASE_DELAY * 2^(n-1), at most MAX_DELAY, with jitter
+BASE_DELAY = 0.1
+MAX_DELAY = 2.0
+
+# locks: histories locked; lock_wait_ms: time spent in locking reads;
+# gave_up: conflicts still failing after MAX_ATTEMPTS
+COUNTERS = (
+    "locks", "lock_wait_ms", DEADLOCK + "s", LOCK_TIMEOUT + "s", DUPLICATE + "s", "retries", "gave_up"
+)
+
+_local_counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+
+T = TypeVar("T")
+
+
+def _counter_key(counter: str) -> str:
+    return frappe.cache().make_key(f"payroll_indonesia:aph_lock:{counter}")
+
+
+def _count(counter: str, amount: int = 1) -> None:
+    if not amount:
+        return
+    _local_counters[counter] += amount
+    try:
+        frappe.cache().incr(_counter_key(counter), amount)
+    except Exception:
+        # Counters are informational only
+        pass
+
+
+def local_contention() -> Dict[str, int]:
+    """Counters of this process (a chunk job measures its own share with them)."""
+    return dict(_local_counters)
+
+
+def get_lock_contention() -> Dict[str, int]:
+    """Counters of every worker since the last ``reset_lock_contention``."""
+    counters = {}
+    for counter in COUNTERS:
+        try:
+            counters[counter] = int(frappe.cache().get(_counter_key(counter)) or 0)
+        except Exception:
+            counters[counter] = _local_counters[counter]
+    return counters
+
+
+def reset_lock_contention() -> None:
+    for counter in COUNTERS:
+        _local_counters[counter] = 0
+        try:
+            frappe.cache().delete(_counter_key(counter))
+        except Exception:
+            pass
+
+
+def lock_conflict(exc: BaseException) -> Optional[str]:
+    """
+    ``DEADLOCK`` or ``LOCK_TIMEOUT`` when ``exc`` is one, ``DUPLICATE`` when it
+    is the insert of an Annual Payroll History another worker just created,
+    else None.
+    """
+    db = getattr(frappe, "db", None)
+    for kind, check in ((DEADLOCK, "is_deadlocked"), (LOCK_TIMEOUT, "is_timedout")):
+        try:
+            if getattr(db, check)(exc):
+                return kind
+        except Exception:
+            pass
+    for kind, error in ((DEADLOCK, "QueryDeadlockError"), (LOCK_TIMEOUT, "QueryTimeoutError")):
+        error_type = getattr(frappe, error, None)
+        if isinstance(error_type, type) and isinstance(exc, error_type):
+            return kind
+    code = exc.args[0] if getattr(exc, "args", None) else None
+    duplicate_error = getattr(frappe, "DuplicateEntryError", None)
+    if isinstance(duplicate_error, type) and isinstance(exc, duplicate_error):
+        # Raised as DuplicateEntryError(doctype, name, error)
+        return DUPLICATE if code == HISTORY_DOCTYPE else None
+    if code == _ER_LOCK_DEADLOCK:
+        return DEADLOCK
+    if code == _ER_LOCK_WAIT_TIMEOUT:
+        return LOCK_TIMEOUT
+    return None
+
+
+def reraise_lock_conflict(exc: BaseException, savepoint: Optional[str] = None) -> None:
+    """
+    Re-raise ``exc`` unchanged if it is a lock conflict, for handlers that would
+    otherwise log it away or wrap it. After a lock-wait timeout or a duplicate
+    history insert the work since ``savepoint`` is rolled back; after a deadlock the server already rolled
+    back the transaction (and the savepoint with it).
+    """
+    kind = lock_conflict(exc)
+    if kind is None:
+        return
+    if kind in (LOCK_TIMEOUT, DUPLICATE) and savepoint:
+        frappe.db.rollback(save_point=savepoint)
+    raise exc
+
+
+def lock_histories(
+    keys: Iterable[Tuple[str, str]], fields: Sequence[str] = ("name", "employee", "fiscal_year", "docstatus")
+) -> List[Dict[str, Any]]:
+    """
+    Lock the Annual Payroll History rows of (employee, fiscal_year) ``keys``
+    and return them (``fields``), in (employee, fiscal_year, creation) order.
+
+    Only the exact pairs are locked, not every combination of the employees and
+    years. Keys without a history lock nothing: their creation is serialised by
+    the unique name instead (``DUPLICATE``).
+    """
+    keys = sorted({(employee, str(fiscal_year)) for employee, fiscal_year in keys})
+    if not keys:
+        return []
+    start = time.perf_counter()
+    rows = frappe.db.sql(
+        """
+        SELECT {fields}
+        FROM `tab{doctype}`
+        WHERE (`employee`, `fiscal_year`) IN ({pairs})
+        ORDER BY `employee` ASC, `fiscal_year` ASC, `creation` ASC
+        FOR UPDATE
+        """.format(
+            fields=", ".join(f"`{field}`" for field in fields),
+            doctype=HISTORY_DOCTYPE,
+            pairs=", ".join(["(%s, %s)"] * len(keys)),
+        ),
+        [value for key in keys for value in key],
+        as_dict=True,
+    )
+    _count("lock_wait_ms", int((time.perf_counter() - start) * 1000))
+    _count("locks", len(rows))
+    return list(rows)
+
+
+def _backoff(attempt: int) -> float:
+    delay = min(BASE_DELAY * (2 ** (attempt - 1)), MAX_DELAY)
+    return delay * (0.5 + random.random() / 2)
+
+
+def run_with_lock_retry(
+    fn: Callable[[], T],
+    label: str,
+    owns_transaction: bool = False,
+    max_attempts: int = MAX_ATTEMPTS,
+) -> T:
+    """
+    Call ``fn``, retrying it after a lock conflict with exponential backoff.
+
+    With ``owns_transaction`` ``fn`` is the whole transaction: after either
+    conflict everything is rolled back and ``fn`` runs again. Otherwise only
+    lock-wait timeouts and duplicate history inserts are retried (``fn`` rolls back its own savepoint, see
+    ``reraise_lock_conflict``) and deadlocks go up to the transaction owner.
+    """
+    attempt = 1
+    while True:
+        try:
+            return fn()
+        except Exception as e:
+            kind = lock_conflict(e)
+            if kind is None:
+                raise
+            _count(kind + "s")
+            if attempt >= max_attempts or (kind == DEADLOCK and not owns_transaction):
+                if attempt >= max_attempts:
+                    _count("gave_up")
+                    logger.warning(f"{label}: {kind} after {attempt} attempts, giving up: {str(e)}")
+                raise
+            if owns_transaction:
+                frappe.db.rollback()
+            delay = _backoff(attempt)
+            logger.info(f"{label}: {kind} on attempt {attempt}, retrying in {delay:.2f}s")
+            _count("retries")
+            time.sleep(delay)
+            attempt += 1
@@ -0,0 +1,502 @@
+"""
+Full-year rebuild of Annual Payroll History from submitted Salary Slips.
+
+``rebuild_annual_payroll_history(company, fiscal_year, shards=N)`` recomputes every
+history of a company and fiscal year from scratch out of the ``pph21_info`` of
+the submitted Salary Slips, for when that information was corrected or slips
+were cancelled out of band::
+
+    bench --site <site> execute \\
+        payroll_indonesia.utils.annual_history_rebuild.rebuild_annual_payroll_history \\
+        --kwargs "{'company': 'PT Contoh', 'fiscal_year': '2025', 'shards': 4}"
+
+Employees with a submitted slip or an existing history are split into
+``shards`` by a CRC32 of the employee id, one background job per shard. A shard
+streams its slips ordered by employee, ``EMPLOYEE_BATCH_SIZE`` employees per
+query, replaces the monthly rows and totals of each history, saves only the
+histories that changed and commits after every batch. Progress and the diff of
+each shard are kept in the cache under the rebuild id (``get_rebuild_status``);
+the shard finishing last merges them into the diff summary.
+"""
+
+import json
+import time
+import traceback
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+
+import frappe
+
+from payroll_indonesia.utils.annual_history_lock import DEADLOCK, lock_conflict, run_with_lock_retry
+from payroll_indonesia.utils.annual_history_summary import (
+    TOTAL_FIELDS,
+    rebuild_summary,
+)
+from payroll_indonesia.utils.sync_annual_payroll_history import (
+    get_or_create_annual_payroll_history,
+    history_values_from_result,
+    update_annual_payroll_summary,
+)
+
+try:
+    from frappe.utils import cint, flt, getdate
+except Exception:  # pragma: no cover - fallback for test stubs without cint/flt
+    from datetime import datetime
+
+    def cint(value: Any) -> int:
+        try:
+            return int(value)
+        except Exception:
+            return 0
+
+    def flt(value: Any, precision: Optional[int] = None) -> float:
+        try:
+            return float(value)
+        except Exception:
+            return 0.0
+
+    def getdate(value: Any) -> Any:
+        return value if hasattr(value, "month") else datetime.strptime(str(value), "%Y-%m-%d")
+
+logger = frappe.logger("payroll_indonesia")
+
+DEFAULT_SHARDS = 4
+# Employees whose slips are read with one query (and committed together)
+EMPLOYEE_BATCH_SIZE = 200
+REBUILD_JOB_TIMEOUT = 4 * 3600
+# Changed employees listed by name in a diff summary
+DIFF_SAMPLE_SIZE = 100
+
+SAVEPOINT = "annual_history_rebuild"
+
+# Fields of the rebuild status hash besides the shard numbers
+INFO_KEY = "info"
+SUMMARY_KEY = "summary"
+
+# Monthly detail fields compared by the diff
+DETAIL_FIELDS = ("bulan", "bruto", "pengurang_netto", "biaya_jabatan", "netto", "pkp", "rate", "pph21")
+# Parent fields compared by the diff; only the December slip sets the last two
+SUMMARY_FIELDS = TOTAL_FIELDS + ("ptkp_annual", "koreksi_pph21")
+
+_SLIP_QUERY = """
+    SELECT name, employee, employee_name, start_date, tax_type, pph21_info
+    FROM `tabSalary Slip`
+    WHERE docstatus = 1
+        AND company = %(company)s
+        AND start_date BETWEEN %(year_start)s AND %(year_end)s
+        AND employee IN %(employees)s
+    ORDER BY employee, start_date, name
+"""
+
+
+def _status_key(rebuild_id: str) -> str:
+    return f"payroll_indonesia:aph_rebuild:{rebuild_id}"
+
+
+def _done_counter_key(rebuild_id: str) -> str:
+    return frappe.cache().make_key(f"payroll_indonesia:aph_rebuild_done:{rebuild_id}")
+
+
+def _year_bounds(fiscal_year: str) -> Tuple[str, str]:
+    return f"{fiscal_year}-01-01", f"{fiscal_year}-12-31"
+
+
+def shard_of(employee: str, shards: int) -> int:
+    """Shard of ``employee``; stable across processes and runs."""
+    return zlib.crc32(str(employee).encode()) % max(shards, 1)
+
+
+def new_diff() -> Dict[str, Any]:
+    return {
+        "created": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "rows_added": 0,
+        "rows_removed": 0,
+        "rows_changed": 0,
+        "pph21_annual_delta": 0.0,
+        "changed": [],
+    }
+
+
+def merge_diff(total: Dict[str, Any], diff: Dict[str, Any]) -> None:
+    for key, value in diff.items():
+        if key == "changed":
+            total["changed"].extend(value[:DIFF_SAMPLE_SIZE - len(total["changed"])])
+        else:
+            total[key] = total.get(key, 0) + value
+
+
+def rebuild_employees(company: str, fiscal_year: str) -> List[str]:
+    """Employees with a submitted slip or an Annual Payroll History in the year."""
+    year_start, year_end = _year_bounds(fiscal_year)
+    slip_employees = frappe.get_all(
+        "Salary Slip",
+        filters={"docstatus": 1, "company": company, "start_date": ["between", [year_start, year_end]]},
+        pluck="employee",
+        distinct=True,
+    )
+    history_employees = frappe.get_all(
+        "Annual Payroll History",
+        filters={"company": company, "fiscal_year": fiscal_year},
+        pluck="employee",
+    )
+    return sorted({e for e in list(slip_employees) + list(history_employees) if e})
+
+
+def rebuild_annual_payroll_history(
+    company: str,
+    fiscal_year: str,
+    shards: int = DEFAULT_SHARDS,
+    dry_run: bool = False,
+    now: bool = False,
+) -> str:
+    """
+    Recompute every Annual Payroll History of ``company`` and ``fiscal_year``
+    from its submitted Salary Slips.
+
+    Args:
+        shards: Number of background jobs the employees are split over
+        dry_run: Only compute the diff; nothing is saved
+        now: Run the shards in this process instead of enqueuing them
+
+    Returns:
+        The rebuild id for ``get_rebuild_status``
+    """
+    fiscal_year = str(fiscal_year)
+    shards = max(cint(shards), 1)
+    buckets: List[List[str]] = [[] for _ in range(shards)]
+    employees = rebuild_employees(company, fiscal_year)
+    for employee in employees:
+        buckets[shard_of(employee, shards)].append(employee)
+
+    rebuild_id = frappe.generate_hash(length=10)
+    frappe.cache().hset(
+        _status_key(rebuild_id),
+        INFO_KEY,
+        {
+            "company": company,
+            "fiscal_year": fiscal_year,
+            "shards": shards,
+            "employees": len(employees),
+            "dry_run": bool(dry_run),
+            "started": time.time(),
+        },
+    )
+
+    for shard, bucket in enumerate(buckets):
+        kwargs = {
+            "rebuild_id": rebuild_id,
+            "company": company,
+            "fiscal_year": fiscal_year,
+            "shard": shard,
+            "shards": shards,
+            "employees": bucket,
+            "dry_run": dry_run,
+        }
+        if now:
+            run_rebuild_shard(**kwargs)
+        else:
+            frappe.enqueue(
+                "payroll_indonesia.utils.annual_history_rebuild.run_rebuild_shard",
+                queue="long",
+                timeout=REBUILD_JOB_TIMEOUT,
+                job_name=f"aph-rebuild-{fiscal_year}-{shard + 1}-of-{shards}",
+                **kwargs,
+            )
+
+    logger.info(
+        f"Annual Payroll History rebuild {rebuild_id} of {company} {fiscal_year}: "
+        f"{len(employees)} employees in {shards} shards{' (dry run)' if dry_run else ''}"
+    )
+    return rebuild_id
+
+
+def _stream_slips(company: str, fiscal_year: str, employees: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+    """Submitted slips of ``employees`` in the year, per employee in period order."""
+    year_start, year_end = _year_bounds(fiscal_year)
+    slips: Dict[str, List[Dict[str, Any]]] = {}
+    for slip in frappe.db.sql(
+        _SLIP_QUERY,
+        {
+            "company": company,
+            "year_start": year_start,
+            "year_end": year_end,
+            "employees": tuple(employees),
+        },
+        as_dict=True,
+    ):
+        slips.setdefault(slip.get("employee"), []).append(slip)
+    return slips
+
+
+def _history_values(slips: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Monthly rows and summary of a history, from its slips in period order."""
+    rows: List[Dict[str, Any]] = []
+    # Without a December slip the year has no annual correction
+    summary: Dict[str, Any] = {"ptkp_annual": 0, "koreksi_pph21": 0}
+    for slip in slips:
+        try:
+            info = json.loads(slip.get("pph21_info") or "{}")
+        except (TypeError, ValueError):
+            info = {}
+        bulan = getdate(slip.get("start_date")).month
+        # Same mode as CustomSalarySlip.on_submit
+        tax_type = slip.get("tax_type") or info.get("_tax_type")
+        december = tax_type == "DECEMBER" or (not tax_type and bulan == 12)
+        monthly_result, december_summary = history_values_from_result(
+            info, bulan, slip.get("name"), december=december
+        )
+        rows.append(monthly_result)
+        if december_summary:
+            summary.update(december_summary)
+    return rows, summary
+
+
+def _row_key(row: Any) -> str:
+    return row.get("salary_slip") or f"bulan-{cint(row.get('bulan'))}"
+
+
+def _row_values(row: Any) -> Tuple[float, ...]:
+    return tuple(round(flt(row.get(field) or 0), 2) for field in DETAIL_FIELDS)
+
+
+def _summary_values(history: Any) -> Dict[str, float]:
+    return {field: round(flt(history.get(field) or 0), 2) for field in SUMMARY_FIELDS}
+
+
+def rebuild_history(
+    employee: str,
+    company: str,
+    fiscal_year: str,
+    slips: List[Dict[str, Any]],
+    diff: Dict[str, Any],
+    dry_run: bool = False,
+) -> Optional[str]:
+    """
+    Replace the monthly rows and totals of one history with those of ``slips``
+    and count the changes in ``diff``. Saves only a changed history.
+
+    Returns:
+        "created", "updated" or "unchanged"; None when there is nothing to rebuild
+    """
+    rows, summary = _history_values(slips)
+    history = get_or_create_annual_payroll_history(
+        employee, fiscal_year, create_if_missing=bool(rows), for_update=True
+    )
+    if history is None:
+        return None
+    if cint(history.get("docstatus")) == 2:
+        raise frappe.ValidationError(f"Annual Payroll History {history.name} is cancelled")
+
+    is_new = history.is_new()
+    before_rows = {_row_key(row): _row_values(row) for row in history.get("monthly_details") or []}
+    before_summary = _summary_values(history)
+
+    history.set("monthly_details", [])
+    for row in rows:
+        history.append("monthly_details", row)
+    if is_new:
+        history.company = company
+        history.employee_name = (slips[0].get("employee_name") if slips else None) or employee
+    # Totals and checksum are rebuilt from the new rows; validate keeps them
+    rebuild_summary(history)
+    history.flags.summary_maintained = True
+    update_annual_payroll_summary(history, summary)
+
+    after_rows = {_row_key(row): _row_values(row) for row in rows}
+    after_summary = _summary_values(history)
+    added = len(after_rows.keys() - before_rows.keys())
+    removed = len(before_rows.keys() - after_rows.keys())
+    changed = sum(1 for key in after_rows.keys() & before_rows.keys() if after_rows[key] != before_rows[key])
+
+    if not is_new and not (added or removed or changed) and after_summary == before_summary:
+        diff["unchanged"] += 1
+        return "unchanged"
+
+    status = "created" if is_new else "updated"
+    diff[status] += 1
+    diff["rows_added"] += added
+    diff["rows_removed"] += removed
+    diff["rows_changed"] += changed
+    diff["pph21_annual_delta"] = flt(
+        diff["pph21_annual_delta"] + after_summary["pph21_annual"] - before_summary["pph21_annual"], 2
+    )
+    if len(diff["changed"]) < DIFF_SAMPLE_SIZE:
+        diff["changed"].append(employee)
+
+    if not dry_run:
+        history.flags.ignore_links = True
+        history.flags.ignore_permissions = True
+        history.flags.ignore_validate_update_after_submit = True
+        if cint(history.get("docstatus")) == 0:
+            history.docstatus = 1
+        history.save()
+    return status
+
+
+def _rebuild_batch(company: str, fiscal_year: str, employees: List[str], dry_run: bool) -> Dict[str, Any]:
+    """Rebuild the histories of one batch of employees and commit them."""
+    result: Dict[str, Any] = {"slips": 0, "diff": new_diff(), "errors": {}}
+    slips = _stream_slips(company, fiscal_year, employees)
+    for employee in employees:
+        employee_slips = slips.get(employee, [])
+        result["slips"] += len(employee_slips)
+        frappe.db.savepoint(SAVEPOINT)
+        try:
+            run_with_lock_retry(
+                lambda: rebuild_history(
+                    employee, company, fiscal_year, employee_slips, result["diff"], dry_run
+                ),
+                label=f"Annual Payroll History rebuild of {employee}",
+            )
+        except Exception as e:
+            if lock_conflict(e) == DEADLOCK:
+                raise
+            frappe.db.rollback(save_point=SAVEPOINT)
+            result["errors"][employee] = str(e)
+            logger.warning(f"Annual Payroll History rebuild of {employee} {fiscal_year} failed: {str(e)}")
+    if not dry_run:
+        frappe.db.commit()
+    return result
+
+
+def _publish_progress(rebuild_id: str, shard: int, shards: int, progress: Dict[str, Any]) -> None:
+    frappe.cache().hset(_status_key(rebuild_id), str(shard), progress)
+    if not progress["employees"]:
+        return
+    try:
+        frappe.publish_progress(
+            progress["done"] * 100 / progress["employees"],
+            title="Rebuilding Annual Payroll History",
+            description=f"Shard {shard + 1}/{shards}: {progress['done']} / {progress['employees']} employees",
+        )
+    except Exception:
+        # Progress is informational only
+        pass
+
+
+def run_rebuild_shard(
+    rebuild_id: str,
+    company: str,
+    fiscal_year: str,
+    shard: int,
+    shards: int,
+    employees: List[str],
+    dry_run: bool = False,
+) -> Dict[str, Any]:
+    """
+    Background job: rebuild the histories of one shard's ``employees``. The job
+    finishing the last shard merges the results (``finalize_rebuild``).
+    """
+    progress: Dict[str, Any] = {
+        "employees": len(employees),
+        "done": 0,
+        "slips": 0,
+        "diff": new_diff(),
+        "errors": {},
+        "finished": False,
+    }
+    try:
+        for start in range(0, len(employees), EMPLOYEE_BATCH_SIZE):
+            batch = employees[start:start + EMPLOYEE_BATCH_SIZE]
+            # A deadlock rolls the whole batch back; it is rebuilt again from its slips
+            result = run_with_lock_retry(
+                lambda: _rebuild_batch(company, fiscal_year, batch, dry_run),
+                label=f"Annual Payroll History rebuild shard {shard + 1}/{shards}",
+                owns_transaction=True,
+            )
+            progress["slips"] += result["slips"]
+            merge_diff(progress["diff"], result["diff"])
+            progress["errors"].update(result["errors"])
+            progress["done"] += len(batch)
+            _publish_progress(rebuild_id, shard, shards, progress)
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(
+            message=(
+                f"Annual Payroll History rebuild shard {shard + 1}/{shards} of {company} {fiscal_year} "
+                f"failed: {str(e)}\n{traceback.format_exc()}"
+            ),
+            title="Payroll Indonesia Annual History Rebuild Error",
+        )
+        progress["errors"][f"shard-{shard + 1}"] = str(e)
+
+    progress["finished"] = True
+    frappe.cache().hset(_status_key(rebuild_id), str(shard), progress)
+    logger.info(
+        f"Annual Payroll History rebuild {rebuild_id} shard {shard + 1}/{shards}: "
+        f"{progress['done']} employees, {progress['slips']} slips, {len(progress['errors'])} errors"
+    )
+
+    # Atomic counter: exactly one job sees the last shard finish
+    if frappe.cache().incr(_done_counter_key(rebuild_id)) >= shards:
+        finalize_rebuild(rebuild_id, shards)
+    return progress
+
+
+def finalize_rebuild(rebuild_id: str, shards: int) -> Dict[str, Any]:
+    """Coordinator: merge the shard diffs of ``rebuild_id`` into its summary."""
+    cache = frappe.cache()
+    status = cache.hgetall(_status_key(rebuild_id)) or {}
+    info = status.get(INFO_KEY) or {}
+
+    diff = new_diff()
+    errors: Dict[str, str] = {}
+    employees = slips = 0
+    for shard in range(shards):
+        progress = status.get(str(shard))
+        if not progress:
+            logger.warning(f"Missing result of shard {shard + 1}/{shards} for rebuild {rebuild_id}")
+            continue
+        merge_diff(diff, progress.get("diff") or {})
+        errors.update(progress.get("errors") or {})
+        employees += progress.get("done") or 0
+        slips += progress.get("slips") or 0
+
+    summary = {
+        "employees": employees,
+        "slips": slips,
+        "diff": diff,
+        "errors": errors,
+        "duration": time.time() - (info.get("started") or time.time()),
+    }
+    cache.hset(_status_key(rebuild_id), SUMMARY_KEY, summary)
+    cache.delete(_done_counter_key(rebuild_id))
+
+    if errors:
+        frappe.log_error(
+            message="\n".join(f"{name}: {error}" for name, error in sorted(errors.items())),
+            title=f"Payroll Indonesia: {len(errors)} Annual Payroll History rebuild errors ({rebuild_id})",
+        )
+    logger.info(
+        f"Annual Payroll History rebuild {rebuild_id} of {info.get('company')} {info.get('fiscal_year')} "
+        f"finished{' (dry run)' if info.get('dry_run') else ''}: {diff['created']} created, "
+        f"{diff['updated']} updated, {diff['unchanged']} unchanged; rows +{diff['rows_added']} "
+        f"-{diff['rows_removed']} ~{diff['rows_changed']}; PPh21 annual delta "
+        f"{diff['pph21_annual_delta']}; {len(errors)} errors in {summary['duration']:.1f}s"
+    )
+    return summary
+
+
+def get_rebuild_status(rebuild_id: str) -> Dict[str, Any]:
+    """
+    Progress of a rebuild: employees done out of ``employees`` per shard and in
+    total, and the diff ``summary`` once every shard finished.
+    """
+    status = frappe.cache().hgetall(_status_key(rebuild_id)) or {}
+    info = status.get(INFO_KEY) or {}
+    shards = [status.get(str(shard)) or {} for shard in range(cint(info.get("shards")))]
+    done = sum(progress.get("done") or 0 for progress in shards)
+    total = cint(info.get("employees"))
+    return {
+        "info": info,
+        "done": done,
+        "employees": total,
+        "percent": done * 100.0 / total if total else 100.0,
+        "shards": [
+            {key: progress.get(key) for key in ("employees", "done", "slips", "finished")}
+            for progress in shards
+        ],
+        "summary": status.get(SUMMARY_KEY),
+    }
@@ -0,0 +1,174 @@
+"""
+Incremental totals of Annual Payroll History.
+
+Every total (``bruto_total``, ``netto_total``, ``pkp_annual``, ``pph21_annual``,
+``pengurang_netto_total``, ``biaya_jabatan_total``) is the sum of one field of
+the monthly detail rows. The sync path keeps them current with signed deltas
+when it inserts, replaces or removes a row, instead of re-summing every row.
+
+``summary_checksum`` records which rows the totals were summed from: the row
+count and the 64-bit sum of a digest of each row. It is updated together with
+the deltas. When a loaded history's rows no longer match it (rows edited
+outside the sync path), the totals are rebuilt from the rows once.
+"""
+
+import hashlib
+from typing import Any, Dict, Iterable, Optional
+
+import frappe
+
+try:
+    from frappe.utils import flt
+except Exception:  # pragma: no cover - fallback for test stubs without flt
+    def flt(value: Any, precision: Optional[int] = None) -> float:
+        try:
+            return float(value)
+        except Exception:
+            return 0.0
+
+CHECKSUM_FIELD = "summary_checksum"
+
+# Parent total -> monthly detail field it sums
+TOTALS = (
+    ("bruto_total", "bruto"),
+    ("netto_total", "netto"),
+    ("pkp_annual", "pkp"),
+    ("pph21_annual", "pph21"),
+    ("pengurang_netto_total", "pengurang_netto"),
+    ("biaya_jabatan_total", "biaya_jabatan"),
+)
+TOTAL_FIELDS = tuple(total for total, _ in TOTALS)
+
+_MASK = (1 << 64) - 1
+
+
+def _get(obj: Any, field: str) -> Any:
+    if isinstance(obj, dict):
+        return obj.get(field)
+    return getattr(obj, field, None)
+
+
+def _set(obj: Any, field: str, value: Any) -> None:
+    if isinstance(obj, dict):
+        obj[field] = value
+    else:
+        setattr(obj, field, value)
+
+
+def _rows(history: Any) -> Iterable[Any]:
+    rows = history.get("monthly_details") if hasattr(history, "get") else None
+    return rows or []
+
+
+def row_snapshot(row: Any) -> Dict[str, Any]:
+    """Values of a monthly detail row that the totals and the checksum read."""
+    snapshot = {"salary_slip": _get(row, "salary_slip") or "", "bulan": _get(row, "bulan") or 0}
+    for _, field in TOTALS:
+        snapshot[field] = flt(_get(row, field) or 0)
+    if not snapshot["netto"]:
+        # Rows without a stored netto count bruto - pengurang netto - biaya jabatan
+        snapshot["netto"] = snapshot["bruto"] - snapshot["pengurang_netto"] - snapshot["biaya_jabatan"]
+    return snapshot
+
+
+def _digest(snapshot: Dict[str, Any]) -> int:
+    key = "|".join(
+        [str(snapshot["salary_slip"]), str(snapshot["bulan"])]
+        + [f"{snapshot[field]:.2f}" for _, field in TOTALS]
+    )
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+def _format_checksum(count: int, total: int) -> str:
+    return f"{count}:{total & _MASK:016x}"
+
+
+def _parse_checksum(checksum: Any) -> Optional[tuple]:
+    try:
+        count, total = str(checksum).split(":")
+        return int(count), int(total, 16)
+    except (TypeError, ValueError):
+        return None
+
+
+def summary_checksum(rows: Iterable[Any]) -> str:
+    """Checksum of ``rows``, as stored in ``summary_checksum``."""
+    count = total = 0
+    for row in rows:
+        count += 1
+        total += _digest(row_snapshot(row))
+    return _format_checksum(count, total)
+
+
+def rebuild_summary(history: Any, rows: Optional[Iterable[Any]] = None) -> None:
+    """
+    Full rescan: set every total and the checksum from the monthly detail rows
+    (``rows``, or ``history.monthly_details``).
+    """
+    totals = dict.fromkeys(TOTAL_FIELDS, 0.0)
+    count = checksum = 0
+    for row in _rows(history) if rows is None else rows:
+        snapshot = row_snapshot(row)
+        for total, field in TOTALS:
+            totals[total] += snapshot[field]
+        count += 1
+        checksum += _digest(snapshot)
+    for total, value in totals.items():
+        _set(history, total, flt(value, 2))
+    _set(history, CHECKSUM_FIELD, _format_checksum(count, checksum))
+
+
+def prepare_summary(
+    history: Any, is_new: bool = False, rows: Optional[Iterable[Any]] = None
+) -> None:
+    """
+    Start maintaining ``history``'s totals with deltas.
+
+    A new history starts from zero; an existing one whose rows do not match its
+    stored checksum is rebuilt first. Sets ``flags.summary_maintained`` so that
+    ``AnnualPayrollHistory.validate`` keeps the totals instead of re-summing.
+    """
+    rows = list(_rows(history) if rows is None else rows)
+    if is_new and not rows:
+        for total in TOTAL_FIELDS:
+            _set(history, total, 0.0)
+        _set(history, CHECKSUM_FIELD, _format_checksum(0, 0))
+    elif _get(history, CHECKSUM_FIELD) != summary_checksum(rows):
+        if _get(history, CHECKSUM_FIELD):
+            frappe.logger("payroll_indonesia").warning(
+                f"Annual Payroll History {_get(history, 'name')}: summary checksum mismatch, "
+                f"rebuilding totals from {len(rows)} monthly rows"
+            )
+        rebuild_summary(history, rows)
+    flags = _get(history, "flags")
+    if flags is not None:
+        _set(flags, "summary_maintained", True)
+
+
+def is_summary_maintained(history: Any) -> bool:
+    flags = _get(history, "flags")
+    return bool(flags is not None and _get(flags, "summary_maintained"))
+
+
+def apply_row_delta(
+    history: Any, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]
+) -> None:
+    """
+    Move the totals and the checksum from row snapshot ``old`` to ``new``.
+
+    ``old`` is None for an inserted row, ``new`` is None for a removed one.
+    """
+    for total, field in TOTALS:
+        delta = (new[field] if new else 0.0) - (old[field] if old else 0.0)
+        if delta:
+            _set(history, total, flt(flt(_get(history, total) or 0) + delta, 2))
+
+    parsed = _parse_checksum(_get(history, CHECKSUM_FIELD)) or (0, 0)
+    count, checksum = parsed
+    if old is not None:
+        count -= 1
+        checksum -= _digest(old)
+    if new is not None:
+        count += 1
+        checksum += _digest(new)
+    _set(history, CHECKSUM_FIELD, _format_checksum(count, checksum))
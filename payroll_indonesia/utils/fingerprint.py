@@ -0,0 +1,157 @@
+"""
+Input fingerprints for incremental payroll re-runs.
+
+A salary slip is fully determined by the employee's Salary Structure
+Assignment, the Additional Salaries of the period, the employee's tax
+attributes, attendance/leave of the period and the Payroll Indonesia Settings.
+``compute_input_fingerprints`` hashes those inputs per employee with a fixed
+number of grouped queries; a draft slip whose stored fingerprint still matches
+can be kept when its Payroll Entry is run again.
+"""
+
+import hashlib
+import json
+from typing import Any, Dict, Iterable, Optional
+
+import frappe
+
+from payroll_indonesia.utils.ytd import YTDPrefetch
+
+# Custom Field on Salary Slip holding the fingerprint the slip was computed from
+FINGERPRINT_FIELD = "payroll_indonesia_fingerprint"
+
+# Employee fields that change the PPh21 result or the payment days
+EMPLOYEE_FIELDS = (
+    "tax_status",
+    "employment_type",
+    "status",
+    "date_of_joining",
+    "relieving_date",
+    "npwp_no",
+)
+
+
+def _hash(payload: Dict[str, Any]) -> str:
+    data = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def _existing_fields(doctype: str, fields: Iterable[str]) -> list:
+    meta = frappe.get_meta(doctype)
+    return [f for f in fields if meta.has_field(f)]
+
+
+def _overlaps(row: Dict[str, Any], start_date: Any, end_date: Any) -> bool:
+    from_date = row.get("from_date")
+    to_date = row.get("to_date")
+    return (not from_date or str(from_date) <= str(end_date)) and (
+        not to_date or str(to_date) >= str(start_date)
+    )
+
+
+def compute_input_fingerprints(
+    employees: Iterable[str],
+    start_date: Any,
+    end_date: Any,
+    settings_version: str,
+    tax_mode: str,
+    ytd: Optional[YTDPrefetch] = None,
+) -> Dict[str, str]:
+    """
+    Fingerprint the slip inputs of every employee for the period.
+
+    Args:
+        employees: Employee names of the Payroll Entry
+        start_date, end_date: Payroll period
+        settings_version: Persisted settings version of the run
+            (``get_settings_version``, equal to ``PayrollSettingsSnapshot.version``)
+        tax_mode: "TER" or "DECEMBER"
+        ytd: December only, the Jan–Nov YTD prefetch the slips are computed from
+
+    Returns:
+        Dict of employee -> hex fingerprint
+    """
+    employees = sorted({e for e in employees if e})
+    if not employees:
+        return {}
+
+    payload: Dict[str, Dict[str, Any]] = {
+        emp: {
+            "period": [str(start_date), str(end_date)],
+            "mode": tax_mode,
+            "settings": settings_version,
+            "assignment": None,
+            "additional_salary": [],
+            "employee": None,
+            "attendance": None,
+            "leave": None,
+        }
+        for emp in employees
+    }
+
+    # Latest submitted assignment effective in the period
+    for row in frappe.get_all(
+        "Salary Structure Assignment",
+        filters={"employee": ["in", employees], "docstatus": 1, "from_date": ["<=", end_date]},
+        fields=["employee", "name", "salary_structure", "from_date", "base", "variable", "modified"],
+        order_by="employee asc, from_date desc",
+    ):
+        entry = payload[row.get("employee")]
+        if entry["assignment"] is None:
+            entry["assignment"] = row
+
+    for row in frappe.get_all(
+        "Additional Salary",
+        filters={"employee": ["in", employees], "docstatus": 1},
+        or_filters=[
+            ["payroll_date", "between", [start_date, end_date]],
+            ["is_recurring", "=", 1],
+        ],
+        fields=[
+            "employee", "name", "salary_component", "amount", "payroll_date",
+            "is_recurring", "from_date", "to_date", "overwrite_salary_structure_amount", "modified",
+        ],
+        order_by="name asc",
+    ):
+        if row.get("is_recurring") and not _overlaps(row, start_date, end_date):
+            continue
+        payload[row.get("employee")]["additional_salary"].append(row)
+
+    for row in frappe.get_all(
+        "Employee",
+        filters={"name": ["in", employees]},
+        fields=["name"] + _existing_fields("Employee", EMPLOYEE_FIELDS),
+    ):
+        payload[row.get("name")]["employee"] = row
+
+    # Payment days: count and last change of attendance / leave in the period
+    for row in frappe.get_all(
+        "Attendance",
+        filters={
+            "employee": ["in", employees],
+            "docstatus": 1,
+            "attendance_date": ["between", [start_date, end_date]],
+        },
+        fields=["employee", "count(name) as records", "max(modified) as last_modified"],
+        group_by="employee",
+    ):
+        payload[row.get("employee")]["attendance"] = [row.get("records"), row.get("last_modified")]
+
+    for row in frappe.get_all(
+        "Leave Application",
+        filters={
+            "employee": ["in", employees],
+            "docstatus": 1,
+            "from_date": ["<=", end_date],
+            "to_date": [">=", start_date],
+        },
+        fields=["employee", "count(name) as records", "max(modified) as last_modified"],
+        group_by="employee",
+    ):
+        payload[row.get("employee")]["leave"] = [row.get("records"), row.get("last_modified")]
+
+    if ytd is not None:
+        for emp in employees:
+            payload[emp]["ytd"] = ytd.get(emp, ytd.fiscal_year)
+
+    return {emp: _hash(entry) for emp, entry in payload.items()}
@@ -0,0 +1,82 @@
+"""
+Write-behind buffer for "light" Salary Slip fields.
+
+``db_set`` is one UPDATE per field per slip. ``LightFieldWriter`` collects the
+changed values of a whole chunk and writes them with one multi-row UPDATE per
+``FLUSH_BATCH_SIZE`` slips, each field set through ``CASE name WHEN ... END``.
+``modified`` is left untouched, as with ``db_set(..., update_modified=False)``.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import frappe
+
+logger = frappe.logger("payroll_indonesia")
+
+# Slips per UPDATE statement
+FLUSH_BATCH_SIZE = 500
+
+
+class LightFieldWriter:
+    """Buffer of (name -> {field: value}) for one DocType, flushed in bulk."""
+
+    def __init__(self, doctype: str, fields: Iterable[str]):
+        self.doctype = doctype
+        # Only these fields may be written; they become SQL identifiers
+        self.fields = frozenset(fields)
+        self.pending: Dict[str, Dict[str, Any]] = {}
+
+    def set(self, name: str, field: str, value: Any) -> None:
+        if field not in self.fields:
+            raise ValueError(f"{field} is not a light field of {self.doctype}")
+        self.pending.setdefault(name, {})[field] = value
+
+    def discard(self, name: str) -> None:
+        """Drop pending values of ``name`` (e.g. after a full save wrote them)."""
+        self.pending.pop(name, None)
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def flush(self) -> int:
+        """
+        Write every pending value and clear the buffer.
+
+        Returns:
+            Number of UPDATE statements issued
+        """
+        names = list(self.pending)
+        statements = 0
+        for start in range(0, len(names), FLUSH_BATCH_SIZE):
+            batch = names[start:start + FLUSH_BATCH_SIZE]
+            query, values = self._build_update(batch)
+            if query:
+                frappe.db.sql(query, values)
+                statements += 1
+        logger.debug(
+            f"Flushed light fields of {len(names)} {self.doctype} rows in {statements} statements"
+        )
+        self.pending = {}
+        return statements
+
+    def _build_update(self, names: List[str]) -> Tuple[Optional[str], List[Any]]:
+        assignments: List[str] = []
+        values: List[Any] = []
+        for field in sorted(self.fields):
+            cases = [(name, self.pending[name][field]) for name in names if field in self.pending[name]]
+            if not cases:
+                continue
+            whens = " ".join(["WHEN %s THEN %s"] * len(cases))
+            assignments.append(f"`{field}` = CASE `name` {whens} ELSE `{field}` END")
+            for name, value in cases:
+                values.extend((name, value))
+        if not assignments:
+            return None, []
+
+        placeholders = ", ".join(["%s"] * len(names))
+        values.extend(names)
+        query = (
+            f"UPDATE `tab{self.doctype}` SET {', '.join(assignments)} "
+            f"WHERE `name` IN ({placeholders})"
+        )
+        return query, values
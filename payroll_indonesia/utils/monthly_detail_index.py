@@ -0,0 +1,116 @@
+"""
+Per-load index of Annual Payroll History monthly detail rows.
+
+Finding the row of a salary slip or of a month used to scan
+``history.monthly_details`` on every upsert, removal and YTD read.
+``get_detail_index`` builds a ``salary_slip`` -> rows and ``bulan`` -> rows map
+once per loaded history and keeps it on the document; the sync helpers update
+it as they append, re-key and remove rows. An index whose row list was replaced
+or changed length behind its back is rebuilt on the next lookup.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+def _get(row: Any, field: str) -> Any:
+    if isinstance(row, dict):
+        return row.get(field)
+    return getattr(row, field, None)
+
+
+def _bulan(row: Any) -> int:
+    try:
+        return int(_get(row, "bulan") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+class MonthlyDetailIndex:
+    """Rows of one history by salary slip and by month, in row order."""
+
+    __slots__ = ("rows", "count", "by_slip", "by_bulan", "keys")
+
+    def __init__(self, rows: List[Any]):
+        self.rows = rows
+        self.count = 0
+        self.by_slip: Dict[str, List[Any]] = {}
+        self.by_bulan: Dict[int, List[Any]] = {}
+        # id(row) -> (salary_slip, bulan) the row is indexed under
+        self.keys: Dict[int, Tuple[Optional[str], int]] = {}
+        for row in rows:
+            self._insert(row)
+
+    def _insert(self, row: Any) -> None:
+        slip, bulan = _get(row, "salary_slip") or None, _bulan(row)
+        if slip:
+            self.by_slip.setdefault(slip, []).append(row)
+        self.by_bulan.setdefault(bulan, []).append(row)
+        self.keys[id(row)] = (slip, bulan)
+        self.count += 1
+
+    def _drop(self, row: Any) -> None:
+        slip, bulan = self.keys.pop(id(row))
+        if slip:
+            self._remove_from(self.by_slip, slip, row)
+        self._remove_from(self.by_bulan, bulan, row)
+        self.count -= 1
+
+    @staticmethod
+    def _remove_from(mapping: Dict[Any, List[Any]], key: Any, row: Any) -> None:
+        rows = [r for r in mapping.get(key, []) if r is not row]
+        if rows:
+            mapping[key] = rows
+        else:
+            mapping.pop(key, None)
+
+    def is_current(self, rows: List[Any]) -> bool:
+        return rows is self.rows and len(rows) == self.count
+
+    def add(self, row: Any) -> None:
+        """Index a row just appended to the history."""
+        self._insert(row)
+
+    def update(self, row: Any) -> None:
+        """Re-key a row whose ``salary_slip`` or ``bulan`` may have changed."""
+        if self.keys.get(id(row)) != (_get(row, "salary_slip") or None, _bulan(row)):
+            self._drop(row)
+            self._insert(row)
+
+    def remove(self, row: Any) -> None:
+        """Remove a row from the history's row list and from the index."""
+        self._drop(row)
+        self.rows[:] = [r for r in self.rows if r is not row]
+
+    def find_slip(self, salary_slip: Optional[str]) -> Optional[Any]:
+        rows = self.by_slip.get(salary_slip) if salary_slip else None
+        return rows[0] if rows else None
+
+    def rows_for_slip(self, salary_slip: Optional[str]) -> List[Any]:
+        return list(self.by_slip.get(salary_slip, [])) if salary_slip else []
+
+    def find_month(self, bulan: int) -> Optional[Any]:
+        rows = self.by_bulan.get(bulan)
+        return rows[0] if rows else None
+
+    def rows_in_months(self, first: int, last: int) -> Iterator[Any]:
+        for bulan in range(first, last + 1):
+            yield from self.by_bulan.get(bulan, [])
+
+
+def get_detail_index(history: Any) -> MonthlyDetailIndex:
+    """Index of ``history.monthly_details``, built once per loaded document."""
+    rows = history.get("monthly_details") if hasattr(history, "get") else None
+    if rows is None:
+        rows = []
+        try:
+            history.monthly_details = rows
+        except AttributeError:
+            pass
+    index = getattr(history, "_detail_index", None)
+    if index is None or not index.is_current(rows):
+        index = MonthlyDetailIndex(rows)
+        try:
+            history._detail_index = index
+        except AttributeError:
+            pass
+    return index
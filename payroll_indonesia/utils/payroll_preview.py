@@ -0,0 +1,37 @@
+"""
+Desk / API entry point for the dry-run preview of a Payroll Entry
+(``CustomPayrollEntry.preview_salary_slips``).
+"""
+
+from typing import Any, Dict
+
+import frappe
+
+
+@frappe.whitelist()
+def preview_payroll_entry(payroll_entry: str) -> Dict[str, Any]:
+    """
+    Calculate PPh21 for every eligible employee of ``payroll_entry`` without
+    creating Salary Slips or Annual Payroll History rows.
+
+    The rows hold every employee's salary figures, so only the payroll roles
+    (as for ``resume_payroll_entry``) may run it, not every reader of the entry.
+
+    Returns:
+        Dict with the tax mode, the per-employee rows and their totals
+    """
+    frappe.only_for(["System Manager", "HR Manager"])
+    entry = frappe.get_doc("Payroll Entry", payroll_entry)
+    entry.check_permission("read")
+    rows = entry.preview_salary_slips()
+    valid = [row for row in rows if not row.get("error")]
+    return {
+        "payroll_entry": payroll_entry,
+        "tax_mode": "DECEMBER" if getattr(entry, "run_payroll_indonesia_december", False) else "TER",
+        "rows": rows,
+        "totals": {
+            field: sum(row.get(field) or 0 for row in valid)
+            for field in ("bruto", "netto", "pkp", "pph21", "koreksi")
+        },
+        "errors": len(rows) - len(valid),
+    }
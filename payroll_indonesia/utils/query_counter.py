@@ -0,0 +1,41 @@
+"""
+Count the database queries issued while a block runs.
+
+Every Frappe database access (``get_doc``, ``get_all``, ``get_value``,
+``db_set``, ...) goes through ``frappe.db.sql``. ``QueryCounter`` wraps it for
+the duration of a ``with`` block so a payroll run can report how many queries
+it needed.
+"""
+
+import frappe
+
+
+class QueryCounter:
+    """Context manager counting ``frappe.db.sql`` calls; nests safely."""
+
+    def __init__(self):
+        self.count = 0
+        self._db = None
+        self._sql = None
+        self._own_attr = False
+
+    def __enter__(self) -> "QueryCounter":
+        self._db = frappe.db
+        self._sql = self._db.sql
+        # Whether sql is set on the instance (an outer counter, a test stub)
+        self._own_attr = "sql" in vars(self._db)
+        original = self._sql
+
+        def counted_sql(*args, **kwargs):
+            self.count += 1
+            return original(*args, **kwargs)
+
+        self._db.sql = counted_sql
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        if self._own_attr:
+            self._db.sql = self._sql
+        else:
+            del self._db.sql
+        return False
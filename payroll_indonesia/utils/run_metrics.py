@@ -0,0 +1,181 @@
+"""
+Per-stage timing of Payroll Entry runs.
+
+``RunMetrics`` records wall time, database queries and rows per stage (base slip
+creation, loading, tax calculation, save, submit, Annual Payroll History sync,
+...), per chunk and per salary slip. Chunk jobs return their metrics as a plain
+dict which the run merges; ``save_run_metrics`` stores the result in a
+"Payroll Run Metrics" record linked to the Payroll Entry.
+"""
+
+import json
+import math
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import frappe
+
+from payroll_indonesia.utils.query_counter import QueryCounter
+
+logger = frappe.logger("payroll_indonesia")
+
+METRICS_DOCTYPE = "Payroll Run Metrics"
+
+# Slips listed by name in the "slowest slips" breakdown
+SLOWEST_SLIPS = 10
+
+STAGE_DELETE = "delete_salary_slips"
+STAGE_BASE_SLIPS = "create_base_slips"
+STAGE_LOAD = "load_slips"
+STAGE_CALCULATE_BATCH = "calculate_batch"
+STAGE_CALCULATE = "calculate_income_tax"
+STAGE_SAVE = "save"
+STAGE_SUBMIT = "submit"
+STAGE_ANNUAL_HISTORY = "sync_annual_payroll_history"
+# Time spent waiting for Annual Payroll History row locks (rows: histories locked),
+# part of STAGE_ANNUAL_HISTORY
+STAGE_ANNUAL_HISTORY_LOCK = "annual_history_lock_wait"
+STAGE_LIGHT_FIELDS = "flush_light_fields"
+STAGE_FINALIZE = "finalize"
+
+
+def percentile(values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of ``values`` (0.0 when empty)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, int(math.ceil(pct / 100.0 * len(ordered))))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class StageRecord:
+    """Handle yielded by ``RunMetrics.stage``; set ``rows`` once known."""
+
+    __slots__ = ("rows",)
+
+    def __init__(self, rows: int):
+        self.rows = rows
+
+
+class RunMetrics:
+    """Stage, chunk and per-slip timings of one payroll run (or one chunk of it)."""
+
+    def __init__(self):
+        # stage -> {"calls", "rows", "seconds", "queries"}
+        self.stages: Dict[str, Dict[str, float]] = {}
+        # One entry per chunk: {"slips", "seconds", "queries"}
+        self.chunks: List[Dict[str, Any]] = []
+        # slip name -> seconds spent in its own stages
+        self.slips: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str, rows: int = 0, slip: Optional[str] = None) -> Iterator[StageRecord]:
+        """
+        Time the block as stage ``name``. With ``slip`` the time also counts
+        towards that slip; leave it out for stages nested in another slip stage.
+        """
+        record = StageRecord(rows)
+        counter = QueryCounter()
+        start = time.perf_counter()
+        try:
+            with counter:
+                yield record
+        finally:
+            self.add(name, time.perf_counter() - start, counter.count, record.rows, slip)
+
+    def add(
+        self, name: str, seconds: float, queries: int = 0, rows: int = 0, slip: Optional[str] = None
+    ) -> None:
+        totals = self.stages.setdefault(name, {"calls": 0, "rows": 0, "seconds": 0.0, "queries": 0})
+        totals["calls"] += 1
+        totals["rows"] += rows
+        totals["seconds"] += seconds
+        totals["queries"] += queries
+        if slip:
+            self.slips[slip] = self.slips.get(slip, 0.0) + seconds
+
+    def add_chunk(self, slips: int, seconds: float, queries: int) -> None:
+        self.chunks.append({"slips": slips, "seconds": seconds, "queries": queries})
+
+    def merge(self, other: Optional[Dict[str, Any]]) -> None:
+        """Add the metrics of a chunk (``RunMetrics.to_dict`` output)."""
+        if not other:
+            return
+        for name, totals in (other.get("stages") or {}).items():
+            mine = self.stages.setdefault(name, {"calls": 0, "rows": 0, "seconds": 0.0, "queries": 0})
+            for key in mine:
+                mine[key] += totals.get(key) or 0
+        self.chunks.extend(other.get("chunks") or [])
+        for slip, seconds in (other.get("slips") or {}).items():
+            self.slips[slip] = self.slips.get(slip, 0.0) + seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"stages": self.stages, "chunks": self.chunks, "slips": self.slips}
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> "RunMetrics":
+        metrics = cls()
+        metrics.merge(data)
+        return metrics
+
+    def summary(self) -> Dict[str, Any]:
+        """Per-slip p50/p95/max (seconds) and the slowest slips by name."""
+        durations = list(self.slips.values())
+        slowest = sorted(self.slips.items(), key=lambda item: item[1], reverse=True)[:SLOWEST_SLIPS]
+        return {
+            "slip_count": len(durations),
+            "slip_p50": percentile(durations, 50),
+            "slip_p95": percentile(durations, 95),
+            "slip_max": max(durations) if durations else 0.0,
+            "slowest": [{"salary_slip": name, "seconds": round(seconds, 4)} for name, seconds in slowest],
+        }
+
+
+def save_run_metrics(
+    payroll_entry: str,
+    metrics: RunMetrics,
+    total_seconds: float,
+    tax_mode: Optional[str] = None,
+    queued: bool = False,
+) -> Optional[str]:
+    """
+    Store ``metrics`` as a Payroll Run Metrics record of ``payroll_entry``.
+    Never raises; returns the record name or None.
+    """
+    try:
+        summary = metrics.summary()
+        doc = frappe.get_doc({
+            "doctype": METRICS_DOCTYPE,
+            "payroll_entry": payroll_entry,
+            "tax_mode": tax_mode,
+            "queued": 1 if queued else 0,
+            "total_seconds": round(total_seconds, 4),
+            "total_queries": sum(int(chunk.get("queries") or 0) for chunk in metrics.chunks),
+            "slip_count": summary["slip_count"],
+            "chunk_count": len(metrics.chunks),
+            "slip_p50_seconds": round(summary["slip_p50"], 4),
+            "slip_p95_seconds": round(summary["slip_p95"], 4),
+            "slip_max_seconds": round(summary["slip_max"], 4),
+            "stages": [
+                {
+                    "stage": name,
+                    "calls": int(totals["calls"]),
+                    "rows": int(totals["rows"]),
+                    "seconds": round(totals["seconds"], 4),
+                    "queries": int(totals["queries"]),
+                }
+                for name, totals in metrics.stages.items()
+            ],
+            "slowest_slips": json.dumps(summary["slowest"], indent=1),
+            "chunks": json.dumps(metrics.chunks),
+        })
+        doc.insert(ignore_permissions=True)
+        logger.info(
+            f"Payroll run metrics of {payroll_entry}: {total_seconds:.2f}s, "
+            f"{summary['slip_count']} slips, p95 {summary['slip_p95']:.3f}s ({doc.name})"
+        )
+        return doc.name
+    except Exception as e:
+        logger.warning(f"Could not save payroll run metrics for {payroll_entry}: {str(e)}")
+        return None
@@ -0,0 +1,53 @@
+"""
+Integer-rupiah fixed-point helpers.
+
+With ``use_integer_rupiah`` enabled in Payroll Indonesia Settings the PPh21
+engines keep every amount as whole rupiah (``int``) and every rate as basis
+points (1% = 100 bp). Rounding is integer half-up division, so results are
+exactly reproducible and no ``Decimal`` is created in the hot path.
+"""
+
+from typing import Any
+
+__all__ = [
+    "BP_PER_PERCENT",
+    "BP_SCALE",
+    "to_rupiah",
+    "div_half_up",
+    "to_basis_points",
+    "apply_basis_points",
+]
+
+# 1% = 100 basis points; 100% = 10.000 basis points
+BP_PER_PERCENT = 100
+BP_SCALE = 100 * BP_PER_PERCENT
+
+
+def to_rupiah(value: Any) -> int:
+    """Convert an amount (int, float, numeric str or None) to whole rupiah, half-up."""
+    if isinstance(value, int):
+        return value
+    if not value:
+        return 0
+    value = float(value)
+    if value >= 0:
+        return int(value + 0.5)
+    return -int(-value + 0.5)
+
+
+def div_half_up(numerator: int, denominator: int) -> int:
+    """Integer division rounded half away from zero (``denominator`` > 0)."""
+    quotient, remainder = divmod(abs(numerator), denominator)
+    if remainder * 2 >= denominator:
+        quotient += 1
+    return quotient if numerator >= 0 else -quotient
+
+
+def to_basis_points(rate_percent: Any) -> int:
+    """Convert a percentage (e.g. 1.75) to basis points (175), half-up."""
+    return to_rupiah(float(rate_percent or 0) * BP_PER_PERCENT)
+
+
+def apply_basis_points(amount: int, rate_bp: int) -> int:
+    """``amount`` × ``rate_bp`` / 10.000, rounded half-up to whole rupiah."""
+    return div_half_up(amount * rate_bp, BP_SCALE)
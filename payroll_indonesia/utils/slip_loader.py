@@ -0,0 +1,71 @@
+"""
+Bulk loading of Salary Slip documents.
+
+``frappe.get_doc`` runs one query for the parent and one per child table for
+every slip. ``load_salary_slips`` reads the parent rows of many slips with one
+query and the rows of each child DocType (``Salary Detail`` holds both earnings
+and deductions) with one query per DocType, then builds the documents in memory.
+"""
+
+from typing import Any, Dict, List, Sequence
+
+import frappe
+
+SALARY_SLIP = "Salary Slip"
+
+
+def _table_fields_by_doctype(doctype: str) -> Dict[str, List[str]]:
+    """Child DocType -> table fieldnames of ``doctype`` using it."""
+    tables: Dict[str, List[str]] = {}
+    for df in frappe.get_meta(doctype).get_table_fields():
+        tables.setdefault(df.options, []).append(df.fieldname)
+    return tables
+
+
+def load_salary_slips(names: Sequence[str], doctype: str = SALARY_SLIP) -> Dict[str, Any]:
+    """
+    Load the documents ``names`` of ``doctype`` with their child tables.
+
+    Uses 1 + (number of child DocTypes) queries regardless of ``len(names)``.
+    Names that do not exist are missing from the returned dict.
+
+    Returns:
+        Dict of name -> document (the DocType's controller class)
+    """
+    names = list(dict.fromkeys(n for n in names if n))
+    if not names:
+        return {}
+
+    parents = frappe.get_all(doctype, filters={"name": ["in", names]}, fields=["*"])
+    if not parents:
+        return {}
+
+    tables = _table_fields_by_doctype(doctype)
+    children: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+    found = [p.get("name") for p in parents]
+    for child_doctype, fieldnames in tables.items():
+        rows = frappe.get_all(
+            child_doctype,
+            filters={
+                "parenttype": doctype,
+                "parent": ["in", found],
+                "parentfield": ["in", fieldnames],
+            },
+            fields=["*"],
+            order_by="idx asc",
+        )
+        for row in rows:
+            row = dict(row)
+            row["doctype"] = child_doctype
+            children.setdefault(row["parent"], {}).setdefault(row["parentfield"], []).append(row)
+
+    all_fieldnames = [f for fieldnames in tables.values() for f in fieldnames]
+    docs: Dict[str, Any] = {}
+    for parent in parents:
+        data = dict(parent)
+        data["doctype"] = doctype
+        parent_children = children.get(data["name"], {})
+        for fieldname in all_fieldnames:
+            data[fieldname] = parent_children.get(fieldname, [])
+        docs[data["name"]] = frappe.get_doc(data)
+    return docs
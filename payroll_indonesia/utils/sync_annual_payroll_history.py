@@ -4,6 +4,20 @@ import json
 import traceback
 from typing import Dict, List, Optional, Tuple, Union, Any
 
+from payroll_indonesia.utils.annual_history_summary import (
+    TOTAL_FIELDS,
+    apply_row_delta,
+    is_summary_maintained,
+    prepare_summary,
+    row_snapshot,
+)
+from payroll_indonesia.utils.annual_history_lock import (
+    lock_histories,
+    reraise_lock_conflict,
+    run_with_lock_retry,
+)
+from payroll_indonesia.utils.monthly_detail_index import get_detail_index
+
 try:
     from frappe.utils import cint, flt, getdate
 except Exception:  # pragma: no cover - fallback for test stubs without cint/flt
@@ -78,7 +92,8 @@ def truncate_doc_name(name: str, max_length: int = 140) -> str:
 def get_or_create_annual_payroll_history(
     employee_id: str, 
     fiscal_year: str, 
-    create_if_missing: bool = True
+    create_if_missing: bool = True,
+    for_update: bool = False,
 ) -> Optional[Any]:
     """
     Get or create Annual Payroll History document.
@@ -87,17 +102,26 @@ def get_or_create_annual_payroll_history(
         employee_id: Employee ID
         fiscal_year: Fiscal year
         create_if_missing: Whether to create document if not found
+        for_update: Lock the existing document until the transaction ends
         
     Returns:
         Annual Payroll History document or None
     """
-    doc_name = frappe.db.get_value(
-        "Annual Payroll History",
-        {"employee": employee_id, "fiscal_year": fiscal_year},
-        "name"
-    )
+    if for_update:
+        rows = lock_histories([(employee_id, fiscal_year)])
+        # A live history wins over a cancelled one
+        live = [row for row in rows if cint(row.get("docstatus")) != 2]
+        doc_name = (live or rows)[0].get("name") if rows else None
+    else:
+        doc_name = frappe.db.get_value(
+            "Annual Payroll History",
+            {"employee": employee_id, "fiscal_year": fiscal_year},
+            "name"
+        )
     
     if doc_name:
+        if for_update:
+            return frappe.get_doc("Annual Payroll History", doc_name, for_update=True)
         return frappe.get_doc("Annual Payroll History", doc_name)
 
     if not create_if_missing:
@@ -139,6 +163,46 @@ def get_or_create_annual_payroll_history(
     return history
 
 
+def history_values_from_result(
+    result: Dict[str, Any], bulan: int, salary_slip: Optional[str], december: bool = False
+) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+    """
+    Monthly detail row and (December only) summary of a PPh 21 result
+    (a Salary Slip's ``pph21_info``).
+
+    Returns:
+        Tuple of (monthly_result, summary); summary is None for other months
+    """
+    raw_rate = result.get("rate", 0)
+    numeric_rate = raw_rate if isinstance(raw_rate, (int, float)) else 0
+
+    monthly_result = {
+        "bulan": bulan,
+        "bruto": result.get("bruto", result.get("bruto_total", 0)),
+        "pengurang_netto": result.get("pengurang_netto", result.get("income_tax_deduction_total", 0)),
+        "biaya_jabatan": result.get("biaya_jabatan", result.get("biaya_jabatan_total", 0)),
+        "netto": result.get("netto", result.get("netto_total", 0)),
+        "pkp": result.get("pkp", result.get("pkp_annual", 0)),
+        "rate": flt(numeric_rate),
+        "pph21": result.get("pph21", result.get("pph21_bulan", 0)),
+        "salary_slip": salary_slip,
+    }
+
+    summary = None
+    if december:
+        summary = {
+            "bruto_total": result.get("bruto_total", 0),
+            "netto_total": result.get("netto_total", 0),
+            "ptkp_annual": result.get("ptkp_annual", 0),
+            "pkp_annual": result.get("pkp_annual", 0),
+            "pph21_annual": result.get("pph21_annual", 0),
+            "koreksi_pph21": result.get("koreksi_pph21", 0),
+        }
+        if isinstance(raw_rate, str) and raw_rate:
+            summary["rate_slab"] = raw_rate
+    return monthly_result, summary
+
+
 def update_annual_payroll_summary(history: Any, summary: Dict[str, Any]) -> None:
     """
     Update Annual Payroll History summary fields.
@@ -165,6 +229,10 @@ def update_annual_payroll_summary(history: Any, summary: Dict[str, Any]) -> None
         # This allows the DocType's default value to be used
         if v is None:
             continue
+
+        # Totals of a maintained history follow its monthly rows
+        if field_name in TOTAL_FIELDS and is_summary_maintained(history):
+            continue
             
         if hasattr(history, field_name):
             setattr(history, field_name, v)
@@ -270,17 +338,9 @@ def upsert_monthly_detail(history: Any, month_data: Dict[str, Any]) -> bool:
             )
             return False
 
-    # Improved duplicate detection logic - require both month and slip to match
-    found = None
-    for detail in history.get("monthly_details", []):
-        # If salary slip is provided, match by salary slip first
-        if salary_slip and detail.salary_slip == salary_slip:
-            found = detail
-            break
-        # If no match by salary slip but month matches, use it only if no slip is set
-        if not found and detail.bulan == bulan and not salary_slip:
-            found = detail
-            break
+    # Match by salary slip; by month only when no slip is given
+    index = get_detail_index(history)
+    found = index.find_slip(salary_slip) if salary_slip else index.find_month(bulan)
 
     numeric_fields = [
         "bruto",
@@ -292,10 +352,14 @@ def upsert_monthly_detail(history: Any, month_data: Dict[str, Any]) -> bool:
         "pph21",
     ]
 
+    maintained = is_summary_maintained(history)
     if found:
         target = found
+        before = row_snapshot(found) if maintained else None
     else:
         target = history.append("monthly_details", {})
+        index.add(target)
+        before = None
 
     target.set("bulan", bulan)
     if salary_slip:
@@ -342,6 +406,10 @@ def upsert_monthly_detail(history: Any, month_data: Dict[str, Any]) -> bool:
                 
             target.set(field, flt(value))
 
+    index.update(target)
+    if maintained:
+        apply_row_delta(history, before, row_snapshot(target))
+
     return True
 
 
@@ -365,29 +433,29 @@ def remove_monthly_detail_by_salary_slip(
         return 0
 
     # Set error state if provided (now consistently serialized to JSON)
+    index = get_detail_index(history)
     if error_state is not None:
-        for detail in history.get("monthly_details", []):
-            if detail.salary_slip == salary_slip:
-                # Ensure error_state is properly serialized
-                if not isinstance(error_state, str):
+        detail = index.find_slip(salary_slip)
+        if detail is not None:
+            # Ensure error_state is properly serialized
+            if not isinstance(error_state, str):
+                detail.error_state = json.dumps(error_state)
+            else:
+                # Check if it's already JSON string
+                try:
+                    json.loads(error_state)
+                    detail.error_state = error_state
+                except Exception:
                     detail.error_state = json.dumps(error_state)
-                else:
-                    # Check if it's already JSON string
-                    try:
-                        json.loads(error_state)
-                        detail.error_state = error_state
-                    except Exception:
-                        detail.error_state = json.dumps(error_state)
-                break
         return 0
 
-    to_remove = []
-    for i, detail in enumerate(history.get("monthly_details", [])):
-        if detail.salary_slip == salary_slip:
-            to_remove.append(i)
+    to_remove = index.rows_for_slip(salary_slip)
 
-    for i in reversed(to_remove):
-        history.monthly_details.pop(i)
+    maintained = is_summary_maintained(history)
+    for removed in to_remove:
+        index.remove(removed)
+        if maintained:
+            apply_row_delta(history, row_snapshot(removed), None)
 
     return len(to_remove)
 
@@ -580,6 +648,9 @@ def sync_annual_payroll_history_for_bulan(
 ) -> Optional[str]:
     """
     Synchronize Annual Payroll History for a specific month.
+
+    The history is locked for the rest of the transaction; a lock-wait timeout
+    is retried with backoff (see ``utils.annual_history_lock``).
     
     Args:
         employee: Employee ID, dict or object
@@ -593,6 +664,23 @@ def sync_annual_payroll_history_for_bulan(
     Returns:
         Name of the updated document or None
     """
+    return run_with_lock_retry(
+        lambda: _sync_annual_payroll_history_for_bulan(
+            employee, fiscal_year, bulan, monthly_results, summary, cancelled_salary_slip, error_state
+        ),
+        label="Annual Payroll History sync",
+    )
+
+
+def _sync_annual_payroll_history_for_bulan(
+    employee: Union[str, Dict[str, Any], Any],
+    fiscal_year: str,
+    bulan: Optional[int] = None,
+    monthly_results: Optional[List[Dict[str, Any]]] = None,
+    summary: Optional[Dict[str, Any]] = None,
+    cancelled_salary_slip: Optional[str] = None,
+    error_state: Optional[Dict[str, Any]] = None,
+) -> Optional[str]:
     # Validate employee parameter
     employee_id = None
     if isinstance(employee, str) and employee:
@@ -667,7 +755,7 @@ def sync_annual_payroll_history_for_bulan(
 
     try:
         history = get_or_create_annual_payroll_history(
-            employee_id, fiscal_year, create_if_missing=not only_cancel
+            employee_id, fiscal_year, create_if_missing=not only_cancel, for_update=True
         )
 
         if not history:
@@ -679,6 +767,8 @@ def sync_annual_payroll_history_for_bulan(
             return None
 
         is_new_doc = history.is_new()
+        # Totals follow the rows through deltas from here on
+        prepare_summary(history, is_new=is_new_doc)
         rows_updated = 0
         rows_deleted = 0
 
@@ -770,10 +860,15 @@ def sync_annual_payroll_history_for_bulan(
                     if history.get(field) is None:
                         history.set(field, 0)
 
-        # Calculate totals from monthly details when no summary is provided.
+        # Calculate totals from monthly details when no summary is provided and
+        # the totals were not kept up to date with deltas (prepare_summary).
         # Also ensure totals are recalculated when a salary slip is cancelled
         # without providing new monthly results.
-        if not summary and (monthly_results or cancelled_salary_slip):
+        if (
+            not summary
+            and (monthly_results or cancelled_salary_slip)
+            and not is_summary_maintained(history)
+        ):
             try:
                 # Aggregate monthly details to calculate totals
                 recalculate_summary_from_monthly_details(history)
@@ -834,6 +929,7 @@ def sync_annual_payroll_history_for_bulan(
             )
 
         except Exception as e:
+            reraise_lock_conflict(e, savepoint_name)
             frappe.db.rollback(save_point=savepoint_name)
             
             error_trace = traceback.format_exc()
@@ -848,6 +944,7 @@ def sync_annual_payroll_history_for_bulan(
             frappe.throw(error_message)
             
     except Exception as e:
+        reraise_lock_conflict(e, savepoint_name)
         frappe.db.rollback(save_point=savepoint_name)
         
         error_trace = traceback.format_exc()
@@ -0,0 +1,93 @@
+"""
+Year-to-date (Jan–Nov) totals from Annual Payroll History for December runs.
+
+``CustomSalarySlip._get_ytd_from_aph`` reads one employee's Annual Payroll
+History document (with every child row) per slip. For a December Payroll Entry
+``get_ytd_jan_nov_bulk`` sums bruto, netto and PPh21 of months 1–11 for every
+employee of the entry with one grouped query; the slips then read their YTD from
+the returned ``YTDPrefetch``.
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+
+import frappe
+from frappe.utils import flt
+
+logger = frappe.logger("payroll_indonesia")
+
+# (ytd_bruto_jan_nov, ytd_netto_jan_nov, ytd_tax_paid_jan_nov)
+YTDTotals = Tuple[float, float, float]
+
+ZERO_YTD: YTDTotals = (0.0, 0.0, 0.0)
+
+# Netto falls back to bruto - biaya jabatan - pengurang netto when the row has none,
+# same as the per-slip reader
+_YTD_QUERY = """
+    SELECT
+        aph.employee AS employee,
+        SUM(IFNULL(c.bruto, 0)) AS bruto,
+        SUM(
+            CASE WHEN IFNULL(c.netto, 0) != 0 THEN c.netto
+            ELSE IFNULL(c.bruto, 0) - IFNULL(c.biaya_jabatan, 0) - IFNULL(c.pengurang_netto, 0)
+            END
+        ) AS netto,
+        SUM(IFNULL(c.pph21, 0)) AS pph21
+    FROM `tabAnnual Payroll History Child` c
+    INNER JOIN `tabAnnual Payroll History` aph
+        ON aph.name = c.parent AND c.parenttype = 'Annual Payroll History'
+    WHERE aph.fiscal_year = %(fiscal_year)s
+        AND aph.employee IN %(employees)s
+        AND c.bulan BETWEEN 1 AND 11
+    GROUP BY aph.employee
+"""
+
+
+class YTDPrefetch:
+    """Jan–Nov YTD totals of one fiscal year, keyed by employee."""
+
+    __slots__ = ("fiscal_year", "totals")
+
+    def __init__(self, fiscal_year: str, totals: Dict[str, YTDTotals]):
+        self.fiscal_year = str(fiscal_year)
+        self.totals = totals
+
+    def get(self, employee: str, fiscal_year: str) -> Optional[YTDTotals]:
+        """Totals of ``employee``, or None if it was not prefetched for ``fiscal_year``."""
+        if str(fiscal_year) != self.fiscal_year:
+            return None
+        return self.totals.get(employee)
+
+    def __len__(self) -> int:
+        return len(self.totals)
+
+
+def get_ytd_jan_nov_bulk(employees: Iterable[str], fiscal_year: str) -> Optional[YTDPrefetch]:
+    """
+    Prefetch Jan–Nov YTD bruto, netto and PPh21 for ``employees`` with one query.
+
+    Employees without Annual Payroll History rows get ``ZERO_YTD``. Returns None
+    when the query fails, so callers fall back to the per-slip reader.
+    """
+    employees = sorted({e for e in employees if e})
+    if not employees or not fiscal_year:
+        return None
+
+    try:
+        rows = frappe.db.sql(
+            _YTD_QUERY,
+            {"fiscal_year": str(fiscal_year), "employees": tuple(employees)},
+            as_dict=True,
+        )
+    except Exception as e:
+        logger.warning(f"Error prefetching YTD from Annual Payroll History: {e}")
+        return None
+
+    totals: Dict[str, YTDTotals] = dict.fromkeys(employees, ZERO_YTD)
+    for row in rows:
+        totals[row.get("employee")] = (flt(row.get("bruto")), flt(row.get("netto")), flt(row.get("pph21")))
+
+    logger.info(
+        f"Prefetched YTD Jan-Nov {fiscal_year} for {len(employees)} employees "
+        f"({len(rows)} with Annual Payroll History)"
+    )
+    return YTDPrefetch(fiscal_year, totals)